@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+API GET cache benchmark: cold encode vs. cached 200 vs. conditional 304
+for a large config section, as seen by a polling collector.
+
+Usage: python benchmarks/bench_api_cache.py [--vlans 4000] [--requests 2000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+for path in (SRC_DIR, os.path.join(SRC_DIR, "mgmt", "web")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import api
+
+
+def _rate(client, requests, headers=None, invalidate=False):
+    t0 = time.perf_counter()
+    for _ in range(requests):
+        if invalidate:
+            api.RESPONSE_CACHE.clear()
+        client.get("/api/l2/vlans", headers=headers or {})
+    return round(requests / (time.perf_counter() - t0))
+
+
+def run(vlans=4000, requests=2000):
+    with api.DATASTORE.begin("bench") as txn:
+        txn.set(("vlans",), {str(v): {"vlan_id": v, "name": f"vlan{v}"} for v in range(1, vlans + 1)})
+    client = api.app.test_client()
+    first = client.get("/api/l2/vlans")
+    etag = first.headers["ETag"]
+    gz = client.get("/api/l2/vlans", headers={"Accept-Encoding": "gzip"})
+    return {
+        "vlans": vlans,
+        "body_bytes": len(first.data),
+        "gzip_bytes": len(gz.data),
+        "uncached_rps": _rate(client, requests, invalidate=True),
+        "cached_rps": _rate(client, requests),
+        "not_modified_rps": _rate(client, requests, {"If-None-Match": etag}),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS API GET cache benchmark")
+    parser.add_argument("--vlans", type=int, default=4000)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.vlans, args.requests), indent=2))
+
+
+if __name__ == "__main__":
+    main()
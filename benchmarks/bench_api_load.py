@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Management API load test: p50/p99 latency and requests/sec for a GET and a
+PUT path at 1, 8 and 64 concurrent keep-alive clients.
+
+By default it starts the production server (src/mgmt/web/serve.py) on a free
+port; --target flask-dev starts the Flask debug server (api.py) instead for
+comparison, and --url points at an already running server.
+
+Usage: python benchmarks/bench_api_load.py [--target serve|flask-dev] [--url http://host:port]
+                                           [--clients 1,8,64] [--seconds 3]
+"""
+import argparse
+import http.client
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WEB_DIR = os.path.join(ROOT, "src", "mgmt", "web")
+
+SCENARIOS = {
+    "get_vlans": ("GET", "/api/l2/vlans", None),
+    "put_stp": ("PUT", "/api/l2/stp", {"enabled": True, "priority": 4096}),
+}
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(target):
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port))
+    if target == "flask-dev":
+        cmd = [sys.executable, os.path.join(WEB_DIR, "api.py")]
+    else:
+        cmd = [sys.executable, os.path.join(WEB_DIR, "serve.py"), "--host", "127.0.0.1", "--port", str(port)]
+    proc = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            conn.request("GET", "/api/health")
+            if conn.getresponse().status == 200:
+                return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.2)
+    stop_server(proc)
+    raise RuntimeError(f"server did not start: {' '.join(cmd)}")
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        pass
+    proc.wait(timeout=10)
+
+
+def seed(url, vlans):
+    """Populate the VLAN table so GETs return a realistic body"""
+    parts = urlsplit(url)
+    conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=30)
+    body = json.dumps({"operations": [{"op": "set", "path": f"l2/vlans/1-{vlans}",
+                                       "value": {"name": "vlan{vlan_id}"}}]})
+    conn.request("POST", "/api/batch", body, {"Content-Type": "application/json"})
+    conn.getresponse().read()
+
+
+def _client(host, port, method, path, body, deadline, latencies, errors):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    headers = {"Content-Type": "application/json"} if body is not None else {}
+    while time.perf_counter() < deadline:
+        t0 = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException):
+            errors.append(0)
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append(time.perf_counter() - t0)
+    conn.close()
+
+
+def _percentile(values, pct):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def measure(url, scenario, clients, seconds):
+    method, path, payload = SCENARIOS[scenario]
+    body = json.dumps(payload) if payload is not None else None
+    parts = urlsplit(url)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_client, args=(parts.hostname, parts.port, method, path, body,
+                                                      deadline, latencies, errors))
+               for _ in range(clients)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "clients": clients,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2) if latencies else None,
+    }
+
+
+def run(target="serve", url=None, clients=(1, 8, 64), seconds=3.0, vlans=1000):
+    proc = None
+    if url is None:
+        proc, url = start_server(target)
+    try:
+        seed(url, vlans)
+        return {
+            "target": target if proc is not None else url,
+            "results": {scenario: [measure(url, scenario, n, seconds) for n in clients]
+                        for scenario in SCENARIOS},
+        }
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS management API load test")
+    parser.add_argument("--target", choices=("serve", "flask-dev"), default="serve")
+    parser.add_argument("--url", help="test an already running server instead")
+    parser.add_argument("--clients", default="1,8,64")
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--vlans", type=int, default=1000)
+    args = parser.parse_args()
+    clients = [int(n) for n in args.clients.split(",")]
+    print(json.dumps(run(args.target, args.url, clients, args.seconds, args.vlans), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Management API at scale, in process through the Flask test client: seed a
+config of every VLAN (4094), --routes static routes and --acls ACL rules
+from fixed-seed generators, then time the endpoints an operator and a
+collector hit against it (p50/p99 per request): section GETs cold, warm
+and conditional, paged route views, single-item edits, FIB and ACL
+lookups, and the version history.
+
+Usage: python benchmarks/bench_api_scale.py [--routes 100000] [--acls 50000] [--requests 200] [--seed 7]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SRC_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src")
+for path in (SRC_DIR, os.path.join(SRC_DIR, "mgmt", "web")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import api
+from bench_acl import NETS, _ip, make_rule
+from bench_routes import make_routes
+
+MAX_VLAN = 4094
+BATCH = 50000
+
+
+def _quantiles(samples):
+    samples = sorted(samples)
+    return {"p50_us": round(samples[len(samples) // 2] * 1e6, 1),
+            "p99_us": round(samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1e6, 1)}
+
+
+def timed(requests, call):
+    """p50/p99 of call(i) for i in range(requests); call must return a response with a 2xx/304 status"""
+    samples = []
+    perf = time.perf_counter
+    for i in range(requests):
+        t0 = perf()
+        resp = call(i)
+        samples.append(perf() - t0)
+        if resp.status_code >= 400:
+            raise RuntimeError(f"{resp.status_code}: {resp.get_data(as_text=True)[:200]}")
+    return _quantiles(samples)
+
+
+def _batch(client, operations):
+    for first in range(0, len(operations), BATCH):
+        resp = client.post("/api/batch", json={"operations": operations[first:first + BATCH]})
+        if resp.status_code != 200:
+            raise RuntimeError(resp.get_data(as_text=True)[:200])
+
+
+def seed(client, routes, acls, rng):
+    """Seed the config; seconds per part"""
+    spent = {}
+    t0 = time.perf_counter()
+    _batch(client, [{"op": "set", "path": f"l2/vlans/1-{MAX_VLAN}", "value": {"name": "vlan{vlan_id}"}},
+                    {"op": "set", "path": "l2/interfaces/eth0-47", "value": {"mode": "trunk", "vlan": 1,
+                                                                              "allowed_vlans": "1-4094"}}])
+    spent["vlans_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+    table, _ = make_routes(routes, 8, seed=rng.getrandbits(32))
+    t0 = time.perf_counter()
+    _batch(client, [{"op": "append", "path": "l3/static-routes",
+                     "value": {"destination": r["destination"], "gateway": r["gateway"]}} for r in table])
+    spent["routes_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+    rules = [make_rule(rng) for _ in range(acls)]
+    t0 = time.perf_counter()
+    _batch(client, [{"op": "set", "path": "mgmt/acl", "value": rules}])
+    spent["acl_ms"] = round((time.perf_counter() - t0) * 1e3, 1)
+    return spent, table
+
+
+def run(routes=100000, acls=50000, requests=200, seed_value=7):
+    rng = random.Random(seed_value)
+    client = api.app.test_client()
+    result = {"vlans": MAX_VLAN, "routes": routes, "acls": acls, "requests": requests}
+    result["seed"], table = seed(client, routes, acls, rng)
+
+    def bump(i):
+        return client.put("/api/l2/lldp", json={"enabled": bool(i & 1)})
+
+    vlans = {}
+    vlans["get_cold"] = timed(requests // 10 or 1, lambda i: (client.post("/api/l2/vlans", json={
+        "vlan_id": 2 + i % 4000, "name": f"edit{i}"}), client.get("/api/l2/vlans"))[1])
+    vlans["get_warm"] = timed(requests, lambda i: client.get("/api/l2/vlans"))
+    etag = client.get("/api/l2/vlans").headers["ETag"]
+    vlans["get_304"] = timed(requests, lambda i: client.get("/api/l2/vlans", headers={"If-None-Match": etag}))
+    vlans["post"] = timed(requests, lambda i: client.post("/api/l2/vlans", json={"vlan_id": 2 + i % 4000,
+                                                                                 "name": f"v{i}"}))
+    vlans["port_members"] = timed(requests, lambda i: client.get(f"/api/l2/vlans/{1 + i % MAX_VLAN}/ports"))
+    result["vlans_api"] = vlans
+
+    routes_api = {}
+    client.get("/api/l3/static-routes?limit=100")
+    routes_api["page_warm"] = timed(requests, lambda i: client.get(
+        f"/api/l3/static-routes?offset={(i * 7919) % max(1, routes - 100)}&limit=100"))
+    ids = []
+
+    def add(i):
+        resp = client.post("/api/l3/static-routes", json={"destination": f"198.18.{i >> 8 & 255}.{i & 255}/32",
+                                                         "gateway": "192.0.2.1"})
+        ids.append(resp.get_json()["route"]["id"])
+        return resp
+
+    routes_api["add"] = timed(requests, add)
+    routes_api["page_after_edit"] = timed(requests // 10 or 1, lambda i: (bump(i), client.post(
+        "/api/l3/static-routes", json={"destination": f"198.19.{i >> 8 & 255}.{i & 255}/32", "gateway": "192.0.2.2"}),
+        client.get("/api/l3/static-routes?limit=100"))[2])
+    routes_api["get_one"] = timed(requests, lambda i: client.get(f"/api/l3/static-routes/{ids[i]}"))
+    routes_api["delete"] = timed(requests, lambda i: client.delete(f"/api/l3/static-routes/{ids[i]}"))
+    addresses = [_ip(rng.getrandbits(32)) for _ in range(requests)]
+    routes_api["fib_lookup"] = timed(requests, lambda i: client.get(f"/api/l3/fib/lookup?address={addresses[i]}"))
+    result["routes_api"] = routes_api
+
+    acl = {}
+    packets = [{"src": _ip(rng.choice(NETS) | rng.getrandbits(16)), "dst": _ip(rng.choice(NETS) | rng.getrandbits(16)),
+                "proto": rng.choice(("tcp", "udp")), "src_port": rng.randrange(1024, 65536),
+                "dst_port": rng.choice((22, 53, 80, 443, 8080))} for _ in range(requests)]
+    acl["classify"] = timed(requests, lambda i: client.post("/api/mgmt/acl/classify", json={"packets": [packets[i]]}))
+    acl["classify_batch_256"] = timed(requests // 10 or 1, lambda i: client.post(
+        "/api/mgmt/acl/classify", json={"packets": (packets * 2)[:256]}))
+    acl["get_warm"] = timed(requests // 10 or 1, lambda i: client.get("/api/mgmt/acl"))
+    acl["append"] = timed(requests // 10 or 1, lambda i: client.post("/api/mgmt/acl", json=make_rule(rng)))
+    result["acl_api"] = acl
+
+    result["config_api"] = {
+        "versions": timed(requests, lambda i: client.get("/api/config/versions?limit=20")),
+        "put_small_section": timed(requests, bump),
+    }
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS management API scale benchmark")
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--acls", type=int, default=50000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(run(args.routes, args.acls, args.requests, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
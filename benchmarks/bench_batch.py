@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Bulk provisioning benchmark: 10k config edits sent as individual REST
+calls vs. one /api/batch request (item list, and with server-side ranges).
+
+Usage: python benchmarks/bench_batch.py [--items 10000] [--ports 48]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+for path in (SRC_DIR, os.path.join(SRC_DIR, "mgmt", "web")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import api
+
+
+def workload(items, ports):
+    """VLAN creates (up to 4094) then interface updates round-robin over ports"""
+    vlans = min(items, 4094)
+    ops = [{"op": "set", "path": f"l2/vlans/{v}", "value": {"vlan_id": v, "name": f"vlan{v}"}}
+           for v in range(1, vlans + 1)]
+    for i in range(items - vlans):
+        port = f"eth{i % ports}"
+        ops.append({"op": "merge", "path": f"l2/interfaces/{port}",
+                    "value": {"mode": "trunk", "description": f"rev {i // ports}"}})
+    return ops
+
+
+def _reset():
+    with api.DATASTORE.begin("reset") as txn:
+        txn.set(("vlans",), {})
+        txn.set(("interfaces",), {})
+
+
+def per_item(client, ops):
+    _reset()
+    t0 = time.perf_counter()
+    for op in ops:
+        if op["path"].startswith("l2/vlans/"):
+            client.post("/api/l2/vlans", json=op["value"])
+        else:
+            client.put(f"/api/{op['path']}", json=op["value"])
+    return time.perf_counter() - t0
+
+
+def batched(client, ops):
+    _reset()
+    t0 = time.perf_counter()
+    response = client.post("/api/batch", json={"operations": ops})
+    elapsed = time.perf_counter() - t0
+    assert response.status_code == 200, response.json
+    return elapsed
+
+
+def run(items=10000, ports=48):
+    client = api.app.test_client()
+    ops = workload(items, ports)
+    vlans = min(items, 4094)
+    ranged = [{"op": "set", "path": f"l2/vlans/1-{vlans}", "value": {"name": "vlan{vlan_id}"}},
+              {"op": "merge", "path": f"l2/interfaces/eth0-{ports - 1}", "value": {"mode": "trunk"}}]
+    single_s = per_item(client, ops)
+    batch_s = batched(client, ops)
+    ranged_s = batched(client, ranged)
+    return {
+        "items": items,
+        "per_item_s": round(single_s, 3),
+        "per_item_ops_per_s": round(items / single_s),
+        "batch_s": round(batch_s, 3),
+        "batch_ops_per_s": round(items / batch_s),
+        "speedup": round(single_s / batch_s, 1),
+        "ranged_batch_s": round(ranged_s, 4),
+        "commits": api.DATASTORE.version,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS bulk provisioning benchmark")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--ports", type=int, default=48)
+    args = parser.parse_args()
+    print(json.dumps(run(args.items, args.ports), indent=2))
+
+
+if __name__ == "__main__":
+    main()
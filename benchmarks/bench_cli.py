@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+CLI benchmark and startup budget check: the import cost of the CLI module
+(python -X importtime, bytecode cached) against a 50 ms budget; a one-shot
+`nateos-cli show` process vs the same show on a persistent session, shows
+sent one by one vs pipelined; a script of set lines committed once vs a
+commit per line; and streaming `show routes` over a large route table
+(time to the first row, rows/s, a server-side match).
+
+Exits 1 when the import budget is blown, so it can gate CI.
+
+Usage: python benchmarks/bench_cli.py [--url http://host:port] [--shows 1000] [--sets 1000] [--routes 100000]
+                                      [--budget-ms 50]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CLI_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src", "mgmt", "cli")
+CLI = os.path.join(CLI_DIR, "cli.py")
+if CLI_DIR not in sys.path:
+    sys.path.insert(0, CLI_DIR)
+
+from bench_api_load import start_server, stop_server
+from cli import Session, Shell
+
+BUDGET_MS = 50.0
+
+
+class Sink:
+    """Output that keeps nothing but notes when the first row (second write) arrived"""
+
+    def __init__(self):
+        self.writes = 0
+        self.first_row = None
+
+    def write(self, text):
+        self.writes += 1
+        if self.writes == 2 and self.first_row is None:
+            self.first_row = time.perf_counter()
+
+    def flush(self):
+        pass
+
+
+def import_ms(runs=7):
+    """Median cumulative import time of the cli module, with bytecode cached as in an install"""
+    env = {k: v for k, v in os.environ.items() if k != "PYTHONDONTWRITEBYTECODE"}
+    env["PYTHONPATH"] = CLI_DIR
+    code = "import cli"
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-X", "importtime", "-c", code], env=env, check=True,
+                             capture_output=True, text=True).stderr
+        line = next(line for line in out.splitlines() if line.rstrip().endswith("| cli"))
+        samples.append(int(line.split("|")[1]) / 1e3)
+    return statistics.median(samples)
+
+
+def one_shot(url, runs=10):
+    """Wall time of a whole `nateos-cli show` process"""
+    samples = []
+    for _ in range(runs):
+        t0 = time.perf_counter()
+        subprocess.run([sys.executable, CLI, "--url", url, "show", "stp"], check=True, stdout=subprocess.DEVNULL)
+        samples.append(time.perf_counter() - t0)
+    return statistics.median(samples) * 1e3
+
+
+def shows(url, count):
+    lines = ["show stp", "show system", "show lldp", "show health"] * (count // 4)
+    shell = Shell(Session(url), Sink())
+    shell.run(lines[:4])
+    t0 = time.perf_counter()
+    for line in lines:
+        shell.run([line])
+    sequential = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    shell.run(lines)
+    pipelined = time.perf_counter() - t0
+    connects = shell.session.stats["connects"]
+    shell.session.close()
+    return {"count": len(lines), "session_show_us": round(sequential / len(lines) * 1e6, 1),
+            "pipelined_show_us": round(pipelined / len(lines) * 1e6, 1),
+            "pipelined_speedup": round(sequential / pipelined, 2), "connections": connects}
+
+
+def sets(url, count):
+    lines = [f"set l2/vlans/{vid} name=cli{vid}" for vid in range(2, count + 2)]
+    shell = Shell(Session(url), Sink())
+    t0 = time.perf_counter()
+    errors = shell.run(lines + ["commit script"])
+    batched = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for line in lines:
+        errors += shell.run([line.replace("name=cli", "name=each"), "commit"])
+    each = time.perf_counter() - t0
+    shell.session.close()
+    if errors:
+        raise RuntimeError("set lines failed")
+    return {"count": len(lines), "one_commit_ms": round(batched * 1e3, 1), "commit_each_ms": round(each * 1e3, 1),
+            "speedup": round(each / batched, 1)}
+
+
+def stream(url, routes):
+    session = Session(url)
+    for first in range(0, routes, 50000):
+        session.call("POST", "/batch", {"operations": [
+            {"op": "append", "path": "l3/static-routes",
+             "value": {"destination": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}/32",
+                       "gateway": f"192.0.2.{1 + i % 8}"}}
+            for i in range(first, min(routes, first + 50000))]})
+    result = {"routes": routes}
+    for name, line in (("show_routes_cold", "show routes"), ("show_routes", "show routes"),
+                       ("match_cold", "show routes | match 192.0.2.3"), ("match", "show routes | match 192.0.2.3")):
+        sink = Sink()
+        shell = Shell(session, sink)
+        t0 = time.perf_counter()
+        shell.run([line])
+        elapsed = time.perf_counter() - t0
+        result[name] = {"first_row_ms": round((sink.first_row - t0) * 1e3, 1), "total_ms": round(elapsed * 1e3, 1)}
+    result["rows_per_s"] = round(routes / (result["show_routes"]["total_ms"] / 1e3))
+    session.close()
+    return result
+
+
+def run(url=None, count_shows=1000, count_sets=1000, routes=100000, budget=BUDGET_MS):
+    startup = import_ms()
+    result = {"import_ms": round(startup, 2), "budget_ms": budget, "within_budget": startup <= budget}
+    proc = None
+    if url is None:
+        proc, url = start_server("serve")
+    try:
+        result["one_shot_process_ms"] = round(one_shot(url), 1)
+        result["shows"] = shows(url, count_shows)
+        result["sets"] = sets(url, count_sets)
+        if routes:
+            result["stream"] = stream(url, routes)
+        return result
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS CLI benchmark and import budget check")
+    parser.add_argument("--url", help="test an already running server instead")
+    parser.add_argument("--shows", type=int, default=1000)
+    parser.add_argument("--sets", type=int, default=1000)
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--budget-ms", type=float, default=BUDGET_MS)
+    args = parser.parse_args()
+    result = run(args.url, args.shows, args.sets, args.routes, args.budget_ms)
+    print(json.dumps(result, indent=2))
+    if not result["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Datastore benchmark: single-entry commit, diff and snapshot cost as the
+config grows, to check that commits scale with the change, not the config.
+
+Usage: python benchmarks/bench_datastore.py [--sizes 1000,12000,48000] [--commits N]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from mgmt.datastore import Datastore
+
+
+def make_config(entries):
+    half = entries // 2
+    return {
+        "interfaces": {f"eth{i}": {"mode": "trunk" if i % 4 == 0 else "access", "vlan": 1 + i % 4094}
+                       for i in range(half)},
+        "vlans": {str(i): {"vlan_id": i, "name": f"vlan{i}"} for i in range(1, half + 1)},
+        "system": {"hostname": "nateos-switch", "domain": "local"},
+    }
+
+
+def measure(entries, commits):
+    t0 = time.perf_counter()
+    store = Datastore(make_config(entries))
+    load_s = time.perf_counter() - t0
+    base = store.version
+
+    t0 = time.perf_counter()
+    for i in range(commits):
+        with store.begin("bench") as txn:
+            txn.merge(("interfaces", f"eth{i % (entries // 2)}"), {"description": f"uplink {i}"})
+    commit_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    changes = store.diff(base, store.version)
+    diff_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for version in range(base, store.version + 1):
+        store.snapshot(version)
+    snapshot_s = time.perf_counter() - t0
+
+    return {
+        "entries": entries,
+        "load_s": round(load_s, 3),
+        "commit_us": round(commit_s / commits * 1e6, 1),
+        "diff_ms": round(diff_s * 1000, 3),
+        "diff_changes": len(changes),
+        "snapshot_us": round(snapshot_s / (commits + 1) * 1e6, 2),
+    }
+
+
+def run(sizes=(1000, 12000, 48000), commits=1000):
+    return {str(size): measure(size, commits) for size in sizes}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS config datastore benchmark")
+    parser.add_argument("--sizes", default="1000,12000,48000")
+    parser.add_argument("--commits", type=int, default=1000)
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",")]
+    print(json.dumps(run(sizes, args.commits), indent=2))
+
+
+if __name__ == "__main__":
+    main()
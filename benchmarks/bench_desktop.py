@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Desktop GUI load benchmark against a 4094-VLAN, 1000-route config: the old
+start-up path (health plus ten section GETs, each a fresh urlopen, serially on
+the UI thread) vs the pooled client (parallel keep-alive fetches on workers,
+rows built on the UI thread as sections land, first page only for the paged
+tables), a warm refresh revalidated with ETags, and the refresh after adding
+a VLAN (full reload vs the cached list patched from the /api/stream change
+feed).
+
+Then the windowed route table on --table-routes routes: time until the first
+window, a jump to the middle, a sort toggle, a new sort field and a filter
+have their rows, and until a route added elsewhere shows up in the loaded
+pages; plus the UI-thread cost of each redraw's row diff.
+
+Needs no display: it times the client work and the row building the window
+does, not Tk drawing. --rtt-ms repeats the runs through a local proxy that
+delays every chunk by half the round trip each way, for a remote API.
+
+Usage: python benchmarks/bench_desktop.py [--url http://host:port] [--vlans 4094] [--routes 1000] [--rounds 5]
+                                          [--rtt-ms 0,20] [--table-routes 100000]
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import sys
+import threading
+import time
+import urllib.request
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DESKTOP_DIR = os.path.join(os.path.dirname(BENCH_DIR), "src", "mgmt", "desktop")
+if DESKTOP_DIR not in sys.path:
+    sys.path.insert(0, DESKTOP_DIR)
+
+from bench_api_load import start_server, stop_server
+from client import ApiClient, wait_for
+from app import SECTIONS, TABLES
+from table import PagedRows, diff_rows
+
+# The old window fetched every section whole, tables included
+ALL_SECTIONS = dict(SECTIONS, **{name: table[0] for name, table in TABLES.items()})
+WINDOW = 10
+
+
+def seed(client, vlans, routes, interfaces=48):
+    operations = [{"op": "set", "path": f"l2/vlans/1-{vlans}", "value": {"name": "vlan{vlan_id}"}},
+                  {"op": "set", "path": f"l2/interfaces/eth0-{interfaces - 1}", "value": {"mode": "access", "vlan": 1}}]
+    client.post("/batch", {"operations": operations})
+    add_routes(client, 0, routes)
+
+
+def add_routes(client, start, count, per_batch=50000):
+    for first in range(start, start + count, per_batch):
+        client.post("/batch", {"operations": [
+            {"op": "append", "path": "l3/static-routes",
+             "value": {"destination": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}/32",
+                       "gateway": f"192.0.2.{1 + i % 8}"}}
+            for i in range(first, min(start + count, first + per_batch))]})
+
+
+def rows(section, value):
+    """The row strings the window builds for a section (the UI-thread work besides drawing)"""
+    if section == "vlans":
+        return [f"VLAN {vid} {('- ' + v.get('name', '')) if v.get('name') else ''}" for vid, v in value.items()]
+    if section == "interfaces":
+        return [f"{name} - {c.get('mode', 'access')} - VLAN {c.get('vlan', '-')}" for name, c in value.items()]
+    if section == "static_routes":
+        return [f"{r.get('destination', '')} via {r.get('gateway', '')}" for r in value]
+    return [value]
+
+
+def serial_load(url):
+    """The old _load_all: one fresh connection per GET, all on the UI thread"""
+    t0 = time.perf_counter()
+    for path in ["/health"] + list(ALL_SECTIONS.values()):
+        with urllib.request.urlopen(f"{url}/api{path}") as resp:
+            value = json.loads(resp.read().decode("utf-8"))
+        section = next((name for name, p in ALL_SECTIONS.items() if p == path), None)
+        if section:
+            rows(section, value)
+    elapsed = time.perf_counter() - t0
+    return {"ready_ms": elapsed * 1e3, "ui_blocked_ms": elapsed * 1e3}
+
+
+def pooled_load(client):
+    """The new _load_all: parallel fetches, callbacks dispatched on this (UI) thread"""
+    ui = [0.0]
+    paths = {path: name for name, path in SECTIONS.items()}
+
+    def landed(path, value):
+        t0 = time.perf_counter()
+        if path in paths:
+            rows(paths[path], value)
+        else:
+            diff_rows({}, value["entries"][:WINDOW], "id")
+        ui[0] += time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    futures = [client.submit(lambda: client.get("/health"))]
+    pages = [PagedRows(client, path, None).query(0) for path, _, _ in TABLES.values()]
+    futures += client.fetch_many(list(paths) + pages, landed)
+    wait_for(client, futures)
+    return {"ready_ms": (time.perf_counter() - t0) * 1e3, "ui_blocked_ms": ui[0] * 1e3}
+
+
+def edit_refresh(url, client, changed, vlan):
+    """Add a VLAN, then time until the VLAN list has it: full reload vs the patched stream copy"""
+    t0 = time.perf_counter()
+    client.post("/l2/vlans", {"vlan_id": vlan, "name": "old"})
+    with urllib.request.urlopen(f"{url}/api/l2/vlans") as resp:
+        rows("vlans", json.loads(resp.read().decode("utf-8")))
+    reload_ms = (time.perf_counter() - t0) * 1e3
+
+    changed.clear()
+    t0 = time.perf_counter()
+    client.post("/l2/vlans", {"vlan_id": vlan, "name": "new"})
+    deadline = time.perf_counter() + 10
+    while time.perf_counter() < deadline:
+        client.dispatch()
+        if changed:
+            vlans = changed.pop()
+            if vlans is None:
+                wait_for(client, client.fetch_many(["/l2/vlans"], lambda path, value: changed.append(value)))
+                vlans = changed.pop()
+            if vlans.get(str(vlan), {}).get("name") == "new":
+                rows("vlans", vlans)
+                break
+        time.sleep(0.0005)
+    return {"full_reload_ms": reload_ms, "subscription_ms": (time.perf_counter() - t0) * 1e3}
+
+
+class DelayProxy:
+    """TCP proxy adding rtt/2 to each direction of every connection"""
+
+    def __init__(self, url, rtt_ms):
+        host, port = url.rsplit("//", 1)[1].split(":")
+        self.upstream = (host, int(port))
+        self.delay = rtt_ms / 2000.0
+        self.sock = socket.create_server(("127.0.0.1", 0))
+        self.url = f"http://127.0.0.1:{self.sock.getsockname()[1]}"
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def _accept(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            server = socket.create_connection(self.upstream)
+            for src, dst in ((client, server), (server, client)):
+                threading.Thread(target=self._pump, args=(src, dst), daemon=True).start()
+
+    def _pump(self, src, dst):
+        try:
+            while True:
+                data = src.recv(65536)
+                if not data:
+                    break
+                time.sleep(self.delay)
+                dst.sendall(data)
+        except OSError:
+            pass
+        finally:
+            for s in (src, dst):
+                try:
+                    s.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    def close(self):
+        self.sock.close()
+
+
+def _median(results, key):
+    return round(statistics.median(r[key] for r in results), 2)
+
+
+def measure(url, rounds):
+    client = ApiClient(f"{url}/api")
+    try:
+        changed = []
+        client.subscribe({"vlans": "/l2/vlans"}, lambda changes: changed.append(changes["vlans"]))
+        wait_for(client, client.fetch_many(["/l2/vlans"], lambda path, value: None))
+        serial = [serial_load(url) for _ in range(rounds)]
+        cold = []
+        for _ in range(rounds):
+            fresh = ApiClient(f"{url}/api")
+            cold.append(pooled_load(fresh))
+            fresh.close()
+        warm_client = ApiClient(f"{url}/api")
+        pooled_load(warm_client)
+        before = dict(warm_client.stats)
+        warm = [pooled_load(warm_client) for _ in range(rounds)]
+        not_modified = warm_client.stats["not_modified"] - before["not_modified"]
+        warm_client.close()
+        deadline = time.time() + 5
+        while not client.subscribed and time.time() < deadline:
+            time.sleep(0.01)
+        edits = [edit_refresh(url, client, changed, 4000 + i) for i in range(rounds)]
+    finally:
+        client.close()
+    return {
+        "serial_urlopen": {"ready_ms": _median(serial, "ready_ms"), "ui_blocked_ms": _median(serial, "ui_blocked_ms")},
+        "pooled_cold": {"ready_ms": _median(cold, "ready_ms"), "ui_blocked_ms": _median(cold, "ui_blocked_ms")},
+        "pooled_warm": {"ready_ms": _median(warm, "ready_ms"), "ui_blocked_ms": _median(warm, "ui_blocked_ms"),
+                        "not_modified_share": round(not_modified / (rounds * (len(ALL_SECTIONS) + 1)), 2)},
+        "after_add_vlan": {"full_reload_ms": _median(edits, "full_reload_ms"),
+                           "subscription_ms": _median(edits, "subscription_ms")},
+    }
+
+
+class Window:
+    """The route table's visible rows without Tk: PagedRows plus the per-redraw row diff"""
+
+    def __init__(self, client):
+        self.client = client
+        self.data = PagedRows(client, TABLES["static_routes"][0], self.redraw)
+        self.first = 0
+        self.shown = {}
+        self.ui = []
+
+    def redraw(self):
+        t0 = time.perf_counter()
+        order, delete, upsert = diff_rows(self.shown, self.data.rows(self.first, WINDOW), "id")
+        for iid in delete:
+            del self.shown[iid]
+        self.shown.update(upsert)
+        self.ui.append(time.perf_counter() - t0)
+        return len(order)
+
+    def until(self, ready, timeout=60.0):
+        """ms until ready() holds, dispatching callbacks like the Tk loop would"""
+        t0 = time.perf_counter()
+        self.redraw()
+        while not ready():
+            if time.perf_counter() - t0 > timeout:
+                raise RuntimeError("table did not load")
+            self.client.dispatch()
+            time.sleep(0.0005)
+        return round((time.perf_counter() - t0) * 1e3, 2)
+
+    def full(self):
+        return self.data.total is not None and None not in self.data.rows(self.first, WINDOW)
+
+
+def paging(url, routes, added):
+    """Windowed route table on a large route list; added: routes to top the table up with first"""
+    client = ApiClient(f"{url}/api")
+    try:
+        if added:
+            add_routes(client, routes - added, added)
+        win = Window(client)
+        result = {"routes": routes, "first_window_cold_ms": win.until(win.full)}
+        win = Window(client)
+        result["first_window_warm_ms"] = win.until(win.full)
+        win.first = routes // 2
+        result["jump_to_middle_ms"] = win.until(win.full)
+        win.first = 0
+        win.data.set_order("-destination")
+        result["sort_reversed_ms"] = win.until(win.full)
+        win.data.set_order("gateway")
+        result["sort_new_field_cold_ms"] = win.until(win.full)
+        win.data.set_order("destination", "192.0.2.3")
+        result["filter_cold_ms"] = win.until(win.full)
+        win.data.set_order("destination")
+        win.until(win.full)
+        # A route sorting into the visible window, added by someone else
+        client.post("/l3/static-routes", {"destination": "0.0.0.0/0", "gateway": "192.0.2.9"})
+        win.data.reload()
+        result["after_add_route_ms"] = win.until(lambda: any(r and r["destination"] == "0.0.0.0/0"
+                                                             for r in win.data.rows(0, WINDOW)))
+        win.ui.clear()
+        win.data.reload()
+        result["after_unchanged_reload_ms"] = win.until(lambda: not win.data._pending)
+        result["redraw_ui_ms_max"] = round(max(win.ui) * 1e3, 3)
+        return result
+    finally:
+        client.close()
+
+
+def run(url=None, vlans=4094, routes=1000, rounds=5, rtts=(0, 20), table_routes=100000):
+    proc = None
+    if url is None:
+        proc, url = start_server("serve")
+    try:
+        client = ApiClient(f"{url}/api")
+        seed(client, vlans, routes)
+        client.close()
+        result = {"vlans": vlans, "routes": routes}
+        for rtt in rtts:
+            proxy = DelayProxy(url, rtt) if rtt else None
+            result[f"rtt_{rtt}ms"] = measure(proxy.url if proxy else url, rounds)
+            if proxy is not None:
+                proxy.close()
+        if table_routes:
+            result["route_table"] = paging(url, table_routes, max(0, table_routes - routes))
+        return result
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS desktop GUI load benchmark")
+    parser.add_argument("--url", help="test an already running server instead")
+    parser.add_argument("--vlans", type=int, default=4094)
+    parser.add_argument("--routes", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--rtt-ms", default="0,20", help="simulated round trips to test, comma-separated")
+    parser.add_argument("--table-routes", type=int, default=100000, help="route table size for the paging runs (0: skip)")
+    args = parser.parse_args()
+    rtts = [float(r) if "." in r else int(r) for r in args.rtt_ms.split(",")]
+    print(json.dumps(run(args.url, args.vlans, args.routes, args.rounds, rtts, args.table_routes), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+ECMP benchmark: batched vs per-flow 5-tuple hashing throughput, flows
+disrupted by a member add/remove (resilient buckets vs hash % N), and the
+config size of many prefixes sharing a few next-hop groups vs inline
+next-hop lists.
+
+Usage: python benchmarks/bench_ecmp.py [--flows 100000] [--members 8] [--prefixes 200000] [--groups 32]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from array import array
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from dataplane.ecmp import ResilientGroup, flow_hash, flow_hash_many, group_ref
+from dataplane.fib import Fib
+
+
+def make_flows(count, seed=1):
+    rng = random.Random(seed)
+    return (array("I", [rng.getrandbits(32) for _ in range(count)]),
+            array("I", [rng.getrandbits(32) for _ in range(count)]),
+            array("B", [rng.choice((6, 17)) for _ in range(count)]),
+            array("H", [rng.getrandbits(16) for _ in range(count)]),
+            array("H", [rng.choice((53, 80, 443)) for _ in range(count)]))
+
+
+def hashing(flows, vector=256):
+    src, dst, proto, sport, dport = flows
+    n = len(src)
+    t0 = time.perf_counter()
+    for s, d, p, sp, dp in zip(src, dst, proto, sport, dport):
+        flow_hash(s, d, p, sp, dp)
+    single = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for start in range(0, n, vector):
+        idx = range(start, min(n, start + vector))
+        flow_hash_many(src, dst, proto, sport, dport, idx)
+    batched = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    flow_hash_many(src, dst, proto, sport, dport)
+    whole = time.perf_counter() - t0
+    return {
+        "per_flow_mflows": round(n / single / 1e6, 3),
+        f"batched_{vector}_mflows": round(n / batched / 1e6, 3),
+        "whole_array_mflows": round(n / whole / 1e6, 3),
+    }
+
+
+def disruption(hashes, members):
+    """Percent of flows whose member changes on add/remove, resilient vs modulo"""
+    names = [f"192.0.2.{i + 1}" for i in range(members + 1)]
+    group = ResilientGroup("bench", names[:members])
+    before = [group.select(h) for h in hashes]
+    group.add(names[members])
+    after_add = [group.select(h) for h in hashes]
+    group.remove(names[0])
+    after_remove = [group.select(h) for h in hashes]
+
+    def moved(a, b):
+        return round(100.0 * sum(x != y for x, y in zip(a, b)) / len(hashes), 2)
+
+    mod_before = [names[h % members] for h in hashes]
+    mod_add = [names[h % (members + 1)] for h in hashes]
+    mod_remove = [names[1:members + 1][h % members] for h in hashes]
+    return {
+        "members": members,
+        "ideal_add_pct": round(100.0 / (members + 1), 2),
+        "resilient_add_pct": moved(before, after_add),
+        "resilient_remove_pct": moved(after_add, after_remove),
+        "modulo_add_pct": moved(mod_before, mod_add),
+        "modulo_remove_pct": moved(mod_add, mod_remove),
+        "bucket_loads": sorted(group.loads().values()),
+    }
+
+
+def sharing(prefixes, groups, members, seed=2):
+    """Config bytes and FIB next-hops: inline member lists vs shared group ids"""
+    rng = random.Random(seed)
+    sets = [sorted(rng.sample([f"10.255.{i // 250}.{i % 250 + 1}" for i in range(1000)], members))
+            for _ in range(groups)]
+    dests = [f"{(i >> 16) + 1}.{(i >> 8) & 255}.{i & 255}.0/24" for i in range(prefixes)]
+    picks = [rng.randrange(groups) for _ in range(prefixes)]
+    inline = sum(len(json.dumps({"destination": d, "gateways": sets[g]})) for d, g in zip(dests, picks))
+    shared = sum(len(json.dumps({"destination": d, "group": f"{g:016x}"})) for d, g in zip(dests, picks))
+    shared += sum(len(json.dumps({"id": f"{g:016x}", "members": sets[g]})) for g in range(groups))
+
+    fib = Fib()
+    for g in range(groups):
+        fib.groups.set(f"{g:016x}", sets[g])
+    t0 = time.perf_counter()
+    for d, g in zip(dests, picks):
+        fib.insert(d, group_ref(f"{g:016x}"))
+    install = time.perf_counter() - t0
+    return {
+        "prefixes": prefixes,
+        "groups": groups,
+        "inline_config_mb": round(inline / 1e6, 2),
+        "shared_config_mb": round(shared / 1e6, 2),
+        "fib_next_hops": len(fib.next_hops),
+        "install_s": round(install, 3),
+    }
+
+
+def run(flows=100000, members=8, prefixes=200000, groups=32):
+    flow_arrays = make_flows(flows)
+    hashes = flow_hash_many(*flow_arrays)
+    return {
+        "hashing": hashing(flow_arrays),
+        "disruption": disruption(hashes, members),
+        "sharing": sharing(prefixes, groups, members),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS ECMP benchmark")
+    parser.add_argument("--flows", type=int, default=100000)
+    parser.add_argument("--members", type=int, default=8)
+    parser.add_argument("--prefixes", type=int, default=200000)
+    parser.add_argument("--groups", type=int, default=32)
+    args = parser.parse_args()
+    print(json.dumps(run(args.flows, args.members, args.prefixes, args.groups), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+FDB benchmark: learn rate for new MACs, refresh rate, aging cost and
+bulk flush at the 256k-entry target.
+
+Usage: python benchmarks/bench_fdb.py [--entries N] [--batch N] [--seed S]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from dataplane.fdb import Fdb
+
+
+def run(entries=262144, batch=256, seed=42):
+    rng = random.Random(seed)
+    macs = array("Q", rng.sample(range(1, 1 << 48), entries))
+    vlans = array("H", (rng.randrange(1, 4095) for _ in range(entries)))
+    pids = array("H", (rng.randrange(1, 129) for _ in range(entries)))
+
+    # Memory is measured on a separate fill so tracing does not skew rates
+    tracemalloc.start()
+    fdb = Fdb(capacity=entries, aging=300.0, now=0.0)
+    fdb.learn_many(vlans, macs, pids, 1.0)
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del fdb
+
+    fdb = Fdb(capacity=entries, aging=300.0, now=0.0)
+    t0 = time.perf_counter()
+    for i in range(0, entries, batch):
+        fdb.learn_many(vlans[i:i + batch], macs[i:i + batch], pids[i:i + batch], 1.0)
+    learn_s = time.perf_counter() - t0
+
+    # Refresh half the table, then age: only the idle half should expire
+    t0 = time.perf_counter()
+    half = entries // 2
+    for i in range(0, half, batch):
+        fdb.learn_many(vlans[i:i + batch], macs[i:i + batch], pids[i:i + batch], 200.0)
+    refresh_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    aged = fdb.expire(302.0)
+    expire_s = time.perf_counter() - t0
+
+    # A quiet sweep with nothing due should be nearly free
+    t0 = time.perf_counter()
+    fdb.expire(303.0)
+    idle_s = time.perf_counter() - t0
+
+    out = array("H", bytes(2 * batch))
+    t0 = time.perf_counter()
+    for i in range(0, half, batch):
+        fdb.lookup_many(vlans[i:i + batch], macs[i:i + batch], out)
+    lookup_s = time.perf_counter() - t0
+
+    busiest = max(fdb._by_vlan, key=lambda v: len(fdb._by_vlan[v]))
+    t0 = time.perf_counter()
+    flushed = fdb.flush_vlan(busiest) + fdb.flush_port(1)
+    flush_s = time.perf_counter() - t0
+
+    return {
+        "entries": entries,
+        "learn_per_s": round(entries / learn_s),
+        "refresh_per_s": round(half / refresh_s),
+        "lookup_per_s": round(half / lookup_s),
+        "aged": aged,
+        "expire_s": round(expire_s, 4),
+        "idle_expire_s": round(idle_s, 6),
+        "flushed": flushed,
+        "flush_s": round(flush_s, 4),
+        "memory_bytes": mem,
+        "bytes_per_entry": round(mem / entries, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS FDB benchmark")
+    parser.add_argument("--entries", type=int, default=262144)
+    parser.add_argument("--batch", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args.entries, args.batch, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+FIB benchmark: build a synthetic BGP-like table, then measure batched
+lookups per second and memory per million prefixes, plus the memory of a
+full Internet feed (900k IPv4 and 200k IPv6 prefixes by default).
+
+Usage: python benchmarks/bench_fib.py [--v4 N] [--v6 N] [--lookups N] [--full-v4 N] [--full-v6 N] [--seed S]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from dataplane.fib import PrefixTable, NextHopTable, IPV4_STRIDES, IPV6_STRIDES
+
+# Rough prefix-length mix of a full Internet table
+V4_LENGTHS = [(24, 60), (22, 10), (23, 8), (20, 5), (21, 5), (19, 4), (16, 4), (18, 2), (17, 2)]
+V6_LENGTHS = [(48, 50), (32, 15), (44, 10), (40, 10), (36, 5), (29, 5), (64, 5)]
+
+
+def _lengths(rng, mix, count):
+    population = [plen for plen, _ in mix]
+    weights = [weight for _, weight in mix]
+    return rng.choices(population, weights, k=count)
+
+
+def build(table, width, mix, count, next_hops, rng):
+    # Cluster prefixes under allocation blocks like a real table does
+    block_len = 16 if width == 32 else 32
+    blocks = [rng.getrandbits(block_len) for _ in range(max(1, count // 12))]
+    prefixes = []
+    for plen in _lengths(rng, mix, count):
+        if plen >= block_len:
+            bits = (rng.choice(blocks) << (plen - block_len)) | rng.getrandbits(plen - block_len)
+        else:
+            bits = rng.getrandbits(plen)
+        prefix = bits << (width - plen)
+        table.insert(prefix, plen, next_hops[rng.randrange(len(next_hops))])
+        prefixes.append((prefix, plen))
+    return prefixes
+
+
+def measure(width, strides, mix, count, lookups, rng):
+    nht = NextHopTable()
+    hops = [nht.acquire(f"gw{i}") for i in range(64)]
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    table = PrefixTable(width, strides)
+    prefixes = build(table, width, mix, count, hops, rng)
+    build_s = time.perf_counter() - t0
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    installed = len(table)
+
+    # Half the addresses hit installed prefixes, half are random
+    addrs = []
+    for i in range(lookups):
+        if i & 1 and prefixes:
+            prefix, plen = prefixes[rng.randrange(len(prefixes))]
+            addrs.append(prefix | rng.getrandbits(width - plen))
+        else:
+            addrs.append(rng.getrandbits(width))
+    if width == 32:
+        addrs = array("I", addrs)
+    out = array("I", bytes(4 * lookups))
+
+    t0 = time.perf_counter()
+    table.lookup_many(addrs, out)
+    lookup_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for prefix, plen in prefixes[: len(prefixes) // 10]:
+        table.withdraw(prefix, plen)
+    withdraw_s = time.perf_counter() - t0
+
+    return {
+        "prefixes": installed,
+        "build_s": round(build_s, 3),
+        "inserts_per_s": round(count / build_s) if build_s else None,
+        "lookups": lookups,
+        "lookups_per_s": round(lookups / lookup_s),
+        "withdraws_per_s": round((len(prefixes) // 10) / withdraw_s) if withdraw_s else None,
+        "memory_bytes": mem,
+        "mb_per_million_prefixes": round(mem / installed, 1) if installed else None,
+    }
+
+
+def feed_memory(width, strides, mix, count, rng):
+    """Memory of one family's table at full-feed size"""
+    nht = NextHopTable()
+    hops = [nht.acquire(f"gw{i}") for i in range(64)]
+    tracemalloc.start()
+    table = PrefixTable(width, strides)
+    build(table, width, mix, count, hops, rng)
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"prefixes": len(table), "memory_mb": round(mem / 1e6, 1),
+            "mb_per_million_prefixes": round(mem / len(table), 1) if len(table) else None}
+
+
+def run(v4=100000, v6=20000, lookups=200000, full_v4=900000, full_v6=200000, seed=42):
+    rng = random.Random(seed)
+    result = {
+        "ipv4": measure(32, IPV4_STRIDES, V4_LENGTHS, v4, lookups, rng),
+        "ipv6": measure(128, IPV6_STRIDES, V6_LENGTHS, v6, lookups, rng),
+    }
+    result["full_feed"] = {
+        "ipv4": feed_memory(32, IPV4_STRIDES, V4_LENGTHS, full_v4, rng),
+        "ipv6": feed_memory(128, IPV6_STRIDES, V6_LENGTHS, full_v6, rng),
+    }
+    result["full_feed"]["memory_mb"] = round(sum(f["memory_mb"] for f in result["full_feed"].values()), 1)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS FIB benchmark")
+    parser.add_argument("--v4", type=int, default=100000, help="IPv4 prefixes (full table: 900000)")
+    parser.add_argument("--v6", type=int, default=20000, help="IPv6 prefixes (full table: 200000)")
+    parser.add_argument("--lookups", type=int, default=200000)
+    parser.add_argument("--full-v4", type=int, default=900000, help="IPv4 prefixes for the full-feed memory figure")
+    parser.add_argument("--full-v6", type=int, default=200000, help="IPv6 prefixes for the full-feed memory figure")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    print(json.dumps(run(args.v4, args.v6, args.lookups, args.full_v4, args.full_v6, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
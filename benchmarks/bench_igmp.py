@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+IGMP snooping benchmark: report-storm throughput (refreshes and IPTV-style
+channel changes), coalesced vs per-report egress recomputation, dataplane
+egress lookups, and timer-wheel expiry of a large membership table.
+
+Usage: python benchmarks/bench_igmp.py [--hosts 50000] [--channels 500] [--ports 48] [--vector 256]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from control.igmp import IgmpSnooping, ip_to_int
+
+CHANNEL_BASE = ip_to_int("232.1.0.0")
+
+
+def make_hosts(hosts, channels, ports, seed=1):
+    """(vlan, channel, port) per subscriber, skewed towards popular channels"""
+    rng = random.Random(seed)
+    weights = [1.0 / (c + 1) for c in range(channels)]
+    chosen = rng.choices(range(channels), weights, k=hosts)
+    return ([rng.choice((10, 20)) for _ in range(hosts)],
+            [CHANNEL_BASE + c for c in chosen],
+            [rng.randrange(1, ports + 1) for _ in range(hosts)])
+
+
+def storm(snoop, vlans, groups, ports, vector, now):
+    n = len(vlans)
+    t0 = time.perf_counter()
+    for start in range(0, n, vector):
+        end = start + vector
+        snoop.join_many(vlans[start:end], groups[start:end], ports[start:end], now)
+        snoop.commit()
+    return n / (time.perf_counter() - t0)
+
+
+def channel_change(snoop, vlans, groups, ports, channels, vector, now, coalesce=True, seed=2):
+    """Every host leaves its channel and joins another (fast-leave); returns (reports/s, recomputes)"""
+    rng = random.Random(seed)
+    targets = [CHANNEL_BASE + rng.randrange(channels) for _ in groups]
+    before = snoop.stats["recomputes"]
+    n = len(vlans)
+    t0 = time.perf_counter()
+    for start in range(0, n, vector):
+        end = min(n, start + vector)
+        if coalesce:
+            for i in range(start, end):
+                snoop.leave(vlans[i], groups[i], ports[i], now)
+            snoop.join_many(vlans[start:end], targets[start:end], ports[start:end], now)
+            snoop.commit()
+            continue
+        for i in range(start, end):
+            snoop.leave(vlans[i], groups[i], ports[i], now)
+            snoop.commit()
+            snoop.join(vlans[i], targets[i], ports[i], now)
+            snoop.commit()
+    elapsed = time.perf_counter() - t0
+    groups[:] = targets
+    return 2 * n / elapsed, snoop.stats["recomputes"] - before
+
+
+def lookups(snoop, vlans, groups, count=1000000):
+    pairs = list(zip(vlans, groups)) * (count // len(vlans) + 1)
+    pairs = pairs[:count]
+    egress = snoop.egress
+    t0 = time.perf_counter()
+    for vlan, group in pairs:
+        egress(vlan, group)
+    return count / (time.perf_counter() - t0)
+
+
+def run(hosts=50000, channels=500, ports=48, vector=256):
+    config = {"enabled": True, "fast_leave": True, "mrouter_ports": {"10": [ports + 1], "20": [ports + 1]}}
+    vlans, groups, host_ports = make_hosts(hosts, channels, ports)
+
+    snoop = IgmpSnooping(config, now=0.0)
+    initial = storm(snoop, vlans, groups, host_ports, vector, 1.0)
+    refresh = storm(snoop, vlans, groups, host_ports, vector, 60.0)
+    memberships = snoop.count()
+    coalesced, coalesced_recomputes = channel_change(snoop, vlans, list(groups), host_ports, channels, vector, 61.0)
+    uncoalesced = IgmpSnooping(config, now=0.0)
+    storm(uncoalesced, vlans, groups, host_ports, vector, 1.0)
+    per_report, per_report_recomputes = channel_change(
+        uncoalesced, vlans, list(groups), host_ports, channels, vector, 61.0, coalesce=False)
+    lookup_rate = lookups(snoop, vlans, groups)
+
+    t0 = time.perf_counter()
+    expired = snoop.advance(61.0 + snoop.gmi + 1)
+    expiry = time.perf_counter() - t0
+    return {
+        "hosts": hosts,
+        "channels": channels,
+        "memberships": memberships,
+        "join_storm_reports_per_s": round(initial),
+        "refresh_storm_reports_per_s": round(refresh),
+        "channel_change": {
+            "coalesced_reports_per_s": round(coalesced),
+            "coalesced_recomputes": coalesced_recomputes,
+            "per_report_reports_per_s": round(per_report),
+            "per_report_recomputes": per_report_recomputes,
+        },
+        "egress_lookups_per_s": round(lookup_rate),
+        "expiry": {"expired_port_records": expired, "seconds": round(expiry, 4)},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS IGMP snooping benchmark")
+    parser.add_argument("--hosts", type=int, default=50000)
+    parser.add_argument("--channels", type=int, default=500)
+    parser.add_argument("--ports", type=int, default=48)
+    parser.add_argument("--vector", type=int, default=256)
+    args = parser.parse_args()
+    print(json.dumps(run(args.hosts, args.channels, args.ports, args.vector), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+LAG benchmark: LACPDU batch processing across many bundles, member-flap
+handling (one bundle's table rebuilt in place vs every table rebuilt from
+scratch), vector hashing and member selection per hash field set, and
+distribution quality of a skewed and an even flow trace.
+
+Usage: python benchmarks/bench_lag.py [--bundles 64] [--members 8] [--packets 200000] [--vector 256]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from control.lacp import (AGGREGATION, COLLECTING, DISTRIBUTING, LACP_ACTIVITY, SYNCHRONIZATION, LacpSystem,
+                          synthetic_trace)
+
+PARTNER_STATE = LACP_ACTIVITY | AGGREGATION | SYNCHRONIZATION | COLLECTING | DISTRIBUTING
+FIELD_SETS = {
+    "l2": ("src_mac", "dst_mac", "vlan"),
+    "l3": ("src_ip", "dst_ip"),
+    "l4": ("src_ip", "dst_ip", "proto", "sport", "dport"),
+}
+
+
+def make_system(bundles, members, fields=None):
+    config = {"bundles": {f"po{b}": {"members": [f"eth{b * members + m}" for m in range(members)], "key": b + 1}
+                          for b in range(bundles)}}
+    if fields:
+        config["hash_fields"] = list(fields)
+    system = LacpSystem(config, now=0.0)
+    system.set_links([(name, True) for name in system.members], 0.0)
+    return system
+
+
+def partner_pdus(system):
+    """What the partner switch sends: one system, one key per bundle"""
+    return [(m.name, (1 << 63 | 0xAA, m.lag.key, m.number, PARTNER_STATE)) for m in system.members.values()]
+
+
+def flaps(system, rounds=200):
+    pdus = dict(partner_pdus(system))
+    names = list(system.members)
+    before = system.stats["entries_moved"]
+    t0 = time.perf_counter()
+    for r in range(rounds):
+        name = names[(r * 7) % len(names)]
+        system.set_link(name, False, 1.0)
+        system.set_link(name, True, 1.0)
+        system.receive_many([(name, pdus[name])], 1.0)
+    elapsed = time.perf_counter() - t0
+    moved = (system.stats["entries_moved"] - before) / (2 * rounds)
+    # the alternative: every bundle's table recomputed from an empty one on each flap
+    t0 = time.perf_counter()
+    for _ in range(rounds // 10):
+        for lag in system.lags.values():
+            active = list(lag.active)
+            lag.rebuild([])
+            lag.rebuild(active)
+    full = (time.perf_counter() - t0) / (rounds // 10)
+    return {"flap_us": round(elapsed / (2 * rounds) * 1e6, 1), "entries_moved_per_flap": moved,
+            "rebuild_all_us": round(full * 1e6, 1)}
+
+
+def hashing(system, trace, vector):
+    """Hash + select for vectors of packets headed to one bundle"""
+    lag = next(iter(system.lags.values()))
+    count = len(trace["src_ip"])
+    vectors = [{f: trace[f][start:start + vector] for f in system.hash_fields}
+               for start in range(0, count - vector + 1, vector)]
+    t0 = time.perf_counter()
+    for vec in vectors:
+        system.select_many(lag, system.hash_many(vec))
+    return len(vectors) * vector / (time.perf_counter() - t0)
+
+
+def run(bundles=64, members=8, packets=200000, vector=256):
+    system = make_system(bundles, members)
+    pdus = partner_pdus(system)
+    t0 = time.perf_counter()
+    rebuilt = system.receive_many(pdus, 0.5)
+    bring_up = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for _ in range(10):
+        system.receive_many(pdus, 1.0)
+    refresh = (time.perf_counter() - t0) / 10
+    result = {
+        "bundles": bundles,
+        "members": len(system.members),
+        "bring_up_ms": round(bring_up * 1e3, 2),
+        "bundles_up": len(rebuilt),
+        "pdu_refresh_per_s": round(len(pdus) / refresh),
+        "flap": flaps(system),
+        "select_mpps": {},
+        "distribution": {},
+    }
+    trace = synthetic_trace(flows=2000, packets=packets)
+    for name, fields in FIELD_SETS.items():
+        result["select_mpps"][name] = round(hashing(make_system(1, members, fields), trace, vector) / 1e6, 3)
+    for skew in (0.0, 1.0):
+        report = system.distribution("po0", synthetic_trace(flows=2000, packets=packets, skew=skew))
+        result["distribution"][f"skew_{skew:g}"] = {"max_over_mean": report["max_over_mean"], "cv": report["cv"]}
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS LAG benchmark")
+    parser.add_argument("--bundles", type=int, default=64)
+    parser.add_argument("--members", type=int, default=8)
+    parser.add_argument("--packets", type=int, default=200000)
+    parser.add_argument("--vector", type=int, default=256)
+    args = parser.parse_args()
+    print(json.dumps(run(args.bundles, args.members, args.packets, args.vector), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Metrics overhead benchmark: per-record cost of a histogram and a counter;
+API request time (Flask test client, a tiny and a cached section GET) with
+the request metrics off (NATEOS_METRICS=0, no middleware) and on; the switchd
+pipeline with and without its per-stage vector histogram; and request time
+while /api/debug/profile samples at 100 Hz.
+
+Modes are interleaved round by round and each reports its fastest round,
+so drift on a busy machine hits both alike. A difference of a few percent
+is below what an end-to-end A/B resolves, so the middleware's own cost is
+also timed directly, around an app that only answers, and given as a
+share of the cheapest request.
+
+Usage: python benchmarks/bench_metrics.py [--requests 2000] [--rounds 7] [--packets 200000]
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import threading
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+for path in (SRC_DIR, os.path.join(SRC_DIR, "mgmt", "web")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import api
+from dataplane.fdb import Fdb
+from dataplane.fib import Fib
+from dataplane.pipeline import GeneratorSource, Pipeline
+from mgmt.metrics import Counter, Histogram, sample_stacks
+
+PATHS = ("/api/health", "/api/l2/lldp")
+
+
+def record_ns(count=200000):
+    hist, counter = Histogram("bench_seconds", "bench", ("route",)), Counter("bench_total", "bench", ("route",))
+    labels = ("/api/health",)
+    perf = time.perf_counter
+    t0 = perf()
+    for i in range(count):
+        hist.record(i, labels)
+    hist_ns = (perf() - t0) / count * 1e9
+    t0 = perf()
+    for _ in range(count):
+        counter.inc(labels)
+    return {"histogram_record_ns": round(hist_ns, 1), "counter_inc_ns": round((perf() - t0) / count * 1e9, 1)}
+
+
+def _requests(client, path, count):
+    t0 = time.perf_counter()
+    for _ in range(count):
+        client.get(path)
+    return (time.perf_counter() - t0) / count
+
+
+def middleware_ns(count=20000):
+    """What RequestMetrics adds to a request, timed around an app that only answers, in ns"""
+    with api.app.test_request_context("/api/health") as context:
+        request = context.request
+        environ = request.environ
+
+        def bare(environ, start_response):
+            environ["nateos.request"] = request  # as MetricsRequest does
+            start_response("200 OK", [])
+            return []
+
+        def start_response(status, headers, exc_info=None):
+            pass
+
+        timed = api.RequestMetrics(bare)
+        samples = {bare: [], timed: []}
+        perf = time.perf_counter
+        for _ in range(7):
+            for app, times in samples.items():
+                t0 = perf()
+                for _ in range(count):
+                    app(environ, start_response)
+                times.append((perf() - t0) / count * 1e9)
+    return {"middleware_ns": round(min(samples[timed]) - min(samples[bare]), 1)}
+
+
+def _set_mode(mode):
+    """Wrap the app in RequestMetrics or not, as NATEOS_METRICS does at import"""
+    app = api.app.wsgi_app
+    bare = app.wsgi_app if isinstance(app, api.RequestMetrics) else app
+    api.app.wsgi_app = api.RequestMetrics(bare) if mode == "on" else bare
+    api.app.request_class = api.MetricsRequest if mode == "on" else api.Request
+
+
+def api_overhead(requests, rounds):
+    client = api.app.test_client()
+    result = {}
+    try:
+        for path in PATHS:
+            samples = {"off": [], "on": []}
+            _requests(client, path, requests // 10 or 1)
+            for _ in range(rounds):
+                for mode in samples:
+                    _set_mode(mode)
+                    samples[mode].append(_requests(client, path, requests))
+            off, on = min(samples["off"]), min(samples["on"])
+            result[path] = {"off_us": round(off * 1e6, 2), "on_us": round(on * 1e6, 2),
+                            "overhead_pct": round((on / off - 1) * 100, 2)}
+    finally:
+        _set_mode("on")
+    return result
+
+
+def pipeline_overhead(packets, rounds):
+    samples = {"off": [], "histogram": []}
+    for _ in range(rounds):
+        for mode in samples:
+            pipeline = Pipeline(Fdb(), Fib())
+            if mode == "histogram":
+                pipeline.histogram = Histogram("bench_stage_seconds", "bench", ("stage",))
+            source = GeneratorSource(packets, flows=1024)
+            gc.collect()
+            t0 = time.perf_counter()
+            pipeline.run(source)
+            samples[mode].append((time.perf_counter() - t0) / packets)
+    off, on = min(samples["off"]), min(samples["histogram"])
+    return {"packets": packets, "off_ns_per_packet": round(off * 1e9, 1),
+            "histogram_ns_per_packet": round(on * 1e9, 1), "histogram_overhead_pct": round((on / off - 1) * 100, 2)}
+
+
+def profiling_overhead(requests, rounds):
+    """Request time with the sampler running alongside vs. not"""
+    client = api.app.test_client()
+    quiet, profiled, samples = [], [], 0
+    for _ in range(rounds):
+        quiet.append(_requests(client, PATHS[1], requests))
+        result = {}
+        stop = threading.Event()
+
+        def profile():
+            while not stop.is_set():
+                result["samples"] = result.get("samples", 0) + sample_stacks(0.5, 100)[0]
+
+        sampler = threading.Thread(target=profile)
+        sampler.start()
+        profiled.append(_requests(client, PATHS[1], requests))
+        stop.set()
+        sampler.join()
+        samples += result.get("samples", 0)
+    base = min(quiet)
+    return {"quiet_us": round(base * 1e6, 2), "profiled_us": round(min(profiled) * 1e6, 2),
+            "overhead_pct": round((min(profiled) / base - 1) * 100, 2), "samples": samples}
+
+
+def run(requests=2000, rounds=7, packets=200000):
+    result = {"record": record_ns(), "middleware": middleware_ns()}
+    result["api"] = api_overhead(requests, rounds)
+    cheapest = min(entry["off_us"] for entry in result["api"].values()) * 1e3
+    result["middleware"]["share_of_cheapest_pct"] = round(result["middleware"]["middleware_ns"] / cheapest * 100, 2)
+    result["pipeline"] = pipeline_overhead(packets, rounds)
+    result["profiling"] = profiling_overhead(requests, max(3, rounds // 2))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS metrics overhead benchmark")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--packets", type=int, default=200000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.requests, args.rounds, args.packets), indent=2))
+
+
+if __name__ == "__main__":
+    main()
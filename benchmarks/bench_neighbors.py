@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Neighbor cache benchmark: filling a 128k-entry ARP table (batched
+resolution plus confirmations), batched next-hop lookups, REACHABLE ->
+STALE timer-wheel sweeps, and a miss storm (an address scan plus a hot
+unresolved destination) with and without the miss rate limiter.
+
+Usage: python benchmarks/bench_neighbors.py [--neighbors 131072] [--scan 200000] [--vector 256]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from control.neighbors import NeighborCache, parse_ip
+
+BASE = parse_ip("10.0.0.0")[0]
+SCAN_BASE = parse_ip("172.16.0.0")[0]
+
+
+def footprint(neighbors):
+    """Bytes per entry of a full table (arrays, index and interned keys)"""
+    tracemalloc.start()
+    cache = NeighborCache(capacity=neighbors, now=0.0)
+    ifid = cache.if_id("vlan100")
+    for i in range(neighbors):
+        cache.learn(ifid, BASE + i, 0x020000000000 + i, 0.0)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return round(memory / neighbors)
+
+
+def fill(neighbors, vector):
+    cache = NeighborCache(capacity=neighbors, now=0.0)
+    ifids = [cache.if_id(f"vlan{100 + i % 16}") for i in range(neighbors)]
+    ips = [BASE + i for i in range(neighbors)]
+    macs = [0x020000000000 + i for i in range(neighbors)]
+    t0 = time.perf_counter()
+    for start in range(0, neighbors, vector):
+        end = start + vector
+        cache.resolve_many(ifids[start:end], ips[start:end], 0.0)
+    resolve = time.perf_counter() - t0
+    solicits = cache.stats["solicits"]
+    cache.take_solicits()
+    t0 = time.perf_counter()
+    for start in range(0, neighbors, vector):
+        end = start + vector
+        cache.confirm_many(ifids[start:end], ips[start:end], macs[start:end], 0.5)
+    confirm = time.perf_counter() - t0
+    return cache, ifids, ips, {
+        "resolve_per_s": round(neighbors / resolve),
+        "confirm_per_s": round(neighbors / confirm),
+        "solicits": solicits,
+        "bytes_per_entry": footprint(neighbors),
+    }
+
+
+def lookups(cache, ifids, ips, vector, count=1000000):
+    rng = random.Random(1)
+    picks = [rng.randrange(len(ips)) for _ in range(vector)]
+    batch_if, batch_ip = [ifids[i] for i in picks], [ips[i] for i in picks]
+    out = [0] * vector
+    rounds = count // vector
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        cache.lookup_many(batch_if, batch_ip, out, 1.0)
+    return rounds * vector / (time.perf_counter() - t0)
+
+
+def storm(scan, vector, hot_packets, limited=True):
+    """One second of a /14 sweep interleaved with a hot destination that never answers"""
+    cache = NeighborCache(capacity=max(scan, 1024), now=0.0,
+                          miss_rate=1000.0 if limited else float("inf"),
+                          miss_burst=1000 if limited else scan)
+    ifid = cache.if_id("vlan100")
+    hot = SCAN_BASE - 1
+    packets = scan + hot_packets
+    order = [SCAN_BASE + i for i in range(scan)] + [hot] * hot_packets
+    random.Random(2).shuffle(order)
+    ifids = [ifid] * vector
+    payload = [b"x"] * vector
+    hot_solicits = 0
+    t0 = time.perf_counter()
+    for start in range(0, packets, vector):
+        now = start / packets  # the storm spans one simulated second
+        batch = order[start:start + vector]
+        cache.miss_many(ifids[:len(batch)], batch, payload, now)
+        cache.advance(now)
+        hot_solicits += sum(1 for solicit in cache.take_solicits() if solicit[1] == hot)
+    elapsed = time.perf_counter() - t0
+    stats = cache.stats
+    return {
+        "misses_per_s": round(packets / elapsed),
+        "entries_created": len(cache),
+        "solicits": stats["solicits"],
+        "miss_limited": stats["miss_limited"],
+        "held_packets": cache.summary()["held_packets"],
+        "hot_destination_solicits": hot_solicits,
+    }
+
+
+def run(neighbors=131072, scan=200000, vector=256):
+    cache, ifids, ips, filled = fill(neighbors, vector)
+    lookup_rate = lookups(cache, ifids, ips, vector)
+    t0 = time.perf_counter()
+    cache.advance(0.5 + cache.reachable_time + 1)
+    stale_sweep = time.perf_counter() - t0
+    stale = cache.count(state="stale")
+    return {
+        "neighbors": neighbors,
+        "fill": filled,
+        "lookups_per_s": round(lookup_rate),
+        "stale_sweep": {"entries": stale, "seconds": round(stale_sweep, 4)},
+        "miss_storm": {
+            "rate_limited": storm(scan, vector, scan // 10),
+            "unlimited": storm(scan, vector, scan // 10, limited=False),
+        },
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS neighbor cache benchmark")
+    parser.add_argument("--neighbors", type=int, default=131072)
+    parser.add_argument("--scan", type=int, default=200000)
+    parser.add_argument("--vector", type=int, default=256)
+    args = parser.parse_args()
+    print(json.dumps(run(args.neighbors, args.scan, args.vector), indent=2))
+
+
+if __name__ == "__main__":
+    main()
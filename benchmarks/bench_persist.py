@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Config persistence benchmark: commit throughput per fsync mode (group
+commit vs. per-op fsync) at 1 and 8 writer threads, and cold-start time
+(mmap snapshot + WAL tail replay) as the config grows, with the cost of
+the first read of the (deferred) routes section that follows it.
+
+Usage: python benchmarks/bench_persist.py [--commits 2000] [--sizes 1,10,100] [--tail 1000]
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from mgmt.persist import FSYNC_MODES, open_datastore, recover
+
+# Roughly 88 bytes of snapshot per route entry
+ROUTE_BYTES = 88
+
+
+def make_config(megabytes):
+    routes = {}
+    for i in range(int(megabytes * 1e6 / ROUTE_BYTES)):
+        rid = f"{i:016x}"
+        routes[rid] = {"id": rid, "destination": f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}/32",
+                       "gateway": f"192.0.2.{i % 250 + 1}", "vrf": "default", "distance": 1}
+    return {"static_routes": routes, "system": {"hostname": "nateos-switch"}, "vlans": {}}
+
+
+def throughput(mode, threads, commits):
+    directory = tempfile.mkdtemp(prefix="nateos-wal-")
+    try:
+        store, log = open_datastore(directory, {"vlans": {}}, fsync=mode)
+        per_thread = commits // threads
+
+        def writer(t):
+            for i in range(per_thread):
+                with store.begin("bench") as txn:
+                    txn.set(("vlans", f"{t}-{i}"), {"vlan_id": i % 4094 + 1, "name": f"v{i}"})
+
+        workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+        t0 = time.perf_counter()
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        elapsed = time.perf_counter() - t0
+        log.close()
+        return {"commits_per_s": round(per_thread * threads / elapsed), "fsyncs": log.stats["fsyncs"]}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def cold_start(megabytes, tail):
+    directory = tempfile.mkdtemp(prefix="nateos-snap-")
+    try:
+        store, log = open_datastore(directory, make_config(megabytes), fsync="none", snapshot_every=10 ** 9)
+        for i in range(tail):
+            with store.begin("tail") as txn:
+                txn.set(("system", "counter"), i)
+        log.close()
+        snapshot = max(f for f in os.listdir(directory) if f.startswith("snapshot-"))
+        size = os.path.getsize(os.path.join(directory, snapshot))
+        t0 = time.perf_counter()
+        root, version, replayed = recover(directory)
+        elapsed = time.perf_counter() - t0
+        assert version == tail and replayed == tail
+        routes = root["static_routes"]
+        t0 = time.perf_counter()
+        routes.get("0")
+        first_read = time.perf_counter() - t0
+        return {"snapshot_mb": round(size / 1e6, 1), "wal_tail": replayed, "routes": len(routes),
+                "cold_start_ms": round(elapsed * 1000, 1), "first_read_ms": round(first_read * 1000, 1)}
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def run(commits=2000, sizes=(1, 10, 100), tail=1000):
+    return {
+        "throughput": {f"{mode}/{threads}": throughput(mode, threads, commits)
+                       for mode in FSYNC_MODES for threads in (1, 8)},
+        "cold_start": {f"{size}MB": cold_start(size, tail) for size in sizes},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS config persistence benchmark")
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--sizes", default="1,10,100", help="config sizes in MB")
+    parser.add_argument("--tail", type=int, default=1000, help="WAL records after the snapshot")
+    args = parser.parse_args()
+    sizes = [float(s) for s in args.sizes.split(",")]
+    print(json.dumps(run(args.commits, sizes, args.tail), indent=2))
+
+
+if __name__ == "__main__":
+    main()
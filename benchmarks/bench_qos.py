@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+QoS benchmark: batch classification (DSCP translate table) and policing
+throughput against a per-packet dict lookup, scheduler enqueue/dequeue
+rate, and a simulated oversubscribed port with strict-priority voice,
+weighted data classes and a policed scavenger class.
+
+Usage: python benchmarks/bench_qos.py [--packets 1000000] [--vector 256] [--duration 1.0]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from dataplane.qos import PortScheduler, QosPolicy, simulate, synthetic_trace
+
+POLICY = {
+    "trust": "dscp",
+    "dscp_map": {"46": 5, "34": 4, "26": 3, "18": 2, "10": 1, "8": 1},
+    "classes": {
+        "5": {"name": "voice", "priority": True, "ceil_mbps": 200, "queue_limit": 256},
+        "4": {"name": "video", "weight": 4, "rate_mbps": 300},
+        "2": {"name": "business", "weight": 2, "rate_mbps": 100},
+        "0": {"name": "best-effort", "weight": 1},
+        "1": {"name": "scavenger", "weight": 1, "ceil_mbps": 100},
+    },
+    "policers": {"1": {"rate_mbps": 50, "burst_kb": 64}},
+    "ports": {"default": {"rate_mbps": 1000}},
+}
+
+
+def make_packets(count, seed=1):
+    rng = random.Random(seed)
+    dscp = bytes(rng.choice((0, 0, 0, 8, 10, 18, 26, 34, 46)) for _ in range(count))
+    lengths = [rng.choice((64, 128, 512, 1500)) for _ in range(count)]
+    return dscp, lengths
+
+
+def classification(policy, dscp, vector):
+    n = len(dscp)
+    table = {i: policy.dscp_table[i] for i in range(64)}
+    t0 = time.perf_counter()
+    for d in dscp:
+        table[d]
+    per_packet = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for start in range(0, n, vector):
+        policy.classify_many(dscp[start:start + vector])
+    batched = time.perf_counter() - t0
+    return {
+        "per_packet_dict_mpps": round(n / per_packet / 1e6, 2),
+        f"batched_{vector}_mpps": round(n / batched / 1e6, 2),
+    }
+
+
+def policing(policy, dscp, lengths, vector):
+    n = len(dscp)
+    classes = policy.classify_many(dscp)
+    now = 0.0
+    t0 = time.perf_counter()
+    for start in range(0, n, vector):
+        now += 0.0001
+        policy.police_many(classes[start:start + vector], lengths[start:start + vector], now)
+    elapsed = time.perf_counter() - t0
+    return {f"batched_{vector}_mpps": round(n / elapsed / 1e6, 2), "policed": sum(policy.policed)}
+
+
+def scheduling(policy, dscp, lengths, vector):
+    """Enqueue a vector then dequeue what a 100G port shaper allows, per 10us"""
+    n = len(dscp)
+    classes = policy.classify_many(dscp)
+    sched = PortScheduler(100e9 / 8, policy.class_specs)
+    now = 0.0
+    sent = 0
+    t0 = time.perf_counter()
+    for start in range(0, n, vector):
+        now += 0.00001
+        sched.enqueue_many(classes[start:start + vector], lengths[start:start + vector], now)
+        sent += len(sched.dequeue(now))
+    elapsed = time.perf_counter() - t0
+    return {"mpps": round(n / elapsed / 1e6, 2), "sent": sent, "backlog": sched.backlog()}
+
+
+def run(packets=1000000, vector=256, duration=1.0):
+    dscp, lengths = make_packets(packets)
+    policy = QosPolicy(POLICY)
+    trace = synthetic_trace(duration, mix=[(46, 150, 200, 0), (34, 400, 1200, 0.5),
+                                           (18, 250, 800, 0.5), (0, 500, 1500, 0.8), (10, 200, 1000, 0)])
+    t0 = time.perf_counter()
+    sim = simulate(policy, trace)
+    sim_s = time.perf_counter() - t0
+    return {
+        "classification": classification(policy, dscp, vector),
+        "policing": policing(QosPolicy(POLICY), dscp, lengths, vector),
+        "scheduling": scheduling(policy, dscp, lengths, vector),
+        "simulation": {"packets": len(trace), "wall_s": round(sim_s, 3),
+                       "classes": {c["name"]: {k: c[k] for k in ("offered_mbps", "throughput_mbps", "latency_p99_ms",
+                                                                 "queue_drops", "policer_drops")}
+                                   for c in sim["classes"]}},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS QoS benchmark")
+    parser.add_argument("--packets", type=int, default=1000000)
+    parser.add_argument("--vector", type=int, default=256)
+    parser.add_argument("--duration", type=float, default=1.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.packets, args.vector, args.duration), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Static route table benchmark: keyed add/delete and withdraw-by-next-hop
+(a failed gateway) vs. the old list-position scheme, FIB programming included.
+
+Usage: python benchmarks/bench_routes.py [--routes 100000] [--gateways 5]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from control.routes import StaticRouteTable, normalize
+from dataplane.fib import Fib
+
+
+def make_routes(count, gateways, seed=1):
+    rng = random.Random(seed)
+    hops = [f"192.0.2.{i + 1}" for i in range(gateways)]
+    seen, routes = set(), []
+    while len(routes) < count:
+        plen = rng.choice((16, 20, 24, 24, 24, 28, 32))
+        addr = rng.getrandbits(32) & ~((1 << (32 - plen)) - 1)
+        dest = f"{addr >> 24}.{(addr >> 16) & 255}.{(addr >> 8) & 255}.{addr & 255}/{plen}"
+        if dest in seen:
+            continue
+        seen.add(dest)
+        routes.append(normalize({"destination": dest, "gateway": rng.choice(hops)}))
+    return routes, hops
+
+
+def list_withdraw(routes, gateway):
+    """Old scheme: a list of routes, FIB rebuilt after positional deletes"""
+    fib = Fib()
+    for route in routes:
+        fib.insert(route["destination"], route["gateway"])
+    t0 = time.perf_counter()
+    kept = [route for route in routes if route["gateway"] != gateway]
+    fib.clear()
+    for route in kept:
+        fib.insert(route["destination"], route["gateway"])
+    return time.perf_counter() - t0
+
+
+def run(count=100000, gateways=5, deletes=10000):
+    routes, hops = make_routes(count, gateways)
+    table = StaticRouteTable()
+
+    t0 = time.perf_counter()
+    for route in routes:
+        table.add(route)
+    add_s = time.perf_counter() - t0
+
+    victims = random.Random(2).sample(routes, deletes)
+    t0 = time.perf_counter()
+    for route in victims:
+        table.remove(route["id"])
+    delete_s = time.perf_counter() - t0
+    for route in victims:
+        table.add(route)
+
+    failed = hops[0]
+    affected = len(table.via(failed))
+    t0 = time.perf_counter()
+    table.withdraw_nexthop(failed)
+    withdraw_s = time.perf_counter() - t0
+
+    return {
+        "routes": count,
+        "add_per_s": round(count / add_s),
+        "delete_by_id_per_s": round(deletes / delete_s),
+        "withdrawn_routes": affected,
+        "withdraw_nexthop_ms": round(withdraw_s * 1000, 1),
+        "list_rebuild_ms": round(list_withdraw(routes, failed) * 1000, 1),
+        "fib_prefixes_after": len(table.fib),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS static route table benchmark")
+    parser.add_argument("--routes", type=int, default=100000)
+    parser.add_argument("--gateways", type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.routes, args.gateways), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+SPAN benchmark: pipeline Mpps with mirroring off, every frame mirrored
+(full and truncated to 128 bytes) and 1-in-16 sampled; pcap export rate
+from the ring; and a consumer that keeps up with only a fraction of the
+mirrored traffic on a small ring, to show forwarding does not slow down
+while the ring overwrites and counts what the consumer misses.
+
+Usage: python benchmarks/bench_span.py [--packets 300000] [--frame 512] [--vector 256]
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from dataplane.fdb import Fdb
+from dataplane.fib import Fib
+from dataplane.pipeline import GeneratorSource, Pipeline
+from dataplane.span import PcapWriter, RingReader, SpanEngine
+
+MIRRORS = {
+    "off": None,
+    "all_full": {"sample": 1},
+    "all_truncate_128": {"sample": 1, "truncate": 128},
+    "sample_1_in_16": {"sample": 16},
+}
+
+
+def make_source(packets, frame):
+    source = GeneratorSource(packets, flows=1024)
+    # pad the templates so truncation and copy cost show at a realistic size
+    source.templates = [t + bytes(max(0, frame - len(t))) for t in source.templates]
+    return source
+
+
+def make_span(session, slots=8192):
+    if session is None:
+        return None
+    spec = dict(session, source_ports="all", direction="both")
+    return SpanEngine({"sessions": {"bench": spec}, "ring": {"slots": slots}})
+
+
+def forward(span, packets, frame, vector, consumer=None, every=1):
+    """Run packets through a fresh pipeline; consumer (a RingReader) drains every `every` vectors"""
+    pipeline = Pipeline(Fdb(), Fib(), vector_size=vector, span=span)
+    source = make_source(packets, frame)
+    vec = pipeline.vector
+    writer = None
+    if consumer is not None:
+        writer = PcapWriter(os.devnull)
+    vectors = 0
+    busy = 0.0
+    perf = time.perf_counter
+    while source.fill(pipeline.pool, vec):
+        t0 = perf()
+        pipeline.run_vector(vec, time.monotonic())
+        busy += perf() - t0
+        vectors += 1
+        if consumer is not None and vectors % every == 0:
+            consumer.drain(writer, limit=vector)
+    if writer is not None:
+        writer.close()
+    report = pipeline.report()
+    stage = next((s for s in report["stages"] if s["stage"] == "span"), None)
+    return {
+        "mpps": round(packets / busy / 1e6, 3),
+        "span_ns_per_packet": stage["ns_per_packet"] if stage else 0.0,
+        "mirrored": span.sessions[0].packets if span else 0,
+    }
+
+
+def export(packets, frame, vector):
+    """Mirror into a ring big enough to hold everything, then time the drain to a pcap file"""
+    span = make_span(MIRRORS["all_full"], slots=1 << (packets * 2 - 1).bit_length())
+    forward(span, packets, frame, vector)
+    reader = RingReader(span.ring)
+    fd, path = tempfile.mkstemp(suffix=".pcap")
+    os.close(fd)
+    try:
+        writer = PcapWriter(path)
+        t0 = time.perf_counter()
+        written = reader.drain(writer)
+        writer.close()
+        elapsed = time.perf_counter() - t0
+        size = os.path.getsize(path)
+    finally:
+        os.unlink(path)
+        span.ring.close()
+    return {"records": written, "records_per_s": round(written / elapsed), "mb_per_s": round(size / elapsed / 1e6, 1)}
+
+
+def run(packets=300000, frame=512, vector=256):
+    result = {"packets": packets, "frame_bytes": frame, "vector": vector, "pipeline": {}}
+    for name, session in MIRRORS.items():
+        span = make_span(session)
+        result["pipeline"][name] = forward(span, packets, frame, vector)
+        if span is not None:
+            span.ring.close()
+    base = result["pipeline"]["off"]["mpps"]
+    for name, entry in result["pipeline"].items():
+        entry["vs_off"] = round(entry["mpps"] / base, 3)
+    result["pcap_export"] = export(min(packets, 100000), frame, vector)
+    # slow consumer: drains one vector's worth of records every 8 vectors into a 1024-slot ring
+    slow = make_span(MIRRORS["all_full"], slots=1024)
+    reader = RingReader(slow.ring)
+    slow_result = forward(slow, packets, frame, vector, consumer=reader, every=8)
+    stats = reader.stats()
+    slow_result.update(read=stats["read"], overwritten=stats["overwritten"], lost=stats["lost"])
+    slow_result["vs_all_full"] = round(slow_result["mpps"] / result["pipeline"]["all_full"]["mpps"], 3)
+    slow.ring.close()
+    result["slow_consumer"] = slow_result
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS SPAN benchmark")
+    parser.add_argument("--packets", type=int, default=300000)
+    parser.add_argument("--frame", type=int, default=512)
+    parser.add_argument("--vector", type=int, default=256)
+    args = parser.parse_args()
+    print(json.dumps(run(args.packets, args.frame, args.vector), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Spanning-tree benchmark: BPDU batch processing and link-flap convergence on
+a 128-port, 64-MSTI bridge (incremental vs full recomputation), plus a
+simulated multi-bridge mesh that exchanges BPDUs until quiescent after each
+flap and checks every instance still forms a loop-free spanning tree.
+
+Usage: python benchmarks/bench_stp.py [--ports 128] [--instances 64] [--bridges 16] [--flaps 20]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from control.stp import STATE_FORWARDING, SpanningTree, bridge_id
+
+BASE_MAC = 0x020000000000
+
+
+def mstp_config(instances, vlans_per_instance=60):
+    return {"mode": "mstp", "instances": {
+        str(i): {"vlans": f"{(i - 1) * vlans_per_instance + 1}-{i * vlans_per_instance}",
+                 "priority": 4096 * (i % 8)}
+        for i in range(1, instances + 1)}}
+
+
+def upstream_vectors(bridge, root_mac, cost, instances, designated_port):
+    """What a better upstream bridge advertises: a root below our own bridge id in every instance"""
+    return {i: (bridge_id(0, root_mac, i), cost, bridge_id(0, root_mac, i), designated_port)
+            for i in range(instances + 1)}
+
+
+def single_bridge(ports, instances, rounds=20):
+    bridge = SpanningTree(BASE_MAC + 0xFFFF, [f"eth{p}" for p in range(ports)], mstp_config(instances))
+    root_mac = BASE_MAC + 1
+    # two uplinks to the same root: eth0 becomes root port, eth1 alternate
+    uplinks = [(0, upstream_vectors(bridge, root_mac, 0, instances, 0x8001), 0),
+               (1, upstream_vectors(bridge, root_mac, 0, instances, 0x8002), 0)]
+    bridge.receive_many(uplinks, 0.0)
+    bridge.transmit()
+
+    now = 1.0
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        bridge.receive_many(uplinks, now)
+        now += bridge.hello
+    refresh = (time.perf_counter() - t0) / rounds
+
+    # a downstream bridge on eth5 changes its (inferior) info: one port, every instance
+    worse = [(5, {i: (bridge_id(61440, BASE_MAC + 9, i), 40000 + k, bridge_id(61440, BASE_MAC + 9, i), 0x8001)
+                  for i in range(instances + 1)}, 0) for k in range(rounds)]
+    t0 = time.perf_counter()
+    for bpdu in worse:
+        bridge.receive_many([bpdu], now)
+    incremental = (time.perf_counter() - t0) / rounds
+
+    # root-port flap: every instance reselects its root port (eth1 takes over, then hands back)
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        bridge.set_link(0, False, now)
+        bridge.set_link(0, True, now)
+        bridge.receive_many([uplinks[0]], now)
+    flap = (time.perf_counter() - t0) / (2 * rounds)
+
+    # the naive alternative: every instance re-derives every port for every event
+    t0 = time.perf_counter()
+    for _ in range(rounds):
+        for tree in bridge.trees.values():
+            bridge._recompute(tree, now, every=True)
+    naive = (time.perf_counter() - t0) / rounds
+    return {
+        "hello_batch_us": round(refresh * 1e6, 1),
+        "downstream_change_us": round(incremental * 1e6, 1),
+        "root_port_flap_ms": round(flap * 1e3, 3),
+        "full_recompute_ms": round(naive * 1e3, 3),
+        "stats": bridge.stats,
+    }
+
+
+def make_mesh(bridges, instances, ports, seed=1):
+    """Ring plus random chords; returns (bridges, links) with links as (a, pa, b, pb)"""
+    rng = random.Random(seed)
+    nodes = [SpanningTree(BASE_MAC + b + 1, [f"eth{p}" for p in range(ports)], mstp_config(instances))
+             for b in range(bridges)]
+    used = [0] * bridges
+    links = []
+
+    def connect(a, b):
+        if used[a] < ports and used[b] < ports:
+            links.append((a, used[a], b, used[b]))
+            used[a] += 1
+            used[b] += 1
+
+    for b in range(bridges):
+        connect(b, (b + 1) % bridges)
+    for _ in range(bridges):
+        a, b = rng.sample(range(bridges), 2)
+        connect(a, b)
+    return nodes, links
+
+
+def settle(nodes, peer, now, limit=1000):
+    """Deliver BPDUs in batches until no bridge has anything left to send; returns rounds"""
+    for rounds in range(1, limit + 1):
+        inbox = [[] for _ in nodes]
+        for b, node in enumerate(nodes):
+            for p, vectors in node.transmit().items():
+                dest = peer.get((b, p))
+                if dest is not None:
+                    inbox[dest[0]].append((dest[1], vectors, 0))
+        if not any(inbox):
+            return rounds
+        for b, batch in enumerate(inbox):
+            if batch:
+                nodes[b].receive_many(batch, now)
+    raise RuntimeError("spanning tree did not converge")
+
+
+def loop_free(nodes, links, peer):
+    """Every instance: forwarding links form a spanning tree (bridges - 1 links, all connected)"""
+    for instance in nodes[0].trees:
+        edges = [(a, b) for a, pa, b, pb in links
+                 if (a, pa) in peer and nodes[a].trees[instance].states[pa] == STATE_FORWARDING
+                 and nodes[b].trees[instance].states[pb] == STATE_FORWARDING]
+        parent = list(range(len(nodes)))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for a, b in edges:
+            ra, rb = find(a), find(b)
+            if ra == rb:
+                return False
+            parent[ra] = rb
+        if len(edges) != len(nodes) - 1:
+            return False
+    return True
+
+
+def mesh(bridges, instances, ports, flaps, seed=3):
+    nodes, links = make_mesh(bridges, instances, ports)
+    peer = {}
+    for a, pa, b, pb in links:
+        peer[(a, pa)] = (b, pb)
+        peer[(b, pb)] = (a, pa)
+    t0 = time.perf_counter()
+    initial_rounds = settle(nodes, peer, 0.0)
+    initial = time.perf_counter() - t0
+    ok = loop_free(nodes, links, peer)
+
+    rng = random.Random(seed)
+    times = []
+    now = 1.0
+    for _ in range(flaps):
+        a, pa, b, pb = rng.choice(links)
+        for up in (False, True):
+            t0 = time.perf_counter()
+            nodes[a].set_link(pa, up, now)
+            nodes[b].set_link(pb, up, now)
+            if up:
+                peer[(a, pa)], peer[(b, pb)] = (b, pb), (a, pa)
+            else:
+                del peer[(a, pa)], peer[(b, pb)]
+            settle(nodes, peer, now)
+            times.append(time.perf_counter() - t0)
+            ok = ok and loop_free(nodes, links, peer)
+            now += 0.1
+    times.sort()
+    return {
+        "bridges": bridges,
+        "links": len(links),
+        "initial_convergence_ms": round(initial * 1e3, 2),
+        "initial_rounds": initial_rounds,
+        "flap_convergence_ms": {"median": round(times[len(times) // 2] * 1e3, 2),
+                                "max": round(times[-1] * 1e3, 2)},
+        "loop_free": ok,
+    }
+
+
+def run(ports=128, instances=64, bridges=16, flaps=20):
+    return {
+        "ports": ports,
+        "instances": instances,
+        "bridge": single_bridge(ports, instances),
+        "mesh": mesh(bridges, instances, ports, flaps),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS spanning-tree benchmark")
+    parser.add_argument("--ports", type=int, default=128)
+    parser.add_argument("--instances", type=int, default=64)
+    parser.add_argument("--bridges", type=int, default=16)
+    parser.add_argument("--flaps", type=int, default=20)
+    args = parser.parse_args()
+    print(json.dumps(run(args.ports, args.instances, args.bridges, args.flaps), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+switchd startup benchmark: process wall time and dataplane-ready time
+(switchd --startup-profile) for startup configs of increasing route
+counts from a fixed-seed generator, with the config cache cold (parsed
+and validated) and warm (served from the cache), plus the per-component
+init times behind the warm start.
+
+Usage: python benchmarks/bench_switchd.py [--routes 0,10000,100000] [--runs 3] [--seed 7]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SWITCHD = os.path.join(ROOT, "src", "switchd", "switchd.py")
+
+
+def write_config(path, routes, seed):
+    """A startup config with `routes` distinct /24 and /32 static routes"""
+    rng = random.Random(seed)
+    lines = ["user_name: bench", "dataplane:", "  vector_size: 256", "  flows: 1024", "routes:"]
+    seen = set()
+    while len(seen) < routes:
+        plen = rng.choice((24, 32))
+        addr = rng.getrandbits(32) & ~((1 << (32 - plen)) - 1)
+        if addr in seen or addr >> 24 in (0, 127) or addr >> 28 >= 14:
+            continue
+        seen.add(addr)
+        lines += [f"  - destination: {addr >> 24}.{addr >> 16 & 255}.{addr >> 8 & 255}.{addr & 255}/{plen}",
+                  f"    gateway: 192.0.2.{1 + rng.randrange(8)}"]
+    if not routes:
+        lines[-1] = "routes: []"
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def start(config, cache_home, cold):
+    """One switchd start-up: (wall ms, profile)"""
+    env = dict(os.environ, XDG_CACHE_HOME=cache_home)
+    cmd = [sys.executable, SWITCHD, "--config", config, "--startup-profile", "--json"]
+    if cold:
+        cmd.append("--no-config-cache")
+    t0 = time.perf_counter()
+    out = subprocess.run(cmd, env=env, check=True, capture_output=True, text=True).stdout
+    wall = (time.perf_counter() - t0) * 1e3
+    return wall, json.loads(out)["startup"]
+
+
+def measure(routes, runs, seed):
+    with tempfile.TemporaryDirectory() as tmp:
+        config = os.path.join(tmp, "config.yaml")
+        write_config(config, routes, seed)
+        result = {}
+        for name, cold in (("cold_cache", True), ("warm_cache", False)):
+            if not cold:
+                start(config, tmp, False)  # fill the cache
+            samples = [start(config, tmp, cold) for _ in range(runs)]
+            result[name] = {
+                "process_ms": round(statistics.median(s[0] for s in samples), 1),
+                "dataplane_ready_ms": round(statistics.median(s[1]["dataplane_ready_ms"] for s in samples), 1),
+            }
+        phases = samples[len(samples) // 2][1]["phases"]
+        result["warm_phases_ms"] = {p["component"]: p["ms"] for p in phases}
+        result["within_budget"] = samples[0][1]["budget_ms"] >= result["warm_cache"]["dataplane_ready_ms"]
+        return result
+
+
+def run(route_counts=(0, 10000, 100000), runs=3, seed=7):
+    return {str(count): measure(count, runs, seed) for count in route_counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS switchd startup benchmark")
+    parser.add_argument("--routes", default="0,10000,100000", help="route counts, comma-separated")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    counts = [int(c) for c in args.routes.split(",")]
+    print(json.dumps(run(counts, args.runs, args.seed), indent=2))
+
+
+if __name__ == "__main__":
+    main()
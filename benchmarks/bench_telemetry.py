@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Telemetry fan-out benchmark: commit latency and delivery cost with many
+on-change subscribers, plus queue compaction for consumers that never read.
+
+Usage: python benchmarks/bench_telemetry.py [--subscribers 1000] [--commits 2000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from mgmt.datastore import Datastore
+from mgmt.telemetry import TelemetryHub
+
+SECTIONS = ("vlans", "interfaces", "bgp", "ospf", "qos")
+
+
+def _commit_rate(store, commits, rng):
+    t0 = time.perf_counter()
+    for i in range(commits):
+        with store.begin("bench") as txn:
+            txn.set((rng.choice(SECTIONS), str(rng.randrange(64))), {"seq": i})
+    return (time.perf_counter() - t0) / commits
+
+
+def run(subscribers=1000, commits=2000, max_pending=256, seed=1):
+    rng = random.Random(seed)
+    config = {section: {} for section in SECTIONS}
+
+    baseline = _commit_rate(Datastore(config), commits, rng)
+
+    store = Datastore(config)
+    hub = TelemetryHub(store)
+    subs = []
+    for i in range(subscribers):
+        paths = [(rng.choice(SECTIONS),)]
+        if i % 4 == 0:
+            paths.append((rng.choice(SECTIONS), str(rng.randrange(64))))
+        subs.append(hub.subscribe(paths, max_pending=max_pending))
+    for sub in subs:
+        sub.poll()
+
+    # Every consumer drains after each commit, as a live stream would
+    delivered = 0
+    t0 = time.perf_counter()
+    drain_s = 0.0
+    for i in range(commits // 2):
+        with store.begin("bench") as txn:
+            txn.set((rng.choice(SECTIONS), str(rng.randrange(64))), {"seq": i})
+        d0 = time.perf_counter()
+        for sub in subs:
+            message = sub.poll()
+            if message is not None:
+                delivered += len(message.get("updates", ()))
+        drain_s += time.perf_counter() - d0
+    live_s = time.perf_counter() - t0 - drain_s
+
+    # Nobody reads: queues coalesce per leaf and compact at max_pending
+    stalled = _commit_rate(store, commits // 2, rng)
+    resyncs = sum(1 for sub in subs if sub.dropped)
+
+    return {
+        "subscribers": subscribers,
+        "commit_us_no_subscribers": round(baseline * 1e6, 1),
+        "commit_us_live": round(live_s / (commits // 2) * 1e6, 1),
+        "commit_us_stalled": round(stalled * 1e6, 1),
+        "drain_us_per_commit": round(drain_s / (commits // 2) * 1e6, 1),
+        "updates_delivered": delivered,
+        "compacted_subscribers": resyncs,
+        "max_queue": max(len(sub._pending) for sub in subs),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS telemetry fan-out benchmark")
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--commits", type=int, default=2000)
+    parser.add_argument("--queue", type=int, default=256)
+    args = parser.parse_args()
+    print(json.dumps(run(args.subscribers, args.commits, args.queue), indent=2))
+
+
+if __name__ == "__main__":
+    main()
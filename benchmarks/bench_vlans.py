@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+VLAN membership benchmark: bitmap model vs scanning per-interface dicts for
+"ports in VLAN X" and "VLANs on trunk Y", range edits ("allowed vlan add
+100-3999") as bitwise ops, and serialized size (explicit id lists vs range
+text vs raw bitmaps) for full 4094-VLAN trunks.
+
+Usage: python benchmarks/bench_vlans.py [--ports 128] [--queries 20000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from dataplane.vlanmap import MAX_VLAN, VLAN_BYTES, VlanMembership, format_vlans, parse_vlans
+
+
+def make_config(ports, seed=1):
+    """Half the ports are 4094-VLAN trunks, the rest access ports"""
+    rng = random.Random(seed)
+    config = {}
+    for p in range(ports):
+        if p % 2 == 0:
+            config[f"eth{p}"] = {"mode": "trunk", "vlan": 1, "allowed_vlans": "1-4094"}
+        else:
+            config[f"eth{p}"] = {"mode": "access", "vlan": rng.randrange(1, MAX_VLAN + 1)}
+    return config
+
+
+def dict_model(config):
+    """The scan-based model: each interface holds a set of VLAN ids"""
+    return {name: set(range(1, MAX_VLAN + 1)) if cfg["mode"] == "trunk" else {cfg["vlan"]}
+            for name, cfg in config.items()}
+
+
+def run(ports=128, queries=20000):
+    config = make_config(ports)
+    rng = random.Random(2)
+    vlan_queries = [rng.randrange(1, MAX_VLAN + 1) for _ in range(queries)]
+    port_queries = [f"eth{rng.randrange(ports)}" for _ in range(queries)]
+
+    t0 = time.perf_counter()
+    model = VlanMembership()
+    for name, cfg in config.items():
+        model.configure(name, cfg)
+    build = time.perf_counter() - t0
+    scan = dict_model(config)
+
+    t0 = time.perf_counter()
+    for vlan in vlan_queries:
+        model.ports_bitmap(vlan)
+    bitmap_ports = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for vlan in vlan_queries[:queries // 10]:
+        [name for name, vlans in scan.items() if vlan in vlans]
+    scan_ports = (time.perf_counter() - t0) * 10
+    t0 = time.perf_counter()
+    for vlan in vlan_queries:
+        model.ports(vlan)
+    named_ports = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for port in port_queries:
+        model.vlans_bitmap(port)
+    bitmap_vlans = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for port in port_queries[:queries // 10]:
+        sorted(scan[port])
+    scan_vlans = (time.perf_counter() - t0) * 10
+
+    trunk = "eth0"
+    edits = 200
+    remove, add = parse_vlans("100-3999"), parse_vlans("100-3999")
+    t0 = time.perf_counter()
+    for _ in range(edits // 2):
+        model.disallow(trunk, remove)
+        model.allow(trunk, add)
+    range_edit = (time.perf_counter() - t0) / edits
+
+    trunk_bitmap = model.vlans_bitmap(trunk)
+    return {
+        "ports": ports,
+        "memberships": model.stats()["memberships"],
+        "build_s": round(build, 4),
+        "ports_in_vlan_us": {"bitmap": round(bitmap_ports / queries * 1e6, 3),
+                             "bitmap_to_names": round(named_ports / queries * 1e6, 3),
+                             "dict_scan": round(scan_ports / queries * 1e6, 3)},
+        "vlans_on_port_us": {"bitmap": round(bitmap_vlans / queries * 1e6, 3),
+                             "sorted_set": round(scan_vlans / queries * 1e6, 3)},
+        "range_edit_3900_vlans_us": round(range_edit * 1e6, 1),
+        "trunk_serialized_bytes": {"id_list_json": len(json.dumps(sorted(scan[trunk]))),
+                                   "range_text": len(format_vlans(trunk_bitmap)),
+                                   "bitmap": VLAN_BYTES},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS VLAN membership benchmark")
+    parser.add_argument("--ports", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(run(args.ports, args.queries), indent=2))
+
+
+if __name__ == "__main__":
+    main()
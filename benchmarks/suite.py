@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite runner: runs the bench_*.py benchmarks (each in its own
+process, so API and datastore state never leak between them) with fixed
+seeds and sizes, writes one JSON document of results, and compares it
+against a stored baseline to catch regressions.
+
+The default "ci" profile shrinks the slow benchmarks so the whole suite
+finishes in minutes; --profile full runs every benchmark with its own
+defaults. Only timing and rate metrics are compared, by name: *_s, *_ms,
+*_us, *_ns and per-packet costs must not grow, and *per_s, *mpps, *rps and
+speedups must not shrink, by more than --tolerance (one-off s/ms timings
+under 0.1 ms are skipped as timer noise). Baselines only mean
+something on the machine class that recorded them, so record one per CI
+runner type with --update-baseline.
+
+Exit status: 0 clean, 1 regressions against the baseline, 2 a benchmark failed.
+
+Usage: python benchmarks/suite.py [--profile ci|full] [--only fib,acl] [--skip desktop] [--output results.json]
+                                  [--baseline benchmarks/baseline.json] [--tolerance 0.3] [--update-baseline]
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(BENCH_DIR, "baseline.json")
+TOLERANCE = 0.3
+NOISE_FLOOR_S = 1e-4
+
+# bench name -> run() keyword arguments for the ci profile (the full profile uses run()'s defaults)
+SUITE = {
+    "api_scale": {"routes": 100000, "acls": 50000, "requests": 50},
+    "api_cache": {"vlans": 4000, "requests": 500},
+    "api_load": {"clients": [1, 8], "seconds": 1.0},
+    "batch": {"items": 10000},
+    "cli": {"count_shows": 200, "count_sets": 200, "routes": 20000},
+    "datastore": {"sizes": [1000, 12000], "commits": 200},
+    "desktop": {"rounds": 3, "rtts": [0], "table_routes": 20000},
+    "persist": {"commits": 500},
+    "telemetry": {"subscribers": 200, "commits": 500},
+    "metrics": {"requests": 1000, "rounds": 5, "packets": 100000},
+    "switchd": {"route_counts": [0, 10000], "runs": 3},
+    "routes": {"count": 100000, "deletes": 5000},
+    "fib": {"v4": 50000, "v6": 10000, "lookups": 50000},
+    "fdb": {"entries": 65536},
+    "acl": {"rule_counts": [1000, 10000, 50000], "packets": 5000},
+    "ecmp": {"flows": 20000, "prefixes": 50000},
+    "vlans": {},
+    "stp": {"ports": 64, "instances": 16},
+    "lag": {"packets": 50000},
+    "neighbors": {"neighbors": 32768, "scan": 50000},
+    "igmp": {"hosts": 10000},
+    "qos": {"packets": 200000},
+    "span": {"packets": 100000},
+}
+
+_RUNNER = """
+import json, sys
+sys.path.insert(0, sys.argv[1])
+bench = __import__("bench_" + sys.argv[2])
+result = bench.run(**json.loads(sys.argv[3]))
+print("@@RESULT@@" + json.dumps(result))
+"""
+
+
+def run_bench(name, kwargs, timeout):
+    """One benchmark's run(**kwargs) in a fresh interpreter: (result, seconds)"""
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-c", _RUNNER, BENCH_DIR, name, json.dumps(kwargs)],
+                          capture_output=True, text=True, timeout=timeout)
+    elapsed = time.perf_counter() - t0
+    marker = next((line for line in reversed(proc.stdout.splitlines()) if line.startswith("@@RESULT@@")), None)
+    if proc.returncode != 0 or marker is None:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}")
+    return json.loads(marker[len("@@RESULT@@"):]), elapsed
+
+
+def _unit_sign(name):
+    name = name.lower()
+    if "per_s" in name or "mpps" in name or name.endswith(("rps", "speedup")) or name.startswith("speedup"):
+        return 1
+    if name.endswith(("_ms", "_us", "_ns", "_s", "_per_packet")) or name in ("ms", "us", "ns"):
+        return -1
+    return 0
+
+
+def direction(key):
+    """+1 if higher is better, -1 if lower is better, 0 if the metric is not compared
+
+    The unit may sit on a parent key (select_mpps.l2, flap_convergence_ms.median),
+    so the nearest key that names one decides.
+    """
+    for name in reversed(key.split(".")):
+        sign = _unit_sign(name)
+        if sign:
+            return sign
+    return 0
+
+
+def _too_small(key, old, new):
+    """One-off timings in s or ms under 0.1 ms are timer noise (per-op us/ns averages are not)"""
+    unit = next((name for name in reversed(key.split(".")) if _unit_sign(name)), "")
+    scale = 1.0 if unit.endswith("_s") else 1e-3 if unit.endswith("_ms") or unit == "ms" else None
+    return scale is not None and max(old, new) * scale < NOISE_FLOOR_S
+
+
+def flatten(value, prefix=""):
+    """{dotted.key: number} for every numeric leaf (lists are indexed)"""
+    out = {}
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((str(i), v) for i, v in enumerate(value))
+    else:
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            out[prefix] = value
+        return out
+    for key, child in items:
+        out.update(flatten(child, f"{prefix}.{key}" if prefix else str(key)))
+    return out
+
+
+def compare(results, baseline, tolerance):
+    """Regressions and improvements beyond tolerance, metric by metric"""
+    current, previous = flatten(results), flatten(baseline)
+    regressions, improvements, compared = [], [], 0
+    for key, old in sorted(previous.items()):
+        sign = direction(key)
+        new = current.get(key)
+        if not sign or new is None or old <= 0 or _too_small(key, old, new):
+            continue
+        compared += 1
+        change = (new - old) / old
+        entry = {"metric": key, "baseline": old, "current": new, "change": round(change, 3)}
+        if change * sign < -tolerance:
+            regressions.append(entry)
+        elif change * sign > tolerance:
+            improvements.append(entry)
+    missing = sorted(key for key in previous if direction(key) and key not in current
+                     and key.split(".", 1)[0] in results)
+    return {"compared": compared, "regressions": regressions, "improvements": improvements, "missing": missing}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(names=None, profile="ci", timeout=1800, log=None):
+    names = names or list(SUITE)
+    document = {
+        "meta": {"profile": profile, "python": platform.python_version(), "platform": platform.platform(),
+                 "machine": platform.machine(), "commit": _git_commit(),
+                 "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())},
+        "results": {},
+        "errors": {},
+        "seconds": {},
+    }
+    for name in names:
+        kwargs = SUITE[name] if profile == "ci" else {}
+        if log:
+            log(f"[suite] {name} ...")
+        try:
+            result, elapsed = run_bench(name, kwargs, timeout)
+        except (RuntimeError, subprocess.TimeoutExpired) as e:
+            document["errors"][name] = str(e)
+            if log:
+                log(f"[suite] {name} FAILED: {e}")
+            continue
+        document["results"][name] = result
+        document["seconds"][name] = round(elapsed, 1)
+        if log:
+            log(f"[suite] {name} done in {elapsed:.1f}s")
+    return document
+
+
+def main():
+    parser = argparse.ArgumentParser(description="NateOS benchmark suite")
+    parser.add_argument("--profile", choices=("ci", "full"), default="ci")
+    parser.add_argument("--only", help="benchmarks to run, comma-separated (default: all)")
+    parser.add_argument("--skip", default="", help="benchmarks to leave out, comma-separated")
+    parser.add_argument("--output", help="also write the results document to this file")
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="allowed relative change before a metric counts as regressed (default %(default)s)")
+    parser.add_argument("--update-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--timeout", type=int, default=1800, help="per-benchmark timeout in seconds")
+    args = parser.parse_args()
+
+    names = args.only.split(",") if args.only else list(SUITE)
+    skip = set(filter(None, args.skip.split(",")))
+    unknown = [name for name in names + list(skip) if name not in SUITE]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)} (have {', '.join(SUITE)})")
+    names = [name for name in names if name not in skip]
+
+    document = run(names, args.profile, args.timeout, log=lambda text: print(text, file=sys.stderr, flush=True))
+    if os.path.exists(args.baseline) and not args.update_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("meta", {}).get("profile") != args.profile:
+            print(f"[suite] baseline was recorded with profile {baseline.get('meta', {}).get('profile')}, "
+                  f"not {args.profile}; not comparing", file=sys.stderr)
+        else:
+            document["comparison"] = dict(compare(document["results"], baseline["results"], args.tolerance),
+                                          baseline=os.path.relpath(args.baseline), tolerance=args.tolerance,
+                                          baseline_commit=baseline.get("meta", {}).get("commit"))
+    text = json.dumps(document, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    if args.update_baseline:
+        if document["errors"]:
+            print("[suite] not updating the baseline: some benchmarks failed", file=sys.stderr)
+            sys.exit(2)
+        stored = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                stored = json.load(f)
+        # A partial run (--only/--skip) refreshes just its benchmarks
+        if stored.get("meta", {}).get("profile") == args.profile:
+            results = dict(stored.get("results", {}), **document["results"])
+        else:
+            results = document["results"]
+        with open(args.baseline, "w") as f:
+            json.dump({"meta": document["meta"], "results": results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"[suite] baseline written to {os.path.relpath(args.baseline)}", file=sys.stderr)
+    if document["errors"]:
+        sys.exit(2)
+    comparison = document.get("comparison")
+    if comparison and comparison["regressions"]:
+        for entry in comparison["regressions"]:
+            print(f"[suite] REGRESSION {entry['metric']}: {entry['baseline']} -> {entry['current']} "
+                  f"({entry['change']:+.0%})", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
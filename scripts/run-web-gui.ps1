@@ -1,6 +1,7 @@
 Param(
 	[string]$Python = "python",
-	[int]$Port = 8080
+	[int]$Port = 8080,
+	[switch]$Production
 )
 
 Write-Host "[NateOS] Starting Web Management GUI on port $Port"
@@ -8,6 +9,9 @@ Write-Host "[NateOS] Access the GUI at: http://localhost:$Port/static/index.html
 Write-Host "[NateOS] API will be available at: http://localhost:$Port/api"
 
 $env:PORT = $Port
-& $Python "src/mgmt/web/api.py"
+if ($Production) {
+	& $Python "src/mgmt/web/serve.py" --port $Port
+} else {
+	& $Python "src/mgmt/web/api.py"
+}
 if ($LASTEXITCODE -ne 0) { exit $LASTEXITCODE }
-
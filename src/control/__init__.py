@@ -0,0 +1,4 @@
+"""
+NateOS control plane
+Protocol state and table managers that program the dataplane
+"""
@@ -0,0 +1,518 @@
+#!/usr/bin/env python3
+"""
+NateOS IGMP snooping
+(VLAN, group, source) membership with port bitmaps and precomputed egress sets
+
+Ports are bit positions, so each membership's port set is one int bitmap.
+Every (membership, port) pair has a record whose expiry runs on a
+hierarchical timer wheel with lazy re-arm, as in the FDB. A refresh only
+stores the new deadline; the wheel entry re-arms itself when it fires.
+Reports for ports already joined, which are most of a report storm, thus
+cost one dict lookup and one store each.
+
+The dataplane reads egress(vlan, group, source), which is a dict lookup of
+a precomputed bitmap: the (*,G) member ports, plus the (S,G) ports for
+source-specific joins, plus the VLAN's multicast-router ports. Membership
+changes only mark their (VLAN, group) dirty, and commit() recomputes each
+dirty group once. A burst of channel changes in one batch therefore costs
+one recompute per group touched, not one per report.
+
+Timers follow RFC 3376 / RFC 4541: group membership interval = robustness
+* query interval + query response interval; other-querier-present interval
+= robustness * QI + QRI / 2; a leave shortens the port's membership to the
+last-member query time unless fast-leave is on.
+"""
+import socket
+import struct
+from array import array
+
+from dataplane.timerwheel import TimerWheel
+
+ANY_SOURCE = 0
+MAX_PENDING_QUERIES = 4096
+
+IGMP_QUERY = 0x11
+IGMP_V1_REPORT = 0x12
+IGMP_V2_REPORT = 0x16
+IGMP_LEAVE = 0x17
+IGMP_V3_REPORT = 0x22
+
+# IGMPv3 group record types
+MODE_IS_INCLUDE = 1
+MODE_IS_EXCLUDE = 2
+CHANGE_TO_INCLUDE = 3
+CHANGE_TO_EXCLUDE = 4
+ALLOW_NEW_SOURCES = 5
+BLOCK_OLD_SOURCES = 6
+
+DEFAULTS = {
+    "enabled": False,
+    "querier": False,
+    "querier_address": "0.0.0.0",
+    "query_interval": 125,
+    "query_response_interval": 10,
+    "last_member_query_interval": 1,
+    "robustness": 2,
+    "fast_leave": False,
+    "static_groups": [],
+    "mrouter_ports": {},
+}
+
+_GROUP = struct.Struct("!BBHI")
+_V3_HEADER = struct.Struct("!BBHHH")
+_V3_RECORD = struct.Struct("!BBHI")
+
+_MCAST_BASE = 0xE0000000
+_MCAST_MASK = 0xF0000000
+_LINK_LOCAL = 0xE0000000  # 224.0.0.0/24 is never snooped (always flooded)
+
+
+def ip_to_int(text):
+    try:
+        return int.from_bytes(socket.inet_aton(text), "big")
+    except (OSError, TypeError):
+        raise ValueError(f"invalid IPv4 address '{text}'")
+
+
+def int_to_ip(value):
+    return socket.inet_ntoa(value.to_bytes(4, "big"))
+
+
+def is_snooped(group):
+    """True for multicast groups outside the link-local control block"""
+    return group & _MCAST_MASK == _MCAST_BASE and group >> 8 != _LINK_LOCAL >> 8
+
+
+def bits(bitmap):
+    """Port numbers set in a bitmap, ascending"""
+    result = []
+    while bitmap:
+        low = bitmap & -bitmap
+        result.append(low.bit_length() - 1)
+        bitmap ^= low
+    return result
+
+
+class IgmpSnooping:
+    """Snooped multicast membership, querier state and per-group egress bitmaps"""
+
+    def __init__(self, config=None, now=0.0):
+        self._wheel = TimerWheel(tick=1.0, slots=64, levels=3, now=now)
+        self._port_ids = {}
+        self._port_names = {}
+        self.members = {}        # (vlan, group, source) -> dynamic port bitmap
+        self.static = {}         # (vlan, group, source) -> configured port bitmap
+        self.mrouters = {}       # vlan -> learned multicast-router port bitmap
+        self.static_mrouters = {}
+        self.egress_map = {}     # (vlan, group) and (vlan, group, source) -> egress bitmap
+        self.queriers = {}       # vlan -> other querier's address (absent: none seen)
+        self.pending_queries = []
+        self._groups = {}        # (vlan, group) -> sources with state (ANY_SOURCE for *,G)
+        self._dirty = set()
+        self._records = {}       # record key -> record id
+        self._keys = []
+        self._deadline = array("d")
+        self._due = array("q")
+        self._free = []
+        self._now = now
+        self.stats = {"reports": 0, "leaves": 0, "queries": 0, "joins": 0, "expired": 0,
+                      "recomputes": 0, "commits": 0, "ignored": 0}
+        self.configure(config or {})
+
+    def __len__(self):
+        return len(self.egress_map)
+
+    # Port names are interned to small integers; dataplane port numbers are used as-is
+    def port_id(self, port):
+        if isinstance(port, int):
+            return port
+        pid = self._port_ids.get(port)
+        if pid is None:
+            pid = self._port_ids[port] = len(self._port_ids) + 1
+            self._port_names[pid] = port
+        return pid
+
+    def port_name(self, pid):
+        return self._port_names.get(pid, pid)
+
+    # -------- Configuration --------
+    def configure(self, config):
+        """Apply an igmp_snooping config section; raises ValueError if it is invalid"""
+        cfg = dict(DEFAULTS, **config)
+        for key in ("query_interval", "query_response_interval", "last_member_query_interval", "robustness"):
+            if not isinstance(cfg[key], (int, float)) or isinstance(cfg[key], bool) or cfg[key] <= 0:
+                raise ValueError(f"{key} must be a positive number")
+        if cfg["query_response_interval"] >= cfg["query_interval"]:
+            raise ValueError("query_response_interval must be less than query_interval")
+        address = ip_to_int(cfg["querier_address"] or "0.0.0.0")
+        static = {}
+        for i, entry in enumerate(cfg["static_groups"] or ()):
+            if not isinstance(entry, dict):
+                raise ValueError(f"static_groups[{i}] must be an object")
+            try:
+                vlan = int(entry.get("vlan", 1))
+                group = ip_to_int(entry["group"])
+                source = ip_to_int(entry["source"]) if entry.get("source") else ANY_SOURCE
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"static_groups[{i}]: {e}")
+            if not is_snooped(group):
+                raise ValueError(f"static_groups[{i}]: {entry['group']} is not a snoopable multicast group")
+            key = (vlan, group, source)
+            for port in entry.get("ports") or ():
+                static[key] = static.get(key, 0) | 1 << self.port_id(port)
+        static_mrouters = {}
+        for vlan, ports in (cfg["mrouter_ports"] or {}).items():
+            try:
+                vlan = int(vlan)
+            except ValueError:
+                raise ValueError(f"mrouter_ports: invalid VLAN '{vlan}'")
+            for port in ports or ():
+                static_mrouters[vlan] = static_mrouters.get(vlan, 0) | 1 << self.port_id(port)
+
+        was_enabled = getattr(self, "enabled", False)
+        self.config = cfg
+        self.enabled = bool(cfg["enabled"])
+        self.querier = bool(cfg["querier"])
+        self.querier_address = address
+        self.fast_leave = bool(cfg["fast_leave"])
+        self.robustness = cfg["robustness"]
+        self.query_interval = cfg["query_interval"]
+        self.gmi = self.robustness * self.query_interval + cfg["query_response_interval"]
+        self.oqpi = self.robustness * self.query_interval + cfg["query_response_interval"] / 2
+        self.lmqt = self.robustness * cfg["last_member_query_interval"]
+        for key in set(self.static) | set(static):
+            self._dirty.add(key[:2])
+            self._groups.setdefault(key[:2], set()).add(key[2])
+        for vlan in set(self.static_mrouters) | set(static_mrouters):
+            self._dirty_vlan(vlan)
+        self.static = static
+        self.static_mrouters = static_mrouters
+        if was_enabled and not self.enabled:
+            self.flush()
+        if self.querier and self.enabled:
+            for vlan in {key[0] for key in self._groups} | set(static_mrouters):
+                self._arm_query(vlan, self._now)
+        self.commit()
+
+    # -------- Timer records --------
+    def _arm(self, key, deadline):
+        """Create or move the record for key to expire at deadline"""
+        rid = self._records.get(key)
+        if rid is None:
+            if self._free:
+                rid = self._free.pop()
+                self._keys[rid] = key
+                self._deadline[rid] = deadline
+                self._due[rid] = -1
+            else:
+                rid = len(self._keys)
+                self._keys.append(key)
+                self._deadline.append(deadline)
+                self._due.append(-1)
+            self._records[key] = rid
+        elif deadline >= self._deadline[rid] and self._due[rid] >= 0:
+            self._deadline[rid] = deadline  # later: the pending wheel entry re-arms itself
+            return rid
+        self._deadline[rid] = deadline
+        self._due[rid] = self._wheel.schedule(rid, deadline)
+        return rid
+
+    def _drop(self, key):
+        rid = self._records.pop(key, None)
+        if rid is not None:
+            self._keys[rid] = None
+            self._due[rid] = -1
+            self._free.append(rid)
+
+    def _dirty_vlan(self, vlan):
+        self._dirty.update(vg for vg in self._groups if vg[0] == vlan)
+
+    def _queue_query(self, vlan, group):
+        if len(self.pending_queries) < MAX_PENDING_QUERIES:
+            self.pending_queries.append((vlan, group))
+
+    def take_queries(self):
+        """Queries this switch should send as querier: [(vlan, group)], group 0 = general"""
+        queries, self.pending_queries = self.pending_queries, []
+        return queries
+
+    def _arm_query(self, vlan, now):
+        if ("query", vlan) not in self._records:
+            self._arm(("query", vlan), now)
+
+    # -------- Membership --------
+    def join(self, vlan, group, port, now, source=ANY_SOURCE):
+        """Host report: add or refresh port in (vlan, group, source)"""
+        if not self.enabled or not is_snooped(group):
+            self.stats["ignored"] += 1
+            return False
+        self.stats["reports"] += 1
+        pid = self.port_id(port)
+        return self._join(vlan, group, source, pid, now + self.gmi)
+
+    def _join(self, vlan, group, source, pid, deadline):
+        key = (vlan, group, source, pid)
+        rid = self._records.get(key)
+        if rid is not None and self._due[rid] >= 0:
+            if deadline >= self._deadline[rid]:
+                self._deadline[rid] = deadline
+            else:
+                self._arm(key, deadline)
+            return False
+        self._arm(key, deadline)
+        mkey = (vlan, group, source)
+        self.members[mkey] = self.members.get(mkey, 0) | 1 << pid
+        vg = (vlan, group)
+        sources = self._groups.get(vg)
+        if sources is None:
+            sources = self._groups[vg] = set()
+            if self.querier:
+                self._arm_query(vlan, self._now)
+        sources.add(source)
+        self._dirty.add(vg)
+        self.stats["joins"] += 1
+        return True
+
+    def join_many(self, vlans, groups, ports, now, sources=None):
+        """Apply a batch of reports with one timestamp; returns new memberships"""
+        if not self.enabled:
+            return 0
+        deadline = now + self.gmi
+        records, deadlines, due = self._records, self._deadline, self._due
+        join, port_id = self._join, self.port_id
+        added = reports = 0
+        if sources is None:
+            sources = (ANY_SOURCE,) * len(vlans)
+        for vlan, group, port, source in zip(vlans, groups, ports, sources):
+            if not is_snooped(group):
+                self.stats["ignored"] += 1
+                continue
+            reports += 1
+            pid = port if isinstance(port, int) else port_id(port)
+            rid = records.get((vlan, group, source, pid))
+            if rid is not None and due[rid] >= 0 and deadline >= deadlines[rid]:
+                deadlines[rid] = deadline  # refresh: the common case in a storm
+            elif join(vlan, group, source, pid, deadline):
+                added += 1
+        self.stats["reports"] += reports
+        return added
+
+    def leave(self, vlan, group, port, now, source=ANY_SOURCE):
+        """Host leave: drop port now (fast-leave) or after the last-member query time"""
+        if not self.enabled or not is_snooped(group):
+            return False
+        self.stats["leaves"] += 1
+        pid = self.port_id(port)
+        key = (vlan, group, source, pid)
+        if key not in self._records:
+            return False
+        if self.fast_leave:
+            self._remove(key)
+        else:
+            self._arm(key, now + self.lmqt)
+            if self.querier and vlan not in self.queriers:
+                self._queue_query(vlan, group)
+        return True
+
+    def _remove(self, key):
+        vlan, group, source, pid = key
+        self._drop(key)
+        mkey = (vlan, group, source)
+        ports = self.members.get(mkey, 0) & ~(1 << pid)
+        if ports:
+            self.members[mkey] = ports
+        else:
+            self.members.pop(mkey, None)
+        self._dirty.add((vlan, group))
+
+    # -------- Queriers and router ports --------
+    def query(self, vlan, port, src_ip, now, group=0):
+        """Query seen on port: it leads to a multicast router; run the querier election"""
+        if not self.enabled:
+            return
+        self.stats["queries"] += 1
+        pid = self.port_id(port)
+        vlan_routers = self.mrouters.get(vlan, 0)
+        if not vlan_routers & 1 << pid:
+            self.mrouters[vlan] = vlan_routers | 1 << pid
+            self._dirty_vlan(vlan)
+        self._arm(("mrouter", vlan, pid), now + self.oqpi)
+        # Lowest address wins; without an address of our own we always defer
+        if not self.querier or not self.querier_address or src_ip < self.querier_address:
+            self.queriers[vlan] = src_ip
+            self._arm(("querier", vlan), now + self.oqpi)
+
+    def handle_packet(self, vlan, port, src_ip, data, now):
+        """Process one IGMP message (IP payload); returns its type or 0 if malformed"""
+        if len(data) < 8:
+            return 0
+        kind, _, _, group = _GROUP.unpack_from(data)
+        if kind == IGMP_QUERY:
+            self.query(vlan, port, src_ip, now, group)
+        elif kind == IGMP_V1_REPORT or kind == IGMP_V2_REPORT:
+            self.join(vlan, group, port, now)
+        elif kind == IGMP_LEAVE:
+            self.leave(vlan, group, port, now)
+        elif kind == IGMP_V3_REPORT:
+            self._v3_report(vlan, port, data, now)
+        else:
+            return 0
+        return kind
+
+    def _v3_report(self, vlan, port, data, now):
+        _, _, _, _, count = _V3_HEADER.unpack_from(data)
+        offset = 8
+        for _ in range(count):
+            if len(data) < offset + 8:
+                break
+            kind, aux, nsrc, group = _V3_RECORD.unpack_from(data, offset)
+            offset += 8
+            srcs = [int.from_bytes(data[offset + 4 * i:offset + 4 * i + 4], "big") for i in range(nsrc)]
+            offset += 4 * nsrc + 4 * aux
+            if kind in (MODE_IS_EXCLUDE, CHANGE_TO_EXCLUDE):
+                self.join(vlan, group, port, now)  # EXCLUDE(S): forward all sources
+            elif kind in (MODE_IS_INCLUDE, CHANGE_TO_INCLUDE, ALLOW_NEW_SOURCES):
+                if kind == CHANGE_TO_INCLUDE and not srcs:
+                    self.leave(vlan, group, port, now)
+                for source in srcs:
+                    self.join(vlan, group, port, now, source)
+            elif kind == BLOCK_OLD_SOURCES:
+                for source in srcs:
+                    self.leave(vlan, group, port, now, source)
+
+    # -------- Timers and recomputation --------
+    def advance(self, now):
+        """Run expired timers up to now, then commit; returns expired memberships"""
+        self._now = now
+        expired = 0
+        keys, deadlines, due = self._keys, self._deadline, self._due
+        for tick, rid in self._wheel.advance(now):
+            key = keys[rid]
+            if key is None or due[rid] != tick:
+                continue
+            if deadlines[rid] > now:
+                due[rid] = self._wheel.schedule(rid, deadlines[rid])
+                continue
+            due[rid] = -1
+            if not isinstance(key[0], str):
+                self._remove(key)
+                expired += 1
+            elif key[0] == "mrouter":
+                self._drop(key)
+                vlan, pid = key[1], key[2]
+                self.mrouters[vlan] = self.mrouters.get(vlan, 0) & ~(1 << pid)
+                self._dirty_vlan(vlan)
+            elif key[0] == "querier":
+                self._drop(key)
+                self.queriers.pop(key[1], None)  # other querier gone: take over
+            elif key[0] == "query":
+                vlan = key[1]
+                if self.querier and any(vg[0] == vlan for vg in self._groups):
+                    if vlan not in self.queriers:
+                        self._queue_query(vlan, 0)
+                    self._arm(key, now + self.query_interval)
+                else:
+                    self._drop(key)
+        self.stats["expired"] += expired
+        self.commit()
+        return expired
+
+    def commit(self):
+        """Recompute the egress bitmap of every (VLAN, group) changed since the last commit"""
+        if not self._dirty:
+            return 0
+        dirty, self._dirty = self._dirty, set()
+        members, static, egress, groups = self.members, self.static, self.egress_map, self._groups
+        for vg in dirty:
+            vlan, group = vg
+            old = groups.get(vg, ())
+            live = {s for s in old if (vlan, group, s) in members or (vlan, group, s) in static}
+            for source in old:
+                if source not in live or source == ANY_SOURCE:
+                    egress.pop((vlan, group, source) if source else vg, None)
+            if not live:
+                groups.pop(vg, None)
+                continue
+            groups[vg] = live
+            routers = self.mrouters.get(vlan, 0) | self.static_mrouters.get(vlan, 0)
+            star = members.get((vlan, group, ANY_SOURCE), 0) | static.get((vlan, group, ANY_SOURCE), 0)
+            egress[vg] = star | routers
+            for source in live:
+                if source != ANY_SOURCE:
+                    egress[(vlan, group, source)] = (star | routers | members.get((vlan, group, source), 0)
+                                                     | static.get((vlan, group, source), 0))
+        self.stats["recomputes"] += len(dirty)
+        self.stats["commits"] += 1
+        return len(dirty)
+
+    def egress(self, vlan, group, source=ANY_SOURCE):
+        """Egress port bitmap for a multicast packet; unknown groups go to router ports only"""
+        egress = self.egress_map
+        if source:
+            ports = egress.get((vlan, group, source))
+            if ports is not None:
+                return ports
+        ports = egress.get((vlan, group))
+        if ports is None:
+            return self.mrouters.get(vlan, 0) | self.static_mrouters.get(vlan, 0)
+        return ports
+
+    def flush(self, vlan=None):
+        """Forget learned state (all VLANs or one); static groups stay"""
+        for key in [k for k in self._records if vlan is None or k[1 if isinstance(k[0], str) else 0] == vlan]:
+            self._drop(key)
+        for mkey in [k for k in self.members if vlan is None or k[0] == vlan]:
+            del self.members[mkey]
+        for vg in [vg for vg in self._groups if vlan is None or vg[0] == vlan]:
+            self._groups[vg] = {k[2] for k in self.static if k[:2] == vg}
+            self._dirty.add(vg)
+        for table in (self.mrouters, self.queriers):
+            for v in [v for v in table if vlan is None or v == vlan]:
+                del table[v]
+        self.pending_queries = [q for q in self.pending_queries if vlan is not None and q[0] != vlan]
+        self.commit()
+
+    # -------- Reporting --------
+    def count(self, vlan=None, group=None):
+        return sum(len(sources) for vg, sources in self._groups.items()
+                   if (vlan is None or vg[0] == vlan) and (group is None or vg[1] == group))
+
+    def _port_list(self, bitmap):
+        return [self.port_name(pid) for pid in bits(bitmap)]
+
+    def entries(self, vlan=None, group=None, offset=0, limit=None, now=None):
+        """Membership dicts sorted by (vlan, group, source), optionally filtered and paged"""
+        keys = sorted((vg[0], vg[1], source) for vg, sources in self._groups.items() for source in sources
+                      if (vlan is None or vg[0] == vlan) and (group is None or vg[1] == group))
+        end = None if limit is None else offset + limit
+        result = []
+        for key in keys[offset:end]:
+            v, g, source = key
+            dynamic = self.members.get(key, 0)
+            ports = []
+            for pid in bits(dynamic | self.static.get(key, 0)):
+                port = {"port": self.port_name(pid), "type": "dynamic" if dynamic & 1 << pid else "static"}
+                rid = self._records.get((v, g, source, pid))
+                if now is not None and rid is not None:
+                    port["expires_in"] = round(max(0.0, self._deadline[rid] - now), 1)
+                ports.append(port)
+            result.append({
+                "vlan": v,
+                "group": int_to_ip(g),
+                "source": int_to_ip(source) if source else "*",
+                "ports": ports,
+                "egress_ports": self._port_list(self.egress(v, g, source)),
+            })
+        return result
+
+    def summary(self):
+        vlans = set(self.mrouters) | set(self.static_mrouters) | set(self.queriers)
+        return {
+            "enabled": self.enabled,
+            "memberships": self.count(),
+            "groups": sum(1 for key in self.egress_map if len(key) == 2),
+            "mrouter_ports": {str(v): self._port_list(self.mrouters.get(v, 0) | self.static_mrouters.get(v, 0))
+                              for v in sorted(vlans)},
+            "other_queriers": {str(v): int_to_ip(ip) for v, ip in sorted(self.queriers.items())},
+            "stats": dict(self.stats),
+        }
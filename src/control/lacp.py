@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+"""
+NateOS link aggregation
+LACP (802.1AX) actor/partner state per member and flow-hash member selection
+
+Each bundle (LAG) owns a fixed member-selection table of TABLE_SIZE
+entries indexed by flow hash & mask. An entry holds the egress port id of
+one distributing member. The table changes only when the set of
+distributing members changes. It is then rebuilt in one O(table) pass:
+entries whose member is still distributing and within its fair share
+stay put, and only the rest are dealt out to members below their share.
+A member flap therefore remaps about 1/N of flows, and only in its own
+bundle. LACPDUs, link changes and timeouts mark bundles dirty, and
+dirty bundles are rebuilt once per batch.
+
+The actor/partner machines are condensed from 802.1AX: a member is
+selected when its link is up and its partner (system, key) matches the
+bundle's aggregator partner, and it distributes once the partner reports
+synchronization and collecting. Partner information times out after
+three periodic intervals (3 s fast, 90 s slow), leaving the member
+defaulted. Mode "on" bundles skip LACP and distribute on link state.
+
+Hashing runs over a whole packet vector at once, on a configurable field
+set (any of HASH_FIELDS), like ECMP's flow_hash_many.
+"""
+import random
+from array import array
+from itertools import repeat
+from operator import itemgetter
+
+from dataplane.fdb import mac_to_int, int_to_mac
+from dataplane.timerwheel import TimerWheel
+
+TABLE_SIZE = 256
+HASH_FIELDS = ("src_mac", "dst_mac", "vlan", "ethertype", "src_ip", "dst_ip", "proto", "sport", "dport")
+DEFAULT_HASH_FIELDS = ("src_ip", "dst_ip", "proto", "sport", "dport")
+MODES = ("active", "passive", "on")
+DEFAULT_SYSTEM_PRIORITY = 32768
+DEFAULT_SYSTEM_MAC = "02:00:5e:00:00:01"
+FAST_PERIOD = 1.0
+SLOW_PERIOD = 30.0
+NO_PORT = 0
+
+# Actor/partner state bits (802.1AX 6.4.2.3)
+LACP_ACTIVITY = 0x01
+LACP_TIMEOUT = 0x02
+AGGREGATION = 0x04
+SYNCHRONIZATION = 0x08
+COLLECTING = 0x10
+DISTRIBUTING = 0x20
+DEFAULTED = 0x40
+EXPIRED = 0x80
+STATE_BITS = ((LACP_ACTIVITY, "activity"), (LACP_TIMEOUT, "short_timeout"), (AGGREGATION, "aggregation"),
+              (SYNCHRONIZATION, "sync"), (COLLECTING, "collecting"), (DISTRIBUTING, "distributing"),
+              (DEFAULTED, "defaulted"), (EXPIRED, "expired"))
+
+_M32 = 0xFFFFFFFF
+
+
+def state_names(state):
+    return [name for bit, name in STATE_BITS if state & bit]
+
+
+def parse_hash_fields(fields):
+    fields = tuple(fields or DEFAULT_HASH_FIELDS)
+    unknown = [f for f in fields if f not in HASH_FIELDS]
+    if unknown or not fields:
+        raise ValueError(f"hash_fields must be a non-empty list of {', '.join(HASH_FIELDS)}")
+    return fields
+
+
+def synthetic_trace(flows=1000, packets=100000, seed=1, skew=1.0):
+    """{field: [values]} for a packet trace over random 5-tuple flows
+
+    Flow sizes follow 1/rank**skew, so a few elephant flows carry much of
+    the traffic, as on a real uplink; skew 0 gives equal flows.
+    """
+    rng = random.Random(seed)
+    tuples = [(rng.getrandbits(48), rng.getrandbits(48), rng.randrange(1, 4095), 0x0800,
+               0x0A000000 | rng.getrandbits(16), 0x0A010000 | rng.getrandbits(16), rng.choice((6, 17)),
+               rng.randrange(1024, 65536), rng.choice((80, 443, 53, 4789, rng.randrange(1024, 65536))),
+               rng.choice((64, 576, 1500)))
+              for _ in range(flows)]
+    weights = [1.0 / (rank + 1) ** skew for rank in range(flows)]
+    rows = rng.choices(tuples, weights, k=packets)
+    columns = list(zip(*rows)) if rows else [()] * (len(HASH_FIELDS) + 1)
+    trace = {field: list(column) for field, column in zip(HASH_FIELDS, columns)}
+    trace["length"] = list(columns[-1])
+    return trace
+
+
+class Member:
+    """One member port: link, actor state, partner info and its timer"""
+    __slots__ = ("name", "pid", "number", "lag", "up", "actor", "partner", "expires", "due",
+                 "selected", "distributing")
+
+    def __init__(self, name, pid, number, lag):
+        self.name = name
+        self.pid = pid
+        self.number = number
+        self.lag = lag
+        self.up = False
+        self.actor = 0
+        self.partner = None         # (system id, key, port, state) from the partner's LACPDU
+        self.expires = 0.0
+        self.due = -1
+        self.selected = False
+        self.distributing = False
+
+
+class Lag:
+    """A bundle: members, aggregator partner and the member-selection table"""
+
+    def __init__(self, name, pid, config):
+        self.name = name
+        self.pid = pid
+        self.mode = config.get("mode", "active")
+        if self.mode not in MODES:
+            raise ValueError(f"{name}: mode must be one of {', '.join(MODES)}")
+        self.key = int(config.get("key", 1))
+        if not 0 < self.key <= 0xFFFF:
+            raise ValueError(f"{name}: key must be 1-65535")
+        self.min_links = int(config.get("min_links", 1))
+        if self.min_links < 1:
+            raise ValueError(f"{name}: min_links must be >= 1")
+        self.fast = bool(config.get("fast_rate", False))
+        self.members = {}
+        self.aggregator = None      # (partner system, partner key) the bundle aggregates with
+        self.active = []            # distributing member port ids, in table order
+        self.table = array("H", bytes(2 * TABLE_SIZE))
+        self.rebuilds = 0
+        self.moved = 0              # table entries reassigned by the last rebuild
+
+    def rebuild(self, active):
+        """Point the table at a new distributing member set, moving as few entries as possible"""
+        table = self.table
+        if not active:
+            for i in range(TABLE_SIZE):
+                table[i] = NO_PORT
+            self.moved, self.active = TABLE_SIZE, []
+            self.rebuilds += 1
+            return
+        quota = {pid: TABLE_SIZE // len(active) + (i < TABLE_SIZE % len(active)) for i, pid in enumerate(active)}
+        pool = []
+        for i in range(TABLE_SIZE):
+            left = quota.get(table[i], 0)
+            if left:
+                quota[table[i]] = left - 1
+            else:
+                pool.append(i)
+        takers = [pid for pid in active for _ in range(quota[pid])]
+        for i, pid in zip(pool, takers):
+            table[i] = pid
+        self.moved, self.active = len(pool), list(active)
+        self.rebuilds += 1
+
+    def loads(self):
+        counts = dict.fromkeys(self.active, 0)
+        for pid in self.table:
+            if pid in counts:
+                counts[pid] += 1
+        return counts
+
+
+class LacpSystem:
+    """All bundles of one switch, with batched LACPDU processing and per-bundle rebuilds"""
+
+    def __init__(self, config=None, now=0.0, port_id=None):
+        """port_id: name -> small int interning shared with the dataplane (default: private)"""
+        config = config or {}
+        self.priority = int(config.get("system_priority", DEFAULT_SYSTEM_PRIORITY))
+        if not 0 <= self.priority <= 0xFFFF:
+            raise ValueError("system_priority must be 0-65535")
+        self.system_id = self.priority << 48 | mac_to_int(config.get("system_mac") or DEFAULT_SYSTEM_MAC)
+        self.hash_fields = parse_hash_fields(config.get("hash_fields"))
+        self.seed = int(config.get("hash_seed", 0))
+        self._port_ids = {}
+        self.port_id = port_id or self._intern
+        self.lags = {}
+        self.by_pid = {}
+        self.members = {}
+        for name, spec in (config.get("bundles") or {}).items():
+            spec = spec or {}
+            lag = Lag(name, self.port_id(name), spec)
+            for member in spec.get("members") or ():
+                if member in self.members:
+                    raise ValueError(f"{member} is already a member of {self.members[member].lag.name}")
+                m = Member(member, self.port_id(member), len(self.members) + 1, lag)
+                lag.members[member] = m
+                self.members[member] = m
+            self.lags[name] = lag
+            self.by_pid[lag.pid] = lag
+        self._numbers = {m.number: m for m in self.members.values()}
+        self._wheel = TimerWheel(tick=0.5, slots=64, levels=3, now=now)
+        self._dirty = set()
+        self._ntt = set()
+        self.stats = {"pdus": 0, "mismatched": 0, "timeouts": 0, "rebuilds": 0, "entries_moved": 0}
+        for member in self.members.values():
+            self._update(member)
+
+    def _intern(self, name):
+        pid = self._port_ids.get(name)
+        if pid is None:
+            pid = self._port_ids[name] = len(self._port_ids) + 1
+        return pid
+
+    # -------- State machines --------
+    def _update(self, m):
+        """Re-derive selection, actor state and distribution for one member"""
+        lag = m.lag
+        partner = m.partner
+        if lag.mode == "on":
+            selected = m.up
+            distributing = selected
+        else:
+            selected = False
+            if m.up and partner is not None and partner[3] & AGGREGATION \
+                    and (lag.mode == "active" or partner[3] & LACP_ACTIVITY):
+                agg = (partner[0], partner[1])
+                if lag.aggregator is None or lag.aggregator == agg or not self._holds(lag, m):
+                    lag.aggregator = agg
+                    selected = True
+                else:
+                    self.stats["mismatched"] += 1
+            distributing = selected and partner[3] & (SYNCHRONIZATION | COLLECTING) == SYNCHRONIZATION | COLLECTING
+        actor = AGGREGATION
+        if lag.mode == "active":
+            actor |= LACP_ACTIVITY
+        if lag.fast:
+            actor |= LACP_TIMEOUT
+        if selected:
+            actor |= SYNCHRONIZATION | COLLECTING
+        if distributing:
+            actor |= DISTRIBUTING
+        if partner is None and lag.mode != "on":
+            actor |= DEFAULTED
+        if actor != m.actor:
+            m.actor = actor
+            self._ntt.add(m)
+        m.selected = selected
+        if bool(distributing) != m.distributing:
+            m.distributing = bool(distributing)
+            self._dirty.add(lag)
+        if lag.aggregator is not None and not any(x.selected for x in lag.members.values()):
+            lag.aggregator = None  # nobody left aggregating: the next partner may take over
+
+    @staticmethod
+    def _holds(lag, m):
+        """True if some other member is selected with the current aggregator"""
+        return any(x.selected for x in lag.members.values() if x is not m)
+
+    def _commit(self):
+        """Rebuild the tables of bundles whose distributing set changed"""
+        rebuilt = []
+        for lag in self._dirty:
+            active = [m.pid for m in lag.members.values() if m.distributing]
+            if len(active) < lag.min_links:
+                active = []
+            if active != lag.active:
+                lag.rebuild(active)
+                self.stats["rebuilds"] += 1
+                self.stats["entries_moved"] += lag.moved
+                rebuilt.append(lag.name)
+        self._dirty.clear()
+        return rebuilt
+
+    def _arm(self, m, now):
+        m.expires = now + 3 * (FAST_PERIOD if m.lag.fast else SLOW_PERIOD)
+        if m.due < 0:
+            m.due = self._wheel.schedule(m.number, m.expires)
+
+    # -------- Events --------
+    def receive_many(self, pdus, now):
+        """Process (port, (system, key, port, state)) LACPDUs; returns the bundles rebuilt"""
+        members = self.members
+        for port, actor in pdus:
+            m = members.get(port)
+            if m is None or not m.up or m.lag.mode == "on":
+                continue
+            self.stats["pdus"] += 1
+            self._arm(m, now)
+            if m.partner != actor:
+                m.partner = tuple(actor)
+                self._update(m)
+        return self._commit()
+
+    def set_link(self, port, up, now):
+        """Member link up/down; returns the bundles rebuilt"""
+        return self.set_links([(port, up)], now)
+
+    def set_links(self, changes, now):
+        for port, up in changes:
+            m = self.members.get(port)
+            if m is None or m.up == bool(up):
+                continue
+            m.up = bool(up)
+            if not up:
+                m.partner = None
+                m.due = -1
+            self._update(m)
+            if not up:
+                self._recheck(m.lag)
+        return self._commit()
+
+    def _recheck(self, lag):
+        """After a member leaves, members that waited on another partner may now be selected"""
+        for x in lag.members.values():
+            if not x.selected and x.up and x.partner is not None:
+                self._update(x)
+
+    def advance(self, now):
+        """Expire partner info not refreshed in three periods; returns the bundles rebuilt"""
+        by_number = self._numbers
+        for tick, number in self._wheel.advance(now):
+            m = by_number[number]
+            if m.due != tick:
+                continue
+            if m.expires > now:
+                m.due = self._wheel.schedule(number, m.expires)
+                continue
+            m.due = -1
+            if m.partner is not None:
+                m.partner = None
+                self.stats["timeouts"] += 1
+                self._update(m)
+                self._recheck(m.lag)
+        return self._commit()
+
+    def transmit(self):
+        """LACPDUs owed since the last call: {port: (actor info, partner info echoed back)}"""
+        out = {}
+        for m in self._ntt:
+            if m.up and m.lag.mode != "on":
+                out[m.name] = ((self.system_id, m.lag.key, m.number, m.actor), m.partner)
+        self._ntt.clear()
+        return out
+
+    # -------- Dataplane --------
+    def hash_many(self, headers, indexes=None):
+        """32-bit hashes of a packet vector over hash_fields; headers has one array per field"""
+        columns = [getattr(headers, f) if not isinstance(headers, dict) else headers[f] for f in self.hash_fields]
+        if indexes is not None:
+            indexes = list(indexes)
+            if len(indexes) < 2:
+                return array("I", [hash((self.seed,) + tuple(c[i] for c in columns)) & _M32 for i in indexes])
+            pick = itemgetter(*indexes)
+            columns = [pick(c) for c in columns]
+        else:
+            count = getattr(headers, "count", None)
+            if count is not None:
+                columns = [c[:count] for c in columns]
+        return array("I", [h & _M32 for h in map(hash, zip(repeat(self.seed), *columns))])
+
+    def select_many(self, lag, hashes):
+        """Egress member port ids for a batch of flow hashes (NO_PORT if the bundle is down)"""
+        table = lag.table
+        mask = TABLE_SIZE - 1
+        return [table[h & mask] for h in hashes]
+
+    def distribution(self, name, trace, members=None):
+        """Share of packets (and bytes) per member for a trace: {field: [values]}, optional "length"
+
+        members evaluates a what-if member set (names) instead of the live
+        distributing members, on a scratch table built the same way.
+        """
+        lag = self.lags[name]
+        if members is not None:
+            unknown = [m for m in members if m not in lag.members]
+            if unknown:
+                raise ValueError(f"{', '.join(unknown)} not in {name}")
+            scratch = Lag(name, lag.pid, {"mode": lag.mode})
+            scratch.members = lag.members
+            scratch.rebuild([lag.members[m].pid for m in members])
+            lag = scratch
+        count = len(trace[self.hash_fields[0]])
+        hashes = self.hash_many({f: trace[f] for f in self.hash_fields})
+        lengths = trace.get("length") or [1] * count
+        packets = dict.fromkeys(lag.active, 0)
+        octets = dict.fromkeys(lag.active, 0)
+        dropped = 0
+        for pid, length in zip(self.select_many(lag, hashes), lengths):
+            if pid == NO_PORT:
+                dropped += 1
+                continue
+            packets[pid] += 1
+            octets[pid] += length
+        names = {m.pid: m.name for m in lag.members.values()}
+        report = {"lag": name, "hash_fields": list(self.hash_fields), "packets": count, "dropped": dropped,
+                  "members": {}}
+        total_packets, total_bytes = sum(packets.values()) or 1, sum(octets.values()) or 1
+        for pid in lag.active:
+            report["members"][names[pid]] = {"packets": packets[pid], "share": round(packets[pid] / total_packets, 4),
+                                             "bytes_share": round(octets[pid] / total_bytes, 4)}
+        if packets:
+            mean = total_packets / len(packets)
+            variance = sum((p - mean) ** 2 for p in packets.values()) / len(packets)
+            report["max_over_mean"] = round(max(packets.values()) / mean, 3)
+            report["cv"] = round(variance ** 0.5 / mean, 4)
+        return report
+
+    # -------- Queries --------
+    def describe(self, name=None):
+        lags = [self.lags[name]] if name is not None else list(self.lags.values())
+        result = []
+        for lag in lags:
+            agg = lag.aggregator
+            result.append({
+                "name": lag.name,
+                "mode": lag.mode,
+                "key": lag.key,
+                "up": bool(lag.active),
+                "partner_system": None if agg is None else f"{agg[0] >> 48}.{int_to_mac(agg[0] & 0xFFFFFFFFFFFF)}",
+                "partner_key": None if agg is None else agg[1],
+                "distributing": [m.name for m in lag.members.values() if m.distributing],
+                "members": {m.name: {"link": "up" if m.up else "down",
+                                     "actor": state_names(m.actor),
+                                     "partner": state_names(m.partner[3]) if m.partner else None}
+                            for m in lag.members.values()},
+                "table_loads": {self._member_name(lag, pid): n for pid, n in lag.loads().items()},
+                "rebuilds": lag.rebuilds,
+            })
+        return result
+
+    @staticmethod
+    def _member_name(lag, pid):
+        for m in lag.members.values():
+            if m.pid == pid:
+                return m.name
+        return str(pid)
+
+    def summary(self):
+        return {"system_id": f"{self.priority}.{int_to_mac(self.system_id & 0xFFFFFFFFFFFF)}",
+                "hash_fields": list(self.hash_fields), "bundles": len(self.lags),
+                "members": len(self.members), "stats": dict(self.stats)}
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+NateOS neighbor cache
+ARP / IPv6 ND resolution keyed on (interface, IP) with timer-wheel state
+
+Entries live in preallocated parallel arrays indexed by slot, like the
+FDB; a hash index maps the packed key (interface id, family, address) to
+a slot. States follow RFC 4861: INCOMPLETE while resolving, REACHABLE
+after a confirmation, STALE once the reachable time lapses (still used
+for forwarding), PROBE when a STALE entry is used again, and FAILED when
+probes go unanswered. A FAILED entry is a short-lived negative cache, so
+a dead next-hop is not re-requested for every packet.
+
+Every state change re-arms the slot's timer-wheel entry; REACHABLE
+entries re-arm lazily, so a confirmation only bumps a timestamp.
+
+Misses are where a scan would hurt. A miss on a destination that is
+already INCOMPLETE only holds the packet (a few per neighbor, oldest
+dropped first). Solicitations for it are paced by that entry's
+retransmit timer rather than by the packet rate. New destinations are
+admitted through a token bucket, so a sweep of a /16 costs at most
+`miss_rate` new entries and solicitations per second. Next-hops named by
+static routes are resolved in batches (resolve_many) and pinned, so a
+FAILED gateway is retried instead of forgotten.
+"""
+import ipaddress
+from array import array
+from collections import deque
+
+from dataplane.fdb import int_to_mac
+from dataplane.timerwheel import TimerWheel
+
+DEFAULT_CAPACITY = 131072
+REACHABLE_TIME = 30.0
+STALE_TIME = 60.0       # unused STALE entries are collected after this
+RETRANS_TIME = 1.0
+MAX_PROBES = 3
+FAILED_TIME = 20.0
+HOLD_PACKETS = 3        # per INCOMPLETE neighbor
+HOLD_TOTAL = 65536
+MISS_RATE = 1000.0      # new resolutions per second
+MISS_BURST = 1000
+MAX_SOLICITS = 65536
+
+STATE_FREE = 0
+STATE_INCOMPLETE = 1
+STATE_REACHABLE = 2
+STATE_STALE = 3
+STATE_PROBE = 4
+STATE_FAILED = 5
+STATE_STATIC = 6
+STATE_NAMES = ("free", "incomplete", "reachable", "stale", "probe", "failed", "static")
+
+_USABLE = (STATE_REACHABLE, STATE_STALE, STATE_PROBE, STATE_STATIC)
+
+
+def parse_ip(text):
+    """(address int, IP version) for an IPv4 or IPv6 address string"""
+    address = ipaddress.ip_address(text)
+    return int(address), address.version
+
+
+def format_ip(value, version):
+    return str(ipaddress.IPv4Address(value) if version == 4 else ipaddress.IPv6Address(value))
+
+
+class NeighborCache:
+    """ARP/ND cache with hold queues, miss rate limiting and per-interface indexes"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, now=0.0, reachable_time=REACHABLE_TIME,
+                 retrans_time=RETRANS_TIME, probes=MAX_PROBES, miss_rate=MISS_RATE, miss_burst=MISS_BURST,
+                 hold_packets=HOLD_PACKETS):
+        self.capacity = capacity
+        self.reachable_time = reachable_time
+        self.retrans_time = retrans_time
+        self.probes = probes
+        self.hold_packets = hold_packets
+        self.miss_rate = miss_rate
+        self.miss_burst = miss_burst
+        self._tokens = float(miss_burst)
+        self._stamp = now
+        self.keys = [0] * capacity
+        self.macs = array("Q", bytes(8 * capacity))
+        self.ifids = array("H", bytes(2 * capacity))
+        self.versions = array("B", bytes(capacity))
+        self.state = array("B", bytes(capacity))
+        self.sent = array("B", bytes(capacity))           # solicitations sent in this INCOMPLETE/PROBE round
+        self.confirmed = array("d", bytes(8 * capacity))
+        self.deadline = array("d", bytes(8 * capacity))
+        self._due = array("q", [-1]) * capacity
+        self._index = {}
+        self._free = array("I", range(capacity - 1, -1, -1))
+        self._by_if = {}
+        self._if_ids = {}
+        self._if_names = [None]
+        self._held = {}
+        self._held_total = 0
+        self._pinned = set()
+        self._solicits = deque(maxlen=MAX_SOLICITS)
+        self._wheel = TimerWheel(tick=0.25, slots=64, levels=3, now=now)
+        self._version = 0
+        self._sorted = (None, None)
+        self.stats = {"misses": 0, "miss_limited": 0, "held": 0, "hold_dropped": 0, "released": 0,
+                      "failed_drops": 0, "solicits": 0, "resolved": 0, "failed": 0, "collected": 0,
+                      "table_full": 0}
+
+    def __len__(self):
+        return len(self._index)
+
+    # Interface names are interned to small integers, as FDB ports are
+    def if_id(self, name):
+        ifid = self._if_ids.get(name)
+        if ifid is None:
+            ifid = len(self._if_names)
+            self._if_ids[name] = ifid
+            self._if_names.append(name)
+        return ifid
+
+    def if_name(self, ifid):
+        return self._if_names[ifid]
+
+    # -------- Slots and timers --------
+    def _alloc(self, key, ifid, ip, version, state, now):
+        if not self._free:
+            self.stats["table_full"] += 1
+            return -1
+        slot = self._free.pop()
+        self._index[key] = slot
+        self.keys[slot] = key
+        self.ifids[slot] = ifid
+        self.versions[slot] = version
+        self.macs[slot] = 0
+        self.state[slot] = state
+        self.sent[slot] = 0
+        self.confirmed[slot] = now
+        self._by_if.setdefault(ifid, set()).add(slot)
+        self._version += 1
+        return slot
+
+    def _release(self, slot):
+        key = self.keys[slot]
+        del self._index[key]
+        self._by_if[self.ifids[slot]].discard(slot)
+        self._drop_held(slot)
+        self.state[slot] = STATE_FREE
+        self._due[slot] = -1
+        self._free.append(slot)
+        self._version += 1
+
+    def _arm(self, slot, when):
+        self.deadline[slot] = when
+        self._due[slot] = self._wheel.schedule(slot, when)
+
+    def _set_state(self, slot, state, now):
+        self.state[slot] = state
+        self._version += 1
+        if state == STATE_REACHABLE:
+            self.confirmed[slot] = now
+            self._arm(slot, now + self.reachable_time)
+        elif state == STATE_STALE:
+            self._arm(slot, now + STALE_TIME)
+        elif state in (STATE_INCOMPLETE, STATE_PROBE):
+            self.sent[slot] = 0
+            self._solicit(slot, now)
+        elif state == STATE_FAILED:
+            self._drop_held(slot)
+            self.stats["failed"] += 1
+            self._arm(slot, now + FAILED_TIME)
+        else:
+            self._due[slot] = -1
+
+    def _solicit(self, slot, now):
+        """Queue one ARP request / NS: broadcast while INCOMPLETE, unicast to the cached MAC in PROBE"""
+        mac = self.macs[slot] if self.state[slot] == STATE_PROBE else 0
+        ifid = self.ifids[slot]
+        self._solicits.append((self._if_names[ifid], self.keys[slot] & ((1 << 128) - 1), self.versions[slot], mac))
+        self.sent[slot] += 1
+        self.stats["solicits"] += 1
+        self._arm(slot, now + self.retrans_time)
+
+    def advance(self, now):
+        """Run due timers: retransmit, fail, go STALE, collect; returns entries released"""
+        released = 0
+        due, deadline, state = self._due, self.deadline, self.state
+        for tick, slot in self._wheel.advance(now):
+            if due[slot] != tick:
+                continue
+            current = state[slot]
+            if current == STATE_REACHABLE:
+                # confirmations only bump `confirmed`: re-arm until it really lapses
+                deadline[slot] = self.confirmed[slot] + self.reachable_time
+            if deadline[slot] > now:
+                due[slot] = self._wheel.schedule(slot, deadline[slot])
+                continue
+            due[slot] = -1
+            if current in (STATE_INCOMPLETE, STATE_PROBE):
+                if self.sent[slot] < self.probes:
+                    self._solicit(slot, now)
+                else:
+                    self._set_state(slot, STATE_FAILED, now)
+            elif current == STATE_REACHABLE:
+                self._set_state(slot, STATE_STALE, now)
+            elif self.keys[slot] in self._pinned:
+                # a route still needs this next-hop: STALE re-verifies, FAILED retries
+                self._set_state(slot, STATE_PROBE if current == STATE_STALE else STATE_INCOMPLETE, now)
+            elif current in (STATE_STALE, STATE_FAILED):
+                self._release(slot)
+                released += 1
+        self.stats["collected"] += released
+        return released
+
+    # -------- Hold queues --------
+    def _hold(self, slot, packet):
+        queue = self._held.get(slot)
+        if queue is None:
+            queue = self._held[slot] = deque()
+        if len(queue) >= self.hold_packets or self._held_total >= HOLD_TOTAL:
+            if not queue:
+                self.stats["hold_dropped"] += 1
+                return
+            queue.popleft()
+            self._held_total -= 1
+            self.stats["hold_dropped"] += 1
+        queue.append(packet)
+        self._held_total += 1
+        self.stats["held"] += 1
+
+    def _drop_held(self, slot):
+        queue = self._held.pop(slot, None)
+        if queue:
+            self._held_total -= len(queue)
+            self.stats["hold_dropped"] += len(queue)
+
+    def _take_held(self, slot, out):
+        queue = self._held.pop(slot, None)
+        if queue:
+            self._held_total -= len(queue)
+            self.stats["released"] += len(queue)
+            mac = self.macs[slot]
+            out.extend((packet, mac) for packet in queue)
+
+    # -------- Forwarding path --------
+    def lookup(self, ifid, ip, now, version=4):
+        """Destination MAC for (interface id, IP), or 0 on a miss; using a STALE entry starts a probe"""
+        slot = self._index.get((ifid << 129) | ((version == 6) << 128) | ip)
+        if slot is None:
+            return 0
+        state = self.state[slot]
+        if state == STATE_STALE:
+            self._set_state(slot, STATE_PROBE, now)
+        elif state not in _USABLE:
+            return 0
+        return self.macs[slot]
+
+    def lookup_many(self, ifids, ips, out, now):
+        """Batched IPv4 next-hop lookup; writes MACs (0 = miss) into out, returns the miss count"""
+        index, state, macs = self._index, self.state, self.macs
+        misses = 0
+        for i, (ifid, ip) in enumerate(zip(ifids, ips)):
+            slot = index.get((ifid << 129) | ip)
+            s = state[slot] if slot is not None else STATE_FREE
+            if s == STATE_REACHABLE or s == STATE_STATIC or s == STATE_PROBE:
+                out[i] = macs[slot]
+            elif s == STATE_STALE:
+                self._set_state(slot, STATE_PROBE, now)
+                out[i] = macs[slot]
+            else:
+                out[i] = 0
+                misses += 1
+        return misses
+
+    def miss(self, ifid, ip, packet, now, version=4):
+        """Punt one unresolved packet: hold it and start resolution; returns True if held"""
+        self.stats["misses"] += 1
+        key = (ifid << 129) | ((version == 6) << 128) | ip
+        slot = self._index.get(key)
+        if slot is not None:
+            state = self.state[slot]
+            if state == STATE_INCOMPLETE:
+                self._hold(slot, packet)
+                return True
+            if state == STATE_FAILED:
+                self.stats["failed_drops"] += 1
+                return False
+            return False  # resolved meanwhile: the caller's next lookup succeeds
+        # a new destination: admitted by the miss token bucket
+        elapsed = now - self._stamp
+        if elapsed > 0:
+            self._tokens = min(self.miss_burst, self._tokens + elapsed * self.miss_rate)
+            self._stamp = now
+        if self._tokens < 1:
+            self.stats["miss_limited"] += 1
+            return False
+        self._tokens -= 1
+        slot = self._alloc(key, ifid, ip, version, STATE_INCOMPLETE, now)
+        if slot < 0:
+            return False
+        self._set_state(slot, STATE_INCOMPLETE, now)
+        self._hold(slot, packet)
+        return True
+
+    def miss_many(self, ifids, ips, packets, now):
+        """Punt a vector of IPv4 misses; returns how many were held"""
+        miss = self.miss
+        return sum(1 for ifid, ip, packet in zip(ifids, ips, packets) if miss(ifid, ip, packet, now))
+
+    # -------- Control path --------
+    def confirm(self, ifid, ip, mac, now, version=4):
+        """Solicited ARP reply / NA: the entry becomes REACHABLE; returns released (packet, mac) pairs"""
+        out = []
+        slot = self._index.get((ifid << 129) | ((version == 6) << 128) | ip)
+        if slot is None or self.state[slot] == STATE_STATIC:
+            return out
+        if self.state[slot] in (STATE_INCOMPLETE, STATE_FAILED):
+            self.stats["resolved"] += 1
+        if self.macs[slot] != mac:
+            self.macs[slot] = mac
+            self._version += 1
+        if self.state[slot] == STATE_REACHABLE:
+            self.confirmed[slot] = now
+        else:
+            self._set_state(slot, STATE_REACHABLE, now)
+        self._take_held(slot, out)
+        return out
+
+    def confirm_many(self, ifids, ips, macs, now):
+        """A batch of IPv4 replies; returns every released (packet, mac) pair"""
+        out = []
+        for ifid, ip, mac in zip(ifids, ips, macs):
+            out.extend(self.confirm(ifid, ip, mac, now))
+        return out
+
+    def learn(self, ifid, ip, mac, now, version=4):
+        """Passive learning (ARP request, gratuitous ARP, NS source): new or changed entries go STALE"""
+        out = []
+        key = (ifid << 129) | ((version == 6) << 128) | ip
+        slot = self._index.get(key)
+        if slot is None:
+            slot = self._alloc(key, ifid, ip, version, STATE_STALE, now)
+            if slot >= 0:
+                self.macs[slot] = mac
+                self._set_state(slot, STATE_STALE, now)
+            return out
+        state = self.state[slot]
+        if state == STATE_STATIC or (self.macs[slot] == mac and state in _USABLE):
+            return out
+        self.macs[slot] = mac
+        self._set_state(slot, STATE_STALE, now)
+        self._take_held(slot, out)
+        return out
+
+    def resolve_many(self, ifids, ips, now, versions=None):
+        """Start resolving next-hops (e.g. static route gateways) and pin them; returns how many were new"""
+        started = 0
+        versions = versions or [4] * len(ips)
+        for ifid, ip, version in zip(ifids, ips, versions):
+            key = (ifid << 129) | ((version == 6) << 128) | ip
+            self._pinned.add(key)
+            slot = self._index.get(key)
+            if slot is None:
+                slot = self._alloc(key, ifid, ip, version, STATE_INCOMPLETE, now)
+                if slot >= 0:
+                    self._set_state(slot, STATE_INCOMPLETE, now)
+                    started += 1
+            elif self.state[slot] == STATE_FAILED:
+                self._set_state(slot, STATE_INCOMPLETE, now)
+        return started
+
+    def unpin(self, ifid, ip, version=4):
+        self._pinned.discard((ifid << 129) | ((version == 6) << 128) | ip)
+
+    def pinned(self):
+        return len(self._pinned)
+
+    def take_solicits(self):
+        """Queued solicitations as (interface, ip, version, mac); mac 0 means broadcast / multicast"""
+        solicits = list(self._solicits)
+        self._solicits.clear()
+        return solicits
+
+    # -------- Static entries and flushes --------
+    def add_static(self, ifid, ip, mac, version=4, now=0.0):
+        key = (ifid << 129) | ((version == 6) << 128) | ip
+        slot = self._index.get(key)
+        out = []
+        if slot is None:
+            slot = self._alloc(key, ifid, ip, version, STATE_STATIC, now)
+            if slot < 0:
+                return -1, out
+        self.macs[slot] = mac
+        self._set_state(slot, STATE_STATIC, now)
+        self._take_held(slot, out)
+        return slot, out
+
+    def remove(self, ifid, ip, version=4):
+        slot = self._index.get((ifid << 129) | ((version == 6) << 128) | ip)
+        if slot is None:
+            return False
+        self._release(slot)
+        return True
+
+    def flush(self, interface=None, include_static=False, now=0.0):
+        """Clear dynamic entries (of one interface); pinned next-hops restart resolution instead"""
+        if interface is not None:
+            slots = self._by_if.get(self._if_ids.get(interface), ())
+        else:
+            slots = self._index.values()
+        flushed = 0
+        for slot in list(slots):
+            if self.state[slot] == STATE_STATIC and not include_static:
+                continue
+            if self.keys[slot] in self._pinned:
+                self._drop_held(slot)
+                self.macs[slot] = 0
+                self._set_state(slot, STATE_INCOMPLETE, now)
+            else:
+                self._release(slot)
+            flushed += 1
+        return flushed
+
+    # -------- Queries --------
+    def _select(self, interface, state):
+        if interface is not None:
+            slots = self._by_if.get(self._if_ids.get(interface), ())
+        else:
+            slots = self._index.values()
+        if state is not None:
+            code = STATE_NAMES.index(state)
+            slots = [slot for slot in slots if self.state[slot] == code]
+        return slots
+
+    def count(self, interface=None, state=None):
+        return len(self._select(interface, state))
+
+    def entries(self, interface=None, state=None, offset=0, limit=None, now=None):
+        """Entry dicts sorted by (interface, family, address), optionally filtered and paged"""
+        # The sorted view is cached until the table next changes
+        cache_key = (interface, state, self._version)
+        if self._sorted[0] == cache_key:
+            slots = self._sorted[1]
+        else:
+            names = self._if_names
+            slots = sorted(self._select(interface, state),
+                           key=lambda s: (names[self.ifids[s]], self.keys[s] & ((1 << 129) - 1)))
+            self._sorted = (cache_key, slots)
+        end = None if limit is None else offset + limit
+        result = []
+        for slot in slots[offset:end]:
+            state_code = self.state[slot]
+            entry = {
+                "interface": self._if_names[self.ifids[slot]],
+                "ip": format_ip(self.keys[slot] & ((1 << 128) - 1), self.versions[slot]),
+                "mac": int_to_mac(self.macs[slot]) if self.macs[slot] or state_code in _USABLE else None,
+                "state": STATE_NAMES[state_code],
+                "held": len(self._held.get(slot, ())),
+            }
+            if now is not None and state_code != STATE_STATIC:
+                entry["age"] = round(now - self.confirmed[slot], 1)
+            result.append(entry)
+        return result
+
+    def summary(self):
+        counts = {}
+        for slot in self._index.values():
+            name = STATE_NAMES[self.state[slot]]
+            counts[name] = counts.get(name, 0) + 1
+        return {"entries": len(self._index), "capacity": self.capacity, "pinned": len(self._pinned),
+                "held_packets": self._held_total, "states": counts, "stats": dict(self.stats)}
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+NateOS static routes
+Keyed static-route table with next-hop and prefix-length indexes
+
+Each route has a stable ID derived from (vrf, prefix, next-hop). Adding the
+same route twice is therefore a no-op, and deletes never depend on list
+position. Secondary indexes map each next-hop and each prefix length to
+its route IDs, so withdrawing everything via one gateway costs O(routes
+via that gateway). Routes in the default VRF are programmed into a
+dataplane Fib. When several routes share a prefix, the one with the lowest
+(distance, id) is installed, and the next one takes over when it is
+withdrawn.
+
+A route may name an ECMP next-hop group ("group": id) instead of a single
+gateway. Its next-hop is then the group reference "nhg:<id>", so routes
+sharing a group share one FIB next-hop and the via() index lists every
+route using a group.
+"""
+import functools
+import hashlib
+import ipaddress
+import itertools
+from collections.abc import Mapping
+
+from dataplane.ecmp import group_ref
+from dataplane.fib import Fib
+
+DEFAULT_VRF = "default"
+DEFAULT_DISTANCE = 1
+
+
+def route_id(vrf, destination, gateway):
+    """Stable ID for a (vrf, prefix, next-hop) triple"""
+    key = f"{vrf}|{destination}|{gateway}".encode("utf-8")
+    return hashlib.blake2b(key, digest_size=8).hexdigest()
+
+
+def normalize_gateway(gateway):
+    """Canonical next-hop text: IP addresses normalized, interface names kept"""
+    if not gateway:
+        return ""
+    if isinstance(gateway, str):
+        # Routes share a handful of next-hops, so their canonical text is cached
+        return _canonical_gateway(gateway)
+    return _canonical_gateway.__wrapped__(gateway)
+
+
+@functools.lru_cache(maxsize=4096)
+def _canonical_gateway(gateway):
+    try:
+        return str(ipaddress.ip_address(gateway))
+    except ValueError:
+        return gateway
+
+
+def group_id(members):
+    """Stable ID for a next-hop group created from a member set"""
+    key = "|".join(sorted(members)).encode("utf-8")
+    return hashlib.blake2b(key, digest_size=8).hexdigest()
+
+
+def normalize_group(group, gid=None):
+    """Validate a next-hop group mapping and return its canonical dict (with id)"""
+    if not isinstance(group, Mapping):
+        raise ValueError("group object required")
+    members = group.get("members")
+    if isinstance(members, (list, tuple)):
+        # Validate what is left after dropping blank entries, so [""] is rejected too
+        members = sorted({normalize_gateway(str(m)) for m in members if m})
+    if not isinstance(members, list) or not members:
+        raise ValueError("members must be a non-empty list of next-hops")
+    gid = str(gid or group.get("id") or group_id(members))
+    if not gid or "/" in gid:
+        raise ValueError(f"invalid group id '{gid}'")
+    entry = dict(group.items())
+    entry.update(id=gid, members=members)
+    return entry
+
+
+def normalize(route):
+    """Validate a route mapping and return its canonical dict (with id)"""
+    return parse(route)[0]
+
+
+def parse(route):
+    """normalize() that also returns the destination's Fib.prefix_key, for add()/load()"""
+    if not isinstance(route, Mapping):
+        raise ValueError("route object required")
+    destination, key = Fib.prefix_key(route.get("destination", ""))
+    gateway = normalize_gateway(route.get("gateway"))
+    if route.get("group"):
+        if gateway and gateway != group_ref(str(route["group"])):
+            raise ValueError("a route takes either a gateway or a group")
+        gateway = group_ref(str(route["group"]))
+    vrf = route.get("vrf") or DEFAULT_VRF
+    distance = int(route.get("distance", DEFAULT_DISTANCE))
+    if not 0 <= distance <= 255:
+        raise ValueError("distance must be 0-255")
+    entry = dict(route.items())
+    entry.update(destination=destination, gateway=gateway, vrf=vrf, distance=distance,
+                 id=route_id(vrf, destination, gateway))
+    return entry, key
+
+
+class StaticRouteTable:
+    """Static routes by ID with next-hop, prefix-length and prefix indexes"""
+
+    def __init__(self, fib=None):
+        self.fib = fib if fib is not None else Fib()
+        self._routes = {}
+        self._by_nexthop = {}
+        self._by_plen = {}
+        self._by_prefix = {}
+        self._installed = {}
+
+    def __len__(self):
+        return len(self._routes)
+
+    def __contains__(self, rid):
+        return rid in self._routes
+
+    def get(self, rid):
+        return self._routes.get(rid)
+
+    def routes(self):
+        return list(self._routes.values())
+
+    def via(self, gateway):
+        """IDs of routes whose next-hop is gateway"""
+        return list(self._by_nexthop.get(normalize_gateway(gateway), ()))
+
+    def using_group(self, gid):
+        """IDs of routes that point at next-hop group gid"""
+        return list(self._by_nexthop.get(group_ref(gid), ()))
+
+    def with_prefix_length(self, plen):
+        return list(self._by_plen.get(plen, ()))
+
+    def add(self, route, key=None):
+        """Insert or replace a normalized route (see normalize); key is its prefix key from parse()"""
+        rid = route["id"]
+        if rid in self._routes:
+            self.remove(rid)
+        dest, gateway, vrf = route["destination"], route["gateway"], route["vrf"]
+        plen = int(dest.rsplit("/", 1)[1])
+        self._routes[rid] = route
+        self._by_nexthop.setdefault(gateway, set()).add(rid)
+        self._by_plen.setdefault(plen, set()).add(rid)
+        self._by_prefix.setdefault((vrf, dest), set()).add(rid)
+        self._program(vrf, dest, key)
+        return rid
+
+    def remove(self, rid):
+        """Remove a route by ID; returns it, or None if unknown"""
+        route = self._routes.pop(rid, None)
+        if route is None:
+            return None
+        dest, gateway, vrf = route["destination"], route["gateway"], route["vrf"]
+        plen = int(dest.rsplit("/", 1)[1])
+        self._discard(self._by_nexthop, gateway, rid)
+        self._discard(self._by_plen, plen, rid)
+        self._discard(self._by_prefix, (vrf, dest), rid)
+        self._program(vrf, dest)
+        return route
+
+    def withdraw_nexthop(self, gateway):
+        """Remove every route via gateway; returns the removed routes"""
+        return [self.remove(rid) for rid in self.via(gateway)]
+
+    def load(self, routes, keys=None):
+        """Replace the whole table; keys are the routes' prefix keys from parse(), in order"""
+        self.clear()
+        # Fill the indexes first, then program each prefix's preferred route
+        # once, instead of re-electing a prefix for every route that shares it
+        routes_by_id, by_nexthop, by_plen, by_prefix = self._routes, self._by_nexthop, self._by_plen, self._by_prefix
+        prefix_keys = {}
+        for route, key in zip(routes, keys or itertools.repeat(None)):
+            rid, dest, vrf = route["id"], route["destination"], route["vrf"]
+            routes_by_id[rid] = route
+            by_nexthop.setdefault(route["gateway"], set()).add(rid)
+            by_plen.setdefault(int(dest.rsplit("/", 1)[1]), set()).add(rid)
+            by_prefix.setdefault((vrf, dest), set()).add(rid)
+            prefix_keys[vrf, dest] = key
+        for prefix, ids in by_prefix.items():
+            if prefix[0] != DEFAULT_VRF:
+                continue
+            best = min(ids, key=lambda rid: (routes_by_id[rid]["distance"], rid)) if len(ids) > 1 else next(iter(ids))
+            self._installed[prefix] = best
+            self.fib.insert(prefix[1], routes_by_id[best]["gateway"], prefix_keys[prefix])
+
+    def clear(self):
+        self._routes.clear()
+        self._by_nexthop.clear()
+        self._by_plen.clear()
+        self._by_prefix.clear()
+        self._installed.clear()
+        self.fib.clear()
+
+    @staticmethod
+    def _discard(index, key, rid):
+        ids = index.get(key)
+        if ids is not None:
+            ids.discard(rid)
+            if not ids:
+                del index[key]
+
+    def _program(self, vrf, dest, prefix_key=None):
+        """Install the preferred route for (vrf, dest) into the FIB"""
+        if vrf != DEFAULT_VRF:
+            return  # the dataplane has a single (default) FIB
+        key = (vrf, dest)
+        ids = self._by_prefix.get(key)
+        best = min(ids, key=lambda rid: (self._routes[rid]["distance"], rid)) if ids else None
+        if best == self._installed.get(key):
+            return
+        if best is None:
+            del self._installed[key]
+            self.fib.withdraw(dest, prefix_key)
+        else:
+            self._installed[key] = best
+            self.fib.insert(dest, self._routes[best]["gateway"], prefix_key)
+
+    def stats(self):
+        return {
+            "routes": len(self._routes),
+            "next_hops": len(self._by_nexthop),
+            "prefix_lengths": {str(plen): len(ids) for plen, ids in sorted(self._by_plen.items())},
+        }
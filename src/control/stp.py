@@ -0,0 +1,422 @@
+#!/usr/bin/env python3
+"""
+NateOS spanning tree
+RSTP / MSTP port-role computation with batched BPDU processing
+
+Each spanning-tree instance keeps the priority vector received on every
+non-designated port: (root id, root path cost, designated bridge id,
+designated port id), compared as a tuple where lower wins. The port's
+role follows from that vector, the instance's root vector and the port's
+own designated vector, as in IEEE 802.1D-2004 clause 17. A port that
+becomes designated drops what it received, so stale information can
+never outrank the bridge's own.
+
+Recomputation is incremental. A BPDU that repeats stored information
+only refreshes the port's info-age timer. A changed BPDU on a port that
+is not the root port, and whose new information would not beat the
+current root vector, re-derives only that port's role. A change that can
+move the root (new info on the root port, a better candidate or the root
+port going down) reselects the root port of that instance only; every
+port is re-derived only if the root or root path cost actually changed.
+A batch collects all of this first, so each affected instance is
+recomputed at most once per batch.
+
+MSTP runs the CIST (instance 0) and each MSTI as independent trees over
+the same ports, as within a single MST region. Each MSTI maps to a VLAN
+bitmap, and a 4096-byte table gives the instance of any VLAN in O(1).
+RSTP is the same engine with only instance 0. Root and designated ports
+forward at once, which models the proposal/agreement handshake on
+point-to-point links as completing immediately. A non-edge port that
+starts forwarding raises a topology change, which queues an FDB flush
+of the instance's other ports.
+"""
+import struct
+from array import array
+
+from dataplane.fdb import int_to_mac, mac_to_int
+from dataplane.timerwheel import TimerWheel
+from dataplane.vlanmap import ALL_VLANS, MAX_VLAN, format_vlans, parse_vlans, runs
+
+MODES = ("rstp", "mstp")
+MAX_INSTANCES = 64
+
+ROLE_DISABLED = 0
+ROLE_ROOT = 1
+ROLE_DESIGNATED = 2
+ROLE_ALTERNATE = 3
+ROLE_BACKUP = 4
+ROLE_NAMES = ("disabled", "root", "designated", "alternate", "backup")
+
+STATE_DISCARDING = 0
+STATE_FORWARDING = 1
+STATE_NAMES = ("discarding", "forwarding")
+
+DEFAULT_PRIORITY = 32768
+DEFAULT_PORT_PRIORITY = 128
+DEFAULT_HELLO = 2.0
+DEFAULT_BRIDGE_MAC = "02:00:5e:00:00:01"
+
+# BPDU flags (802.1D 9.3.3)
+FLAG_TC = 0x01
+
+_BPDU_HEADER = struct.Struct("!HBBB")
+_CIST = struct.Struct("!QIQH")
+_MST_CIST = struct.Struct("!IQB")
+_MSTI = struct.Struct("!BQIBBB")
+_MSTI_OFFSET = 102
+
+
+def path_cost(speed_mbps):
+    """802.1t default path cost for a link speed"""
+    return max(1, min(200000000, 20000000 // max(1, int(speed_mbps))))
+
+
+def bridge_id(priority, mac, instance=0):
+    """64-bit bridge id: 4-bit priority, 12-bit system id extension (the instance), 48-bit MAC"""
+    if not 0 <= priority <= 61440 or priority % 4096:
+        raise ValueError("bridge priority must be a multiple of 4096 in 0-61440")
+    return (priority | instance) << 48 | mac
+
+
+def format_bridge_id(value):
+    return f"{value >> 48}.{int_to_mac(value & 0xFFFFFFFFFFFF)}"
+
+
+def parse_bpdu(data):
+    """Decode an RST or MST BPDU (LLC payload) into (vectors, flags)
+
+    vectors maps instance -> (root, cost, designated bridge, designated
+    port). Returns None for TCN, config and unknown BPDUs.
+    """
+    if len(data) < 36:
+        return None
+    protocol, version, kind, flags = _BPDU_HEADER.unpack_from(data)
+    if protocol != 0 or kind != 2:
+        return None
+    root, cost, bridge, port = _CIST.unpack_from(data, 5)
+    if version < 3 or len(data) < _MSTI_OFFSET:
+        return {0: (root, cost, bridge, port)}, flags
+    internal_cost, cist_bridge, _ = _MST_CIST.unpack_from(data, 89)
+    vectors = {0: (root, cost + internal_cost, cist_bridge, port)}
+    mac = cist_bridge & 0xFFFFFFFFFFFF
+    v3_end = min(len(data), 38 + struct.unpack_from("!H", data, 36)[0])
+    for offset in range(_MSTI_OFFSET, v3_end - 15, 16):
+        msti_flags, regional_root, msti_cost, bridge_pri, port_pri, _ = _MSTI.unpack_from(data, offset)
+        msti = (regional_root >> 48) & 0xFFF
+        vectors[msti] = (regional_root, msti_cost, ((bridge_pri & 0xF0) << 8 | msti) << 48 | mac,
+                         (port_pri & 0xF0) << 8 | (port & 0xFFF))
+        flags |= msti_flags & FLAG_TC
+    return vectors, flags
+
+
+def from_config(config, interfaces=(), now=0.0):
+    """SpanningTree for an "stp" config section, with a port per configured interface
+
+    config: {"mode", "priority", "hello_time", "bridge_mac", "instances":
+    {msti: {"vlans", "priority"}}, "ports": {name: {"cost", "priority", "edge"}}}
+    """
+    ports = {name: {} for name in interfaces}
+    ports.update(config.get("ports") or {})
+    return SpanningTree(mac_to_int(config.get("bridge_mac") or DEFAULT_BRIDGE_MAC), ports, config, now)
+
+
+class _Tree:
+    """Per-instance state: received vectors, roles, states and the root vector"""
+    __slots__ = ("instance", "bridge_id", "rx", "roles", "states", "forwarding", "root_port", "root", "vlans")
+
+    def __init__(self, instance, bridge, ports, vlans):
+        self.instance = instance
+        self.bridge_id = bridge
+        self.rx = [None] * ports
+        self.roles = bytearray(ports)
+        self.states = bytearray(ports)
+        self.forwarding = 0                     # port bitmap of states == FORWARDING
+        self.root_port = -1
+        self.root = (bridge, 0, bridge, 0, 0)
+        self.vlans = vlans
+
+
+class SpanningTree:
+    """One bridge's RSTP/MSTP instances over a fixed set of ports"""
+
+    def __init__(self, mac, ports, config=None, now=0.0):
+        """ports: [name] or {name: {"cost", "speed_mbps", "priority", "edge"}}"""
+        config = config or {}
+        self.mac = mac
+        self.mode = config.get("mode", "rstp")
+        if self.mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        self.priority = int(config.get("priority", DEFAULT_PRIORITY))
+        self.hello = float(config.get("hello_time", DEFAULT_HELLO))
+        if not 0 < self.hello <= 10:
+            raise ValueError("hello_time must be 0-10 seconds")
+        self.max_age = 3 * self.hello  # RSTP: information ages out after three missed hellos
+
+        specs = ports if isinstance(ports, dict) else {name: {} for name in ports}
+        self.names = list(specs)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        n = len(self.names)
+        self.cost = array("I", bytes(4 * n))
+        self.port_ids = array("H", bytes(2 * n))
+        self.edge = bytearray(n)
+        self.up = bytearray(b"\x01") * n
+        for i, name in enumerate(self.names):
+            spec = specs[name] or {}
+            cost = spec.get("cost") or path_cost(spec.get("speed_mbps", 1000))
+            pri = int(spec.get("priority", DEFAULT_PORT_PRIORITY))
+            if not 0 <= pri <= 240 or pri % 16:
+                raise ValueError(f"{name}: port priority must be a multiple of 16 in 0-240")
+            if i + 1 > 0xFFF:
+                raise ValueError("at most 4095 ports")
+            self.cost[i] = int(cost)
+            self.port_ids[i] = pri << 8 | (i + 1)
+            self.edge[i] = bool(spec.get("edge", False))
+        self._edge_mask = sum(1 << i for i in range(n) if self.edge[i])
+
+        # MSTI -> VLAN bitmap; unmapped VLANs stay on the CIST
+        self.trees = {}
+        self.vlan_instance = bytearray(MAX_VLAN + 2)
+        mapped = 0
+        instances = config.get("instances") or {} if self.mode == "mstp" else {}
+        if len(instances) > MAX_INSTANCES:
+            raise ValueError(f"at most {MAX_INSTANCES} MST instances")
+        for key, spec in sorted(instances.items(), key=lambda item: int(item[0])):
+            msti = int(key)
+            if not 1 <= msti <= 4094:
+                raise ValueError(f"instances.{key}: MSTI must be 1-4094")
+            spec = spec or {}
+            vlans = parse_vlans(spec.get("vlans"))
+            if vlans & mapped:
+                raise ValueError(f"instances.{key}: VLANs {format_vlans(vlans & mapped)} already mapped")
+            mapped |= vlans
+            for lo, hi in runs(vlans):
+                self.vlan_instance[lo:hi + 1] = bytes([len(self.trees) + 1]) * (hi - lo + 1)
+            self.trees[msti] = _Tree(msti, bridge_id(int(spec.get("priority", self.priority)), mac, msti), n, vlans)
+        self.trees[0] = _Tree(0, bridge_id(self.priority, mac), n, ALL_VLANS & ~mapped)
+        # vlan_instance holds a dense index; _order maps it back to the instance number
+        self._order = [0] + [msti for msti in self.trees if msti]
+
+        self._wheel = TimerWheel(tick=self.hello / 4, slots=64, levels=3, now=now)
+        self._age = array("d", bytes(8 * n))
+        self._due = array("q", [-1] * n)
+        self._tx = set(range(n))
+        self.flushes = {}
+        self.stats = {"bpdus": 0, "refreshes": 0, "port_updates": 0, "instance_recomputes": 0,
+                      "topology_changes": 0, "aged": 0}
+        for tree in self.trees.values():
+            self._recompute(tree, now, every=True)
+        self.flushes.clear()  # nothing was learned yet
+        self.stats["topology_changes"] = 0
+
+    # -------- Role computation --------
+    def _candidate(self, tree, p):
+        v = tree.rx[p]
+        if v is None or not self.up[p] or v[2] == tree.bridge_id:
+            return None
+        return (v[0], v[1] + self.cost[p], v[2], v[3], self.port_ids[p])
+
+    def _recompute(self, tree, now, every=False):
+        """Reselect the root port; re-derive every port's role only if the root vector moved"""
+        best, best_port = (tree.bridge_id, 0, tree.bridge_id, 0, 0), -1
+        candidate = self._candidate
+        for p, v in enumerate(tree.rx):
+            if v is not None:
+                c = candidate(tree, p)
+                if c is not None and c < best:
+                    best, best_port = c, p
+        old_port = tree.root_port
+        moved = best[:2] != tree.root[:2]
+        tree.root, tree.root_port = best, best_port
+        if moved or every:
+            self._tx.update(range(len(self.names)))  # our designated vectors changed
+            for p in range(len(self.names)):
+                self._set_role(tree, p, now)
+        else:
+            # same root and cost: designated vectors are unchanged, only the root port moved
+            for p in (old_port, best_port):
+                if p >= 0:
+                    self._set_role(tree, p, now)
+        self.stats["instance_recomputes"] += 1
+
+    def _role(self, tree, p):
+        if not self.up[p]:
+            return ROLE_DISABLED
+        if p == tree.root_port:
+            return ROLE_ROOT
+        v = tree.rx[p]
+        if v is None:
+            return ROLE_DESIGNATED
+        if v < (tree.root[0], tree.root[1], tree.bridge_id, self.port_ids[p]):
+            return ROLE_BACKUP if v[2] == tree.bridge_id else ROLE_ALTERNATE
+        return ROLE_DESIGNATED
+
+    def _set_role(self, tree, p, now):
+        role = self._role(tree, p)
+        if role == ROLE_DESIGNATED:
+            # our own vector replaces whatever was received (802.1D infoIs Mine), so stale
+            # inferior info can never outrank us later
+            tree.rx[p] = None
+        if role == tree.roles[p]:
+            return
+        tree.roles[p] = role
+        if role == ROLE_DESIGNATED:
+            self._tx.add(p)
+        state = STATE_FORWARDING if role in (ROLE_ROOT, ROLE_DESIGNATED) else STATE_DISCARDING
+        if state != tree.states[p]:
+            tree.states[p] = state
+            tree.forwarding ^= 1 << p
+            if state == STATE_FORWARDING and not self.edge[p]:
+                self._topology_change(tree, p)
+
+    def _topology_change(self, tree, p):
+        """Flush what was learned on the instance's other forwarding ports"""
+        others = tree.forwarding & ~self._edge_mask & ~(1 << p)
+        self.flushes[tree.instance] = self.flushes.get(tree.instance, 0) | others
+        self.stats["topology_changes"] += 1
+
+    # -------- Events --------
+    def receive_many(self, bpdus, now):
+        """Process a batch of (port, vectors, flags) BPDUs; returns instances recomputed in full"""
+        trees, index = self.trees, self.index
+        full = set()
+        partial = set()
+        for port, vectors, flags in bpdus:
+            p = index[port] if not isinstance(port, int) else port
+            if not self.up[p]:
+                continue
+            self.stats["bpdus"] += 1
+            self._age[p] = now + self.max_age
+            if self._due[p] < 0:
+                self._due[p] = self._wheel.schedule(p, self._age[p])
+            if self.edge[p]:
+                self.edge[p] = 0  # a BPDU on an edge port: it is not an edge after all
+                self._edge_mask &= ~(1 << p)
+            changed = False
+            for instance, vector in vectors.items():
+                tree = trees.get(instance)
+                if tree is None or tree.rx[p] == vector:
+                    continue
+                changed = True
+                tree.rx[p] = vector
+                partial.add((instance, p))
+                if instance in full:
+                    continue
+                c = self._candidate(tree, p)
+                if p == tree.root_port or (c is not None and c < tree.root):
+                    full.add(instance)
+            if flags & FLAG_TC:
+                for instance in vectors:
+                    tree = trees.get(instance)
+                    if tree is not None and tree.states[p] == STATE_FORWARDING:
+                        self._topology_change(tree, p)
+            if not changed:
+                self.stats["refreshes"] += 1
+        self._settle(full, partial, now)
+        return full
+
+    def receive(self, port, vectors, now, flags=0):
+        return self.receive_many([(port, vectors, flags)], now)
+
+    def _settle(self, full, partial, now):
+        for instance in full:
+            self._recompute(self.trees[instance], now)
+        for instance, p in partial:
+            self._set_role(self.trees[instance], p, now)
+            self.stats["port_updates"] += 1
+
+    def _withdraw(self, p, now):
+        """Forget everything received on port p, in every instance"""
+        full, partial = set(), set()
+        for instance, tree in self.trees.items():
+            tree.rx[p] = None
+            if tree.root_port == p:
+                full.add(instance)
+            partial.add((instance, p))
+        self._settle(full, partial, now)
+        return full
+
+    def set_link(self, port, up, now):
+        """Link up/down on port; returns instances recomputed in full"""
+        p = self.index[port] if not isinstance(port, int) else port
+        if bool(self.up[p]) == bool(up):
+            return set()
+        self.up[p] = 1 if up else 0
+        if up:
+            self._tx.add(p)
+        self._due[p] = -1
+        return self._withdraw(p, now)
+
+    def advance(self, now):
+        """Age out information on ports that stopped hearing BPDUs; returns ports aged"""
+        aged = []
+        for tick, p in self._wheel.advance(now):
+            if self._due[p] != tick:
+                continue
+            if self._age[p] > now:
+                self._due[p] = self._wheel.schedule(p, self._age[p])
+                continue
+            self._due[p] = -1
+            if self.up[p]:
+                self._withdraw(p, now)
+                aged.append(p)
+        self.stats["aged"] += len(aged)
+        return aged
+
+    # -------- Output --------
+    def transmit(self):
+        """BPDUs owed since the last call: {port index: {instance: vector}} for designated ports"""
+        out = {}
+        for p in self._tx:
+            if not self.up[p]:
+                continue
+            vectors = {instance: (tree.root[0], tree.root[1], tree.bridge_id, self.port_ids[p])
+                       for instance, tree in self.trees.items() if tree.roles[p] == ROLE_DESIGNATED}
+            if vectors:
+                out[p] = vectors
+        self._tx = set()
+        return out
+
+    def hello_all(self):
+        """Periodic hello: every designated port re-sends its vectors"""
+        self._tx.update(range(len(self.names)))
+        return self.transmit()
+
+    def take_flushes(self):
+        """{instance: port bitmap} of FDB flushes owed to topology changes"""
+        flushes, self.flushes = self.flushes, {}
+        return flushes
+
+    def instance_of(self, vlan):
+        """Spanning-tree instance a VLAN belongs to: O(1)"""
+        return self._order[self.vlan_instance[vlan]]
+
+    def forwarding(self, vlan, port):
+        """True if port forwards frames of vlan"""
+        p = self.index[port] if not isinstance(port, int) else port
+        return self.trees[self.instance_of(vlan)].states[p] == STATE_FORWARDING
+
+    def forwarding_bitmap(self, instance):
+        return self.trees[instance].forwarding
+
+    def describe(self, instance=None):
+        trees = [self.trees[instance]] if instance is not None else \
+            [self.trees[i] for i in sorted(self.trees)]
+        result = []
+        for tree in trees:
+            root_port = self.names[tree.root_port] if tree.root_port >= 0 else None
+            result.append({
+                "instance": tree.instance,
+                "vlans": format_vlans(tree.vlans),
+                "bridge_id": format_bridge_id(tree.bridge_id),
+                "root_id": format_bridge_id(tree.root[0]),
+                "root_path_cost": tree.root[1],
+                "root_port": root_port,
+                "is_root": root_port is None,
+                "ports": {name: {"role": ROLE_NAMES[tree.roles[p]], "state": STATE_NAMES[tree.states[p]]}
+                          for p, name in enumerate(self.names)},
+            })
+        return result
+
+    def summary(self):
+        return {"mode": self.mode, "bridge_mac": int_to_mac(self.mac),
+                "ports": len(self.names), "instances": len(self.trees), "stats": dict(self.stats)}
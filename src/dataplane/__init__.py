@@ -0,0 +1,4 @@
+"""
+NateOS software dataplane
+Forwarding tables and packet pipeline shared by switchd and the mgmt API
+"""
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+NateOS ACL classifier
+Compiles first-match ACL rules into a priority-sorted tuple space
+
+Rules with the same "shape" (source/destination prefix lengths, whether the
+protocol is set, and exact/any/range for each port) share a hash table
+keyed on the masked header fields. Classifying a packet probes each shape's
+table once, visiting shapes in order of their best rule and stopping as soon
+as no remaining shape can beat the match already found. Adding or removing
+a rule touches only its own shape, so edits are incremental.
+"""
+import ipaddress
+
+DEFAULT_ACTION = "deny"
+
+PROTOCOLS = {"icmp": 1, "tcp": 6, "udp": 17, "icmpv6": 58}
+
+PORT_ANY = 0
+PORT_EXACT = 1
+PORT_RANGE = 2
+
+
+def _parse_prefix(value):
+    if value in (None, "", "any", "*"):
+        return None
+    return ipaddress.ip_network(value, strict=False)
+
+
+def _parse_proto(value):
+    if value in (None, "", "any", "ip", "*"):
+        return None
+    if isinstance(value, str) and not value.isdigit():
+        try:
+            return PROTOCOLS[value.lower()]
+        except KeyError:
+            raise ValueError(f"unknown protocol: {value}")
+    proto = int(value)
+    if not 0 <= proto <= 255:
+        raise ValueError(f"protocol out of range: {value}")
+    return proto
+
+
+def _parse_ports(value):
+    """Return (mode, lo, hi) for a port spec: None/'any', 80, '80', '1000-2000'"""
+    if value in (None, "", "any", "*"):
+        return PORT_ANY, 0, 65535
+    if isinstance(value, str) and "-" in value:
+        lo, hi = (int(p) for p in value.split("-", 1))
+    else:
+        lo = hi = int(value)
+    if not 0 <= lo <= hi <= 65535:
+        raise ValueError(f"invalid port range: {value}")
+    if lo == 0 and hi == 65535:
+        return PORT_ANY, 0, 65535
+    return (PORT_EXACT if lo == hi else PORT_RANGE), lo, hi
+
+
+class Rule:
+    """A parsed ACL rule"""
+    __slots__ = ("priority", "position", "version", "src", "src_len", "dst", "dst_len", "proto",
+                 "sport", "dport", "action", "config")
+
+    def __init__(self, priority, config):
+        src = _parse_prefix(config.get("src"))
+        dst = _parse_prefix(config.get("dst"))
+        if src is not None and dst is not None and src.version != dst.version:
+            raise ValueError("src and dst must be the same address family")
+        family = src or dst
+        self.priority = priority
+        self.position = None  # index in the owning classifier's rule list
+        self.version = family.version if family is not None else None
+        self.src = int(src.network_address) if src is not None else 0
+        self.src_len = src.prefixlen if src is not None else 0
+        self.dst = int(dst.network_address) if dst is not None else 0
+        self.dst_len = dst.prefixlen if dst is not None else 0
+        self.proto = _parse_proto(config.get("proto", config.get("protocol")))
+        self.sport = _parse_ports(config.get("src_port"))
+        self.dport = _parse_ports(config.get("dst_port"))
+        action = config.get("action", "permit")
+        if action not in ("permit", "deny"):
+            raise ValueError(f"action must be permit or deny: {action}")
+        self.action = action
+        self.config = config
+
+    def shape(self):
+        return (self.src_len, self.dst_len, self.proto is not None, self.sport[0], self.dport[0])
+
+    def matches(self, src, dst, proto, sport, dport, width):
+        """Reference first-match predicate (used by the naive classifier)"""
+        if self.src_len and (src >> (width - self.src_len)) != (self.src >> (width - self.src_len)):
+            return False
+        if self.dst_len and (dst >> (width - self.dst_len)) != (self.dst >> (width - self.dst_len)):
+            return False
+        if self.proto is not None and proto != self.proto:
+            return False
+        return self.sport[1] <= sport <= self.sport[2] and self.dport[1] <= dport <= self.dport[2]
+
+
+class _Shape:
+    """Hash table for all rules sharing one tuple shape"""
+    __slots__ = ("src_mask", "dst_mask", "has_proto", "sport_mode", "dport_mode", "buckets", "best")
+
+    def __init__(self, shape, width):
+        src_len, dst_len, has_proto, sport_mode, dport_mode = shape
+        full = (1 << width) - 1
+        self.src_mask = full ^ ((1 << (width - src_len)) - 1)
+        self.dst_mask = full ^ ((1 << (width - dst_len)) - 1)
+        self.has_proto = has_proto
+        self.sport_mode = sport_mode
+        self.dport_mode = dport_mode
+        self.buckets = {}
+        self.best = None
+
+    def key(self, src, dst, proto, sport, dport):
+        return (src & self.src_mask, dst & self.dst_mask,
+                proto if self.has_proto else 0,
+                sport if self.sport_mode == PORT_EXACT else 0,
+                dport if self.dport_mode == PORT_EXACT else 0)
+
+    def rule_key(self, rule):
+        return self.key(rule.src, rule.dst, rule.proto or 0, rule.sport[1], rule.dport[1])
+
+
+class _Family:
+    """Tuple space for one address family"""
+
+    def __init__(self, width):
+        self.width = width
+        self.shapes = {}
+        self.order = []
+
+    def add(self, rule):
+        shape_id = rule.shape()
+        shape = self.shapes.get(shape_id)
+        if shape is None:
+            shape = self.shapes[shape_id] = _Shape(shape_id, self.width)
+        bucket = shape.buckets.setdefault(shape.rule_key(rule), [])
+        bucket.append(rule)
+        if len(bucket) > 1 and bucket[-2].priority > rule.priority:
+            bucket.sort(key=lambda r: r.priority)
+        if shape.best is None or rule.priority < shape.best:
+            shape.best = rule.priority
+            self._reorder()
+
+    def remove(self, rule):
+        shape_id = rule.shape()
+        shape = self.shapes[shape_id]
+        key = shape.rule_key(rule)
+        bucket = shape.buckets[key]
+        bucket.remove(rule)
+        if not bucket:
+            del shape.buckets[key]
+        if not shape.buckets:
+            del self.shapes[shape_id]
+        elif shape.best == rule.priority:
+            shape.best = min(b[0].priority for b in shape.buckets.values())
+        self._reorder()
+
+    def _reorder(self):
+        # Flattened probe list: multiplying by 0/1 flags masks unused fields
+        self.order = [(s.best, s.src_mask, s.dst_mask, int(s.has_proto),
+                       int(s.sport_mode == PORT_EXACT), int(s.dport_mode == PORT_EXACT), s.buckets)
+                      for s in sorted(self.shapes.values(), key=lambda s: s.best)]
+
+    def classify(self, src, dst, proto, sport, dport):
+        found = None
+        limit = None
+        for best, src_mask, dst_mask, use_proto, use_sport, use_dport, buckets in self.order:
+            if limit is not None and best > limit:
+                break
+            bucket = buckets.get((src & src_mask, dst & dst_mask, proto * use_proto,
+                                  sport * use_sport, dport * use_dport))
+            if not bucket:
+                continue
+            for rule in bucket:
+                if limit is not None and rule.priority > limit:
+                    break
+                if rule.sport[1] <= sport <= rule.sport[2] and rule.dport[1] <= dport <= rule.dport[2]:
+                    found, limit = rule, rule.priority
+                    break
+        return found
+
+
+class AclClassifier:
+    """Compiled first-match ACL over IPv4 and IPv6 5-tuples"""
+
+    def __init__(self, rules=None, default_action=DEFAULT_ACTION):
+        self.default_action = default_action
+        self.compile(rules or [])
+
+    def compile(self, rules):
+        """Rebuild from a full rule list (list order is match priority)"""
+        self._families = {4: _Family(32), 6: _Family(128)}
+        self._rules = []
+        for config in rules:
+            self.add(config)
+
+    def __len__(self):
+        return len(self._rules)
+
+    @staticmethod
+    def parse(config, priority=0):
+        """Validate a rule dict, raising ValueError if malformed"""
+        return Rule(priority, config)
+
+    def add(self, config):
+        """Append a rule at the lowest priority; returns the parsed Rule"""
+        priority = self._rules[-1].priority + 1 if self._rules else 0
+        rule = Rule(priority, config)
+        rule.position = len(self._rules)
+        self._rules.append(rule)
+        for version in ((rule.version,) if rule.version else (4, 6)):
+            self._families[version].add(rule)
+        return rule
+
+    def remove(self, index):
+        """Remove the rule at list position index; returns its config"""
+        rule = self._rules.pop(index)
+        for later in self._rules[rule.position:]:
+            later.position -= 1
+        for version in ((rule.version,) if rule.version else (4, 6)):
+            self._families[version].remove(rule)
+        return rule.config
+
+    def matcher(self, version):
+        """Return the raw classify(src, dst, proto, sport, dport) -> Rule for one family"""
+        return self._families[version].classify
+
+    def shapes(self):
+        return {version: len(family.shapes) for version, family in self._families.items()}
+
+    def classify(self, src, dst, proto=0, sport=0, dport=0):
+        """Classify one packet given textual addresses; returns (action, rule index or None)"""
+        src_addr = ipaddress.ip_address(src)
+        dst_addr = ipaddress.ip_address(dst)
+        if src_addr.version != dst_addr.version:
+            raise ValueError("src and dst must be the same address family")
+        rule = self._families[src_addr.version].classify(
+            int(src_addr), int(dst_addr), _parse_proto(proto) or 0, int(sport), int(dport))
+        if rule is None:
+            return self.default_action, None
+        return rule.action, rule.position
+
+    def classify_many(self, tuples, version=4):
+        """Classify a batch of integer 5-tuples; returns the matched Rule (or None) per packet"""
+        classify = self._families[version].classify
+        return [classify(src, dst, proto, sport, dport) for src, dst, proto, sport, dport in tuples]
+
+
+class NaiveAcl:
+    """Linear first-match reference classifier, for correctness and benchmarks"""
+
+    def __init__(self, rules):
+        self.rules = [Rule(i, config) for i, config in enumerate(rules)]
+
+    def classify_many(self, tuples, version=4):
+        width = 32 if version == 4 else 128
+        rules = [r for r in self.rules if r.version in (None, version)]
+        results = []
+        for src, dst, proto, sport, dport in tuples:
+            for rule in rules:
+                if rule.matches(src, dst, proto, sport, dport, width):
+                    results.append(rule)
+                    break
+            else:
+                results.append(None)
+        return results
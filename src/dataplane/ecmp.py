@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+NateOS ECMP next-hop groups
+Shared next-hop groups with resilient hashing and batched 5-tuple hashing
+
+A route reaches a group through the pseudo next-hop "nhg:<id>". The FIB
+interns that as one next-hop index, so any number of prefixes can share a
+group at no extra cost per prefix. Each group owns a fixed table of hash
+buckets (a power of two), and each bucket points at one member slot. A
+flow's bucket is its 5-tuple hash & mask. Adding a member moves only the
+buckets it takes from the most-loaded members, and removing one moves
+only that member's buckets. Each change therefore remaps about 1/N of
+flows instead of nearly all of them, as hash % N would.
+
+flow_hash_many hashes a whole packet vector without a Python-level loop
+body per packet. It zips the metadata arrays into 5-tuples and maps them
+through the interpreter's tuple hash, which runs in C. For integers that
+hash is deterministic, so it does not depend on PYTHONHASHSEED.
+"""
+from array import array
+from itertools import repeat
+from operator import itemgetter
+
+GROUP_PREFIX = "nhg:"
+DEFAULT_BUCKETS = 512
+NO_HOP = 0
+
+_M32 = 0xFFFFFFFF
+
+
+def group_ref(gid):
+    """Pseudo next-hop that routes use to point at group gid"""
+    return GROUP_PREFIX + gid
+
+
+def group_of(gateway):
+    """Group id referenced by a next-hop string, or None for a plain next-hop"""
+    if isinstance(gateway, str) and gateway.startswith(GROUP_PREFIX):
+        return gateway[len(GROUP_PREFIX):]
+    return None
+
+
+def flow_hash(src, dst, proto, sport, dport, seed=0):
+    """32-bit hash of one 5-tuple (integer addresses)"""
+    return hash((seed, src, dst, proto, sport, dport)) & _M32
+
+
+def flow_hash_many(src_ip, dst_ip, proto, sport, dport, indexes=None, seed=0):
+    """Hash a batch of 5-tuples held in parallel arrays; returns array('I')
+
+    indexes selects positions (e.g. the routed packets of a vector); by
+    default every position is hashed. Results match flow_hash.
+    """
+    if indexes is not None:
+        indexes = list(indexes)
+        if len(indexes) < 2:
+            # itemgetter returns a bare value, not a tuple, for one index
+            return array("I", [flow_hash(src_ip[i], dst_ip[i], proto[i], sport[i], dport[i], seed)
+                               for i in indexes])
+        pick = itemgetter(*indexes)
+        src_ip, dst_ip, proto, sport, dport = pick(src_ip), pick(dst_ip), pick(proto), pick(sport), pick(dport)
+    rows = zip(repeat(seed), src_ip, dst_ip, proto, sport, dport)
+    return array("I", [h & _M32 for h in map(hash, rows)])
+
+
+class ResilientGroup:
+    """One ECMP group: member slots plus a resilient bucket table"""
+
+    def __init__(self, gid, members=(), buckets=DEFAULT_BUCKETS):
+        if buckets < 1 or buckets & (buckets - 1):
+            raise ValueError("bucket count must be a power of two")
+        self.id = gid
+        self.mask = buckets - 1
+        self.slots = []               # member next-hop per slot (None = free slot)
+        self.hops = array("I")        # FIB next-hop index per slot
+        self.buckets = array("H", bytes(2 * buckets))
+        self._slot_of = {}
+        self._owned = []              # bucket indexes held by each slot
+        members = list(dict.fromkeys(members))
+        if len(members) > buckets:
+            raise ValueError(f"a group holds at most {buckets} members")
+        for member in members:
+            self._new_slot(member)
+        for b in range(buckets):
+            # Fresh group: deal the buckets out round-robin
+            slot = b % len(members) if members else 0
+            self.buckets[b] = slot
+            if members:
+                self._owned[slot].append(b)
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def __contains__(self, member):
+        return member in self._slot_of
+
+    @property
+    def members(self):
+        return [m for m in self.slots if m is not None]
+
+    def _new_slot(self, member):
+        if None in self.slots:
+            slot = self.slots.index(None)
+            self.slots[slot] = member
+            self.hops[slot] = NO_HOP
+        else:
+            slot = len(self.slots)
+            self.slots.append(member)
+            self.hops.append(NO_HOP)
+            self._owned.append([])
+        self._slot_of[member] = slot
+        return slot
+
+    def add(self, member):
+        """Add a member, taking an even share of buckets from the most-loaded members"""
+        if member in self._slot_of:
+            return False
+        if len(self._slot_of) > self.mask:
+            raise ValueError(f"a group holds at most {self.mask + 1} members")
+        slot = self._new_slot(member)
+        owned = self._owned
+        if len(self._slot_of) == 1:
+            owned[slot] = list(range(self.mask + 1))
+            for b in owned[slot]:
+                self.buckets[b] = slot
+            return True
+        share = (self.mask + 1) // len(self._slot_of)
+        donors = [s for s in self._slot_of.values() if s != slot]
+        for _ in range(share):
+            donor = max(donors, key=lambda s: len(owned[s]))
+            b = owned[donor].pop()
+            owned[slot].append(b)
+            self.buckets[b] = slot
+        return True
+
+    def remove(self, member):
+        """Remove a member, handing only its buckets to the least-loaded members"""
+        slot = self._slot_of.pop(member, None)
+        if slot is None:
+            return False
+        moved, self._owned[slot] = self._owned[slot], []
+        self.slots[slot] = None
+        self.hops[slot] = NO_HOP
+        owned = self._owned
+        remaining = list(self._slot_of.values())
+        if remaining:
+            for b in moved:
+                taker = min(remaining, key=lambda s: len(owned[s]))
+                owned[taker].append(b)
+                self.buckets[b] = taker
+        return True
+
+    def set_members(self, members):
+        """Converge on a new member list with the fewest bucket moves"""
+        wanted = list(dict.fromkeys(members))
+        for member in [m for m in self._slot_of if m not in wanted]:
+            self.remove(member)
+        for member in wanted:
+            self.add(member)
+
+    def select(self, h):
+        """Member next-hop for flow hash h (None if the group is empty)"""
+        return self.slots[self.buckets[h & self.mask]] if self._slot_of else None
+
+    def select_hops(self, hashes):
+        """FIB next-hop indexes for a batch of flow hashes"""
+        if not self._slot_of:
+            return [NO_HOP] * len(hashes)
+        buckets, hops, mask = self.buckets, self.hops, self.mask
+        return [hops[buckets[h & mask]] for h in hashes]
+
+    def loads(self):
+        return {self.slots[s]: len(self._owned[s]) for s in self._slot_of.values()}
+
+
+class NextHopGroups:
+    """ECMP groups by id, with member next-hops interned in a FIB NextHopTable"""
+
+    def __init__(self, next_hops, buckets=DEFAULT_BUCKETS):
+        self.next_hops = next_hops
+        self.buckets = buckets
+        self._groups = {}
+
+    def __len__(self):
+        return len(self._groups)
+
+    def __contains__(self, gid):
+        return gid in self._groups
+
+    def __iter__(self):
+        return iter(self._groups.values())
+
+    def get(self, gid):
+        return self._groups.get(gid)
+
+    def set(self, gid, members):
+        """Create group gid, or move it to a new member list (resiliently)"""
+        group = self._groups.get(gid)
+        if group is None:
+            group = self._groups[gid] = ResilientGroup(gid, buckets=self.buckets)
+        before = set(group.members)
+        group.set_members(members)
+        after = set(group.members)
+        for member in before - after:
+            self._release(member)
+        for member in group.members:
+            slot = group._slot_of[member]
+            if group.hops[slot] == NO_HOP:
+                group.hops[slot] = self.next_hops.acquire(member)
+        return group
+
+    def remove(self, gid):
+        group = self._groups.pop(gid, None)
+        if group is None:
+            return False
+        for member in group.members:
+            self._release(member)
+        return True
+
+    def _release(self, member):
+        idx = self.next_hops.index_of(member)
+        if idx:
+            self.next_hops.release(idx)
+
+    def find(self, members):
+        """Id of an existing group with exactly these members, else None"""
+        wanted = set(members)
+        for group in self._groups.values():
+            if len(group) == len(wanted) and wanted.issuperset(group.members):
+                return group.id
+        return None
+
+    def rebind(self, next_hops):
+        """Re-intern every member in a fresh NextHopTable (after a FIB clear)"""
+        self.next_hops = next_hops
+        for group in self._groups.values():
+            for member in group.members:
+                group.hops[group._slot_of[member]] = next_hops.acquire(member)
+
+    def hop_map(self):
+        """FIB next-hop index of each installed group reference -> group"""
+        index_of = self.next_hops.index_of
+        hops = {}
+        for gid, group in self._groups.items():
+            idx = index_of(group_ref(gid))
+            if idx:
+                hops[idx] = group
+        return hops
+
+    def stats(self):
+        return {
+            "groups": len(self._groups),
+            "members": sum(len(g) for g in self._groups.values()),
+            "buckets_per_group": self.buckets,
+        }
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+NateOS FDB (Forwarding Database)
+MAC learning keyed on (VLAN, MAC) with timer-wheel aging
+
+Entries live in preallocated parallel arrays indexed by slot; the hash
+index maps the packed key `(vlan << 48) | mac` to a slot. Aging uses a
+hierarchical timer wheel with lazy refresh: re-learning a MAC only bumps
+its last-seen time, and the wheel entry re-arms itself when it fires, so
+both learning and aging cost O(1) per entry touched.
+"""
+from array import array
+
+from dataplane.timerwheel import TimerWheel
+
+DEFAULT_CAPACITY = 262144
+DEFAULT_AGING = 300.0
+
+ENTRY_FREE = 0
+ENTRY_DYNAMIC = 1
+ENTRY_STATIC = 2
+
+MAC_MASK = (1 << 48) - 1
+
+
+def mac_to_int(mac):
+    """Pack 'aa:bb:cc:dd:ee:ff' (or '-'/'.' separated) into a 48-bit integer"""
+    digits = mac.replace(":", "").replace("-", "").replace(".", "")
+    if len(digits) != 12:
+        raise ValueError(f"invalid MAC address: {mac}")
+    return int(digits, 16)
+
+
+def int_to_mac(value):
+    """Format a 48-bit integer as 'aa:bb:cc:dd:ee:ff'"""
+    raw = f"{value:012x}"
+    return ":".join(raw[i:i + 2] for i in range(0, 12, 2))
+
+
+class Fdb:
+    """Forwarding database with per-VLAN and per-port indexes"""
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, aging=DEFAULT_AGING, now=0.0):
+        self.capacity = capacity
+        self.aging = aging
+        self.macs = array("Q", bytes(8 * capacity))
+        self.vlans = array("H", bytes(2 * capacity))
+        self.ports = array("H", bytes(2 * capacity))
+        self.last_seen = array("d", bytes(8 * capacity))
+        self.kind = array("B", bytes(capacity))
+        self._due = array("q", bytes(8 * capacity))
+        self._index = {}
+        self._free = array("I", range(capacity - 1, -1, -1))
+        self._by_vlan = {}
+        self._by_port = {}
+        self._port_ids = {}
+        self._port_names = [None]
+        self._wheel = TimerWheel(tick=1.0, slots=64, levels=3, now=now)
+        self._version = 0
+        self._sorted = (None, None)
+        self.stats = {"learned": 0, "moves": 0, "aged": 0, "flushed": 0, "table_full": 0}
+
+    def __len__(self):
+        return len(self._index)
+
+    # Port names are interned to small integers so entries stay compact
+    def port_id(self, name):
+        pid = self._port_ids.get(name)
+        if pid is None:
+            pid = len(self._port_names)
+            self._port_ids[name] = pid
+            self._port_names.append(name)
+        return pid
+
+    def port_name(self, pid):
+        return self._port_names[pid]
+
+    def _alloc(self, key, vlan, mac, pid, now, kind):
+        if not self._free:
+            self.stats["table_full"] += 1
+            return -1
+        slot = self._free.pop()
+        self._index[key] = slot
+        self.macs[slot] = mac
+        self.vlans[slot] = vlan
+        self.ports[slot] = pid
+        self.last_seen[slot] = now
+        self.kind[slot] = kind
+        self._by_vlan.setdefault(vlan, set()).add(slot)
+        self._by_port.setdefault(pid, set()).add(slot)
+        self._version += 1
+        if kind == ENTRY_DYNAMIC:
+            self._due[slot] = self._wheel.schedule(slot, now + self.aging)
+        return slot
+
+    def _release(self, slot):
+        vlan, pid = self.vlans[slot], self.ports[slot]
+        del self._index[(vlan << 48) | self.macs[slot]]
+        self._by_vlan[vlan].discard(slot)
+        self._by_port[pid].discard(slot)
+        self.kind[slot] = ENTRY_FREE
+        self._due[slot] = -1
+        self._free.append(slot)
+        self._version += 1
+
+    def _move(self, slot, pid):
+        old = self.ports[slot]
+        self._by_port[old].discard(slot)
+        self._by_port.setdefault(pid, set()).add(slot)
+        self.ports[slot] = pid
+        self._version += 1
+        self.stats["moves"] += 1
+
+    def learn(self, vlan, mac, port, now):
+        """Learn or refresh (vlan, mac) on port; returns the entry slot or -1 if full"""
+        pid = port if isinstance(port, int) else self.port_id(port)
+        key = (vlan << 48) | mac
+        slot = self._index.get(key)
+        if slot is None:
+            slot = self._alloc(key, vlan, mac, pid, now, ENTRY_DYNAMIC)
+            if slot >= 0:
+                self.stats["learned"] += 1
+            return slot
+        if self.kind[slot] == ENTRY_DYNAMIC:
+            if self.ports[slot] != pid:
+                self._move(slot, pid)
+            self.last_seen[slot] = now
+        return slot
+
+    def learn_many(self, vlans, macs, pids, now):
+        """Learn a batch of (vlan, mac, port id) triples with one timestamp"""
+        index = self._index
+        ports = self.ports
+        last_seen = self.last_seen
+        kind = self.kind
+        learned = 0
+        for vlan, mac, pid in zip(vlans, macs, pids):
+            slot = index.get((vlan << 48) | mac)
+            if slot is None:
+                if self._alloc((vlan << 48) | mac, vlan, mac, pid, now, ENTRY_DYNAMIC) >= 0:
+                    learned += 1
+            elif kind[slot] == ENTRY_DYNAMIC:
+                if ports[slot] != pid:
+                    self._move(slot, pid)
+                last_seen[slot] = now
+        self.stats["learned"] += learned
+        return learned
+
+    def add_static(self, vlan, mac, port, now=0.0):
+        """Install a static (non-aging) entry, replacing any dynamic one"""
+        pid = port if isinstance(port, int) else self.port_id(port)
+        key = (vlan << 48) | mac
+        slot = self._index.get(key)
+        if slot is not None:
+            self._release(slot)
+        return self._alloc(key, vlan, mac, pid, now, ENTRY_STATIC)
+
+    def remove(self, vlan, mac):
+        slot = self._index.get((vlan << 48) | mac)
+        if slot is None:
+            return False
+        self._release(slot)
+        return True
+
+    def lookup(self, vlan, mac):
+        """Return the egress port id for (vlan, mac) or 0 if unknown"""
+        slot = self._index.get((vlan << 48) | mac)
+        return 0 if slot is None else self.ports[slot]
+
+    def lookup_many(self, vlans, macs, out):
+        """Batched destination lookup; writes port ids (0 = flood) into out"""
+        index = self._index
+        ports = self.ports
+        for i, (vlan, mac) in enumerate(zip(vlans, macs)):
+            slot = index.get((vlan << 48) | mac)
+            out[i] = 0 if slot is None else ports[slot]
+        return out
+
+    def expire(self, now):
+        """Age out dynamic entries idle longer than the aging time; returns count"""
+        aged = 0
+        due, kind, last_seen = self._due, self.kind, self.last_seen
+        aging = self.aging
+        for tick, slot in self._wheel.advance(now):
+            if due[slot] != tick or kind[slot] != ENTRY_DYNAMIC:
+                continue
+            deadline = last_seen[slot] + aging
+            if deadline > now:
+                due[slot] = self._wheel.schedule(slot, deadline)
+            else:
+                self._release(slot)
+                aged += 1
+        self.stats["aged"] += aged
+        return aged
+
+    def _flush(self, slots, include_static):
+        flushed = 0
+        for slot in list(slots):
+            if include_static or self.kind[slot] == ENTRY_DYNAMIC:
+                self._release(slot)
+                flushed += 1
+        self.stats["flushed"] += flushed
+        return flushed
+
+    def flush_port(self, port, include_static=False):
+        pid = port if isinstance(port, int) else self._port_ids.get(port)
+        return self._flush(self._by_port.get(pid, ()), include_static)
+
+    def flush_vlan(self, vlan, include_static=False):
+        return self._flush(self._by_vlan.get(vlan, ()), include_static)
+
+    def flush(self, include_static=False):
+        return self._flush(self._index.values(), include_static)
+
+    def count(self, vlan=None, port=None):
+        return len(self._select(vlan, port))
+
+    def _select(self, vlan, port):
+        if vlan is not None and port is not None:
+            pid = self._port_ids.get(port)
+            return self._by_vlan.get(vlan, set()) & self._by_port.get(pid, set())
+        if vlan is not None:
+            return self._by_vlan.get(vlan, ())
+        if port is not None:
+            return self._by_port.get(self._port_ids.get(port), ())
+        return self._index.values()
+
+    def entries(self, vlan=None, port=None, offset=0, limit=None, now=None):
+        """Return entry dicts sorted by (vlan, mac), optionally filtered and paged"""
+        # The sorted view is cached until the table next changes
+        cache_key = (vlan, port, self._version)
+        if self._sorted[0] == cache_key:
+            slots = self._sorted[1]
+        else:
+            slots = sorted(self._select(vlan, port), key=lambda s: (self.vlans[s] << 48) | self.macs[s])
+            self._sorted = (cache_key, slots)
+        end = None if limit is None else offset + limit
+        result = []
+        for slot in slots[offset:end]:
+            entry = {
+                "vlan": self.vlans[slot],
+                "mac": int_to_mac(self.macs[slot]),
+                "port": self._port_names[self.ports[slot]],
+                "type": "static" if self.kind[slot] == ENTRY_STATIC else "dynamic",
+            }
+            if now is not None and self.kind[slot] == ENTRY_DYNAMIC:
+                entry["age"] = round(now - self.last_seen[slot], 1)
+            result.append(entry)
+        return result
@@ -0,0 +1,412 @@
+#!/usr/bin/env python3
+"""
+NateOS FIB (Forwarding Information Base)
+Longest-prefix-match tables for IPv4/IPv6 with batched lookups
+
+Each address family is a multibit stride trie. A dense node is a flat
+array indexed by the next `stride` address bits holding the best next-hop
+index for prefixes that end inside that node (controlled prefix
+expansion), so a lookup costs one array read per level: 3 levels for IPv4
+(16-8-8) and at most 15 for IPv6 (16-8-...-8). Below the root a node
+starts sparse, as a short list of its prefixes scanned on lookup, and only
+expands to arrays once it holds more than SPARSE_ROUTES of them, so the
+long thin IPv6 paths down to each /48 do not cost a full array per level.
+Next-hops are interned into a shared table and referenced by small integer
+index; index 0 means "no route". A next-hop of the form "nhg:<id>"
+refers to an ECMP group (see ecmp.py).
+"""
+import ipaddress
+import re
+from array import array
+
+from dataplane.ecmp import NextHopGroups, group_of
+
+IPV4_STRIDES = (16, 8, 8)
+IPV6_STRIDES = (16,) + (8,) * 14
+
+NO_ROUTE = 0
+
+# A trie node keeps its prefixes as a list up to this many, then expands to
+# per-slot arrays; most deep IPv6 nodes hold one or two prefixes
+SPARSE_ROUTES = 8
+
+# Dotted-quad IPv4 with an optional prefix length, spelled the way ipaddress accepts it
+_OCTET = r"(25[0-5]|2[0-4][0-9]|1[0-9][0-9]|[1-9]?[0-9])"
+_IPV4_CIDR = re.compile(r"\.".join([_OCTET] * 4) + r"(?:/([0-9]+))?")
+
+
+class NextHopTable:
+    """Interned next-hops referenced by index with refcounts"""
+
+    def __init__(self):
+        self._hops = [None]
+        self._refs = [0]
+        self._index = {}
+        self._free = []
+
+    def acquire(self, gateway):
+        """Return the index for gateway, allocating it if needed"""
+        idx = self._index.get(gateway)
+        if idx is None:
+            if self._free:
+                idx = self._free.pop()
+                self._hops[idx] = gateway
+                self._refs[idx] = 0
+            else:
+                idx = len(self._hops)
+                self._hops.append(gateway)
+                self._refs.append(0)
+            self._index[gateway] = idx
+        self._refs[idx] += 1
+        return idx
+
+    def release(self, idx):
+        """Drop one reference to idx, freeing it when unused"""
+        self._refs[idx] -= 1
+        if self._refs[idx] == 0:
+            del self._index[self._hops[idx]]
+            self._hops[idx] = None
+            self._free.append(idx)
+
+    def get(self, idx):
+        return self._hops[idx]
+
+    def index_of(self, gateway):
+        """Index of an interned gateway, or 0 if it is not in use"""
+        return self._index.get(gateway, NO_ROUTE)
+
+    def __len__(self):
+        return len(self._index)
+
+
+def _by_plen(entry):
+    return entry[2]
+
+
+class _Node:
+    """One trie level: sparse (a short route list) until it holds more than
+    SPARSE_ROUTES prefixes, then dense (expanded per-slot arrays)"""
+    __slots__ = ("size", "nh", "plen", "sparse", "children", "routes")
+
+    def __init__(self, size, dense=False):
+        self.size = size
+        self.nh = self.plen = None
+        # (first slot, end slot, plen, nh), shortest prefix first
+        self.sparse = []
+        self.children = {}
+        self.routes = 0
+        if dense:
+            self.densify()
+
+    def densify(self):
+        """Expand the route list into per-slot arrays"""
+        size = self.size
+        nh, plen = array("I", bytes(4 * size)), array("B", bytes(size))
+        # Shortest first, so longer prefixes overwrite the slots they share
+        for first, end, length, hop in self.sparse:
+            for slot in range(first, end):
+                nh[slot] = hop
+                plen[slot] = length
+        self.nh, self.plen, self.sparse = nh, plen, None
+
+
+class PrefixTable:
+    """Longest-prefix-match table for one address family"""
+
+    def __init__(self, width, strides):
+        if sum(strides) != width:
+            raise ValueError("strides must cover the full address width")
+        self.width = width
+        self._levels = []
+        start = 0
+        for stride in strides:
+            self._levels.append((start, stride, width - start - stride, (1 << stride) - 1))
+            start += stride
+        self._lookup_levels = tuple((shift, mask) for _, _, shift, mask in self._levels)
+        self._root = _Node(1 << strides[0], dense=True)
+        self._default = NO_ROUTE
+        self._prefixes = [dict() for _ in range(width + 1)]
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _mask(self, plen):
+        return ((1 << plen) - 1) << (self.width - plen)
+
+    def _depth(self, plen):
+        for depth, (start, stride, _, _) in enumerate(self._levels):
+            if plen <= start + stride:
+                return depth
+        raise ValueError(f"prefix length {plen} exceeds width {self.width}")
+
+    def _slots(self, depth, prefix, plen):
+        start, stride, shift, mask = self._levels[depth]
+        base = (prefix >> shift) & mask
+        return range(base, base + (1 << (start + stride - plen)))
+
+    def _cover(self, prefix, plen, floor):
+        """Longest stored prefix shorter than plen and longer than floor covering prefix"""
+        for length in range(plen - 1, floor, -1):
+            nh = self._prefixes[length].get(prefix & self._mask(length))
+            if nh is not None:
+                return nh, length
+        return NO_ROUTE, 0
+
+    def get(self, prefix, plen):
+        """Exact-match lookup of an installed prefix; returns next-hop index or None"""
+        return self._prefixes[plen].get(prefix)
+
+    def insert(self, prefix, plen, nh):
+        """Install or replace prefix/plen; returns the previous next-hop index or None"""
+        prefix &= self._mask(plen)
+        previous = self._prefixes[plen].get(prefix)
+        self._prefixes[plen][prefix] = nh
+        if previous is None:
+            self._count += 1
+        if plen == 0:
+            self._default = nh
+            return previous
+
+        depth = self._depth(plen)
+        node = self._root
+        for level in range(depth):
+            _, _, shift, mask = self._levels[level]
+            slot = (prefix >> shift) & mask
+            child = node.children.get(slot)
+            if child is None:
+                child = _Node(1 << self._levels[level + 1][1])
+                node.children[slot] = child
+            node = child
+        if previous is None:
+            node.routes += 1
+
+        slots = self._slots(depth, prefix, plen)
+        sparse = node.sparse
+        if sparse is not None:
+            entry = (slots.start, slots.stop, plen, nh)
+            if previous is not None:
+                sparse[self._sparse_index(sparse, slots.start, plen)] = entry
+            else:
+                sparse.append(entry)
+                sparse.sort(key=_by_plen)
+                if len(sparse) > SPARSE_ROUTES:
+                    node.densify()
+            return previous
+        node_nh, node_plen = node.nh, node.plen
+        for slot in slots:
+            if node_plen[slot] <= plen:
+                node_nh[slot] = nh
+                node_plen[slot] = plen
+        return previous
+
+    @staticmethod
+    def _sparse_index(sparse, first, plen):
+        for i, entry in enumerate(sparse):
+            if entry[0] == first and entry[2] == plen:
+                return i
+        raise KeyError((first, plen))
+
+    def withdraw(self, prefix, plen):
+        """Remove prefix/plen; returns its next-hop index or None if absent"""
+        prefix &= self._mask(plen)
+        nh = self._prefixes[plen].pop(prefix, None)
+        if nh is None:
+            return None
+        self._count -= 1
+        if plen == 0:
+            self._default = NO_ROUTE
+            return nh
+
+        depth = self._depth(plen)
+        node = self._root
+        path = []
+        for level in range(depth):
+            _, _, shift, mask = self._levels[level]
+            slot = (prefix >> shift) & mask
+            path.append((node, slot))
+            node = node.children[slot]
+
+        slots = self._slots(depth, prefix, plen)
+        if node.sparse is not None:
+            # Shorter prefixes in a sparse node keep their own entries, so there is no cover to restore
+            del node.sparse[self._sparse_index(node.sparse, slots.start, plen)]
+        else:
+            cover_nh, cover_plen = self._cover(prefix, plen, self._levels[depth][0])
+            node_nh, node_plen = node.nh, node.plen
+            for slot in slots:
+                if node_plen[slot] == plen:
+                    node_nh[slot] = cover_nh
+                    node_plen[slot] = cover_plen
+
+        node.routes -= 1
+        # Prune nodes that no longer hold routes or children
+        while path and node.routes == 0 and not node.children:
+            parent, slot = path.pop()
+            del parent.children[slot]
+            node = parent
+        return nh
+
+    def lookup(self, addr):
+        """Longest-prefix match for one integer address; returns (nh, plen)"""
+        node = self._root
+        best, best_plen = self._default, 0
+        for shift, mask in self._lookup_levels:
+            slot = (addr >> shift) & mask
+            if node.sparse is None:
+                plen = node.plen[slot]
+                if plen:
+                    best, best_plen = node.nh[slot], plen
+            else:
+                for first, end, plen, nh in node.sparse:
+                    if first <= slot < end:
+                        best, best_plen = nh, plen
+            node = node.children.get(slot)
+            if node is None:
+                break
+        return best, best_plen
+
+    def lookup_many(self, addrs, out=None):
+        """Batched next-hop lookup over an iterable of integer addresses"""
+        if out is None:
+            out = array("I", bytes(4 * len(addrs)))
+        levels = self._lookup_levels
+        root = self._root
+        default = self._default
+        for i, addr in enumerate(addrs):
+            node = root
+            best = default
+            for shift, mask in levels:
+                slot = (addr >> shift) & mask
+                sparse = node.sparse
+                if sparse is None:
+                    nh = node.nh[slot]
+                    if nh:
+                        best = nh
+                else:
+                    for first, end, _, nh in sparse:
+                        if first <= slot < end:
+                            best = nh
+                node = node.children.get(slot)
+                if node is None:
+                    break
+            out[i] = best
+        return out
+
+    def items(self):
+        """Yield (prefix, plen, nh) for every installed prefix"""
+        for plen, table in enumerate(self._prefixes):
+            for prefix, nh in table.items():
+                yield prefix, plen, nh
+
+
+class Fib:
+    """Dual-stack FIB keyed on textual prefixes with shared next-hops"""
+
+    def __init__(self):
+        self.next_hops = NextHopTable()
+        self.v4 = PrefixTable(32, IPV4_STRIDES)
+        self.v6 = PrefixTable(128, IPV6_STRIDES)
+        self.groups = NextHopGroups(self.next_hops)
+
+    def _table(self, version):
+        return self.v4 if version == 4 else self.v6
+
+    def __len__(self):
+        return len(self.v4) + len(self.v6)
+
+    @staticmethod
+    def parse_prefix(destination):
+        """Parse a CIDR string, raising ValueError if malformed"""
+        return ipaddress.ip_network(destination, strict=False)
+
+    @staticmethod
+    def prefix_key(destination):
+        """Parse a CIDR string into (canonical text, (version, network, length)); ValueError if malformed"""
+        # Plain dotted-quad IPv4 is matched directly, several times cheaper than
+        # ipaddress; every other spelling falls through to it, so both accept
+        # exactly the same input
+        match = _IPV4_CIDR.fullmatch(destination) if isinstance(destination, str) else None
+        plen = int(match[5] or 32) if match is not None else None
+        if plen is not None and plen <= 32:
+            a, b, c, d = match.groups()[:4]
+            prefix = ((int(a) << 24) | (int(b) << 16) | (int(c) << 8) | int(d)) & (((1 << plen) - 1) << (32 - plen))
+            text = f"{prefix >> 24}.{prefix >> 16 & 255}.{prefix >> 8 & 255}.{prefix & 255}/{plen}"
+            return text, (4, prefix, plen)
+        net = ipaddress.ip_network(destination, strict=False)
+        return str(net), (net.version, int(net.network_address), net.prefixlen)
+
+    def insert(self, destination, gateway, key=None):
+        """Install destination (CIDR) via gateway, replacing any previous route; key skips the parse"""
+        version, prefix, plen = key or self.prefix_key(destination)[1]
+        table = self._table(version)
+        nh = self.next_hops.acquire(gateway or "")
+        previous = table.insert(prefix, plen, nh)
+        if previous is not None:
+            self.next_hops.release(previous)
+
+    def withdraw(self, destination, key=None):
+        """Remove destination (CIDR); returns True if it was installed"""
+        version, prefix, plen = key or self.prefix_key(destination)[1]
+        nh = self._table(version).withdraw(prefix, plen)
+        if nh is None:
+            return False
+        self.next_hops.release(nh)
+        return True
+
+    def clear(self):
+        """Drop every prefix; ECMP groups are kept"""
+        self.next_hops = NextHopTable()
+        self.v4 = PrefixTable(32, IPV4_STRIDES)
+        self.v6 = PrefixTable(128, IPV6_STRIDES)
+        self.groups.rebind(self.next_hops)
+
+    def lookup(self, address):
+        """Longest-prefix match for one address string; returns a dict or None"""
+        addr = ipaddress.ip_address(address)
+        table = self._table(addr.version)
+        nh, plen = table.lookup(int(addr))
+        if nh == NO_ROUTE:
+            return None
+        network = ipaddress.IPv4Network if addr.version == 4 else ipaddress.IPv6Network
+        net = network((int(addr) & table._mask(plen), plen))
+        gateway = self.next_hops.get(nh)
+        result = {"address": address, "prefix": str(net), "gateway": gateway}
+        gid = group_of(gateway)
+        if gid is not None:
+            group = self.groups.get(gid)
+            result.update(group=gid, members=group.members if group is not None else [])
+        return result
+
+    def lookup_many_v4(self, addrs, out=None):
+        """Batched IPv4 lookup over integer addresses (e.g. array('I')); returns next-hop indexes"""
+        return self.v4.lookup_many(addrs, out)
+
+    def lookup_many_v6(self, addrs, out=None):
+        """Batched IPv6 lookup over integer addresses; returns next-hop indexes"""
+        return self.v6.lookup_many(addrs, out)
+
+    def lookup_batch(self, addresses):
+        """Look up a list of address strings, grouping by family for the batched path"""
+        results = [None] * len(addresses)
+        groups = {4: ([], []), 6: ([], [])}
+        for i, address in enumerate(addresses):
+            addr = ipaddress.ip_address(address)
+            positions, ints = groups[addr.version]
+            positions.append(i)
+            ints.append(int(addr))
+        for version, (positions, ints) in groups.items():
+            if not ints:
+                continue
+            hops = self._table(version).lookup_many(ints)
+            for i, nh in zip(positions, hops):
+                results[i] = self.next_hops.get(nh) if nh else None
+        return results
+
+    def stats(self):
+        return {
+            "ipv4_prefixes": len(self.v4),
+            "ipv6_prefixes": len(self.v6),
+            "next_hops": len(self.next_hops),
+            "next_hop_groups": len(self.groups),
+        }
@@ -0,0 +1,471 @@
+#!/usr/bin/env python3
+"""
+NateOS QoS engine
+Classification, policing and hierarchical egress scheduling compiled from
+the "qos" config section
+
+- Classification: DSCP (64 entries) and PCP (8 entries) to traffic-class
+  tables, expanded to 256-byte translate tables. A whole vector is
+  classified with one bytes.translate call, in C.
+- Policing: an optional per-class ingress token bucket; out-of-profile
+  packets are dropped.
+- Scheduling: each port has a root token bucket (the port shaper) over
+  eight class queues. Strict-priority classes drain first, highest class
+  first, limited only by their ceiling. The rest share the port by
+  deficit round robin with weight-scaled quanta: first within their
+  guaranteed rate, then borrowing up to their ceiling (HTB style).
+
+Every batch entry point takes `now` from the caller, so the clock is read
+once per vector and not once per packet. simulate() replays a trace
+through a policy on a simulated clock and reports per-class throughput,
+latency and drops.
+
+Config (all keys optional):
+    {"trust": "dscp"|"pcp"|"none", "default_class": 0,
+     "dscp_map": {"46": 5, "32-39": 4}, "pcp_map": {"5": 5},
+     "classes": {"5": {"name": "voice", "priority": true, "ceil_mbps": 200, "queue_limit": 128},
+                 "0": {"weight": 1, "rate_mbps": 100, "ceil_mbps": 1000}},
+     "policers": {"1": {"rate_mbps": 50, "burst_kb": 64}},
+     "ports": {"default": {"rate_mbps": 1000}, "eth1": {"rate_mbps": 100}}}
+"""
+import random
+from collections import deque
+
+NUM_CLASSES = 8
+TRUST_MODES = ("dscp", "pcp", "none")
+DEFAULT_PORT_MBPS = 1000
+DEFAULT_QUEUE_LIMIT = 1024
+DEFAULT_WEIGHT = 1
+MTU = 1514
+LATENCY_SAMPLES = 100000
+
+# RFC 4594-style defaults: class selector -> class, EF -> 5
+DEFAULT_DSCP = [dscp >> 3 for dscp in range(64)]
+DEFAULT_DSCP[46] = 5
+
+
+def _mbps(value, what):
+    rate = float(value)
+    if rate <= 0:
+        raise ValueError(f"{what} must be positive")
+    return rate * 1e6 / 8  # bytes per second
+
+
+def _class(value, what):
+    try:
+        tc = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{what}: traffic class must be 0-{NUM_CLASSES - 1}")
+    if not 0 <= tc < NUM_CLASSES:
+        raise ValueError(f"{what}: traffic class must be 0-{NUM_CLASSES - 1}")
+    return tc
+
+
+def _code_points(key, size, what):
+    """'46' or '40-47' -> range of code points below size"""
+    lo, sep, hi = str(key).partition("-")
+    try:
+        lo = int(lo)
+        hi = int(hi) if sep else lo
+    except ValueError:
+        raise ValueError(f"{what}: invalid code point '{key}'")
+    if not 0 <= lo <= hi < size:
+        raise ValueError(f"{what}: code point '{key}' out of range 0-{size - 1}")
+    return range(lo, hi + 1)
+
+
+def build_table(defaults, mapping, what):
+    """256-byte translate table from per-code-point defaults plus a config map"""
+    table = bytearray(256)
+    table[:len(defaults)] = bytes(defaults)
+    for key, tc in (mapping or {}).items():
+        for point in _code_points(key, len(defaults), what):
+            table[point] = _class(tc, what)
+    return bytes(table)
+
+
+class TokenBucket:
+    """Byte token bucket refilled from caller-supplied timestamps"""
+    __slots__ = ("rate", "burst", "tokens", "stamp")
+
+    def __init__(self, rate, burst, now=0.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = now
+
+    def refill(self, now):
+        elapsed = now - self.stamp
+        if elapsed > 0:
+            self.tokens = min(self.burst, self.tokens + elapsed * self.rate)
+            self.stamp = now
+
+
+class ClassQueue:
+    """One traffic-class queue with its shapers and counters"""
+
+    def __init__(self, tc, spec, record=False):
+        self.tc = tc
+        self.name = spec.get("name") or f"tc{tc}"
+        self.priority = bool(spec.get("priority", False))
+        self.weight = int(spec.get("weight", DEFAULT_WEIGHT))
+        if self.weight < 1:
+            raise ValueError(f"class {tc}: weight must be >= 1")
+        self.quantum = self.weight * MTU
+        self.limit = int(spec.get("queue_limit", DEFAULT_QUEUE_LIMIT))
+        if self.limit < 1:
+            raise ValueError(f"class {tc}: queue_limit must be >= 1")
+        self.rate = self.ceil = None
+        if spec.get("rate_mbps") is not None:
+            rate = _mbps(spec["rate_mbps"], f"class {tc} rate_mbps")
+            self.rate = TokenBucket(rate, max(2 * MTU, rate * 0.002))
+        if spec.get("ceil_mbps") is not None:
+            ceil = _mbps(spec["ceil_mbps"], f"class {tc} ceil_mbps")
+            if self.rate is not None and ceil < self.rate.rate:
+                raise ValueError(f"class {tc}: ceil_mbps below rate_mbps")
+            self.ceil = TokenBucket(ceil, max(2 * MTU, ceil * 0.002))
+        self.packets = deque()
+        self.deficit = 0
+        self.record = record
+        self.latencies = []
+        self.enqueued = self.dropped = self.tx_packets = self.tx_bytes = 0
+        self.latency_sum = 0.0
+
+    def stats(self):
+        return {
+            "class": self.tc,
+            "name": self.name,
+            "priority": self.priority,
+            "weight": self.weight,
+            "queued": len(self.packets),
+            "enqueued": self.enqueued,
+            "dropped": self.dropped,
+            "tx_packets": self.tx_packets,
+            "tx_bytes": self.tx_bytes,
+        }
+
+
+class PortScheduler:
+    """Strict priority + DRR over eight class queues under a port shaper"""
+
+    def __init__(self, rate, specs, record=False, now=0.0):
+        self.root = TokenBucket(rate, max(3 * MTU, rate * 0.002), now)
+        self.queues = [ClassQueue(tc, specs.get(tc, {}), record) for tc in range(NUM_CLASSES)]
+        for q in self.queues:
+            for bucket in (q.rate, q.ceil):
+                if bucket is not None:
+                    bucket.stamp = now
+        self.strict = sorted((q for q in self.queues if q.priority), key=lambda q: -q.tc)
+        self.shared = [q for q in self.queues if not q.priority]
+        self._turn = 0
+        self._granted = False
+
+    def enqueue_many(self, classes, lengths, now, tags=None):
+        """Queue a batch (tail drop when a class is full); returns drops"""
+        queues = self.queues
+        drops = 0
+        for i, (tc, length) in enumerate(zip(classes, lengths)):
+            q = queues[tc]
+            if len(q.packets) >= q.limit:
+                q.dropped += 1
+                drops += 1
+                continue
+            q.packets.append((length, now, tags[i] if tags is not None else None))
+            q.enqueued += 1
+        return drops
+
+    def _send(self, q, now, sent, green=False):
+        length, arrival, tag = q.packets.popleft()
+        self.root.tokens -= length
+        if green:
+            q.rate.tokens -= length  # only guaranteed sends use the class's own rate
+        if q.ceil is not None:
+            q.ceil.tokens -= length
+        q.tx_packets += 1
+        q.tx_bytes += length
+        delay = now - arrival
+        q.latency_sum += delay
+        if q.record and len(q.latencies) < LATENCY_SAMPLES:
+            q.latencies.append(delay)
+        sent.append((q.tc, length, tag))
+        return length
+
+    def dequeue(self, now):
+        """Transmit whatever the shapers allow at time now; returns [(class, length, tag)]"""
+        root = self.root
+        root.refill(now)
+        for q in self.queues:
+            if q.rate is not None:
+                q.rate.refill(now)
+            if q.ceil is not None:
+                q.ceil.refill(now)
+        sent = []
+        for q in self.strict:
+            packets, ceil = q.packets, q.ceil
+            while packets:
+                length = packets[0][0]
+                if root.tokens < length or (ceil is not None and ceil.tokens < length):
+                    break
+                self._send(q, now, sent)
+
+        # Guaranteed rates first (HTB "green"), then DRR over the excess up to each ceiling
+        for q in self.shared:
+            packets, rate, ceil = q.packets, q.rate, q.ceil
+            if rate is None:
+                continue
+            while packets:
+                length = packets[0][0]
+                if root.tokens < length or rate.tokens < length or (ceil is not None and ceil.tokens < length):
+                    break
+                self._send(q, now, sent, green=True)
+        self._drr(now, sent)
+        return sent
+
+    def _drr(self, now, sent):
+        """Deficit round robin whose position and granted quantum persist across calls"""
+        root, shared = self.root, self.shared
+        if not shared:
+            return
+        idle = 0
+        while idle < len(shared) and root.tokens > 0:
+            q = shared[self._turn]
+            packets, ceil = q.packets, q.ceil
+            progressed = False
+            if packets:
+                if not self._granted:
+                    q.deficit += q.quantum
+                    self._granted = True
+                while packets:
+                    length = packets[0][0]
+                    if root.tokens < length:
+                        return  # port busy: keep this turn (and its quantum) for the next call
+                    if length > q.deficit or (ceil is not None and ceil.tokens < length):
+                        break
+                    q.deficit -= self._send(q, now, sent)
+                    progressed = True
+                if not packets:
+                    q.deficit = 0
+                elif q.deficit > q.quantum:
+                    q.deficit = q.quantum  # held back by its ceiling: do not bank credit
+            self._turn = (self._turn + 1) % len(shared)
+            self._granted = False
+            idle = 0 if progressed else idle + 1
+
+    def backlog(self):
+        return sum(len(q.packets) for q in self.queues)
+
+    def stats(self):
+        return [q.stats() for q in self.queues]
+
+
+class QosPolicy:
+    """A compiled qos config: classification tables, policers and port schedulers"""
+
+    def __init__(self, config=None):
+        config = config or {}
+        self.config = config
+        self.trust = config.get("trust", "dscp")
+        if self.trust not in TRUST_MODES:
+            raise ValueError(f"trust must be one of {', '.join(TRUST_MODES)}")
+        self.default_class = _class(config.get("default_class", 0), "default_class")
+        self.dscp_table = build_table(DEFAULT_DSCP, config.get("dscp_map"), "dscp_map")
+        self.pcp_table = build_table(list(range(NUM_CLASSES)), config.get("pcp_map"), "pcp_map")
+        if self.trust == "none":
+            self.dscp_table = self.pcp_table = bytes([self.default_class]) * 256
+
+        self.class_specs = {}
+        for key, spec in (config.get("classes") or {}).items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"classes.{key} must be an object")
+            self.class_specs[_class(key, f"classes.{key}")] = dict(spec)
+        self.policer_specs = {}
+        for key, spec in (config.get("policers") or {}).items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"policers.{key} must be an object")
+            rate = _mbps(spec.get("rate_mbps", 0), f"policers.{key}.rate_mbps")
+            burst = float(spec.get("burst_kb", 64)) * 1024
+            if burst < MTU:
+                raise ValueError(f"policers.{key}.burst_kb must cover one {MTU}-byte frame")
+            self.policer_specs[_class(key, f"policers.{key}")] = (rate, burst)
+        self.policers = [None] * NUM_CLASSES
+        for tc, (rate, burst) in self.policer_specs.items():
+            self.policers[tc] = TokenBucket(rate, burst)
+        self.policed = [0] * NUM_CLASSES
+
+        self.port_rates = {}
+        for port, spec in (config.get("ports") or {}).items():
+            if not isinstance(spec, dict):
+                raise ValueError(f"ports.{port} must be an object")
+            self.port_rates[str(port)] = _mbps(spec.get("rate_mbps", DEFAULT_PORT_MBPS), f"ports.{port}.rate_mbps")
+        self._schedulers = {}
+        # Build one scheduler now so bad class specs fail at compile time
+        PortScheduler(self.port_rate("default"), self.class_specs)
+
+    def port_rate(self, port):
+        return self.port_rates.get(str(port), self.port_rates.get("default", DEFAULT_PORT_MBPS * 1e6 / 8))
+
+    def scheduler(self, port, record=False, now=0.0):
+        """The port's scheduler, created on first use"""
+        sched = self._schedulers.get(port)
+        if sched is None:
+            sched = self._schedulers[port] = PortScheduler(self.port_rate(port), self.class_specs, record, now)
+        return sched
+
+    def classify_many(self, dscp, pcp=None):
+        """Traffic classes for a batch of DSCP (and PCP) byte values, as a bytearray"""
+        if self.trust == "pcp" and pcp is not None:
+            return bytearray(pcp).translate(self.pcp_table)
+        return bytearray(dscp).translate(self.dscp_table)
+
+    def police_many(self, classes, lengths, now):
+        """In-profile flags (bytearray of 0/1) for a batch; one refill per policer"""
+        passed = bytearray(b"\x01") * len(classes)
+        policers = self.policers
+        if not any(policers):
+            return passed
+        for bucket in policers:
+            if bucket is not None:
+                bucket.refill(now)
+        policed = self.policed
+        for i, (tc, length) in enumerate(zip(classes, lengths)):
+            bucket = policers[tc]
+            if bucket is None:
+                continue
+            if bucket.tokens >= length:
+                bucket.tokens -= length
+            else:
+                passed[i] = 0
+                policed[tc] += 1
+        return passed
+
+    def summary(self):
+        return {
+            "trust": self.trust,
+            "default_class": self.default_class,
+            "dscp_to_class": list(self.dscp_table[:64]),
+            "pcp_to_class": list(self.pcp_table[:NUM_CLASSES]),
+            "classes": [q.stats() | {"rate_mbps": q.rate.rate * 8 / 1e6 if q.rate else None,
+                                     "ceil_mbps": q.ceil.rate * 8 / 1e6 if q.ceil else None}
+                        for q in PortScheduler(self.port_rate("default"), self.class_specs).queues],
+            "policers": {str(tc): {"rate_mbps": rate * 8 / 1e6, "burst_bytes": int(burst)}
+                         for tc, (rate, burst) in sorted(self.policer_specs.items())},
+            "ports": {port: rate * 8 / 1e6 for port, rate in sorted(self.port_rates.items())},
+        }
+
+
+# -------- Simulation --------
+def synthetic_trace(duration=1.0, seed=1, mix=None):
+    """(time, dscp, pcp, length) tuples for a default oversubscribed traffic mix
+
+    mix: [(dscp, mbps, packet_length, burstiness)], with burstiness 0 for
+    paced (CBR-like) traffic up to 1 for heavy on/off bursts.
+    """
+    rng = random.Random(seed)
+    mix = mix or [
+        (46, 60, 200, 0.0),     # voice (EF)
+        (34, 400, 1200, 0.3),   # video (AF41)
+        (0, 700, 1500, 0.8),    # best effort, bursty
+        (8, 300, 1500, 0.5),    # scavenger (CS1)
+    ]
+    trace = []
+    for dscp, mbps, length, burstiness in mix:
+        pps = mbps * 1e6 / 8 / length
+        t = rng.random() / pps
+        while t < duration:
+            trace.append((t, dscp, dscp >> 3, length))
+            gap = 1.0 / pps
+            if burstiness:
+                gap = rng.expovariate(pps) if rng.random() < burstiness else gap
+            t += gap
+    trace.sort()
+    return trace
+
+
+def load_trace(path):
+    """Read a CSV trace: time_s,dscp,length[,pcp] per line ('#' comments allowed)"""
+    trace = []
+    with open(path, "r", encoding="utf-8") as f:
+        for lineno, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#") or line[0].isalpha():
+                continue
+            parts = line.split(",")
+            try:
+                t, dscp, length = float(parts[0]), int(parts[1]), int(parts[2])
+                pcp = int(parts[3]) if len(parts) > 3 and parts[3].strip() else dscp >> 3
+            except (ValueError, IndexError):
+                raise ValueError(f"{path}:{lineno}: expected time_s,dscp,length[,pcp]")
+            trace.append((t, dscp & 63, pcp & 7, length))
+    trace.sort()
+    return trace
+
+
+def _percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100.0))]
+
+
+def simulate(policy, trace, port="default", tick=0.0001, drain=1.0):
+    """Replay trace through one port of policy on a simulated clock
+
+    Arrivals within each `tick` form one batch: classified, policed and
+    enqueued at the tick's timestamp, after which the scheduler transmits
+    what the port shaper allows. Queues get `drain` seconds after the last
+    arrival to empty. The live policy's policers are left untouched.
+    """
+    trace = list(trace)
+    start = trace[0][0] if trace else 0.0
+    end = (trace[-1][0] if trace else start) + drain
+    policy = QosPolicy(policy.config)
+    for bucket in policy.policers:
+        if bucket is not None:
+            bucket.stamp = start
+    sched = PortScheduler(policy.port_rate(port), policy.class_specs, record=True, now=start)
+    offered = [0] * NUM_CLASSES
+    i, n = 0, len(trace)
+    now = start
+    while (i < n or sched.backlog()) and now < end:
+        if i < n and not sched.backlog() and trace[i][0] > now + tick:
+            now += (trace[i][0] - now) // tick * tick  # idle: skip to the next arrival
+        now += tick
+        j = i
+        while j < n and trace[j][0] < now:
+            j += 1
+        if j > i:
+            batch = trace[i:j]
+            classes = policy.classify_many(bytes(p[1] for p in batch), bytes(p[2] for p in batch))
+            lengths = [p[3] for p in batch]
+            for tc, length in zip(classes, lengths):
+                offered[tc] += length
+            passed = policy.police_many(classes, lengths, now)
+            keep = [k for k in range(len(batch)) if passed[k]]
+            sched.enqueue_many([classes[k] for k in keep], [lengths[k] for k in keep], now)
+            i = j
+        sched.dequeue(now)
+    elapsed = max(now - start, tick)
+    results = []
+    for q in sched.queues:
+        policed = policy.policed[q.tc]
+        if not (offered[q.tc] or q.enqueued or policed):
+            continue
+        results.append({
+            "class": q.tc,
+            "name": q.name,
+            "offered_mbps": round(offered[q.tc] * 8 / elapsed / 1e6, 2),
+            "throughput_mbps": round(q.tx_bytes * 8 / elapsed / 1e6, 2),
+            "tx_packets": q.tx_packets,
+            "queue_drops": q.dropped,
+            "policer_drops": policed,
+            "latency_avg_ms": round(q.latency_sum / q.tx_packets * 1000, 3) if q.tx_packets else 0.0,
+            "latency_p99_ms": round(_percentile(q.latencies, 99) * 1000, 3),
+            "queued_at_end": len(q.packets),
+        })
+    return {
+        "port": port,
+        "port_mbps": round(sched.root.rate * 8 / 1e6, 2),
+        "duration_s": round(elapsed, 6),
+        "packets": n,
+        "classes": results,
+    }
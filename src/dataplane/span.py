@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+NateOS SPAN (port mirroring)
+Sampled, truncated frame copies into an mmap-backed overwrite ring
+
+The ring is one mmap region: a 64-byte header followed by `slots`
+fixed-size slots. Each slot holds a 32-byte record header and up to
+slot_size - 32 bytes of frame. The mirror stage copies a frame once,
+straight from its pool buffer (a memoryview slice) into the mmap. No
+intermediate bytes object is made, and the pool buffer is still freed
+by egress as usual.
+
+The producer never waits. It writes slot write_seq % slots and bumps
+write_seq. If the consumer (which publishes its read_seq in the header)
+is a full ring behind, the oldest unread record is overwritten and
+counted in `dropped`. A reader that falls behind skips to the oldest
+record still intact and counts the gap as lost, so a slow or absent
+consumer costs mirrored frames, never forwarding.
+
+Every record carries its sequence number, so a reader can tell a slot
+that was overwritten after it read write_seq from one it can still use.
+The producer owns write_seq and dropped, the consumer read_seq; neither
+writes the other's fields. The ring can be backed by a file (e.g. under /dev/shm) for a
+consumer in another process, or anonymous for one in the same process.
+"""
+import mmap
+import os
+import struct
+import time
+
+MAGIC = b"NATESPAN"
+VERSION = 1
+HEADER_SIZE = 64
+RECORD_SIZE = 32
+DEFAULT_SLOTS = 8192
+DEFAULT_SLOT_SIZE = 2048
+DIRECTIONS = ("rx", "tx", "both")
+DIR_RX = 1
+DIR_TX = 2
+MAX_PORTS = 4096
+
+# magic, version, slots, slot_size, write_seq, read_seq, dropped
+_HEADER = struct.Struct("<8sIII4xQQQ")
+_SEQS = struct.Struct("<QQQ")
+_U64 = struct.Struct("<Q")
+_SEQ_OFFSET = 24
+_READ_OFFSET = 32
+_DROPPED_OFFSET = 40
+# seq, timestamp, original length, captured length, port, direction, session
+_RECORD = struct.Struct("<QdIHHBB")
+_pack_record = _RECORD.pack_into
+_PCAP_HEADER = struct.Struct("<IHHiIII")
+_PCAP_RECORD = struct.Struct("<IIII")
+LINKTYPE_ETHERNET = 1
+
+
+def check_geometry(slots, slot_size):
+    if slots & (slots - 1) or slots < 2:
+        raise ValueError("ring slots must be a power of two >= 2")
+    if slot_size % 8 or not RECORD_SIZE + 64 <= slot_size <= 65536:
+        raise ValueError(f"ring slot_size must be a multiple of 8 in {RECORD_SIZE + 64}-65536")
+
+
+class MirrorRing:
+    """Single-producer overwrite ring in an mmap"""
+
+    def __init__(self, slots=DEFAULT_SLOTS, slot_size=DEFAULT_SLOT_SIZE, path=None):
+        check_geometry(slots, slot_size)
+        self.slots = slots
+        self.slot_size = slot_size
+        self.mask = slots - 1
+        self.path = path
+        size = HEADER_SIZE + slots * slot_size
+        if path:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o600)
+            try:
+                os.ftruncate(fd, size)
+                self.mm = mmap.mmap(fd, size)
+            finally:
+                os.close(fd)
+        else:
+            self.mm = mmap.mmap(-1, size)
+        _HEADER.pack_into(self.mm, 0, MAGIC, VERSION, slots, slot_size, 0, 0, 0)
+        self.write_seq = 0
+        self.read_seq = 0   # consumer position as of the last publish
+        self.dropped = 0
+
+    @classmethod
+    def attach(cls, path):
+        """Map an existing ring file (consumer side)"""
+        with open(path, "r+b") as f:
+            mm = mmap.mmap(f.fileno(), 0)
+        magic, version, slots, slot_size, write_seq, _, dropped = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a NateOS mirror ring")
+        ring = cls.__new__(cls)
+        ring.slots, ring.slot_size, ring.mask, ring.path, ring.mm = slots, slot_size, slots - 1, path, mm
+        ring.write_seq, ring.read_seq, ring.dropped = write_seq, write_seq, dropped
+        return ring
+
+    @property
+    def capacity(self):
+        """Largest frame prefix a slot holds"""
+        return self.slot_size - RECORD_SIZE
+
+    def push(self, frame, length, ts, port, direction, session, snaplen):
+        """Copy frame[:min(length, snaplen)] into the next slot; never blocks
+
+        snaplen must not exceed capacity (Session clamps it).
+        """
+        seq = self.write_seq
+        if seq - self.read_seq >= self.slots:
+            self.read_seq = _U64.unpack_from(self.mm, _READ_OFFSET)[0]
+            if seq - self.read_seq >= self.slots:
+                self.dropped += 1  # overwriting a record the consumer has not read
+        offset = HEADER_SIZE + (seq & self.mask) * self.slot_size
+        cap = length if length < snaplen else snaplen
+        mm = self.mm
+        _pack_record(mm, offset, seq, ts, length, cap, port, direction, session)
+        offset += RECORD_SIZE
+        mm[offset:offset + cap] = frame[:cap]
+        self.write_seq = seq + 1
+
+    def publish(self):
+        """Make pushed records visible to readers and pick up the consumer position (once per vector)"""
+        mm = self.mm
+        self.read_seq = _U64.unpack_from(mm, _READ_OFFSET)[0]
+        _U64.pack_into(mm, _DROPPED_OFFSET, self.dropped)
+        _U64.pack_into(mm, _SEQ_OFFSET, self.write_seq)
+
+    def close(self):
+        self.mm.close()
+        if self.path:
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class RingReader:
+    """Consumer of a MirrorRing: yields records, tracks loss, writes pcap"""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.read_seq = _U64.unpack_from(ring.mm, _READ_OFFSET)[0]
+        self.lost = 0
+        self.read = 0
+
+    def pending(self):
+        return _U64.unpack_from(self.ring.mm, _SEQ_OFFSET)[0] - self.read_seq
+
+    def poll(self, limit=None):
+        """[(ts, orig_len, port, direction, session, data memoryview)] of records ready to read
+
+        The memoryviews point into the ring and are valid until the producer
+        wraps around; write or copy them before the next poll.
+        """
+        ring = self.ring
+        mm = ring.mm
+        seq, end = self._window(limit)
+        view = memoryview(mm)
+        records = []
+        mask, slot_size = ring.mask, ring.slot_size
+        unpack = _RECORD.unpack_from
+        for s in range(seq, end):
+            offset = HEADER_SIZE + (s & mask) * slot_size
+            rec_seq, ts, length, cap, port, direction, session = unpack(mm, offset)
+            if rec_seq != s:
+                self.lost += 1  # overwritten since write_seq was read
+                continue
+            start = offset + RECORD_SIZE
+            records.append((ts, length, port, direction, session, view[start:start + cap]))
+        self.read_seq = end
+        self.read += len(records)
+        self._ack()
+        return records
+
+    def _window(self, limit):
+        """[seq, end) of records to read; skips (and counts) what was overwritten unread"""
+        ring = self.ring
+        write_seq = _U64.unpack_from(ring.mm, _SEQ_OFFSET)[0]
+        seq = self.read_seq
+        if write_seq - seq > ring.slots:
+            self.lost += write_seq - seq - ring.slots
+            seq = write_seq - ring.slots
+        return seq, write_seq if limit is None else min(write_seq, seq + limit)
+
+    def _ack(self):
+        # Only the consumer writes read_seq, only the producer the other fields
+        _U64.pack_into(self.ring.mm, _READ_OFFSET, self.read_seq)
+
+    def drain(self, writer, limit=None, ts_offset=0.0):
+        """Write ready records to a PcapWriter; returns records written
+
+        ts_offset converts record timestamps (the dataplane's monotonic
+        clock) to wall-clock time for the pcap.
+        """
+        ring = self.ring
+        mm = ring.mm
+        seq, end = self._window(limit)
+        view = memoryview(mm)
+        mask, slot_size = ring.mask, ring.slot_size
+        unpack = _RECORD.unpack_from
+        write = writer.write
+        written = 0
+        for s in range(seq, end):
+            offset = HEADER_SIZE + (s & mask) * slot_size
+            rec_seq, ts, length, cap, _, _, _ = unpack(mm, offset)
+            if rec_seq != s:
+                self.lost += 1
+                continue
+            start = offset + RECORD_SIZE
+            write(ts + ts_offset, length, view[start:start + cap])
+            written += 1
+        self.read_seq = end
+        self.read += written
+        self._ack()
+        return written
+
+    def stats(self):
+        ring = self.ring
+        write_seq, read_seq, dropped = _SEQS.unpack_from(ring.mm, _SEQ_OFFSET)
+        return {"written": write_seq, "read": self.read, "pending": write_seq - read_seq,
+                "overwritten": dropped, "lost": self.lost}
+
+
+class PcapWriter:
+    """Classic libpcap file writer; record headers are packed into one reused buffer"""
+
+    def __init__(self, path, snaplen=65535, linktype=LINKTYPE_ETHERNET):
+        self.file = open(path, "wb", buffering=1 << 20)
+        self.file.write(_PCAP_HEADER.pack(0xA1B2C3D4, 2, 4, 0, 0, snaplen, linktype))
+        self._header = bytearray(_PCAP_RECORD.size)
+        self.packets = 0
+        self.bytes = _PCAP_HEADER.size
+
+    def write(self, ts, length, data):
+        sec = int(ts)
+        _PCAP_RECORD.pack_into(self._header, 0, sec, int((ts - sec) * 1e6), len(data), length)
+        self.file.write(self._header)
+        self.file.write(data)
+        self.packets += 1
+        self.bytes += _PCAP_RECORD.size + len(data)
+
+    def close(self):
+        self.file.close()
+
+
+class Session:
+    """One SPAN session: source ports, direction, sampling and truncation"""
+    __slots__ = ("index", "name", "direction", "sample", "countdown", "snaplen", "ports", "packets", "bytes")
+
+    def __init__(self, index, name, spec, capacity):
+        self.index = index
+        self.name = name
+        self.direction = spec.get("direction", "both")
+        if self.direction not in DIRECTIONS:
+            raise ValueError(f"{name}: direction must be one of {', '.join(DIRECTIONS)}")
+        self.sample = int(spec.get("sample", 1))
+        if self.sample < 1:
+            raise ValueError(f"{name}: sample must be >= 1 (1-in-N)")
+        self.countdown = self.sample
+        self.snaplen = int(spec.get("truncate") or capacity)
+        if not 14 <= self.snaplen <= 65535:
+            raise ValueError(f"{name}: truncate must be 14-65535 bytes")
+        self.snaplen = min(self.snaplen, capacity)
+        self.ports = parse_ports(spec.get("source_ports"), name)
+        self.packets = 0
+        self.bytes = 0
+
+
+def parse_ports(spec, name):
+    """Port ids from [1, 2, "5-8"] or "all" """
+    if spec == "all":
+        return list(range(1, MAX_PORTS))
+    if not isinstance(spec, (list, tuple)) or not spec:
+        raise ValueError(f"{name}: source_ports must be a non-empty list or \"all\"")
+    ports = []
+    for item in spec:
+        lo, sep, hi = str(item).partition("-")
+        try:
+            lo, hi = int(lo), int(hi) if sep else int(lo)
+        except ValueError:
+            raise ValueError(f"{name}: invalid port '{item}'")
+        if not 1 <= lo <= hi < MAX_PORTS:
+            raise ValueError(f"{name}: ports must be 1-{MAX_PORTS - 1}")
+        ports.extend(range(lo, hi + 1))
+    return ports
+
+
+class SpanEngine:
+    """SPAN sessions compiled to per-port session tables, feeding one MirrorRing
+
+    config: {"sessions": {name: {"source_ports", "direction", "sample",
+    "truncate", "enabled"}}, "ring": {"slots", "slot_size", "path"}}. With
+    allocate=False the config is only checked and no ring is mapped.
+    """
+
+    def __init__(self, config=None, ring=None, allocate=True):
+        config = config or {}
+        ring_cfg = config.get("ring") or {}
+        slots = int(ring_cfg.get("slots", DEFAULT_SLOTS))
+        slot_size = int(ring_cfg.get("slot_size", DEFAULT_SLOT_SIZE))
+        check_geometry(slots, slot_size)
+        self.sessions = []
+        self.rx = bytearray(MAX_PORTS)      # port -> session index + 1 (0 = not mirrored)
+        self.tx = bytearray(MAX_PORTS)
+        sessions = config.get("sessions") or {}
+        if len(sessions) > 255:
+            raise ValueError("at most 255 SPAN sessions")
+        for name, spec in sessions.items():
+            spec = spec or {}
+            if not spec.get("enabled", True):
+                continue
+            session = Session(len(self.sessions), name, spec, slot_size - RECORD_SIZE)
+            for table, direction in ((self.rx, "rx"), (self.tx, "tx")):
+                if session.direction not in (direction, "both"):
+                    continue
+                for port in session.ports:
+                    if table[port]:
+                        raise ValueError(f"{name}: port {port} {direction} is already mirrored "
+                                         f"by {self.sessions[table[port] - 1].name}")
+                    table[port] = session.index + 1
+            self.sessions.append(session)
+        self.ring = ring
+        if ring is None and self.sessions and allocate:
+            self.ring = MirrorRing(slots, slot_size, ring_cfg.get("path"))
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def summary(self):
+        result = {"sessions": {s.name: {"direction": s.direction, "sample": s.sample, "truncate": s.snaplen,
+                                        "ports": len(s.ports), "packets": s.packets, "bytes": s.bytes}
+                               for s in self.sessions}}
+        if self.ring is not None:
+            result["ring"] = {"slots": self.ring.slots, "slot_size": self.ring.slot_size,
+                              "path": self.ring.path, "written": self.ring.write_seq,
+                              "overwritten": self.ring.dropped}
+        return result
+
+
+def wall_offset():
+    """Seconds to add to time.monotonic() stamps to get wall-clock time"""
+    return time.time() - time.monotonic()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+NateOS hierarchical timer wheel
+Schedules integer keys at a deadline; advancing costs O(ticks + fired)
+
+Level 0 has `slots` buckets of one tick each, level 1 has `slots` buckets
+of `slots` ticks each, and so on. Entries further out than the top level
+wait in an overflow list that is re-examined whenever the top level wraps.
+Cancellation is lazy: callers keep their own notion of the current
+deadline and ignore stale firings, which keeps refreshes O(1).
+"""
+
+
+class TimerWheel:
+    """Hierarchical timing wheel keyed on integer ticks"""
+
+    def __init__(self, tick=1.0, slots=64, levels=4, now=0.0):
+        if slots & (slots - 1):
+            raise ValueError("slots must be a power of two")
+        self.tick = tick
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        self._levels = levels
+        self._wheels = [[[] for _ in range(slots)] for _ in range(levels)]
+        self._overflow = []
+        self._current = self.to_tick(now)
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    @property
+    def current(self):
+        """Last processed tick"""
+        return self._current
+
+    def to_tick(self, when):
+        """Convert a time in seconds to a wheel tick (rounded up)"""
+        return -int(-when // self.tick)
+
+    def schedule(self, key, when):
+        """Fire key at time `when` (seconds); returns the tick it will fire on"""
+        tick = max(self.to_tick(when), self._current + 1)
+        self._place(tick, key)
+        self._count += 1
+        return tick
+
+    def _place(self, tick, key):
+        delta = tick - self._current
+        bits = self._bits
+        for level in range(self._levels):
+            if delta < (1 << (bits * (level + 1))):
+                self._wheels[level][(tick >> (bits * level)) & self._mask].append((tick, key))
+                return
+        self._overflow.append((tick, key))
+
+    def advance(self, now):
+        """Advance to time `now` and return the list of (tick, key) that fired"""
+        target = int(now // self.tick)
+        fired = []
+        wheels = self._wheels
+        bits, mask = self._bits, self._mask
+        while self._current < target:
+            self._current += 1
+            current = self._current
+            # Find the highest level whose bucket boundary we just crossed,
+            # then cascade from the top down so entries settle in one pass
+            top = 0
+            while top + 1 < self._levels and (current & ((1 << (bits * (top + 1))) - 1)) == 0:
+                top += 1
+            if (self._overflow and top == self._levels - 1
+                    and (current & ((1 << (bits * self._levels)) - 1)) == 0):
+                overflow, self._overflow = self._overflow, []
+                for tick, key in overflow:
+                    self._place(max(tick, current), key)
+            for level in range(top, 0, -1):
+                index = (current >> (bits * level)) & mask
+                bucket = wheels[level][index]
+                if bucket:
+                    wheels[level][index] = []
+                    for tick, key in bucket:
+                        self._place(max(tick, current), key)
+            slot = current & mask
+            bucket = wheels[0][slot]
+            if bucket:
+                wheels[0][slot] = []
+                fired.extend(bucket)
+                self._count -= len(bucket)
+            if not self._count:
+                # Nothing pending: jump straight to the target
+                self._current = target
+                break
+        return fired
+
+    def clear(self):
+        for wheel in self._wheels:
+            for i in range(len(wheel)):
+                wheel[i] = []
+        self._overflow = []
+        self._count = 0
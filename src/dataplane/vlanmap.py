@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+NateOS VLAN membership
+Per-port VLAN bitmaps and per-VLAN port bitmaps, kept in sync
+
+Each port has a 4096-bit VLAN bitmap (a Python int, 64 machine words),
+and each VLAN has a port bitmap with one bit per port. "Which VLANs does
+trunk Y carry" is one list index, and "which ports are in VLAN X" is
+another; both return a bitmap. Range edits such as "allowed vlan add
+100-3999" are a single OR / AND-NOT on the port's bitmap. Only the VLANs
+whose membership actually changed are then updated in the transposed
+per-VLAN table, one run of consecutive VLANs at a time.
+
+VLAN lists serialize as compact range text ("1,10-20,100-3999") for the
+config, or as a 512-byte big-endian bitmap (to_bytes / from_bytes).
+"""
+import re
+
+MAX_VLAN = 4094
+VLAN_BITS = 4096
+VLAN_BYTES = VLAN_BITS // 8
+ALL_VLANS = ((1 << (MAX_VLAN + 1)) - 1) & ~1   # VLANs 1-4094
+MODES = ("access", "trunk")
+
+_RUNS = re.compile("1+")
+
+
+def vlan_range(lo, hi):
+    """Bitmap of VLANs lo..hi inclusive"""
+    if not 1 <= lo <= hi <= MAX_VLAN:
+        raise ValueError(f"invalid VLAN range {lo}-{hi}")
+    return (1 << (hi + 1)) - (1 << lo)
+
+
+def parse_vlans(spec):
+    """VLAN bitmap from "10,100-199", "all", "none", an int id or a list of ids/ranges"""
+    if spec is None:
+        return 0
+    if isinstance(spec, bool):
+        raise ValueError(f"invalid VLAN list {spec!r}")
+    if isinstance(spec, int):
+        return vlan_range(spec, spec)
+    if isinstance(spec, (list, tuple)):
+        bitmap = 0
+        for item in spec:
+            bitmap |= parse_vlans(item)
+        return bitmap
+    text = str(spec).strip().lower()
+    if text == "all":
+        return ALL_VLANS
+    if text in ("", "none"):
+        return 0
+    bitmap = 0
+    for part in text.replace(" ", "").split(","):
+        lo, sep, hi = part.partition("-")
+        try:
+            lo = int(lo)
+            hi = int(hi) if sep else lo
+        except ValueError:
+            raise ValueError(f"invalid VLAN range '{part}'")
+        bitmap |= vlan_range(lo, hi)
+    return bitmap
+
+
+def runs(bitmap):
+    """(first, last) of each run of consecutive set bits, ascending"""
+    text = bin(bitmap)[:1:-1]  # bit 0 first
+    return [(m.start(), m.end() - 1) for m in _RUNS.finditer(text)]
+
+
+def format_vlans(bitmap):
+    """Compact range text for a VLAN bitmap, e.g. "1,10-20" """
+    return ",".join(str(lo) if lo == hi else f"{lo}-{hi}" for lo, hi in runs(bitmap))
+
+
+def members(bitmap):
+    """Set VLAN ids, ascending (walks runs: cheap for dense range-heavy bitmaps)"""
+    return [i for lo, hi in runs(bitmap) for i in range(lo, hi + 1)]
+
+
+def positions(bitmap):
+    """Set bit positions, ascending (one pass over the bits: cheap for short port bitmaps)"""
+    return [i for i, c in enumerate(bin(bitmap)[:1:-1]) if c == "1"]
+
+
+def to_bytes(bitmap):
+    return bitmap.to_bytes(VLAN_BYTES, "big")
+
+
+def from_bytes(data):
+    if len(data) != VLAN_BYTES:
+        raise ValueError(f"VLAN bitmap must be {VLAN_BYTES} bytes")
+    return int.from_bytes(data, "big") & ALL_VLANS
+
+
+class VlanMembership:
+    """Port <-> VLAN membership as two synchronized bitmap tables"""
+
+    def __init__(self):
+        self._bit = {}                          # port name -> bit position
+        self._names = []                        # bit position -> port name (None = free)
+        self._free = []
+        self.port_vlans = []                    # bit -> VLAN bitmap (tagged and untagged)
+        self.native = []                        # bit -> untagged VLAN (0 = none)
+        self._pvid = []                         # bit -> configured native VLAN, even while disallowed
+        self.modes = []
+        self.vlan_ports = [0] * VLAN_BITS       # VLAN -> port bitmap
+        self.untagged_ports = [0] * VLAN_BITS   # VLAN -> ports sending it untagged
+        self.version = 0
+
+    def __len__(self):
+        return len(self._bit)
+
+    def __contains__(self, port):
+        return port in self._bit
+
+    def _port(self, name):
+        bit = self._bit.get(name)
+        if bit is None:
+            if self._free:
+                bit = self._free.pop()
+                self._names[bit] = name
+                self.port_vlans[bit] = self.native[bit] = self._pvid[bit] = 0
+                self.modes[bit] = "access"
+            else:
+                bit = len(self._names)
+                self._names.append(name)
+                self.port_vlans.append(0)
+                self.native.append(0)
+                self._pvid.append(0)
+                self.modes.append("access")
+            self._bit[name] = bit
+        return bit
+
+    def _apply(self, bit, vlans, native):
+        """Move port bit to a new VLAN bitmap and untagged VLAN, touching only changed VLANs"""
+        changed = self.port_vlans[bit] ^ vlans
+        if changed:
+            vlan_ports = self.vlan_ports
+            mask = 1 << bit
+            for lo, hi in runs(changed):
+                for vlan in range(lo, hi + 1):
+                    vlan_ports[vlan] ^= mask
+            self.port_vlans[bit] = vlans
+        old = self.native[bit]
+        if old != native:
+            if old:
+                self.untagged_ports[old] &= ~(1 << bit)
+            if native:
+                self.untagged_ports[native] |= 1 << bit
+            self.native[bit] = native
+        if changed or old != native:
+            self.version += 1
+        return changed
+
+    # -------- Edits --------
+    def set_access(self, port, vlan):
+        """Untagged member of one VLAN"""
+        vlans = vlan_range(vlan, vlan)
+        bit = self._port(port)
+        self.modes[bit] = "access"
+        self._pvid[bit] = vlan
+        return self._apply(bit, vlans, vlan)
+
+    def set_trunk(self, port, allowed=ALL_VLANS, native=1):
+        """Tagged member of every VLAN in allowed; native (if allowed) goes untagged"""
+        if native and not 1 <= native <= MAX_VLAN:
+            raise ValueError(f"invalid native VLAN {native}")
+        allowed &= ALL_VLANS
+        bit = self._port(port)
+        self.modes[bit] = "trunk"
+        self._pvid[bit] = native
+        return self._apply(bit, allowed, native if native and allowed >> native & 1 else 0)
+
+    def allow(self, port, vlans):
+        """"allowed vlan add": OR a VLAN bitmap into a trunk"""
+        bit = self._trunk(port)
+        allowed = self.port_vlans[bit] | (vlans & ALL_VLANS)
+        return self._apply(bit, allowed, self._native_for(bit, allowed))
+
+    def disallow(self, port, vlans):
+        """"allowed vlan remove": AND-NOT a VLAN bitmap out of a trunk"""
+        bit = self._trunk(port)
+        allowed = self.port_vlans[bit] & ~vlans
+        return self._apply(bit, allowed, self._native_for(bit, allowed))
+
+    def _trunk(self, port):
+        bit = self._bit.get(port)
+        if bit is None or self.modes[bit] != "trunk":
+            raise ValueError(f"{port} is not a trunk port")
+        return bit
+
+    def _native_for(self, bit, allowed):
+        native = self._pvid[bit]
+        return native if native and allowed >> native & 1 else 0
+
+    def remove(self, port):
+        bit = self._bit.get(port)
+        if bit is None:
+            return False
+        self._apply(bit, 0, 0)
+        del self._bit[port]
+        self._names[bit] = None
+        self._free.append(bit)
+        return True
+
+    def configure(self, port, config):
+        """Apply an interfaces.<port> config: {"mode", "vlan", "allowed_vlans"}; raises ValueError"""
+        mode = config.get("mode") or "access"
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        vlan = config.get("vlan")
+        if vlan is not None and (isinstance(vlan, bool) or not isinstance(vlan, int) or not 1 <= vlan <= MAX_VLAN):
+            raise ValueError(f"vlan must be 1-{MAX_VLAN}")
+        if mode == "access":
+            return self.set_access(port, vlan or 1)
+        allowed = config.get("allowed_vlans", "all")
+        return self.set_trunk(port, parse_vlans(allowed), vlan or 1)
+
+    # -------- Queries --------
+    def ports_bitmap(self, vlan):
+        """Port bitmap of VLAN: O(1)"""
+        return self.vlan_ports[vlan]
+
+    def vlans_bitmap(self, port):
+        """VLAN bitmap of port: O(1)"""
+        bit = self._bit.get(port)
+        return 0 if bit is None else self.port_vlans[bit]
+
+    def is_member(self, port, vlan):
+        bit = self._bit.get(port)
+        return bit is not None and bool(self.port_vlans[bit] >> vlan & 1)
+
+    def ports(self, vlan):
+        """Port names in VLAN, in port-creation order"""
+        names = self._names
+        return [names[bit] for bit in positions(self.vlan_ports[vlan])]
+
+    def untagged(self, vlan):
+        names = self._names
+        return [names[bit] for bit in positions(self.untagged_ports[vlan])]
+
+    def vlans(self, port):
+        return members(self.vlans_bitmap(port))
+
+    def describe(self, port):
+        bit = self._bit.get(port)
+        if bit is None:
+            return None
+        vlans = self.port_vlans[bit]
+        return {
+            "interface": port,
+            "mode": self.modes[bit],
+            "native_vlan": self.native[bit] or None,
+            "vlans": format_vlans(vlans),
+            "count": bin(vlans).count("1"),
+        }
+
+    def stats(self):
+        return {
+            "ports": len(self._bit),
+            "vlans_in_use": sum(1 for ports in self.vlan_ports if ports),
+            "memberships": sum(bin(v).count("1") for v in self.port_vlans),
+        }
@@ -0,0 +1,4 @@
+"""
+NateOS management plane
+Config datastore shared by the web API, desktop app and CLI
+"""
@@ -1,21 +1,500 @@
 #!/usr/bin/env python3
-import argparse
+"""
+NateOS CLI (nateos-cli)
+Interactive shell, one-shot command or script runner over one persistent
+keep-alive connection to the management API.
 
+  show interfaces|vlans|routes [sort FIELD] [| match TEXT] [| count]
+  show <name or API path> [| match TEXT]
+  set <path> <json> | set <path> key=value ...   stage a set (JSON) or merge (key=value)
+  append <path> <json> | append <path> key=value ...
+  delete <path>
+  compare | commit [comment] | discard
 
-def main():
-    parser = argparse.ArgumentParser(prog="nateos-cli", description="NateOS CLI (stub)")
-    sub = parser.add_subparsers(dest="cmd")
+Staged edits are sent to /api/batch as one atomic batch, so a script of set
+lines ending in commit is one request and one datastore commit. Reads are
+pipelined: a run of show lines is written to the socket before the first
+reply is read, and the big tables are fetched page by page (filtered and
+sorted server-side) with a few pages requested ahead of the one printing.
+
+Startup matters (automation runs one process per command too), so only
+cheap modules are imported here: replies are parsed in Session rather than
+by http.client (whose email imports cost more than the rest of the CLI),
+and argparse, shlex and readline load on demand.
+
+Usage: python src/mgmt/cli/cli.py [--url http://localhost:8080] [-f SCRIPT] [-k] [command ...]
+"""
+import json
+import os
+import select
+import socket
+import sys
+from collections import deque
+from urllib.parse import urlencode, urlsplit
+
+API_URL = os.environ.get("NATEOS_API", "http://localhost:8080")
+API_PREFIX = "/api"
+TIMEOUT = 30.0
+MAX_LINE = 65536
+PAGE = 1000
+PIPELINE_DEPTH = 4
+
+# Streamed tables: API path, (column, width)s
+TABLES = {
+    "interfaces": ("/l2/interfaces", (("name", 10), ("mode", 8), ("vlan", 6), ("allowed_vlans", 20))),
+    "vlans": ("/l2/vlans", (("vlan_id", 7), ("name", 32))),
+    "routes": ("/l3/static-routes", (("destination", 20), ("gateway", 16), ("interface", 10), ("distance", 8),
+                                     ("vrf", 10), ("id", 16))),
+}
+# show <name> -> API path for everything else
+SHOW = {
+    "config": "/config",
+    "versions": "/config/versions",
+    "stp": "/l2/stp/state",
+    "lacp": "/l2/lacp/state",
+    "lldp": "/l2/lldp",
+    "igmp-snooping": "/l2/igmp-snooping/groups",
+    "fdb": "/l2/fdb",
+    "neighbors": "/l3/neighbors",
+    "next-hop-groups": "/l3/next-hop-groups",
+    "ospf": "/l3/ospf",
+    "bgp": "/l3/bgp",
+    "vrrp": "/l3/vrrp",
+    "qos": "/mgmt/qos",
+    "acl": "/mgmt/acl",
+    "span": "/mgmt/span",
+    "system": "/mgmt/system",
+    "aaa": "/mgmt/aaa",
+    "health": "/health",
+}
+EDIT_OPS = ("set", "append", "delete")
+
+
+class CliError(Exception):
+    pass
+
+
+class Session:
+    """One keep-alive HTTP/1.1 connection with request pipelining
+
+    send() writes a request without waiting for earlier replies; receive()
+    reads replies back in order. call() is the two back to back.
+    """
+
+    def __init__(self, url=API_URL, timeout=TIMEOUT):
+        parts = urlsplit(url if "//" in url else f"http://{url}")
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip("/") or API_PREFIX
+        self.timeout = timeout
+        self.sock = None
+        self._file = None
+        self._inflight = deque()
+        self.stats = {"connects": 0, "requests": 0}
+
+    def _connect(self):
+        self.sock = socket.create_connection((self.host, self.port), self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self.sock.makefile("rb")
+        self.stats["connects"] += 1
+
+    def _stale(self):
+        # An idle keep-alive socket the server has closed reads as ready (EOF)
+        return not self._inflight and bool(select.select([self.sock], [], [], 0)[0])
+
+    def send(self, method, path, payload=None):
+        if self.sock is None or self._stale():
+            self.close()
+            self._connect()
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        head = [f"{method} {self.prefix}{path} HTTP/1.1", f"Host: {self.host}:{self.port}",
+                f"Content-Length: {len(body)}"]
+        if payload is not None:
+            head.append("Content-Type: application/json")
+        self.sock.sendall(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+        self._inflight.append(method)
+        self.stats["requests"] += 1
+
+    def receive(self):
+        """(status, decoded JSON body) of the oldest request still waiting"""
+        self._inflight.popleft()
+        try:
+            status, close, data = self._read_reply()
+        except (OSError, ValueError) as e:
+            self.close()
+            raise CliError(f"connection to {self.host}:{self.port} lost: {e or 'closed'}")
+        if close:
+            self.close()
+        try:
+            value = json.loads(data) if data else None
+        except ValueError:
+            value = data.decode("utf-8", "replace")
+        return status, value
+
+    def _read_reply(self):
+        fp = self._file
+        line = fp.readline(MAX_LINE)
+        if not line:
+            raise ValueError("")
+        version, status = line.split(None, 2)[:2]
+        status = int(status)
+        length, chunked, close = None, False, version == b"HTTP/1.0"
+        while True:
+            line = fp.readline(MAX_LINE)
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.partition(b":")
+            name = name.strip().lower()
+            if name == b"content-length":
+                length = int(value)
+            elif name == b"transfer-encoding":
+                chunked = b"chunked" in value.lower()
+            elif name == b"connection":
+                close = value.strip().lower() == b"close"
+        if status in (204, 304) or status < 200:
+            return status, close, b""
+        if chunked:
+            parts = []
+            while True:
+                size = int(fp.readline(MAX_LINE).split(b";")[0], 16)
+                if not size:
+                    while fp.readline(MAX_LINE) not in (b"\r\n", b"\n", b""):
+                        pass
+                    break
+                parts.append(fp.read(size))
+                fp.readline(MAX_LINE)
+            return status, close, b"".join(parts)
+        if length is None:
+            return status, True, fp.read()
+        data = fp.read(length)
+        if len(data) < length:
+            raise ValueError("reply cut short")
+        return status, close, data
+
+    def call(self, method, path, payload=None):
+        self.send(method, path, payload)
+        return _checked(*self.receive())
+
+    def close(self):
+        if self.sock is not None:
+            self._file.close()
+            self.sock.close()
+        self.sock = None
+        self._inflight.clear()
+
+
+def _checked(status, value):
+    if status >= 400:
+        detail = value.get("error", value) if isinstance(value, dict) else value
+        raise CliError(f"{status}: {detail}")
+    return value
+
+
+def _parse_value(text):
+    """JSON if it parses, key=value pairs as an object, else the bare string"""
+    text = text.strip()
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    first = text.split(None, 1)[0] if text else ""
+    if "=" not in first:
+        return text
+    import shlex
+    value = {}
+    for pair in shlex.split(text):
+        key, sep, raw = pair.partition("=")
+        if not sep:
+            raise CliError(f"expected key=value, got '{pair}'")
+        try:
+            value[key] = json.loads(raw)
+        except ValueError:
+            value[key] = raw
+    return value
 
-    sub.add_parser("show", help="Show system state (stub)")
-    sub.add_parser("conf", help="Enter configuration mode (stub)")
 
+class Shell:
+    """Parses and runs CLI lines against a Session, writing to out"""
+
+    def __init__(self, session, out=sys.stdout):
+        self.session = session
+        self.out = out
+        self.pending = []
+
+    # -------- Lines --------
+    def run(self, lines, keep_going=False):
+        """Run lines in order, pipelining each run of single-request reads; returns the error count"""
+        errors = 0
+        reads = []
+        for number, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            try:
+                step = self.plan(line)
+            except CliError as e:
+                step = e
+            if isinstance(step, tuple):
+                reads.append((number, step))
+                continue
+            errors += self._flush(reads, keep_going)
+            reads = []
+            if errors and not keep_going:
+                return errors
+            try:
+                if isinstance(step, CliError):
+                    raise step
+                step()
+            except CliError as e:
+                self.error(number, e)
+                errors += 1
+                if not keep_going:
+                    return errors
+        return errors + self._flush(reads, keep_going)
+
+    def _flush(self, reads, keep_going):
+        """Send every queued read, then print the replies as they come back in order"""
+        if not reads:
+            return 0
+        for _, (path, _) in reads:
+            self.session.send("GET", path)
+        errors = 0
+        for number, (_, render) in reads:
+            status, value = self.session.receive()
+            if errors and not keep_going:
+                continue
+            try:
+                render(_checked(status, value))
+            except CliError as e:
+                self.error(number, e)
+                errors += 1
+        return errors
+
+    def error(self, number, e):
+        self.out.flush()
+        sys.stderr.write(f"error (line {number}): {e}\n" if number else f"error: {e}\n")
+
+    def plan(self, line):
+        """A (GET path, render) tuple for single-request reads, else a callable to run in turn"""
+        command, pipes = line, []
+        if " | " in line:
+            command, *pipes = [part.strip() for part in line.split(" | ")]
+        words = command.split(None, 2)
+        verb = words[0].lower()
+        if verb == "show":
+            return self._plan_show(words[1:], pipes)
+        if pipes:
+            raise CliError("'|' only applies to show")
+        if verb in EDIT_OPS:
+            return lambda: self.stage(verb, words[1:])
+        if verb == "compare":
+            return self.compare
+        if verb == "commit":
+            comment = command.split(None, 1)[1] if len(words) > 1 else ""
+            return lambda: self.commit(comment)
+        if verb in ("discard", "rollback"):
+            return self.discard
+        if verb in ("help", "?"):
+            return lambda: self.write(__doc__.split("\n\n")[1] + "\n")
+        raise CliError(f"unknown command '{verb}' (try help)")
+
+    def _plan_show(self, args, pipes):
+        if not args:
+            raise CliError("show what? (" + ", ".join(list(TABLES) + list(SHOW)) + ")")
+        name = args[0]
+        match = count = None
+        for pipe in pipes:
+            op, _, arg = pipe.partition(" ")
+            if op == "match" and arg:
+                match = arg.strip().strip('"').lower()
+            elif op == "count":
+                count = True
+            else:
+                raise CliError(f"unknown pipe '{pipe}' (match TEXT, count)")
+        if name == "compare":
+            return self.compare
+        if name in TABLES:
+            rest = " ".join(args[1:]).split()
+            sort = None
+            if rest[:1] == ["sort"] and len(rest) == 2:
+                sort = rest[1]
+            elif rest:
+                raise CliError(f"show {name} [sort FIELD] [| match TEXT] [| count]")
+            return lambda: self.show_table(name, sort, match, count)
+        path = SHOW.get(name)
+        if path is None:
+            if "/" not in name:
+                raise CliError(f"unknown table '{name}'")
+            path = "/" + name.strip("/")
+        return path, lambda value: self.show_value(value, match, count)
+
+    # -------- Output --------
+    def write(self, text):
+        self.out.write(text)
+
+    def show_value(self, value, match=None, count=None):
+        lines = json.dumps(value, indent=2, sort_keys=True).splitlines()
+        if match:
+            lines = [line for line in lines if match in line.lower()]
+        self.write(f"{len(lines)}\n" if count else "\n".join(lines) + "\n")
+
+    def show_table(self, name, sort=None, match=None, count=None):
+        """Print a table page by page as pages land, keeping PIPELINE_DEPTH requests ahead
+
+        match and sort run server-side (the table's filter/sort args), so only
+        matching rows cross the wire.
+        """
+        path, columns = TABLES[name]
+        args = {}
+        if sort:
+            args["sort"] = sort
+        if match:
+            args["filter"] = match
+
+        def page_path(offset, limit=PAGE):
+            return f"{path}?{urlencode(dict(args, offset=offset, limit=limit))}"
+
+        session = self.session
+        if count:
+            self.write(f"{session.call('GET', page_path(0, 1))['total']}\n")
+            return
+        line = "  ".join(f"{{{i}:<{width}}}" for i, (_, width) in enumerate(columns))
+        fields = [field for field, _ in columns]
+        self.write(line.format(*[field.upper() for field in fields]).rstrip() + "\n")
+        page = session.call("GET", page_path(0))
+        total = page["total"]
+        offsets = deque(range(PAGE, total, PAGE))
+        waiting = 0
+        try:
+            while True:
+                # Ask for the next pages before formatting this one, so the server works meanwhile
+                while offsets and waiting < PIPELINE_DEPTH:
+                    session.send("GET", page_path(offsets.popleft()))
+                    waiting += 1
+                self.write("".join(line.format(*["-" if row.get(field) is None else row[field] for field in fields])
+                                   .rstrip() + "\n" for row in page["entries"]))
+                self.out.flush()
+                if not waiting:
+                    break
+                page = _checked(*session.receive())
+                waiting -= 1
+        except CliError:
+            # Replies still queued behind the failed one would answer the next command
+            session.close()
+            raise
+        self.write(f"{total} {name}\n")
+
+    # -------- Edits --------
+    def stage(self, op, args):
+        if not args:
+            raise CliError(f"{op} <path>{'' if op == 'delete' else ' <value>'}")
+        item = {"op": op, "path": args[0]}
+        if op != "delete":
+            if len(args) < 2:
+                raise CliError(f"{op} {args[0]} needs a value (JSON or key=value ...)")
+            item["value"] = _parse_value(args[1])
+            # key=value pairs edit only those leaves
+            if op == "set" and isinstance(item["value"], dict) and not args[1].lstrip().startswith("{"):
+                item["op"] = "merge"
+        elif len(args) > 1:
+            raise CliError("delete takes only a path")
+        self.pending.append(item)
+
+    def compare(self):
+        for item in self.pending:
+            value = "" if item["op"] == "delete" else " " + json.dumps(item["value"])
+            self.write(f"{item['op']} {item['path']}{value}\n")
+        self.write(f"{len(self.pending)} staged edit(s)\n")
+
+    def commit(self, comment=""):
+        """Apply every staged edit in one atomic /api/batch (one transaction, one commit)"""
+        if not self.pending:
+            self.write("nothing to commit\n")
+            return
+        body = {"operations": self.pending, "atomic": True, "comment": comment or "nateos-cli"}
+        self.session.send("POST", "/batch", body)
+        status, value = self.session.receive()
+        if status == 400 and isinstance(value, dict) and "results" in value:
+            failed = [r for r in value["results"] if r["status"] == "error"]
+            for result in failed:
+                item = self.pending[result["index"]]
+                self.write(f"  {item['op']} {item['path']}: {result['error']}\n")
+            raise CliError(f"commit rejected: {len(failed)} invalid edit(s), nothing applied")
+        _checked(status, value)
+        self.pending = []
+        self.write(f"committed version {value['version']} ({value['edits']} edits)\n")
+
+    def discard(self):
+        self.write(f"discarded {len(self.pending)} staged edit(s)\n")
+        self.pending = []
+
+
+def interactive(shell):
+    try:
+        import readline  # noqa: F401  (line editing and history for input())
+    except ImportError:
+        pass
+    while True:
+        prompt = "nateos(edit)# " if shell.pending else "nateos> "
+        try:
+            line = input(prompt)
+        except EOFError:
+            shell.write("\n")
+            break
+        except KeyboardInterrupt:
+            shell.write("\n")
+            continue
+        if line.strip() in ("exit", "quit"):
+            break
+        try:
+            shell.run([line], keep_going=True)
+        except KeyboardInterrupt:
+            # The rest of an interrupted stream is still on the socket
+            shell.session.close()
+            shell.write("\n")
+        shell.out.flush()
+    if shell.pending:
+        shell.write(f"exiting with {len(shell.pending)} uncommitted edit(s) discarded\n")
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(prog="nateos-cli", description="NateOS CLI")
+    parser.add_argument("--url", default=API_URL, help="management API (default $NATEOS_API or %(default)s)")
+    parser.add_argument("-f", "--file", help="run a script of CLI lines ('-' for stdin)")
+    parser.add_argument("-k", "--keep-going", action="store_true", help="in scripts, continue after an error")
+    parser.add_argument("command", nargs=argparse.REMAINDER, help="one command to run, e.g. show vlans")
     args = parser.parse_args()
-    if args.cmd == "show":
-        print("(stub) show: interfaces, vlans, routes, neighbors")
-    elif args.cmd == "conf":
-        print("(stub) configuration mode: set system ... commit")
-    else:
-        parser.print_help()
+
+    shell = Shell(Session(args.url))
+    try:
+        if args.command or args.file or not sys.stdin.isatty():
+            if args.command:
+                errors = shell.run([" ".join(args.command)])
+            else:
+                stream = sys.stdin if args.file in (None, "-") else open(args.file)
+                with stream:
+                    errors = shell.run(stream, args.keep_going)
+            if shell.pending:
+                sys.stderr.write(f"{len(shell.pending)} edit(s) staged without commit were not applied\n")
+                errors += 1
+        else:
+            interactive(shell)
+            errors = 0
+        sys.stdout.flush()
+    except BrokenPipeError:
+        # Output piped into head and the like: stop quietly
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        errors = 0
+    except OSError as e:
+        sys.stderr.write(f"error: cannot reach NateOS API at {args.url}: {e}\n")
+        errors = 1
+    except CliError as e:
+        shell.error(None, e)
+        errors = 1
+    finally:
+        shell.session.close()
+    sys.exit(1 if errors else 0)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,369 @@
+#!/usr/bin/env python3
+"""
+NateOS configuration datastore
+Candidate/running config with versioned commits and O(delta) diffs
+
+The running config is an immutable tree of PMaps (dicts) and tuples
+(lists). A transaction edits a private candidate tree by path copying, so
+each edit costs O(depth * log32 n) and never touches shared state. Commit
+publishes the candidate as the new running root under a lock; every
+committed root is kept (sharing all untouched nodes with its neighbours),
+which makes snapshots free and lets `diff` walk only the changed subtrees.
+
+A transaction whose base is no longer the head is rebased: its edits are
+replayed on the new head, unless a commit since its base changed a path
+that one of its edits writes (or a parent or child of one), in which case
+commit raises CommitConflict and nothing is applied.
+"""
+import threading
+import time
+from collections import deque
+
+from mgmt.pmap import EMPTY, MISSING, PMap, freeze, thaw
+
+DEFAULT_HISTORY = 1024
+
+
+class DatastoreError(Exception):
+    """Base class for datastore errors; `status` is the matching HTTP code"""
+    status = 409
+
+
+class VersionNotFound(DatastoreError):
+    status = 404
+
+
+class TransactionClosed(DatastoreError):
+    status = 409
+
+
+class CommitConflict(DatastoreError):
+    status = 409
+
+
+def get_in(root, path, default=None):
+    """Read the value at path (a tuple of keys/list indexes)"""
+    node = root
+    for key in path:
+        if isinstance(node, PMap):
+            node = node.get(key, MISSING)
+        elif isinstance(node, tuple) and isinstance(key, int) and -len(node) <= key < len(node):
+            node = node[key]
+        else:
+            return default
+        if node is MISSING:
+            return default
+    return node
+
+
+def set_in(root, path, value):
+    """Return a copy of root with path bound to value, creating maps as needed"""
+    if not path:
+        return value
+    key, rest = path[0], path[1:]
+    if isinstance(root, tuple) and isinstance(key, int):
+        items = list(root)
+        items[key] = set_in(items[key], rest, value)
+        return tuple(items)
+    if not isinstance(root, PMap):
+        root = EMPTY
+    return root.set(key, set_in(root.get(key, EMPTY), rest, value))
+
+
+def delete_in(root, path):
+    """Return a copy of root with path removed (unchanged if absent)"""
+    key, rest = path[0], path[1:]
+    if isinstance(root, tuple) and isinstance(key, int):
+        if not -len(root) <= key < len(root):
+            return root
+        items = list(root)
+        if rest:
+            items[key] = delete_in(items[key], rest)
+        else:
+            del items[key]
+        return tuple(items)
+    if not isinstance(root, PMap) or key not in root:
+        return root
+    if not rest:
+        return root.delete(key)
+    return root.set(key, delete_in(root[key], rest))
+
+
+def diff_trees(old, new, prefix=()):
+    """List (path, old, new) leaf changes between two trees; shared subtrees are skipped"""
+    if old is new:
+        return []
+    if not (isinstance(old, PMap) and isinstance(new, PMap)):
+        return [] if old == new else [(prefix, old, new)]
+    changes = []
+    for key, a, b in old.diff(new):
+        if isinstance(a, PMap) and isinstance(b, PMap):
+            changes.extend(diff_trees(a, b, prefix + (key,)))
+        else:
+            changes.append((prefix + (key,), a, b))
+    return changes
+
+
+class Commit:
+    """One committed version of the running config"""
+    __slots__ = ("version", "root", "parent", "timestamp", "comment", "_changes")
+
+    def __init__(self, version, root, parent, comment=""):
+        self.version = version
+        self.root = root
+        self.parent = parent
+        self.timestamp = time.time()
+        self.comment = comment
+        self._changes = None
+
+    @property
+    def changes(self):
+        """Leaf changes relative to the previous version (computed lazily)"""
+        if self._changes is None:
+            self._changes = diff_trees(self.parent, self.root) if self.parent is not None else []
+        return self._changes
+
+    @property
+    def sections(self):
+        return sorted({path[0] for path, _, _ in self.changes if path})
+
+    def summary(self):
+        return {
+            "version": self.version,
+            "timestamp": self.timestamp,
+            "comment": self.comment,
+            "sections": self.sections,
+            "changes": len(self.changes),
+        }
+
+
+class Transaction:
+    """Private candidate config; edits are recorded so commit can rebase them"""
+
+    def __init__(self, store, comment=""):
+        self.store = store
+        self.comment = comment
+        self.base_version = store.version
+        self.candidate = store.running
+        self.closed = False
+        self._ops = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.closed:
+            return False
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+        return False
+
+    def _check(self):
+        if self.closed:
+            raise TransactionClosed("transaction already closed")
+
+    def get(self, path, default=None):
+        return get_in(self.candidate, path, default)
+
+    def set(self, path, value):
+        self._check()
+        self._apply(("set", tuple(path), freeze(value)))
+
+    def merge(self, path, mapping):
+        """Shallow-merge mapping into the map at path (dict.update semantics)"""
+        self._check()
+        self._apply(("merge", tuple(path), freeze(dict(mapping))))
+
+    def append(self, path, value):
+        self._check()
+        self._apply(("append", tuple(path), freeze(value)))
+
+    def delete(self, path):
+        """Remove path; returns True if it existed in the candidate"""
+        self._check()
+        existed = get_in(self.candidate, path, MISSING) is not MISSING
+        if existed:
+            self._apply(("delete", tuple(path), None))
+        return existed
+
+    def _apply(self, op):
+        self.candidate = apply_op(self.candidate, op)
+        self._ops.append(op)
+
+    @property
+    def ops(self):
+        return list(self._ops)
+
+    def changes(self):
+        """Leaf changes this transaction would make against its base"""
+        return diff_trees(self.store.snapshot(self.base_version), self.candidate)
+
+    def commit(self):
+        self._check()
+        try:
+            commit = self.store._commit(self)
+        except CommitConflict:
+            self.rollback()  # replaying on the new head would not help either
+            raise
+        self.closed = True
+        return commit
+
+    def rollback(self):
+        self.closed = True
+        self._ops = []
+
+
+def apply_op(root, op):
+    """Apply one recorded edit to a tree and return the new tree"""
+    kind, path, value = op
+    if kind == "set":
+        return set_in(root, path, value)
+    if kind == "merge":
+        current = get_in(root, path, EMPTY)
+        if not isinstance(current, PMap):
+            current = EMPTY
+        return set_in(root, path, current.update(value))
+    if kind == "append":
+        current = get_in(root, path, ())
+        return set_in(root, path, (current if isinstance(current, tuple) else ()) + (value,))
+    if kind == "delete":
+        return delete_in(root, path)
+    raise ValueError(f"unknown op: {kind}")
+
+
+def op_paths(op):
+    """Paths an op writes: the keys a merge sets, else the op's own path"""
+    kind, path, value = op
+    if kind == "merge" and value:
+        return [path + (key,) for key in value.keys()]
+    return [path]
+
+
+class Datastore:
+    """Versioned running config with transactional candidates"""
+
+    def __init__(self, initial=None, history=DEFAULT_HISTORY, version=0):
+        self._lock = threading.RLock()
+        self._commits = deque([Commit(version, freeze(initial or {}), None, "initial")], maxlen=history)
+        self._hooks = []
+        self._log = None
+
+    def attach_log(self, log):
+        """Write every commit to log (see mgmt/persist.py) before publishing it
+
+        log.append(commit) runs under the store lock, so records are written
+        in commit order; log.sync(version) runs after the lock is released,
+        so concurrent committers can share one fsync.
+        """
+        self._log = log
+
+    @property
+    def running(self):
+        return self._commits[-1].root
+
+    @property
+    def version(self):
+        return self._commits[-1].version
+
+    @property
+    def head(self):
+        return self._commits[-1]
+
+    def get(self, path, default=None):
+        return get_in(self.running, path, default)
+
+    def begin(self, comment=""):
+        return Transaction(self, comment)
+
+    def subscribe(self, hook):
+        """Call hook(commit) after every commit, in commit order
+
+        Returns the head commit at registration, so the caller knows exactly
+        which version the first hook call follows.
+        """
+        with self._lock:
+            self._hooks.append(hook)
+            return self._commits[-1]
+
+    def _commit(self, txn):
+        with self._lock:
+            head = self._commits[-1]
+            if head.version == txn.base_version:
+                root = txn.candidate
+            else:
+                # Someone committed since begin(): replay our edits on top
+                self._check_rebase(txn)
+                root = head.root
+                for op in txn.ops:
+                    root = apply_op(root, op)
+            commit = self._publish(root, txn.comment)
+        return self._durable(commit)
+
+    def _check_rebase(self, txn):
+        """Raise CommitConflict if a commit since txn's base touched a path txn writes"""
+        oldest = self._commits[0].version
+        if txn.base_version < oldest:
+            raise CommitConflict(f"base version {txn.base_version} is no longer in history; begin again")
+        written, covered = set(), set()
+        for op in txn.ops:
+            for path in op_paths(op):
+                written.add(path)
+                covered.update(path[:i] for i in range(len(path) + 1))
+        for index in range(txn.base_version - oldest + 1, len(self._commits)):
+            commit = self._commits[index]
+            for path, _, _ in commit.changes:
+                # Same path, a parent of a written path, or inside one
+                if path in covered or any(path[:i] in written for i in range(len(path))):
+                    raise CommitConflict(f"'{'/'.join(map(str, path))}' was changed by version "
+                                         f"{commit.version} since this transaction began at "
+                                         f"{txn.base_version}")
+
+    def _durable(self, commit):
+        if self._log is not None:
+            self._log.sync(commit.version)
+        return commit
+
+    def _publish(self, root, comment):
+        head = self._commits[-1]
+        if root is head.root:
+            return head
+        commit = Commit(head.version + 1, root, head.root, comment)
+        if self._log is not None:
+            self._log.append(commit)
+        self._commits.append(commit)
+        for hook in self._hooks:
+            hook(commit)
+        return commit
+
+    def _find(self, version):
+        oldest = self._commits[0].version
+        if not oldest <= version <= self.version:
+            raise VersionNotFound(f"version {version} not available (have {oldest}..{self.version})")
+        return self._commits[version - oldest]
+
+    def snapshot(self, version):
+        """Root of the config as of version"""
+        return self._find(version).root
+
+    def diff(self, from_version, to_version=None):
+        """Leaf changes between two versions"""
+        to_version = self.version if to_version is None else to_version
+        return diff_trees(self.snapshot(from_version), self.snapshot(to_version))
+
+    def rollback_to(self, version, comment=None):
+        """Commit a new version whose content equals an earlier one"""
+        with self._lock:
+            root = self.snapshot(version)
+            commit = self._publish(root, comment or f"rollback to {version}")
+        return self._durable(commit)
+
+    def history(self, limit=None):
+        commits = list(self._commits)
+        if limit:
+            commits = commits[-limit:]
+        return [commit.summary() for commit in commits]
+
+    def to_dict(self, version=None):
+        return thaw(self.running if version is None else self.snapshot(version))
@@ -1,35 +1,35 @@
 #!/usr/bin/env python3
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
-import json
-import urllib.request
-import urllib.error
-
-API_BASE = "http://localhost:8080/api"
-
-def api_get(path):
-	with urllib.request.urlopen(f"{API_BASE}{path}") as resp:
-		return json.loads(resp.read().decode("utf-8"))
-
-
-def api_put(path, payload):
-	data = json.dumps(payload).encode("utf-8")
-	req = urllib.request.Request(f"{API_BASE}{path}", data=data, headers={"Content-Type": "application/json"}, method="PUT")
-	with urllib.request.urlopen(req) as resp:
-		return json.loads(resp.read().decode("utf-8"))
-
-
-def api_post(path, payload):
-	data = json.dumps(payload).encode("utf-8")
-	req = urllib.request.Request(f"{API_BASE}{path}", data=data, headers={"Content-Type": "application/json"}, method="POST")
-	with urllib.request.urlopen(req) as resp:
-		return json.loads(resp.read().decode("utf-8"))
-
-
-def api_delete(path):
-	req = urllib.request.Request(f"{API_BASE}{path}", method="DELETE")
-	with urllib.request.urlopen(req) as resp:
-		return json.loads(resp.read().decode("utf-8"))
+import http.client
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+	sys.path.insert(0, BASE_DIR)
+
+from client import API_BASE, ApiClient, ApiError
+from table import VirtualTable
+
+POLL_MS = 15
+# Datastore section -> API path; loaded in parallel and refreshed when /api/stream reports a change
+SECTIONS = {
+	"stp": "/l2/stp",
+	"lldp": "/l2/lldp",
+	"igmp_snooping": "/l2/igmp-snooping",
+	"ospf": "/l3/ospf",
+	"bgp": "/l3/bgp",
+	"system": "/mgmt/system",
+	"aaa": "/mgmt/aaa",
+}
+# Sections shown as VirtualTables (paged server-side): API path, (column, title)s, row id field
+TABLES = {
+	"interfaces": ("/l2/interfaces", [("name", "Name"), ("mode", "Mode"), ("vlan", "VLAN")], "name"),
+	"vlans": ("/l2/vlans", [("vlan_id", "VLAN"), ("name", "Name")], "vlan_id"),
+	"static_routes": ("/l3/static-routes", [("destination", "Destination"), ("gateway", "Gateway"),
+		("interface", "Interface"), ("distance", "Distance"), ("vrf", "VRF")], "id"),
+}
 
 
 class NateOSDesktop(tk.Tk):
@@ -37,8 +37,13 @@ class NateOSDesktop(tk.Tk):
 		super().__init__()
 		self.title("NateOS Network Configuration")
 		self.geometry("980x700")
+		self.api = ApiClient(API_BASE)
+		self.tables = {}
 		self._build_ui()
+		self.protocol("WM_DELETE_WINDOW", self._close)
+		self._poll()
 		self._load_all()
+		self.api.subscribe(dict(SECTIONS, **{name: t[0] for name, t in TABLES.items()}), self._changed)
 
 	def _build_ui(self):
 		top = ttk.Frame(self)
@@ -73,12 +78,18 @@ class NateOSDesktop(tk.Tk):
 		frm.pack(fill=tk.X, padx=6, pady=8)
 		return frm
 
+	def _table(self, parent, section, height=6):
+		path, columns, key = TABLES[section]
+		table = VirtualTable(parent, self.api, path, columns, key, height=height)
+		table.pack(fill=tk.X, padx=6, pady=6)
+		self.tables[section] = table
+		return table
+
 	# -------- L2 --------
 	def _build_tab_l2(self, parent):
 		# Interfaces
 		sec_if = self._section(parent, "Interfaces")
-		self.interfaces_list = tk.Listbox(sec_if, height=6)
-		self.interfaces_list.pack(fill=tk.X, padx=6, pady=6)
+		self.interfaces_table = self._table(sec_if, "interfaces")
 		btns_if = ttk.Frame(sec_if)
 		btns_if.pack(fill=tk.X, padx=6, pady=6)
 		ttk.Button(btns_if, text="Add", command=self._add_interface).pack(side=tk.LEFT)
@@ -86,8 +97,7 @@ class NateOSDesktop(tk.Tk):
 
 		# VLANs
 		sec_vlan = self._section(parent, "VLANs")
-		self.vlans_list = tk.Listbox(sec_vlan, height=6)
-		self.vlans_list.pack(fill=tk.X, padx=6, pady=6)
+		self.vlans_table = self._table(sec_vlan, "vlans")
 		btns_vlan = ttk.Frame(sec_vlan)
 		btns_vlan.pack(fill=tk.X, padx=6, pady=6)
 		ttk.Button(btns_vlan, text="Add VLAN", command=self._add_vlan).pack(side=tk.LEFT)
@@ -123,8 +133,7 @@ class NateOSDesktop(tk.Tk):
 	def _build_tab_l3(self, parent):
 		# Static routes
 		sec_routes = self._section(parent, "Static Routes")
-		self.routes_list = tk.Listbox(sec_routes, height=6)
-		self.routes_list.pack(fill=tk.X, padx=6, pady=6)
+		self.routes_table = self._table(sec_routes, "static_routes", height=10)
 		btns_routes = ttk.Frame(sec_routes)
 		btns_routes.pack(fill=tk.X, padx=6, pady=6)
 		ttk.Button(btns_routes, text="Add Route", command=self._add_route).pack(side=tk.LEFT)
@@ -150,7 +159,8 @@ class NateOSDesktop(tk.Tk):
 	# -------- Mgmt --------
 	def _build_tab_mgmt(self, parent):
 		sec_qos = self._section(parent, "QoS")
-		ttk.Button(sec_qos, text="Configure QoS (stub)", command=lambda: messagebox.showinfo("QoS", "Coming soon")).pack(side=tk.LEFT, padx=6, pady=6)
+		ttk.Button(sec_qos, text="Show Policy", command=self._show_qos).pack(side=tk.LEFT, padx=6, pady=6)
+		ttk.Button(sec_qos, text="Simulate", command=self._simulate_qos).pack(side=tk.LEFT, pady=6)
 
 		sec_acl = self._section(parent, "ACL")
 		self.acl_list = tk.Listbox(sec_acl, height=6)
@@ -182,91 +192,104 @@ class NateOSDesktop(tk.Tk):
 		cmb.pack(side=tk.LEFT, padx=6)
 
 	# -------- Loaders & Actions --------
-	def _safe_call(self, fn, ok_msg=None):
-		try:
-			res = fn()
-			if ok_msg:
-				self.status_var.set(ok_msg)
-			return res
-		except urllib.error.URLError:
+	def _poll(self):
+		# Run callbacks of API calls that finished on worker threads
+		self.api.dispatch()
+		self.after(POLL_MS, self._poll)
+
+	def _close(self):
+		self.api.close()
+		self.destroy()
+
+	def _show_error(self, e):
+		if isinstance(e, ApiError):
+			messagebox.showerror("Error", f"{e.status}: {e.detail}")
+		elif isinstance(e, (OSError, http.client.HTTPException)):
 			self.status_var.set("Disconnected")
-			messagebox.showerror("Error", "Cannot reach NateOS API at http://localhost:8080. Start it with scripts/run-web-gui.ps1")
-		except Exception as e:
+			messagebox.showerror("Error", f"Cannot reach NateOS API at {API_BASE}. Start it with scripts/run-web-gui.ps1")
+		else:
 			messagebox.showerror("Error", str(e))
 
+	def _safe_call(self, fn, ok_msg=None, then=None):
+		"""Run an API call off the Tk thread; ok_msg and then(result) follow on it"""
+		def done(res):
+			if ok_msg:
+				self.status_var.set(ok_msg)
+			if then is not None:
+				then(res)
+		self.api.submit(fn, done, self._show_error)
+
+	def _edited(self, *sections):
+		# The change subscription refreshes edited sections; without it, revalidate them directly
+		if not self.api.subscribed:
+			self._refresh(sections)
+
 	def _load_all(self):
-		# Health
-		try:
-			h = api_get("/health")
-			self.status_var.set("Connected")
-		except Exception:
-			self.status_var.set("Disconnected")
-		# L2
-		self._load_interfaces()
-		self._load_vlans()
-		self._load_stp()
-		self._load_lldp()
-		self._load_igmp()
-		# L3
-		self._load_routes()
-		self._load_ospf()
-		self._load_bgp()
-		# System
-		self._load_system()
-		self._load_aaa()
+		self.api.submit(lambda: self.api.get("/health"), lambda h: self.status_var.set("Connected"),
+			lambda e: self.status_var.set("Disconnected"))
+		self._refresh(SECTIONS)
+
+	def _refresh(self, sections):
+		"""Fetch sections in parallel (conditional GETs) and redraw each as it arrives"""
+		for name in sections:
+			if name in self.tables:
+				self.tables[name].reload()
+		paths = {SECTIONS[name]: name for name in sections if name in SECTIONS}
+		self.api.fetch_many(paths, lambda path, value: self._show(paths[path], value), self._load_failed)
+
+	def _changed(self, changes):
+		"""Stream callback: redraw sections patched from the change feed, refetch the rest"""
+		for name, value in changes.items():
+			if value is not None and name not in self.tables:
+				self._show(name, value)
+		# Tables revalidate their loaded pages; only pages the change touched come back changed
+		stale = [name for name, value in changes.items() if value is None or name in self.tables]
+		if stale:
+			self._refresh(stale)
+
+	def _load_failed(self, path, e):
+		if isinstance(e, (OSError, http.client.HTTPException)):
+			self.status_var.set("Disconnected")  # one dialog-free failure per section
+		else:
+			self._show_error(e)
+
+	def _show(self, section, value):
+		getattr(self, f"_show_{section}")(value or {})
 
 	# L2 loaders/actions
-	def _load_interfaces(self):
-		self.interfaces_list.delete(0, tk.END)
-		ifs = self._safe_call(lambda: api_get("/l2/interfaces")) or {}
-		for name, cfg in ifs.items():
-			mode = cfg.get("mode", "access")
-			vlan = cfg.get("vlan", "-")
-			self.interfaces_list.insert(tk.END, f"{name} - {mode} - VLAN {vlan}")
-
-	def _add_interface(self):
-		name = simpledialog.askstring("Interface", "Interface name (e.g., eth0):", parent=self)
+	def _add_interface(self, name=None):
+		name = name or simpledialog.askstring("Interface", "Interface name (e.g., eth0):", parent=self)
 		if not name:
 			return
 		mode = simpledialog.askstring("Interface", "Mode (access/trunk):", parent=self) or "access"
 		vlan = simpledialog.askinteger("Interface", "VLAN ID (1-4094):", parent=self)
 		payload = {"mode": mode, "vlan": vlan}
-		self._safe_call(lambda: api_put(f"/l2/interfaces/{name}", payload), ok_msg="Interface saved")
-		self._load_interfaces()
+		self._safe_call(lambda: self.api.put(f"/l2/interfaces/{name}", payload), ok_msg="Interface saved",
+			then=lambda res: self._edited("interfaces"))
 
 	def _edit_interface(self):
-		idx = self.interfaces_list.curselection()
-		if not idx:
+		row = self.interfaces_table.selected()
+		if not row:
 			return
-		# In a simple stub, re-run add with same name prompt
-		self._add_interface()
-
-	def _load_vlans(self):
-		self.vlans_list.delete(0, tk.END)
-		vlans = self._safe_call(lambda: api_get("/l2/vlans")) or {}
-		for vid, vcfg in vlans.items():
-			name = vcfg.get("name", "")
-			self.vlans_list.insert(tk.END, f"VLAN {vid} {('- ' + name) if name else ''}")
+		self._add_interface(row["name"])
 
 	def _add_vlan(self):
 		vid = simpledialog.askinteger("VLAN", "VLAN ID (1-4094):", parent=self)
 		if not vid:
 			return
 		name = simpledialog.askstring("VLAN", "VLAN name:", parent=self) or ""
-		self._safe_call(lambda: api_post("/l2/vlans", {"vlan_id": vid, "name": name}), ok_msg="VLAN created")
-		self._load_vlans()
+		self._safe_call(lambda: self.api.post("/l2/vlans", {"vlan_id": vid, "name": name}), ok_msg="VLAN created",
+			then=lambda res: self._edited("vlans"))
 
 	def _delete_vlan(self):
-		sel = self.vlans_list.curselection()
-		if not sel:
+		row = self.vlans_table.selected()
+		if not row:
 			return
-		text = self.vlans_list.get(sel[0])
-		vid = text.split()[1]
-		self._safe_call(lambda: api_delete(f"/l2/vlans/{vid}"), ok_msg="VLAN deleted")
-		self._load_vlans()
+		vid = row["vlan_id"]
+		self._safe_call(lambda: self.api.delete(f"/l2/vlans/{vid}"), ok_msg="VLAN deleted",
+			then=lambda res: self._edited("vlans"))
 
-	def _load_stp(self):
-		stp = self._safe_call(lambda: api_get("/l2/stp")) or {}
+	def _show_stp(self, stp):
 		self.stp_enabled.set(bool(stp.get("enabled", False)))
 		self.stp_mode.set(stp.get("mode", "rstp"))
 		self.stp_priority.set(int(stp.get("priority", 32768)))
@@ -277,76 +300,96 @@ class NateOSDesktop(tk.Tk):
 			"mode": self.stp_mode.get(),
 			"priority": int(self.stp_priority.get()),
 		}
-		self._safe_call(lambda: api_put("/l2/stp", payload), ok_msg="STP updated")
+		self._safe_call(lambda: self.api.put("/l2/stp", payload), ok_msg="STP updated")
 
-	def _load_lldp(self):
-		lldp = self._safe_call(lambda: api_get("/l2/lldp")) or {}
+	def _show_lldp(self, lldp):
 		self.lldp_enabled.set(bool(lldp.get("enabled", False)))
 
 	def _update_lldp(self):
-		self._safe_call(lambda: api_put("/l2/lldp", {"enabled": bool(self.lldp_enabled.get())}), ok_msg="LLDP updated")
+		payload = {"enabled": bool(self.lldp_enabled.get())}
+		self._safe_call(lambda: self.api.put("/l2/lldp", payload), ok_msg="LLDP updated")
 
-	def _load_igmp(self):
-		igmp = self._safe_call(lambda: api_get("/l2/igmp-snooping")) or {}
+	def _show_igmp_snooping(self, igmp):
 		self.igmp_enabled.set(bool(igmp.get("enabled", False)))
 
 	def _update_igmp(self):
-		self._safe_call(lambda: api_put("/l2/igmp-snooping", {"enabled": bool(self.igmp_enabled.get())}), ok_msg="IGMP updated")
+		payload = {"enabled": bool(self.igmp_enabled.get())}
+		self._safe_call(lambda: self.api.put("/l2/igmp-snooping", payload), ok_msg="IGMP updated")
 
 	# L3 loaders/actions
-	def _load_routes(self):
-		self.routes_list.delete(0, tk.END)
-		routes = self._safe_call(lambda: api_get("/l3/static-routes")) or []
-		for r in routes:
-			self.routes_list.insert(tk.END, f"{r.get('destination','') or 'N/A'} via {r.get('gateway','') or 'N/A'}")
-
 	def _add_route(self):
 		dest = simpledialog.askstring("Static Route", "Destination (CIDR):", parent=self)
 		if not dest:
 			return
 		gw = simpledialog.askstring("Static Route", "Gateway IP:", parent=self)
-		self._safe_call(lambda: api_post("/l3/static-routes", {"destination": dest, "gateway": gw}), ok_msg="Route added")
-		self._load_routes()
+		self._safe_call(lambda: self.api.post("/l3/static-routes", {"destination": dest, "gateway": gw}),
+			ok_msg="Route added", then=lambda res: self._edited("static_routes"))
 
 	def _delete_route(self):
-		idxs = self.routes_list.curselection()
-		if not idxs:
+		row = self.routes_table.selected()
+		if not row:
 			return
-		idx = int(idxs[0])
-		self._safe_call(lambda: api_delete(f"/l3/static-routes/{idx}"), ok_msg="Route deleted")
-		self._load_routes()
+		# The server deletes by id, never by position
+		route_id = row["id"]
+		self._safe_call(lambda: self.api.delete(f"/l3/static-routes/{route_id}"), ok_msg="Route deleted",
+			then=lambda res: self._edited("static_routes"))
 
-	def _load_ospf(self):
-		cfg = self._safe_call(lambda: api_get("/l3/ospf")) or {}
+	def _show_ospf(self, cfg):
 		self.ospf_enabled.set(bool(cfg.get("enabled", False)))
 
 	def _update_ospf(self):
-		self._safe_call(lambda: api_put("/l3/ospf", {"enabled": bool(self.ospf_enabled.get())}), ok_msg="OSPF updated")
+		payload = {"enabled": bool(self.ospf_enabled.get())}
+		self._safe_call(lambda: self.api.put("/l3/ospf", payload), ok_msg="OSPF updated")
 
-	def _load_bgp(self):
-		cfg = self._safe_call(lambda: api_get("/l3/bgp")) or {}
+	def _show_bgp(self, cfg):
 		self.bgp_enabled.set(bool(cfg.get("enabled", False)))
 		self.bgp_asn.set(int(cfg.get("asn", 0)))
 
 	def _update_bgp(self):
 		payload = {"enabled": bool(self.bgp_enabled.get()), "asn": int(self.bgp_asn.get())}
-		self._safe_call(lambda: api_put("/l3/bgp", payload), ok_msg="BGP updated")
+		self._safe_call(lambda: self.api.put("/l3/bgp", payload), ok_msg="BGP updated")
 
 	# System
-	def _load_system(self):
-		cfg = self._safe_call(lambda: api_get("/mgmt/system")) or {}
+	def _show_system(self, cfg):
 		self.sys_hostname.set(cfg.get("hostname", ""))
 		self.sys_domain.set(cfg.get("domain", ""))
 
 	def _update_system(self):
-		self._safe_call(lambda: api_put("/mgmt/system", {"hostname": self.sys_hostname.get(), "domain": self.sys_domain.get()}), ok_msg="System saved")
+		payload = {"hostname": self.sys_hostname.get(), "domain": self.sys_domain.get()}
+		self._safe_call(lambda: self.api.put("/mgmt/system", payload), ok_msg="System saved")
 
-	def _load_aaa(self):
-		cfg = self._safe_call(lambda: api_get("/mgmt/aaa")) or {}
+	def _show_aaa(self, cfg):
 		self.aaa_method.set(cfg.get("auth_method", "local"))
 
 	def _update_aaa(self):
-		self._safe_call(lambda: api_put("/mgmt/aaa", {"auth_method": self.aaa_method.get()}), ok_msg="AAA saved")
+		payload = {"auth_method": self.aaa_method.get()}
+		self._safe_call(lambda: self.api.put("/mgmt/aaa", payload), ok_msg="AAA saved")
+
+	# QoS
+	def _show_qos(self):
+		self._safe_call(lambda: self.api.get("/mgmt/qos/compiled"), then=self._show_qos_policy)
+
+	def _show_qos_policy(self, policy):
+		if not policy:
+			return
+		lines = [f"Trust: {policy['trust']}  Default class: {policy['default_class']}"]
+		for c in policy["classes"]:
+			mode = "strict" if c["priority"] else f"weight {c['weight']}"
+			lines.append(f"tc{c['class']} {c['name']}: {mode}, rate {c['rate_mbps'] or '-'} / ceil {c['ceil_mbps'] or '-'} Mbps")
+		messagebox.showinfo("QoS Policy", "\n".join(lines))
+
+	def _simulate_qos(self):
+		self._safe_call(lambda: self.api.post("/mgmt/qos/simulate", {"synthetic": {"duration": 1.0}}),
+			then=self._show_qos_simulation)
+
+	def _show_qos_simulation(self, result):
+		if not result:
+			return
+		lines = [f"{result['packets']} packets on a {result['port_mbps']} Mbps port"]
+		for c in result["classes"]:
+			lines.append(f"{c['name']}: {c['throughput_mbps']}/{c['offered_mbps']} Mbps, p99 {c['latency_p99_ms']} ms, "
+				f"drops {c['queue_drops'] + c['policer_drops']}")
+		messagebox.showinfo("QoS Simulation", "\n".join(lines))
 
 	# ACL (simple add-only stub)
 	def _add_acl(self):
@@ -355,7 +398,7 @@ class NateOSDesktop(tk.Tk):
 		action = simpledialog.askstring("ACL", "Action (permit/deny):", parent=self) or "permit"
 		if not src or not dst:
 			return
-		self._safe_call(lambda: api_post("/mgmt/acl", {"src": src, "dst": dst, "action": action}), ok_msg="ACL added")
+		self._safe_call(lambda: self.api.post("/mgmt/acl", {"src": src, "dst": dst, "action": action}), ok_msg="ACL added")
 		# Optional: refresh list (not stored separately in UI)
 
 
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+NateOS desktop API client
+Keep-alive connection pool, section fetches on worker threads with results
+handed back to the Tk thread, an ETag-revalidated response cache and a
+change subscription over /api/stream.
+
+Tk is not thread-safe, so workers never touch widgets: finished calls are
+queued and the app drains the queue from the Tk thread with after().
+"""
+import gzip
+import http.client
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+
+API_BASE = "http://localhost:8080/api"
+POOL_SIZE = 4
+TIMEOUT = 10.0
+STREAM_TIMEOUT = 60.0
+RETRY_DELAY = 2.0
+# A reused keep-alive socket the server already closed fails like this; retry once on a new one
+_STALE = (http.client.RemoteDisconnected, http.client.BadStatusLine, ConnectionResetError, BrokenPipeError)
+_IDEMPOTENT = ("GET", "PUT", "DELETE", "HEAD")
+_DELETED = object()
+
+
+class ApiError(Exception):
+	"""Non-2xx reply; detail is the API's "error" message when it sent one"""
+
+	def __init__(self, status, detail):
+		super().__init__(f"{status}: {detail}")
+		self.status = status
+		self.detail = detail
+
+
+class ConnectionPool:
+	"""Thread-safe pool of keep-alive HTTPConnections to one host"""
+
+	def __init__(self, host, port, size=POOL_SIZE, timeout=TIMEOUT):
+		self.host = host
+		self.port = port
+		self.size = size
+		self.timeout = timeout
+		self._idle = []
+		self._lock = threading.Lock()
+		self.opened = 0
+
+	def _connect(self):
+		self.opened += 1
+		return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+	def request(self, method, path, body=None, headers=None):
+		"""(status, headers, body bytes) for one request on a pooled connection"""
+		with self._lock:
+			conn = self._idle.pop() if self._idle else None
+		reused = conn is not None
+		if conn is None:
+			conn = self._connect()
+		try:
+			conn.request(method, path, body, headers or {})
+			resp = conn.getresponse()
+			data = resp.read()
+		except _STALE:
+			conn.close()
+			if not reused or method not in _IDEMPOTENT:
+				raise
+			conn = self._connect()
+			conn.request(method, path, body, headers or {})
+			resp = conn.getresponse()
+			data = resp.read()
+		except BaseException:
+			conn.close()
+			raise
+		if resp.will_close:
+			conn.close()
+		else:
+			with self._lock:
+				if len(self._idle) < self.size:
+					self._idle.append(conn)
+					conn = None
+			if conn is not None:
+				conn.close()
+		return resp.status, resp.headers, data
+
+	def close(self):
+		with self._lock:
+			idle, self._idle = self._idle, []
+		for conn in idle:
+			conn.close()
+
+
+class ApiClient:
+	"""JSON calls against the NateOS API over a ConnectionPool
+
+	GETs are cached per path with their ETag and revalidated with
+	If-None-Match, so refreshing an unchanged section costs a 304. Blocking
+	methods (get/put/post/delete) may be called from any thread; submit()
+	and fetch_many() run them on workers and queue the callback for the
+	thread that calls dispatch().
+	"""
+
+	def __init__(self, base=API_BASE, workers=POOL_SIZE, timeout=TIMEOUT):
+		parts = urlsplit(base)
+		self.base = base
+		self.prefix = parts.path.rstrip("/")
+		self.pool = ConnectionPool(parts.hostname or "localhost", parts.port or 80, size=workers, timeout=timeout)
+		self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nateos-api")
+		self._done = queue.SimpleQueue()
+		self._cache = {}
+		self._cache_lock = threading.Lock()
+		self._stream = None
+		self._stop = threading.Event()
+		self.subscribed = False
+		self.stats = {"requests": 0, "not_modified": 0, "bytes": 0}
+
+	# -------- Blocking calls --------
+	def call(self, method, path, payload=None):
+		headers = {"Accept-Encoding": "gzip"}
+		body = None
+		if payload is not None:
+			body = json.dumps(payload).encode("utf-8")
+			headers["Content-Type"] = "application/json"
+		cached = None
+		if method == "GET":
+			with self._cache_lock:
+				cached = self._cache.get(path)
+			if cached is not None and cached[0]:
+				headers["If-None-Match"] = cached[0]
+		status, resp_headers, data = self.pool.request(method, self.prefix + path, body, headers)
+		self.stats["requests"] += 1
+		self.stats["bytes"] += len(data)
+		if status == 304 and cached is not None and cached[0]:
+			self.stats["not_modified"] += 1
+			return cached[1]
+		if resp_headers.get("Content-Encoding") == "gzip":
+			data = gzip.decompress(data)
+		value = json.loads(data.decode("utf-8")) if data else None
+		if status >= 400:
+			detail = value.get("error", status) if isinstance(value, dict) else status
+			raise ApiError(status, detail)
+		etag = resp_headers.get("ETag")
+		if method == "GET" and etag:
+			with self._cache_lock:
+				self._cache[path] = (etag, value)
+		return value
+
+	def get(self, path):
+		return self.call("GET", path)
+
+	def put(self, path, payload):
+		return self.call("PUT", path, payload)
+
+	def post(self, path, payload):
+		return self.call("POST", path, payload)
+
+	def delete(self, path):
+		return self.call("DELETE", path)
+
+	def evict(self, path):
+		"""Drop a cached GET body (e.g. a table page scrolled far out of view)"""
+		with self._cache_lock:
+			self._cache.pop(path, None)
+
+	# -------- Off-thread calls --------
+	def submit(self, fn, callback=None, errback=None):
+		"""Run fn() on a worker; callback(result) or errback(exc) runs in dispatch()"""
+		def task():
+			try:
+				result = fn()
+			except Exception as e:
+				if errback is not None:
+					self._done.put((errback, e))
+				return
+			if callback is not None:
+				self._done.put((callback, result))
+		return self._executor.submit(task)
+
+	def fetch_many(self, paths, callback, errback=None):
+		"""GET paths in parallel; callback(path, value) / errback(path, exc) per path as each lands"""
+		return [self.submit(lambda path=path: self.get(path),
+			lambda value, path=path: callback(path, value),
+			None if errback is None else lambda e, path=path: errback(path, e)) for path in paths]
+
+	def dispatch(self, limit=256):
+		"""Run queued callbacks on the calling (Tk) thread; returns how many ran"""
+		ran = 0
+		while ran < limit:
+			try:
+				fn, arg = self._done.get_nowait()
+			except queue.Empty:
+				break
+			fn(arg)
+			ran += 1
+		return ran
+
+	# -------- Change subscription --------
+	def subscribe(self, sections, on_change):
+		"""Follow /api/stream for {datastore section: API path}; on_change(changes) runs in dispatch()
+
+		changes maps each changed section to its new value, patched into
+		the cached GET body from the streamed leaves, or to None when the
+		section has to be fetched again: it was not cached as an object
+		(e.g. a list the API reshapes), or the stream dropped or resynced
+		and updates may have been missed meanwhile.
+		"""
+		query = quote(",".join(sections), safe=",/")
+		path = f"{self.prefix}/stream?paths={query}"
+		self._stream = threading.Thread(target=self._follow, args=(path, dict(sections), on_change),
+			name="nateos-stream", daemon=True)
+		self._stream.start()
+
+	def _follow(self, path, sections, on_change):
+		first = True
+		while not self._stop.is_set():
+			conn = http.client.HTTPConnection(self.pool.host, self.pool.port, timeout=STREAM_TIMEOUT)
+			try:
+				conn.request("GET", path, headers={"Accept": "text/event-stream"})
+				resp = conn.getresponse()
+				if resp.status != 200:
+					raise ApiError(resp.status, resp.reason)
+				self.subscribed = True
+				if not first:
+					self._done.put((on_change, dict.fromkeys(sections)))
+				first = False
+				self._read_events(resp, sections, on_change)
+			except (OSError, http.client.HTTPException, ApiError, ValueError):
+				pass
+			finally:
+				self.subscribed = False
+				conn.close()
+			self._stop.wait(RETRY_DELAY)
+
+	def _read_events(self, resp, sections, on_change):
+		event, data = None, []
+		synced = False
+		while not self._stop.is_set():
+			line = resp.readline()
+			if not line:
+				return
+			line = line.rstrip(b"\r\n")
+			if line.startswith(b"event:"):
+				event = line[6:].strip().decode()
+			elif line.startswith(b"data:"):
+				data.append(line[5:].strip())
+			elif not line and data:
+				message = json.loads(b"\n".join(data))
+				if event == "update":
+					leaves = [(u["path"], u["value"]) for u in message.get("updates", ())]
+					leaves += [(p, _DELETED) for p in message.get("deletes", ())]
+					changes = self._patch(sections, leaves)
+					if changes:
+						self._done.put((on_change, changes))
+				elif event == "sync":
+					# The first sync is the subscription's snapshot; a later one follows dropped updates
+					if synced:
+						self._done.put((on_change, dict.fromkeys(sections)))
+					synced = True
+				event, data = None, []
+
+	def _patch(self, sections, leaves):
+		"""Apply streamed leaves to cached section bodies; {section: new value or None}"""
+		by_section = {}
+		for text, value in leaves:
+			keys = text.split("/")
+			if keys[0] in sections:
+				by_section.setdefault(keys[0], []).append((keys[1:], value))
+		changes = {}
+		with self._cache_lock:
+			for section, edits in by_section.items():
+				path = sections[section]
+				cached = self._cache.get(path)
+				if cached is None or not isinstance(cached[1], dict) or any(not keys for keys, _ in edits):
+					changes[section] = None
+					continue
+				# Copy along each edited path: callers may still hold the old body
+				root = dict(cached[1])
+				for keys, value in edits:
+					node = root
+					for key in keys[:-1]:
+						child = node.get(key)
+						node[key] = child = dict(child) if isinstance(child, dict) else {}
+						node = child
+					if value is _DELETED:
+						node.pop(keys[-1], None)
+					else:
+						node[keys[-1]] = value
+				# Keep the old ETag out: the next GET must not be answered 304 with this body
+				self._cache[path] = (None, root)
+				changes[section] = root
+		return changes
+
+	def close(self):
+		self._stop.set()
+		self._executor.shutdown(wait=False, cancel_futures=True)
+		self.pool.close()
+
+
+def wait_for(client, futures, timeout=30.0):
+	"""Dispatch callbacks until futures finish (for scripts and benchmarks without a Tk loop)"""
+	deadline = time.perf_counter() + timeout
+	while time.perf_counter() < deadline:
+		client.dispatch()
+		if all(f.done() for f in futures):
+			client.dispatch()
+			return True
+		time.sleep(0.001)
+	return False
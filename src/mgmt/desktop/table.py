@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+NateOS desktop table views
+Windowed tables over the API's paged GETs (?offset=&limit=&sort=&filter=):
+the server sorts and filters, the client keeps a few chunks of rows around
+the visible window and the Treeview only ever holds the visible rows.
+
+PagedRows is the Tk-free part (chunk cache, stale-reply guard, row diff)
+so it can be driven from scripts; VirtualTable draws it.
+"""
+import tkinter as tk
+from tkinter import ttk
+from urllib.parse import urlencode
+
+CHUNK = 200
+MAX_CHUNKS = 16
+
+
+class PagedRows:
+	"""Chunks of one paged API table, fetched on the client's workers
+
+	Changing the sort or filter starts a new epoch: chunks are dropped and
+	replies for the old epoch are ignored when they land. reload()
+	revalidates the cached chunks; pages the server answers with a 304 come
+	back as the same list, so nothing downstream redraws for them.
+	"""
+
+	def __init__(self, api, path, on_change, chunk=CHUNK, max_chunks=MAX_CHUNKS):
+		self.api = api
+		self.path = path
+		self.on_change = on_change
+		self.chunk = chunk
+		self.max_chunks = max_chunks
+		self.sort = None
+		self.filter = ""
+		self.total = None
+		self.epoch = 0
+		self._chunks = {}
+		self._pending = set()
+
+	def query(self, index):
+		args = {"offset": index * self.chunk, "limit": self.chunk}
+		if self.sort:
+			args["sort"] = self.sort
+		if self.filter:
+			args["filter"] = self.filter
+		return f"{self.path}?{urlencode(args)}"
+
+	def set_order(self, sort=None, filter=""):
+		if (sort, filter) == (self.sort, self.filter):
+			return
+		self.sort, self.filter = sort, filter
+		self.epoch += 1
+		for index in self._chunks:
+			self.api.evict(self.query(index))
+		self._chunks.clear()
+		self._pending.clear()
+		self.total = None
+
+	def rows(self, first, count):
+		"""Rows first..first+count that are loaded (None for the rest); fetches what is missing"""
+		out = []
+		if count <= 0:
+			return out
+		last = first + count - 1
+		if self.total is not None:
+			last = min(last, self.total - 1)
+		for index in range(first // self.chunk, max(first, last) // self.chunk + 1):
+			rows = self._chunks.get(index)
+			if rows is None:
+				self.fetch(index)
+			else:
+				# Most recently used last, for eviction
+				self._chunks[index] = self._chunks.pop(index)
+		for i in range(first, last + 1):
+			rows = self._chunks.get(i // self.chunk)
+			offset = i % self.chunk
+			out.append(rows[offset] if rows is not None and offset < len(rows) else None)
+		return out
+
+	def fetch(self, index):
+		if index in self._pending:
+			return
+		self._pending.add(index)
+		epoch, path = self.epoch, self.query(index)
+		self.api.submit(lambda: self.api.get(path), lambda page: self._landed(epoch, index, page),
+			lambda e: self._failed(epoch, index, e))
+
+	def reload(self):
+		"""Revalidate every cached chunk (after the table changed on the server)"""
+		if not self._chunks:
+			self.fetch(0)
+		for index in list(self._chunks):
+			self.fetch(index)
+
+	def _landed(self, epoch, index, page):
+		if epoch != self.epoch:
+			return
+		self._pending.discard(index)
+		old = self._chunks.get(index)
+		self._chunks[index] = page["entries"]
+		changed = page["entries"] is not old or page["total"] != self.total
+		self.total = page["total"]
+		while len(self._chunks) > self.max_chunks:
+			stale = next(iter(self._chunks))
+			del self._chunks[stale]
+			self.api.evict(self.query(stale))
+		if changed:
+			self.on_change()
+
+	def _failed(self, epoch, index, e):
+		if epoch == self.epoch:
+			self._pending.discard(index)
+
+
+def diff_rows(shown, rows, key):
+	"""Plan the Treeview edits turning shown (iid -> row) into rows, in order
+
+	Returns (order, delete, upsert): the visible iids top to bottom, iids to
+	remove and {iid: row} for rows that are new or changed.
+	"""
+	order = []
+	upsert = {}
+	for row in rows:
+		if row is None:
+			continue
+		iid = str(row.get(key))
+		order.append(iid)
+		if shown.get(iid) != row:
+			upsert[iid] = row
+	keep = set(order)
+	return order, [iid for iid in shown if iid not in keep], upsert
+
+
+class VirtualTable(ttk.Frame):
+	"""Treeview over a PagedRows window with server-side sort (click a heading) and filter"""
+
+	def __init__(self, parent, api, path, columns, key, height=8):
+		super().__init__(parent)
+		self.columns = [name for name, _ in columns]
+		self.key = key
+		self.height = height
+		self.first = 0
+		self._shown = {}
+		self._order = []
+		self._filter_job = None
+		self.data = PagedRows(api, path, self._redraw)
+
+		bar = ttk.Frame(self)
+		bar.pack(fill=tk.X)
+		ttk.Label(bar, text="Filter:").pack(side=tk.LEFT)
+		self.filter_var = tk.StringVar(value="")
+		entry = ttk.Entry(bar, textvariable=self.filter_var, width=24)
+		entry.pack(side=tk.LEFT, padx=6)
+		entry.bind("<KeyRelease>", self._filter_typed)
+		self.count_var = tk.StringVar(value="")
+		ttk.Label(bar, textvariable=self.count_var).pack(side=tk.RIGHT)
+
+		body = ttk.Frame(self)
+		body.pack(fill=tk.BOTH, expand=True)
+		self.tree = ttk.Treeview(body, columns=self.columns, show="headings", height=height, selectmode="browse")
+		for name, title in columns:
+			self.tree.heading(name, text=title, command=lambda name=name: self._sort_by(name))
+			self.tree.column(name, width=120, stretch=True)
+		self.scroll = ttk.Scrollbar(body, orient=tk.VERTICAL, command=self._scrolled)
+		self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+		self.scroll.pack(side=tk.RIGHT, fill=tk.Y)
+		for seq in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+			self.tree.bind(seq, self._wheel)
+		for seq, step in (("<Prior>", -height), ("<Next>", height)):
+			self.tree.bind(seq, lambda e, step=step: self.scroll_to(self.first + step))
+		self.tree.bind("<Home>", lambda e: self.scroll_to(0))
+		self.tree.bind("<End>", lambda e: self.scroll_to(self.data.total or 0))
+		self.tree.bind("<Up>", lambda e: self._step(-1))
+		self.tree.bind("<Down>", lambda e: self._step(1))
+		self.data.rows(0, height)
+
+	# -------- Window --------
+	def scroll_to(self, first):
+		total = self.data.total or 0
+		first = max(0, min(int(first), total - self.height))
+		if first != self.first:
+			self.first = first
+			self._redraw()
+		return "break"
+
+	def _scrolled(self, op, amount, unit=None):
+		total = self.data.total or 0
+		if op == "moveto":
+			self.scroll_to(float(amount) * total)
+		elif op == "scroll":
+			self.scroll_to(self.first + int(amount) * (self.height if unit == "pages" else 1))
+
+	def _wheel(self, event):
+		if event.num == 4 or getattr(event, "delta", 0) > 0:
+			return self.scroll_to(self.first - 3)
+		return self.scroll_to(self.first + 3)
+
+	def _step(self, delta):
+		# Moving the selection past either edge scrolls the window instead of leaving it
+		sel = self.tree.selection()
+		if not sel or sel[0] not in self._order:
+			return None
+		pos = self._order.index(sel[0]) + delta
+		if 0 <= pos < len(self._order):
+			return None
+		self.scroll_to(self.first + delta)
+		if self._order:
+			iid = self._order[0 if delta < 0 else -1]
+			self.tree.selection_set(iid)
+			self.tree.focus(iid)
+		return "break"
+
+	def _redraw(self):
+		rows = self.data.rows(self.first, self.height)
+		order, delete, upsert = diff_rows(self._shown, rows, self.key)
+		if delete:
+			self.tree.delete(*delete)
+		for iid in delete:
+			del self._shown[iid]
+		for iid, row in upsert.items():
+			values = [row.get(name, "") for name in self.columns]
+			if iid in self._shown:
+				self.tree.item(iid, values=values)
+			else:
+				self.tree.insert("", tk.END, iid=iid, values=values)
+			self._shown[iid] = row
+		if order != self._order:
+			for pos, iid in enumerate(order):
+				self.tree.move(iid, "", pos)
+			self._order = order
+		total = self.data.total or 0
+		if total:
+			self.scroll.set(self.first / total, min(1.0, (self.first + self.height) / total))
+			self.count_var.set(f"{self.first + 1}-{min(total, self.first + self.height)} of {total}")
+		else:
+			self.scroll.set(0.0, 1.0)
+			self.count_var.set("0 rows")
+
+	# -------- Sort / filter --------
+	def _sort_by(self, name):
+		sort = f"-{name}" if self.data.sort == name else name
+		self._reorder(sort, self.data.filter)
+
+	def _filter_typed(self, event=None):
+		# Wait for a pause in typing before asking the server
+		if self._filter_job is not None:
+			self.after_cancel(self._filter_job)
+		self._filter_job = self.after(250, self._apply_filter)
+
+	def _apply_filter(self):
+		self._filter_job = None
+		self._reorder(self.data.sort, self.filter_var.get().strip())
+
+	def _reorder(self, sort, text):
+		self.data.set_order(sort, text)
+		self.first = 0
+		self._redraw()
+
+	def reload(self):
+		self.data.reload()
+
+	def selected(self):
+		"""Row (dict) under the selection, or None"""
+		sel = self.tree.selection()
+		return self._shown.get(sel[0]) if sel else None
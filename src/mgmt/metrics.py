@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+NateOS metrics
+Counters, HDR-style latency histograms and a sampling profiler
+
+Recording never takes a lock: each thread updates its own shard of a
+counter or histogram (found through a threading.local) and a scrape sums
+the shards. Histograms are log-linear like HdrHistogram, exact below 16
+and then 16 linear sub-buckets per power of two, so a recorded value is
+within ~6% of its bucket's bounds from nanoseconds up to an hour.
+`Registry.render()` writes the Prometheus text exposition format.
+
+`sample_stacks()` polls every thread's Python stack at a fixed rate; its
+result, through `collapse()`, is the "outer;inner count" collapsed-stack
+format read by flamegraph.pl and speedscope.
+"""
+import os
+import re
+import sys
+import threading
+import time
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+SUB_BITS = 4
+SUB_BUCKETS = 1 << SUB_BITS
+MAX_BITS = 42  # values of 2**42 and up (73 min, in ns) share the last bucket
+BUCKETS = (MAX_BITS - SUB_BITS + 1) * SUB_BUCKETS
+
+# Default le bounds, in seconds, of exported latency histograms
+LATENCY_BOUNDS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                  0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+DEFAULT_HZ = 100
+# Leaf frames (file, function) of threads parked waiting for work
+IDLE_FRAMES = {("threading.py", "wait"), ("threading.py", "_wait_for_tstate_lock"), ("thread.py", "_worker"),
+               ("selectors.py", "select"), ("socket.py", "accept"), ("socket.py", "readinto")}
+_THREAD_NUMBER = re.compile(r"[-_]\d+")
+
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value if value > 0 else 0
+    exp = value.bit_length() - SUB_BITS
+    index = (exp << SUB_BITS) + (value >> (exp - 1)) - SUB_BUCKETS
+    return index if index < BUCKETS else BUCKETS - 1
+
+
+def bucket_upper(index):
+    """Exclusive upper bound of the values in bucket index"""
+    if index < SUB_BUCKETS:
+        return index + 1
+    return ((index & (SUB_BUCKETS - 1)) + SUB_BUCKETS + 1) << ((index >> SUB_BITS) - 1)
+
+
+def quantile(counts, q):
+    """Highest value equivalent to the q-quantile of a histogram's bucket counts"""
+    total = sum(counts[:BUCKETS])
+    if not total:
+        return 0
+    rank = max(1, round(q * total))
+    seen = 0
+    for index in range(BUCKETS):
+        seen += counts[index]
+        if seen >= rank:
+            return bucket_upper(index) - 1
+    return bucket_upper(BUCKETS - 1) - 1
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+        pairs.append(f"{name}=\"{value}\"")
+    return "{" + ",".join(pairs) + "}"
+
+
+def _number(value):
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Sharded:
+    """Per-thread {labels: value} shards, merged on read"""
+    kind = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self):
+        shard = {}
+        with self._lock:
+            self._shards.append(shard)
+        self._local.series = shard
+        return shard
+
+    def _merged(self, add):
+        with self._lock:
+            shards = list(self._shards)
+        merged = {}
+        for shard in shards:
+            # dict.copy() runs under the GIL, so the owning thread cannot resize it mid-copy
+            for labels, value in shard.copy().items():
+                merged[labels] = add(merged[labels], value) if labels in merged else add(None, value)
+        return merged
+
+    def _header(self, out):
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+
+
+class Counter(_Sharded):
+    """Monotonic count per label set"""
+    kind = "counter"
+
+    def inc(self, labels=(), amount=1):
+        try:
+            series = self._local.series
+        except AttributeError:
+            series = self._shard()
+        series[labels] = series.get(labels, 0) + amount
+
+    def values(self):
+        return self._merged(lambda a, b: b if a is None else a + b)
+
+    def render(self, out):
+        self._header(out)
+        for labels, value in sorted(self.values().items()):
+            out.append(f"{self.name}{_label_text(self.labels, labels)} {_number(value)}")
+
+
+class Histogram(_Sharded):
+    """Log-linear histogram of integer values (ns for latencies) per label set
+
+    Exported with `bounds` as the le buckets after multiplying values by
+    `scale` (ns to seconds by default); a bucket that straddles a bound is
+    counted in the next one up.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), bounds=LATENCY_BOUNDS, scale=1e-9):
+        super().__init__(name, help, labels)
+        self.bounds = tuple(bounds)
+        self.scale = scale
+        # bucket index where each le bound's cumulative count stops
+        self._cuts = []
+        index = 0
+        for bound in self.bounds:
+            while index < BUCKETS and (bucket_upper(index) - 1) * scale <= bound:
+                index += 1
+            self._cuts.append(index)
+
+    def record(self, value, labels=()):
+        try:
+            series = self._local.series
+        except AttributeError:
+            series = self._shard()
+        counts = series.get(labels)
+        if counts is None:
+            counts = series[labels] = [0] * (BUCKETS + 1)
+        counts[bucket_index(value)] += 1
+        counts[BUCKETS] += value
+
+    def snapshot(self):
+        """{labels: bucket counts followed by the sum of values}, over all threads"""
+        return self._merged(lambda a, b: list(b) if a is None else [x + y for x, y in zip(a, b)])
+
+    def render(self, out):
+        self._header(out)
+        for labels, counts in sorted(self.snapshot().items()):
+            base = list(zip(self.labels, labels))
+            cumulative, start = 0, 0
+            for bound, cut in zip(self.bounds, self._cuts):
+                cumulative += sum(counts[start:cut])
+                start = cut
+                text = _label_text([n for n, _ in base] + ["le"], [v for _, v in base] + [_number(bound)])
+                out.append(f"{self.name}_bucket{text} {cumulative}")
+            count = cumulative + sum(counts[start:BUCKETS])
+            text = _label_text([n for n, _ in base] + ["le"], [v for _, v in base] + ["+Inf"])
+            out.append(f"{self.name}_bucket{text} {count}")
+            text = _label_text(self.labels, labels)
+            out.append(f"{self.name}_sum{text} {_number(counts[BUCKETS] * self.scale)}")
+            out.append(f"{self.name}_count{text} {count}")
+
+
+class Gauge:
+    """A value read at scrape time: read() returns a number or {labels: number}"""
+
+    def __init__(self, name, help, read, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.labels = tuple(labels)
+        self.kind = kind
+
+    def render(self, out):
+        value = self.read()
+        out.append(f"# HELP {self.name} {self.help}")
+        out.append(f"# TYPE {self.name} {self.kind}")
+        items = sorted(value.items()) if isinstance(value, dict) else [((), value)]
+        for labels, number in items:
+            out.append(f"{self.name}{_label_text(self.labels, labels)} {_number(number)}")
+
+
+class Registry:
+    """Named metrics rendered together; `enabled` is for callers to gate their instrumentation on"""
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._metrics = {}
+
+    def _add(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric '{metric.name}' already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self._add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), bounds=LATENCY_BOUNDS, scale=1e-9):
+        return self._add(Histogram(name, help, labels, bounds, scale))
+
+    def gauge(self, name, help, read, labels=(), kind="gauge"):
+        return self._add(Gauge(name, help, read, labels, kind))
+
+    def get(self, name):
+        return self._metrics[name]
+
+    def render(self):
+        out = []
+        for metric in self._metrics.values():
+            metric.render(out)
+        return "\n".join(out) + "\n"
+
+
+# -------- Sampling profiler --------
+class ProfilerBusy(Exception):
+    pass
+
+
+_PROFILING = threading.Lock()
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def sample_stacks(seconds, hz=DEFAULT_HZ, idle=False):
+    """Sample every other thread's stack hz times a second for seconds: (samples, {stack: count})
+
+    Stacks are root-first frame labels joined by ";" under the thread's name
+    (pool numbering dropped, so a pool's threads merge). Threads parked in
+    IDLE_FRAMES are left out unless idle is set. One profile runs at a time.
+    """
+    if not _PROFILING.acquire(blocking=False):
+        raise ProfilerBusy("a profile is already running")
+    try:
+        me = threading.get_ident()
+        labels = {}
+        stacks = {}
+        interval = 1.0 / hz
+        samples = 0
+        perf = time.perf_counter
+        next_at = perf()
+        deadline = next_at + seconds
+        while True:
+            names = {thread.ident: _THREAD_NUMBER.sub("", thread.name) for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                code = frame.f_code
+                if not idle and (os.path.basename(code.co_filename), code.co_name) in IDLE_FRAMES:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    label = labels.get(code)
+                    if label is None:
+                        label = labels[code] = _frame_label(code)
+                    stack.append(label)
+                    frame = frame.f_back
+                stack.append(names.get(ident, "thread"))
+                key = ";".join(reversed(stack))
+                stacks[key] = stacks.get(key, 0) + 1
+            samples += 1
+            next_at += interval
+            if next_at >= deadline:
+                break
+            delay = next_at - perf()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_at -= delay  # fell behind: skip the missed ticks rather than burst
+        return samples, stacks
+    finally:
+        _PROFILING.release()
+
+
+def collapse(stacks):
+    """Collapsed-stack text, hottest stack first"""
+    return "".join(f"{stack} {count}\n" for stack, count in sorted(stacks.items(), key=lambda item: -item[1]))
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+"""
+NateOS config persistence
+Write-ahead log plus compacted binary snapshots for the datastore
+
+Each commit appends one WAL record holding its leaf changes rather than
+the whole config, so a write costs O(change). Records are framed as
+[u32 length][u32 crc32][marshal payload]. Recovery truncates a torn or
+corrupt tail, and moves records that follow a version gap aside to
+<segment>.<offset>.orphan rather than replaying or deleting them.
+
+fsync modes:
+- "group" (default): a commit returns only once it is on disk, but
+  concurrent committers share one fsync.
+- "each": fsync every record under the store lock.
+- "interval": fsync at most every `interval` seconds, from a background
+  flusher.
+- "none": leave flushing to the OS.
+
+Every `snapshot_every` records the WAL rolls to a new segment, and the
+(immutable) running root is written from a background thread to
+snapshot-<version>.bin. That file has an index of top-level sections
+(with each map section's entry count) followed by one marshal blob per
+section. Startup mmaps the newest valid snapshot, checks every section's
+crc and replays only the WAL records after its version; map sections stay
+deferred (see PMap.deferred) until something reads them, so sections the
+tail does not touch cost nothing to load, and a later snapshot copies
+their blobs as they are.
+"""
+import marshal
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+
+from mgmt.datastore import Datastore, delete_in, set_in
+from functools import partial
+
+from mgmt.pmap import EMPTY, MISSING, PMap, deferred_source, freeze, thaw
+
+FSYNC_MODES = ("group", "each", "interval", "none")
+DEFAULT_SNAPSHOT_EVERY = 10000
+DEFAULT_INTERVAL = 0.05
+KEEP_SNAPSHOTS = 2
+
+_RECORD = struct.Struct("<II")
+_SNAP_MAGIC = b"NOSSNAP2"
+_SNAP_HEADER = struct.Struct("<8sQI")
+# key length, blob offset, blob length, blob crc32, map entry count (-1 if not a map)
+_SNAP_ENTRY = struct.Struct("<HQQIq")
+# NOSSNAP1 files (no entry counts) are still read, fully decoded
+_SNAP_FORMATS = {_SNAP_MAGIC: _SNAP_ENTRY, b"NOSSNAP1": struct.Struct("<HQQI")}
+
+
+class PersistError(Exception):
+    pass
+
+
+def _segment_name(first_version):
+    return f"wal-{first_version:016d}.log"
+
+
+def _snapshot_name(version):
+    return f"snapshot-{version:016d}.bin"
+
+
+def _numbered(directory, prefix, suffix):
+    """(number, path) for files like prefix<number>suffix, ascending"""
+    found = []
+    for name in os.listdir(directory):
+        if name.startswith(prefix) and name.endswith(suffix):
+            try:
+                found.append((int(name[len(prefix):-len(suffix)]), os.path.join(directory, name)))
+            except ValueError:
+                continue
+    return sorted(found)
+
+
+def _fsync_dir(directory):
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return  # not supported on this platform
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def encode_record(commit):
+    changes = []
+    for path, _, new in commit.changes:
+        changes.append((path, 0) if new is MISSING else (path, 1, thaw(new)))
+    payload = marshal.dumps((commit.version, commit.timestamp, commit.comment, tuple(changes)))
+    return _RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def read_records(path):
+    """Yield (end_offset, record) for each intact record; stops at a torn/corrupt tail"""
+    with open(path, "rb") as f:
+        data = f.read()
+    offset = 0
+    while offset + _RECORD.size <= len(data):
+        length, crc = _RECORD.unpack_from(data, offset)
+        start = offset + _RECORD.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return
+        offset = start + length
+        yield offset, marshal.loads(payload)
+
+
+def replay(root, changes):
+    """Apply the leaf changes of one WAL record to a root"""
+    for change in changes:
+        if change[1]:
+            root = set_in(root, change[0], freeze(change[2]))
+        else:
+            root = delete_in(root, change[0])
+    return root
+
+
+def _section_blob(value):
+    """Marshal blob of a section; a still-deferred one is copied from its snapshot undecoded"""
+    source = deferred_source(value)
+    if source is not None:
+        mm, offset, length = source
+        return mm[offset:offset + length]
+    return marshal.dumps(thaw(value))
+
+
+def _load_section(mm, offset, length):
+    return freeze(marshal.loads(mm[offset:offset + length]))
+
+
+def write_snapshot(directory, root, version):
+    """Write root as snapshot-<version>.bin (atomic rename); returns its path"""
+    blobs = [(str(key).encode("utf-8"), _section_blob(value), len(value) if isinstance(value, PMap) else -1)
+             for key, value in root.items()]
+    index_size = sum(_SNAP_ENTRY.size + len(key) for key, _, _ in blobs)
+    offset = _SNAP_HEADER.size + index_size
+    index = []
+    for key, blob, size in blobs:
+        index.append(_SNAP_ENTRY.pack(len(key), offset, len(blob), zlib.crc32(blob), size) + key)
+        offset += len(blob)
+    path = os.path.join(directory, _snapshot_name(version))
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_SNAP_HEADER.pack(_SNAP_MAGIC, version, len(blobs)))
+        f.writelines(index)
+        f.writelines(blob for _, blob, _ in blobs)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    _fsync_dir(directory)
+    return path
+
+
+def read_snapshot(path):
+    """Map a snapshot file into (root, version); map sections decode on first use
+
+    Every section's crc is checked here, so a damaged file is still passed
+    over for an older one. The mapping stays open while any section is
+    deferred.
+    """
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        return _read_sections(path, mm)
+    except BaseException:
+        mm.close()
+        raise
+
+
+def _read_sections(path, mm):
+    view = memoryview(mm)
+    try:
+        magic, version, count = _SNAP_HEADER.unpack_from(mm, 0)
+        entry = _SNAP_FORMATS.get(magic)
+        if entry is None:
+            raise PersistError(f"{path}: not a snapshot")
+        pos = _SNAP_HEADER.size
+        sections = []
+        for _ in range(count):
+            klen, offset, length, crc, *size = entry.unpack_from(mm, pos)
+            pos += entry.size
+            key = mm[pos:pos + klen].decode("utf-8")
+            pos += klen
+            with view[offset:offset + length] as blob:
+                if len(blob) != length or zlib.crc32(blob) != crc:
+                    raise PersistError(f"{path}: section '{key}' is corrupt")
+            if size and size[0] >= 0:
+                sections.append((key, PMap.deferred(size[0], partial(_load_section, mm, offset, length),
+                                                    (mm, offset, length))))
+            else:
+                sections.append((key, _load_section(mm, offset, length)))
+    except struct.error:
+        raise PersistError(f"{path}: truncated")
+    finally:
+        view.release()
+    return EMPTY.update(sections), version
+
+
+class WriteAheadLog:
+    """Append-only commit log with group-commit fsync and periodic snapshots"""
+
+    def __init__(self, directory, fsync="group", interval=DEFAULT_INTERVAL,
+                 snapshot_every=DEFAULT_SNAPSHOT_EVERY):
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f"fsync must be one of {', '.join(FSYNC_MODES)}")
+        self.directory = directory
+        self.fsync = fsync
+        self.interval = interval
+        self.snapshot_every = snapshot_every
+        self._fd = None
+        self._segment_records = 0
+        self._written = 0
+        self._synced = 0
+        self._sync_lock = threading.Lock()
+        self._snapshotting = None
+        self._closed = threading.Event()
+        self._flusher = None
+        self.stats = {"records": 0, "bytes": 0, "fsyncs": 0, "snapshots": 0}
+
+    def open(self, version, segment_records=0):
+        """Start appending after version (into the newest segment, or a new one)"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = _numbered(self.directory, "wal-", ".log")
+        while segments and segments[-1][0] > version + 1:
+            # Unreachable after a gap; keep it for inspection, out of the way
+            os.replace(segments[-1][1], segments[-1][1] + ".orphan")
+            segments.pop()
+        if segments and segments[-1][0] <= version + 1:
+            path = segments[-1][1]
+        else:
+            path = os.path.join(self.directory, _segment_name(version + 1))
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_records = segment_records
+        self._written = self._synced = version
+        if self.fsync == "interval":
+            self._flusher = threading.Thread(target=self._flush_loop, name="nateos-wal", daemon=True)
+            self._flusher.start()
+        return self
+
+    def append(self, commit):
+        """Write one commit record; called by the datastore under its lock"""
+        record = encode_record(commit)
+        os.write(self._fd, record)
+        self._written = commit.version
+        self._segment_records += 1
+        self.stats["records"] += 1
+        self.stats["bytes"] += len(record)
+        if self.fsync == "each":
+            self._fsync(commit.version)
+        if self._segment_records >= self.snapshot_every and self._snapshotting is None:
+            self._roll(commit)
+
+    def sync(self, version):
+        """Block until version is on disk (group mode); others return at once"""
+        if self.fsync == "group" and self._synced < version:
+            with self._sync_lock:
+                # Whoever holds the lock syncs everything written so far
+                if self._synced < version:
+                    self._fsync(self._written)
+
+    def _fsync(self, upto):
+        os.fsync(self._fd)
+        self._synced = max(self._synced, upto)
+        self.stats["fsyncs"] += 1
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.interval):
+            if self._synced < self._written:
+                with self._sync_lock:
+                    self._fsync(self._written)
+
+    def _roll(self, commit):
+        """Start a new segment and snapshot commit.root in the background"""
+        with self._sync_lock:
+            if self.fsync != "none":
+                self._fsync(commit.version)
+            os.close(self._fd)
+            path = os.path.join(self.directory, _segment_name(commit.version + 1))
+            self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._segment_records = 0
+        self._snapshotting = threading.Thread(target=self._snapshot, args=(commit.root, commit.version),
+                                              name="nateos-snapshot", daemon=True)
+        self._snapshotting.start()
+
+    def _snapshot(self, root, version):
+        try:
+            self.snapshot(root, version)
+        finally:
+            self._snapshotting = None
+
+    def snapshot(self, root, version):
+        """Write a snapshot of root and drop the WAL/snapshots it supersedes"""
+        write_snapshot(self.directory, root, version)
+        self.stats["snapshots"] += 1
+        segments = _numbered(self.directory, "wal-", ".log")
+        for (_, path), (next_first, _) in zip(segments, segments[1:]):
+            # A segment ends where the next begins; drop it once fully covered
+            if next_first <= version + 1:
+                os.remove(path)
+        for _, path in _numbered(self.directory, "snapshot-", ".bin")[:-KEEP_SNAPSHOTS]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass  # still mapped by a deferred section on some platforms; a later snapshot retries
+
+    def close(self):
+        self._closed.set()
+        if self._snapshotting is not None:
+            self._snapshotting.join()
+        if self._fd is not None:
+            if self.fsync != "none" and self._synced < self._written:
+                self._fsync(self._written)
+            os.close(self._fd)
+            self._fd = None
+
+
+def recover(directory):
+    """Load (root, version, tail_records) from the newest snapshot plus WAL tail"""
+    root, version = None, 0
+    if os.path.isdir(directory):
+        for _, path in reversed(_numbered(directory, "snapshot-", ".bin")):
+            try:
+                root, version = read_snapshot(path)
+                break
+            except (PersistError, ValueError, EOFError, OSError):
+                continue  # fall back to an older snapshot
+    tail = 0
+    if not os.path.isdir(directory):
+        return root, version, tail
+    for first, path in _numbered(directory, "wal-", ".log"):
+        if first > version + 1 and root is not None:
+            break  # gap: records before this segment are missing
+        good = 0
+        gap = False
+        for end, (rec_version, _, _, changes) in read_records(path):
+            if rec_version > version:
+                if rec_version != version + 1:
+                    gap = True
+                    break
+                root = replay(root if root is not None else EMPTY, changes)
+                version = rec_version
+                tail += 1
+            good = end
+        if good < os.path.getsize(path):
+            with open(path, "r+b") as f:
+                if gap:
+                    # Intact records past a gap: keep them for inspection, out of
+                    # the way of the records appended from here on
+                    f.seek(good)
+                    with open(f"{path}.{good}.orphan", "wb") as aside:
+                        aside.write(f.read())
+                        aside.flush()
+                        os.fsync(aside.fileno())
+                # Otherwise a torn write from a crash: cut back to the last good record
+                f.truncate(good)
+        if gap:
+            break
+    return root, version, tail
+
+
+def open_datastore(directory, initial=None, fsync="group", interval=DEFAULT_INTERVAL,
+                   snapshot_every=DEFAULT_SNAPSHOT_EVERY, history=None):
+    """Recover a Datastore from directory (or create it from initial) and log every commit
+
+    Top-level sections in initial that the stored config lacks are added,
+    so new defaults appear after an upgrade.
+    """
+    t0 = time.perf_counter()
+    root, version, tail = recover(directory)
+    if root is None:
+        root = freeze(initial or {})
+    elif initial:
+        for key, value in initial.items():
+            if key not in root:
+                root = root.set(key, freeze(value))
+    kwargs = {"history": history} if history else {}
+    store = Datastore(root, version=version, **kwargs)
+    log = WriteAheadLog(directory, fsync, interval, snapshot_every).open(version, segment_records=tail)
+    if not _numbered(directory, "snapshot-", ".bin"):
+        log.snapshot(root, version)
+    store.attach_log(log)
+    log.stats["recovered_records"] = tail
+    log.stats["startup_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return store, log
@@ -0,0 +1,429 @@
+#!/usr/bin/env python3
+"""
+NateOS persistent map
+Immutable hash array mapped trie (HAMT) with structural sharing
+
+`set`/`delete` return a new map that shares every untouched node with the
+old one, so both cost O(log32 n) and old versions stay valid for free.
+`diff` compares two maps by node identity and only descends into subtrees
+that differ, so comparing two versions costs O(changes), not O(size).
+`PMap.deferred` makes a map whose trie is only built on first use, for
+sections loaded from a snapshot that a process may never read.
+"""
+import threading
+from collections.abc import Mapping
+
+_BITS = 5
+_WIDTH = 1 << _BITS
+_MASK = _WIDTH - 1
+_HASH_BITS = 64
+_HASH_MASK = (1 << _HASH_BITS) - 1
+
+_popcount = getattr(int, "bit_count", None) or (lambda x: bin(x).count("1"))
+
+MISSING = object()
+
+
+class _Bitmap:
+    """Interior node: bitmap of occupied slots plus a dense item list"""
+    __slots__ = ("bitmap", "items")
+
+    def __init__(self, bitmap, items):
+        self.bitmap = bitmap
+        self.items = items
+
+
+class _Collision:
+    """Keys whose full hashes collide"""
+    __slots__ = ("hash", "items")
+
+    def __init__(self, h, items):
+        self.hash = h
+        self.items = items
+
+
+_EMPTY_NODE = _Bitmap(0, [])
+
+
+def _hash(key):
+    return hash(key) & _HASH_MASK
+
+
+def _get(node, shift, h, key, default):
+    while True:
+        if type(node) is _Collision:
+            for k, v in node.items:
+                if k == key:
+                    return v
+            return default
+        bit = 1 << ((h >> shift) & _MASK)
+        if not node.bitmap & bit:
+            return default
+        item = node.items[_popcount(node.bitmap & (bit - 1))]
+        if type(item) is tuple:
+            return item[1] if item[0] == key else default
+        node = item
+        shift += _BITS
+
+
+def _merge(shift, h1, k1, v1, h2, k2, v2):
+    """Build the smallest subtree holding two leaves with different hashes"""
+    if shift >= _HASH_BITS:
+        return _Collision(h1, [(k1, v1), (k2, v2)])
+    i1 = (h1 >> shift) & _MASK
+    i2 = (h2 >> shift) & _MASK
+    if i1 == i2:
+        return _Bitmap(1 << i1, [_merge(shift + _BITS, h1, k1, v1, h2, k2, v2)])
+    items = [(k1, v1), (k2, v2)] if i1 < i2 else [(k2, v2), (k1, v1)]
+    return _Bitmap((1 << i1) | (1 << i2), items)
+
+
+def _set(node, shift, h, key, value):
+    """Return (new_node, added) with key bound to value"""
+    if type(node) is _Collision:
+        if h != node.hash:
+            # Push the collision node down until the hashes diverge
+            wrapper = _Bitmap(1 << ((node.hash >> shift) & _MASK), [node])
+            return _set(wrapper, shift, h, key, value)
+        items = list(node.items)
+        for i, (k, v) in enumerate(items):
+            if k == key:
+                if v is value:
+                    return node, False
+                items[i] = (key, value)
+                return _Collision(h, items), False
+        items.append((key, value))
+        return _Collision(h, items), True
+
+    bit = 1 << ((h >> shift) & _MASK)
+    idx = _popcount(node.bitmap & (bit - 1))
+    if not node.bitmap & bit:
+        items = node.items[:idx]
+        items.append((key, value))
+        items.extend(node.items[idx:])
+        return _Bitmap(node.bitmap | bit, items), True
+
+    item = node.items[idx]
+    if type(item) is tuple:
+        k, v = item
+        if k == key:
+            if v is value:
+                return node, False
+            child, added = (key, value), False
+        else:
+            hk = _hash(k)
+            if hk == h:
+                child = _Collision(h, [item, (key, value)])
+            else:
+                child = _merge(shift + _BITS, hk, k, v, h, key, value)
+            added = True
+    else:
+        child, added = _set(item, shift + _BITS, h, key, value)
+        if child is item:
+            return node, False
+    items = list(node.items)
+    items[idx] = child
+    return _Bitmap(node.bitmap, items), added
+
+
+def _delete(node, shift, h, key):
+    """Return (new_node, removed); new_node is None when the node empties"""
+    if type(node) is _Collision:
+        items = [(k, v) for k, v in node.items if k != key]
+        if len(items) == len(node.items):
+            return node, False
+        if len(items) == 1:
+            return items[0], True
+        return _Collision(node.hash, items), True
+
+    bit = 1 << ((h >> shift) & _MASK)
+    if not node.bitmap & bit:
+        return node, False
+    idx = _popcount(node.bitmap & (bit - 1))
+    item = node.items[idx]
+    if type(item) is tuple:
+        if item[0] != key:
+            return node, False
+        child = None
+    else:
+        child, removed = _delete(item, shift + _BITS, h, key)
+        if not removed:
+            return node, False
+        # Collapse single-leaf children back into this node
+        if type(child) is _Bitmap and len(child.items) == 1 and type(child.items[0]) is tuple:
+            child = child.items[0]
+    items = list(node.items)
+    if child is None:
+        del items[idx]
+        if not items:
+            return None, True
+        return _Bitmap(node.bitmap & ~bit, items), True
+    items[idx] = child
+    return _Bitmap(node.bitmap, items), True
+
+
+def _first(item):
+    return item[0]
+
+
+def _build(entries, shift):
+    """Bulk-build a node from (hash, key, value) entries with distinct keys"""
+    if shift >= _HASH_BITS:
+        return _Collision(entries[0][0], [(k, v) for _, k, v in entries])
+    if len(entries) <= 8:
+        # Small maps (most config objects) usually need no second level
+        slotted = sorted((((h >> shift) & _MASK, k, v) for h, k, v in entries), key=_first)
+        bitmap = 0
+        for slot, _, _ in slotted:
+            bitmap |= 1 << slot
+        if _popcount(bitmap) == len(entries):
+            return _Bitmap(bitmap, [(k, v) for _, k, v in slotted])
+    buckets = {}
+    for entry in entries:
+        slot = (entry[0] >> shift) & _MASK
+        bucket = buckets.get(slot)
+        if bucket is None:
+            buckets[slot] = [entry]
+        else:
+            bucket.append(entry)
+    bitmap = 0
+    items = []
+    for slot in sorted(buckets):
+        bucket = buckets[slot]
+        bitmap |= 1 << slot
+        if len(bucket) == 1:
+            items.append(bucket[0][1:])
+        else:
+            items.append(_build(bucket, shift + _BITS))
+    return _Bitmap(bitmap, items)
+
+
+def _iter(node):
+    for item in node.items:
+        if type(item) is tuple:
+            yield item
+        else:
+            yield from _iter(item)
+
+
+def _diff_nodes(a, b, out):
+    """Append (key, old, new) for every binding that differs between nodes a and b"""
+    if a is b:
+        return
+    if type(a) is _Bitmap and type(b) is _Bitmap:
+        ai = bi = 0
+        for slot in range(_WIDTH):
+            bit = 1 << slot
+            in_a, in_b = a.bitmap & bit, b.bitmap & bit
+            if not in_a and not in_b:
+                continue
+            x = a.items[ai] if in_a else None
+            y = b.items[bi] if in_b else None
+            ai += 1 if in_a else 0
+            bi += 1 if in_b else 0
+            if x is y:
+                continue
+            _diff_items(x, y, out)
+        return
+    _diff_items(a, b, out)
+
+
+def _as_dict(item):
+    if item is None:
+        return {}
+    if type(item) is tuple:
+        return {item[0]: item[1]}
+    return dict(_iter(item))
+
+
+def _diff_items(x, y, out):
+    if type(x) is _Bitmap and type(y) is _Bitmap:
+        _diff_nodes(x, y, out)
+        return
+    if type(x) is tuple and type(y) is tuple and x[0] == y[0]:
+        if x[1] is not y[1] and x[1] != y[1]:
+            out.append((x[0], x[1], y[1]))
+        return
+    # Mixed shapes (leaf vs subtree, collisions): fall back to a local dict diff
+    old, new = _as_dict(x), _as_dict(y)
+    for k, v in old.items():
+        w = new.get(k, MISSING)
+        if w is MISSING:
+            out.append((k, v, MISSING))
+        elif w is not v and w != v:
+            out.append((k, v, w))
+    for k, w in new.items():
+        if k not in old:
+            out.append((k, MISSING, w))
+
+
+class PMap(Mapping):
+    """Immutable mapping with O(log32 n) set/delete and structural sharing"""
+    __slots__ = ("_root", "_len")
+
+    def __init__(self, items=None):
+        self._root = _EMPTY_NODE
+        self._len = 0
+        if items:
+            if not isinstance(items, (dict, PMap)):
+                items = dict(items)  # last binding wins, as with repeated set()
+            if items:
+                self._root = _build([(hash(k) & _HASH_MASK, k, v) for k, v in items.items()], 0)
+                self._len = len(items)
+
+    @classmethod
+    def _from_dict(cls, d):
+        """Bulk build from a dict: one pass per trie level instead of a path copy per key"""
+        if not d:
+            return EMPTY
+        return cls._make(_build([(hash(k) & _HASH_MASK, k, v) for k, v in d.items()], 0), len(d))
+
+    @staticmethod
+    def deferred(size, load, source=None):
+        """A map of size entries built by load() (returning a PMap) on first use
+
+        len() does not build it, and neither does comparing it with itself,
+        so sections nobody touches are never decoded. source is kept for
+        deferred_source().
+        """
+        pm = _DeferredMap.__new__(_DeferredMap)
+        _ROOT.__set__(pm, _Deferred(load, source))
+        pm._len = size
+        return pm
+
+    @classmethod
+    def _make(cls, root, size):
+        pm = cls.__new__(cls)
+        pm._root = root
+        pm._len = size
+        return pm
+
+    def __len__(self):
+        return self._len
+
+    def __getitem__(self, key):
+        value = _get(self._root, 0, _hash(key), key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default=None):
+        return _get(self._root, 0, _hash(key), key, default)
+
+    def __contains__(self, key):
+        return _get(self._root, 0, _hash(key), key, MISSING) is not MISSING
+
+    def __iter__(self):
+        for key, _ in _iter(self._root):
+            yield key
+
+    def items(self):
+        return _iter(self._root)
+
+    def values(self):
+        return (v for _, v in _iter(self._root))
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if isinstance(other, PMap):
+            return self._len == other._len and not self.diff(other)
+        return Mapping.__eq__(self, other)
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"PMap({dict(self.items())!r})"
+
+    def set(self, key, value):
+        root, added = _set(self._root, 0, _hash(key), key, value)
+        if root is self._root:
+            return self
+        return PMap._make(root, self._len + added)
+
+    def delete(self, key):
+        root, removed = _delete(self._root, 0, _hash(key), key)
+        if not removed:
+            return self
+        return PMap._make(root if root is not None else _EMPTY_NODE, self._len - 1)
+
+    def update(self, other):
+        """Return a new map with every binding from other applied"""
+        root, size = self._root, self._len
+        for key, value in (other.items() if isinstance(other, Mapping) else other):
+            root, added = _set(root, 0, _hash(key), key, value)
+            size += added
+        return PMap._make(root, size)
+
+    def diff(self, other):
+        """List (key, old, new) bindings that differ from self to other (MISSING marks absence)"""
+        out = []
+        _diff_nodes(self._root, other._root, out)
+        return out
+
+
+EMPTY = PMap()
+_ROOT = PMap._root
+
+
+class _Deferred:
+    """Root placeholder of a map not built yet"""
+    __slots__ = ("load", "source")
+
+    def __init__(self, load, source):
+        self.load = load
+        self.source = source
+
+
+_DEFERRED_LOCK = threading.RLock()
+
+
+class _DeferredMap(PMap):
+    """A PMap that builds its trie on first access and then becomes a plain PMap"""
+    __slots__ = ()
+
+    @property
+    def _root(self):
+        with _DEFERRED_LOCK:
+            root = _ROOT.__get__(self)
+            if type(root) is _Deferred:
+                loaded = root.load()
+                root = _ROOT.__get__(loaded)
+                _ROOT.__set__(self, root)
+                self._len = len(loaded)
+                self.__class__ = PMap
+            return root
+
+
+def deferred_source(value):
+    """The source a deferred map was made with, or None once it is built (or for any other value)"""
+    if type(value) is _DeferredMap:
+        with _DEFERRED_LOCK:
+            root = _ROOT.__get__(value)
+            if type(root) is _Deferred:
+                return root.source
+    return None
+
+
+_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+
+def freeze(value):
+    """Recursively convert dicts to PMaps and lists to tuples"""
+    t = type(value)
+    if t in _SCALARS or t is PMap:
+        return value
+    if t is dict or isinstance(value, dict):
+        return PMap._from_dict({k: freeze(v) for k, v in value.items()})
+    if t is list or t is tuple or isinstance(value, (list, tuple)):
+        return tuple([freeze(v) for v in value])
+    return value
+
+
+def thaw(value):
+    """Recursively convert PMaps to dicts and tuples to lists"""
+    if isinstance(value, PMap):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
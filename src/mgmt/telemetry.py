@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+NateOS streaming telemetry
+Path subscriptions over the config datastore with delta updates
+
+One datastore commit hook fans each commit out to the subscriptions whose
+paths it touches (indexed by top-level section), so publishing costs
+O(changes + matching subscribers) and the hub owns no threads. Each
+subscription keeps a bounded pending map keyed by leaf path: a burst of
+writes to the same leaf coalesces into the latest value, and when a slow
+consumer lets more distinct leaves pile up than the bound allows, the
+queue is compacted into a single resync (a fresh snapshot of its paths).
+
+Consumers either block in `Subscription.next()` or, from an event loop,
+register `on_ready` and call `poll()` without ever blocking.
+"""
+import threading
+import time
+
+from mgmt.datastore import get_in
+from mgmt.pmap import MISSING
+
+MODE_ON_CHANGE = "on_change"
+MODE_SAMPLE = "sample"
+MODES = (MODE_ON_CHANGE, MODE_SAMPLE)
+
+DEFAULT_MAX_PENDING = 1024
+DEFAULT_MAX_SUBSCRIBERS = 4096
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+def path_text(path):
+    return "/".join(str(p) for p in path)
+
+
+class Subscription:
+    """One subscriber: its paths, mode and bounded queue of pending leaves"""
+
+    def __init__(self, hub, paths, mode=MODE_ON_CHANGE, interval=0.0, max_pending=DEFAULT_MAX_PENDING):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if mode == MODE_SAMPLE and interval <= 0:
+            raise ValueError("sample mode needs a positive interval")
+        self.hub = hub
+        self.paths = [tuple(p) for p in paths]
+        self.mode = mode
+        self.interval = interval
+        self.max_pending = max(1, max_pending)
+        self.version = 0
+        self.dropped = 0
+        self.closed = False
+        self.on_ready = None
+        self._pending = {}
+        self._resync = True  # the first message is always a full snapshot
+        self._cond = threading.Condition(threading.Lock())
+        self._next_sample = 0.0
+
+    def _offer(self, events, version):
+        """Queue (path, value) events from one commit; called by the hub"""
+        with self._cond:
+            if self.closed:
+                return
+            self.version = version
+            if not self._resync:
+                pending = self._pending
+                for path, value in events:
+                    if path in pending:
+                        # Move to the end so replay order follows the last write
+                        del pending[path]
+                    elif len(pending) >= self.max_pending:
+                        # Slow consumer: compact everything into one resync
+                        self.dropped += len(pending)
+                        pending.clear()
+                        self._resync = True
+                        break
+                    pending[path] = value
+            self._cond.notify()
+        callback = self.on_ready
+        if callback is not None:
+            callback(self)
+
+    def _ready(self):
+        return self.closed or self._resync or bool(self._pending)
+
+    def due(self):
+        """Monotonic time the next sample is due (sample mode), else None"""
+        return self._next_sample if self.mode == MODE_SAMPLE else None
+
+    def poll(self, now=None):
+        """Return the next message without blocking, or None"""
+        if self.mode == MODE_SAMPLE:
+            now = time.monotonic() if now is None else now
+            if self.closed or now < self._next_sample:
+                return None
+            self._next_sample = now + self.interval
+            root, version = self.hub.current()
+            with self._cond:
+                self._resync = False
+                self.version = version
+            return self._sync_message(root, version)
+        with self._cond:
+            return self._drain()
+
+    def next(self, timeout=None):
+        """Block until a message is due (or timeout); returns None on timeout/close"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if self.mode == MODE_SAMPLE:
+            with self._cond:
+                while not self.closed:
+                    now = time.monotonic()
+                    if now >= self._next_sample:
+                        break
+                    wait = self._next_sample - now
+                    if deadline is not None:
+                        if now >= deadline:
+                            return None
+                        wait = min(wait, deadline - now)
+                    self._cond.wait(wait)
+            return self.poll()
+
+        with self._cond:
+            while not self._ready():
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            if self.interval > 0 and not self.closed and not self._resync:
+                # Coalescing window: let a burst settle before sending it
+                settle = time.monotonic() + self.interval
+                while not self.closed and not self._resync:
+                    remaining = settle - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            return self._drain()
+
+    def _drain(self):
+        if self.closed:
+            return None
+        if self._resync:
+            self._resync = False
+            self._pending.clear()
+            root, version = self.hub.current()
+            self.version = version
+            return self._sync_message(root, version)
+        if not self._pending:
+            return None
+        updates, deletes = [], []
+        for path, value in self._pending.items():
+            if value is MISSING:
+                deletes.append(path_text(path))
+            else:
+                updates.append({"path": path_text(path), "value": value})
+        self._pending = {}
+        return {"type": "update", "version": self.version, "updates": updates, "deletes": deletes}
+
+    def _sync_message(self, root, version):
+        values = []
+        for path in self.paths:
+            value = get_in(root, path, MISSING)
+            if value is not MISSING:
+                values.append({"path": path_text(path), "value": value})
+        message = {"type": "sync", "version": version, "values": values}
+        if self.dropped:
+            message["dropped"] = self.dropped
+        return message
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+class TelemetryHub:
+    """Fans datastore commits out to path subscriptions"""
+
+    def __init__(self, store, max_subscribers=DEFAULT_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._lock = threading.Lock()
+        self._by_section = {}
+        self._whole = set()
+        self._count = 0
+        head = store.subscribe(self._on_commit)
+        self._root, self._version = head.root, head.version
+
+    def __len__(self):
+        return self._count
+
+    def current(self):
+        with self._lock:
+            return self._root, self._version
+
+    def subscribe(self, paths, mode=MODE_ON_CHANGE, interval=0.0, max_pending=DEFAULT_MAX_PENDING):
+        sub = Subscription(self, paths, mode, interval, max_pending)
+        with self._lock:
+            if self._count >= self.max_subscribers:
+                raise TooManySubscribers(f"subscriber limit ({self.max_subscribers}) reached")
+            self._count += 1
+            sub.version = self._version
+            if mode == MODE_ON_CHANGE:
+                for path in sub.paths:
+                    if path:
+                        self._by_section.setdefault(path[0], set()).add(sub)
+                    else:
+                        self._whole.add(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with sub._cond:
+            if sub.closed:
+                return
+            sub.closed = True
+            sub._pending = {}
+            sub._cond.notify_all()
+        with self._lock:
+            self._count -= 1
+            self._whole.discard(sub)
+            for path in sub.paths:
+                if path:
+                    subs = self._by_section.get(path[0])
+                    if subs is not None:
+                        subs.discard(sub)
+                        if not subs:
+                            del self._by_section[path[0]]
+
+    def _on_commit(self, commit):
+        with self._lock:
+            self._root, self._version = commit.root, commit.version
+            if not self._by_section and not self._whole:
+                return
+            by_section = {}
+            for change in commit.changes:
+                if change[0]:
+                    by_section.setdefault(change[0][0], []).append(change)
+            targets = {}
+            for section, changes in by_section.items():
+                for sub in self._by_section.get(section, ()):
+                    targets.setdefault(sub, []).extend(changes)
+            for sub in self._whole:
+                targets[sub] = commit.changes
+        for sub, changes in targets.items():
+            events = _match(sub.paths, changes, commit)
+            if events:
+                sub._offer(events, commit.version)
+
+
+def _match(paths, changes, commit):
+    """(path, value) events for the subscribed paths touched by changes"""
+    events = []
+    seen = set()
+    for path, _, new in changes:
+        for prefix in paths:
+            if path[:len(prefix)] == prefix:
+                # Change at or below the subscription: send the leaf itself
+                if path not in seen:
+                    seen.add(path)
+                    events.append((path, new))
+                break
+            if prefix[:len(path)] == path:
+                # A whole subtree above the subscription was replaced
+                old_value = get_in(commit.parent, prefix, MISSING)
+                new_value = get_in(commit.root, prefix, MISSING)
+                if old_value is not new_value and old_value != new_value and prefix not in seen:
+                    seen.add(prefix)
+                    events.append((prefix, new_value))
+    return events
@@ -3,16 +3,64 @@
 NateOS Web Management API
 Provides REST endpoints for configuring all networking functions
 """
+import atexit
+import bisect
+import gzip
+import hashlib
 import json
 import os
-from flask import Flask, jsonify, request, send_from_directory
+import re
+import secrets
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from flask import Flask, Request, Response, jsonify, request, send_from_directory, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 
 # Get the directory where this file is located
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
+SRC_DIR = os.path.dirname(os.path.dirname(BASE_DIR))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from control.igmp import ANY_SOURCE, IgmpSnooping, ip_to_int
+from control.lacp import LacpSystem, synthetic_trace as synthetic_lag_trace
+from control.neighbors import STATE_NAMES as NEIGHBOR_STATES, NeighborCache, parse_ip
+from control.stp import from_config as stp_from_config
+from control.routes import StaticRouteTable, normalize as normalize_route, normalize_gateway, normalize_group
+from dataplane.acl import AclClassifier
+from dataplane.fdb import Fdb, mac_to_int
+from dataplane.fib import Fib
+from dataplane.vlanmap import VlanMembership, format_vlans, parse_vlans
+from dataplane.qos import QosPolicy, simulate as simulate_qos, synthetic_trace
+from dataplane.span import SpanEngine
+from mgmt.datastore import Datastore, DatastoreError, MISSING, get_in
+from mgmt.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, ProfilerBusy, Registry, collapse, sample_stacks
+from mgmt.persist import open_datastore
+from mgmt.pmap import PMap, thaw
+from mgmt.telemetry import MODES, MODE_ON_CHANGE, MODE_SAMPLE, TelemetryHub, TooManySubscribers
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd variants are only offered when installed
+    zstandard = None
+
+
+class ConfigJSONProvider(DefaultJSONProvider):
+    """Serialize datastore PMaps like plain dicts"""
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, PMap):
+            return dict(o.items())
+        return DefaultJSONProvider.default(o)
+
 
 app = Flask(__name__, static_folder=STATIC_DIR)
+app.json = ConfigJSONProvider(app)
 CORS(app)  # Enable CORS for frontend
 
 # Serve the main HTML page
@@ -22,15 +70,16 @@ def index():
     """Serve the main web GUI"""
     return send_from_directory(STATIC_DIR, "index.html")
 
-# In-memory config store (will be replaced with Redis/datastore later)
-CONFIG_STORE = {
+# Factory-default layout of the running config
+DEFAULT_CONFIG = {
     "interfaces": {},
     "vlans": {},
     "stp": {"enabled": False, "mode": "rstp", "priority": 32768},
     "lacp": {},
     "lldp": {"enabled": False},
     "igmp_snooping": {"enabled": False},
-    "static_routes": [],
+    "static_routes": {},
+    "next_hop_groups": {},
     "ospf": {"enabled": False, "areas": {}},
     "bgp": {"enabled": False, "asn": 0, "neighbors": {}},
     "vrp": {},
@@ -41,6 +90,807 @@ CONFIG_STORE = {
     "aaa": {"auth_method": "local"},
 }
 
+# Versioned candidate/running config store (see mgmt/datastore.py); with
+# NATEOS_STATE_DIR set it is recovered from and logged to disk (mgmt/persist.py)
+STATE_DIR = os.environ.get("NATEOS_STATE_DIR")
+if STATE_DIR:
+    DATASTORE, WAL = open_datastore(STATE_DIR, DEFAULT_CONFIG, fsync=os.environ.get("NATEOS_FSYNC", "group"))
+    atexit.register(WAL.close)
+else:
+    DATASTORE, WAL = Datastore(DEFAULT_CONFIG), None
+
+# Open candidate transactions by id (X-NateOS-Transaction header) and when
+# each was last used. Each pins the snapshot it was based on, so candidates
+# idle past TRANSACTION_IDLE_S are rolled back, and past MAX_TRANSACTIONS a
+# new one is refused (429) rather than dropping someone's open candidate
+TXN_HEADER = "X-NateOS-Transaction"
+TRANSACTIONS = {}
+TRANSACTION_USED = {}
+TRANSACTION_LOCK = threading.Lock()
+MAX_TRANSACTIONS = 64
+TRANSACTION_IDLE_S = 900.0
+
+# State derived from running config or learned by the dataplane (the tables
+# below, cached views and bodies) is shared by the request threads; commit
+# hooks hold this lock while they update it, and so do handlers that age,
+# advance or read it. Hooks run under the datastore's lock, so nothing may
+# commit while holding this one.
+STATE_LOCK = threading.RLock()
+
+# Serialized GET bodies, reused until their section's generation changes
+SECTION_GENERATIONS = {}
+RESPONSE_CACHE = {}
+COMPRESS_MIN_BYTES = 1024
+
+# Paged table GETs (?offset=&limit=&sort=&filter=): sorted, filtered TableViews
+# per (section, scope, sort field, filter), patched on commit
+TABLE_VIEWS = {}
+MAX_TABLE_VIEWS = 64
+MAX_PAGE = 1000
+PAGE_ARGS = ("offset", "limit", "sort", "filter")
+
+# Streaming subscriptions (/api/stream), fed by datastore commits
+TELEMETRY = TelemetryHub(DATASTORE)
+STREAM_KEEPALIVE = 15.0
+
+# URL segments whose datastore section is spelled differently
+PATH_ALIASES = {"igmp-snooping": "igmp_snooping", "static-routes": "static_routes",
+                "next-hop-groups": "next_hop_groups", "vrrp": "vrp"}
+
+# /api/batch limits and operations (named after the Transaction methods)
+BATCH_OPS = ("set", "merge", "append", "delete")
+MAX_BATCH_ITEMS = 100000
+
+# Compiled ACL classifier mirroring the "acl" section
+ACL = AclClassifier()
+
+# Port <-> VLAN membership bitmaps mirroring the "interfaces" section
+VLAN_MAP = VlanMembership()
+
+# MAC forwarding database: entries the dataplane learned and reported with
+# POST /api/l2/fdb (switchd --api does after a run); they age out here too
+FDB = Fdb(now=time.monotonic())
+
+# IGMP snooping state: memberships the dataplane snooped and reported with
+# POST /api/l2/igmp-snooping/groups, plus the static groups, router ports and
+# timers of the "igmp_snooping" section
+IGMP = IgmpSnooping(now=time.monotonic())
+
+# LAG bundles compiled from the "lacp" section (selection tables, LACP state);
+# there is no link telemetry here, so member links are taken as up
+LACP = LacpSystem()
+MAX_TRACE_PACKETS = 1000000
+
+# Spanning tree over the configured interfaces (None unless stp.enabled);
+# rebuilt, and so reconverged, whenever "stp" or the interface set changes
+STP = None
+
+# Longest-prefix-match table programmed from the "static_routes" section,
+# with ECMP groups from "next_hop_groups"
+FIB = Fib()
+
+# Static routes keyed by route id, with next-hop/prefix-length indexes
+ROUTES = StaticRouteTable(FIB)
+
+# ARP/ND cache (resolved by the dataplane, read-only over the API); static
+# route and next-hop group gateways are pinned in it for resolution, on the
+# route's "interface" or NEIGHBOR_INTERFACE
+NEIGHBORS = NeighborCache(now=time.monotonic())
+NEIGHBOR_INTERFACE = "vlan1"
+# Pinned gateways, (ifid, ip, version) -> routes and group members using
+# them, and what each route id and group id contributes
+NEXT_HOPS = {}
+ROUTE_HOPS = {}
+GROUP_HOPS = {}
+
+# QoS policy compiled from the "qos" section (classification tables, schedulers)
+QOS = QosPolicy()
+MAX_SIM_PACKETS = 1000000
+
+# Per-route request counters and latency histograms, served with table and
+# process gauges by /api/metrics; NATEOS_METRICS=0 leaves requests unrecorded
+METRICS = Registry(enabled=os.environ.get("NATEOS_METRICS", "1") != "0")
+HTTP_REQUESTS = METRICS.counter("nateos_http_requests_total", "API requests by route, method and status",
+                                ("route", "method", "status"))
+HTTP_LATENCY = METRICS.histogram("nateos_http_request_duration_seconds",
+                                 "API request latency up to the response (not its streamed body)", ("route", "method"))
+APPLY_ERRORS = METRICS.counter("nateos_config_apply_errors_total",
+                               "Committed sections the tables could not apply (the old ones stay)", ("section",))
+METRICS.gauge("nateos_config_version", "Running config version", lambda: DATASTORE.version)
+METRICS.gauge("nateos_table_entries", "Entries in the tables mirroring running config and learned state",
+              lambda: {("routes",): len(ROUTES), ("acl_rules",): len(ACL), ("fdb",): len(FDB),
+                       ("neighbors",): len(NEIGHBORS), ("next_hops",): len(NEXT_HOPS)}, ("table",))
+METRICS.gauge("nateos_open_transactions", "Open candidate transactions", lambda: len(TRANSACTIONS))
+METRICS.gauge("nateos_stream_subscribers", "Open /api/stream subscriptions", lambda: len(TELEMETRY))
+METRICS.gauge("nateos_response_cache_entries", "Cached GET bodies", lambda: len(RESPONSE_CACHE))
+METRICS.gauge("nateos_threads", "Live threads", threading.active_count)
+METRICS.gauge("process_cpu_seconds_total", "CPU time used by the process", time.process_time, kind="counter")
+
+# /api/debug/profile limits
+PROFILE_MAX_SECONDS = 60
+PROFILE_MAX_HZ = 1000
+
+
+class TransactionNotFound(DatastoreError):
+    status = 404
+
+
+class TooManyTransactions(DatastoreError):
+    status = 429
+
+
+@app.errorhandler(DatastoreError)
+def datastore_error(e):
+    return jsonify({"error": str(e)}), e.status
+
+
+class MetricsRequest(Request):
+    """Flask request that leaves itself in the environ, where RequestMetrics finds its URL rule"""
+
+    def __init__(self, environ, *args, **kwargs):
+        super().__init__(environ, *args, **kwargs)
+        environ["nateos.request"] = self
+
+
+class RequestMetrics:
+    """WSGI middleware: count and time each request by URL rule, method and status
+
+    Times up to the response (not its streamed body). Takes the request from
+    the environ rather than through the context-local proxies, which cost
+    more than the recording itself.
+    """
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        started = time.perf_counter_ns()
+        status = []
+
+        def capture(line, headers, exc_info=None):
+            status.append(line)
+            return start_response(line, headers, exc_info)
+
+        body = self.wsgi_app(environ, capture)
+        elapsed = time.perf_counter_ns() - started
+        # The URL rule, not the path, so ids in URLs do not explode the label set
+        rule = getattr(environ.pop("nateos.request", None), "url_rule", None)
+        route = rule.rule if rule is not None else "unmatched"
+        method = environ["REQUEST_METHOD"]
+        HTTP_LATENCY.record(elapsed, (route, method))
+        HTTP_REQUESTS.inc((route, method, status[0][:3] if status else "000"))
+        return body
+
+
+# Disabled means not wrapped at all, so requests pay nothing for metrics
+if METRICS.enabled:
+    app.request_class = MetricsRequest
+    app.wsgi_app = RequestMetrics(app.wsgi_app)
+
+
+def _expire_transactions(now):
+    """Roll back candidates idle longer than TRANSACTION_IDLE_S; call with TRANSACTION_LOCK held"""
+    for txn_id, used in list(TRANSACTION_USED.items()):
+        if now - used > TRANSACTION_IDLE_S:
+            del TRANSACTION_USED[txn_id]
+            TRANSACTIONS.pop(txn_id).rollback()
+
+
+def _transaction(txn_id, close=False):
+    """The open transaction txn_id, or None if unknown or expired; marks it used, or forgets it if close"""
+    now = time.monotonic()
+    with TRANSACTION_LOCK:
+        _expire_transactions(now)
+        if close:
+            TRANSACTION_USED.pop(txn_id, None)
+            return TRANSACTIONS.pop(txn_id, None)
+        txn = TRANSACTIONS.get(txn_id)
+        if txn is not None:
+            TRANSACTION_USED[txn_id] = now
+        return txn
+
+
+def _open_txn():
+    """Return the candidate transaction named by the request header, if any"""
+    txn_id = request.headers.get(TXN_HEADER)
+    if not txn_id:
+        return None
+    txn = _transaction(txn_id)
+    if txn is None:
+        raise TransactionNotFound(f"transaction '{txn_id}' not found")
+    return txn
+
+
+def _read(*path, default=None):
+    """Read from the caller's candidate if it has one open, else from running"""
+    txn = _open_txn()
+    if txn is None:
+        return DATASTORE.get(path, default)
+    return txn.get(path, default)
+
+
+@contextmanager
+def _edit(comment):
+    """Edit inside the caller's open transaction, or auto-commit a new one"""
+    txn = _open_txn()
+    if txn is not None:
+        yield txn
+        return
+    with DATASTORE.begin(comment) as txn:
+        yield txn
+
+
+class CachedBody:
+    """One serialized JSON body plus lazily built compressed variants"""
+    __slots__ = ("generation", "etag", "variants")
+
+    def __init__(self, generation, body):
+        self.generation = generation
+        self.etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.variants = {"identity": body}
+
+    def variant(self, encoding):
+        body = self.variants.get(encoding)
+        if body is None:
+            raw = self.variants["identity"]
+            if encoding == "gzip":
+                body = gzip.compress(raw, compresslevel=6, mtime=0)
+            else:
+                body = zstandard.ZstdCompressor(level=3).compress(raw)
+            self.variants[encoding] = body
+        return body
+
+    def etags(self):
+        return [self.etag] + [f"{self.etag}-{encoding}" for encoding in ("gzip", "zstd")]
+
+
+def _bump_generations(commit):
+    """Commit hook: invalidate cached bodies for every section the commit touched"""
+    with STATE_LOCK:
+        for section in commit.sections:
+            SECTION_GENERATIONS[section] = SECTION_GENERATIONS.get(section, 0) + 1
+
+
+DATASTORE.subscribe(_bump_generations)
+
+
+def _pick_encoding(size):
+    if size < COMPRESS_MIN_BYTES:
+        return "identity"
+    accept = request.accept_encodings
+    if zstandard is not None and accept["zstd"]:
+        return "zstd"
+    if accept["gzip"]:
+        return "gzip"
+    return "identity"
+
+
+def _json_response(*path, default=None, transform=None):
+    """GET a config path with a strong ETag, If-None-Match and cached encodings
+
+    transform, if given, reshapes the stored value before encoding (its
+    output is cached like the raw value).
+    """
+    if _open_txn() is not None:
+        value = _read(*path, default=default)
+        return jsonify(transform(value) if transform else value)
+    # Read the generation before the data so a racing commit only costs a re-encode
+    generation = SECTION_GENERATIONS.get(path[0], 0) if path else DATASTORE.version
+    key = (transform, path)
+    entry = RESPONSE_CACHE.get(key)
+    if entry is None or entry.generation != generation:
+        value = DATASTORE.get(path, default)
+        body = (app.json.dumps(transform(value) if transform else value) + "\n").encode("utf-8")
+        entry = CachedBody(generation, body)
+        # Whole config and whole sections are cached; deeper paths only get ETags.
+        # A slower request encoding an older generation must not replace a newer body.
+        if len(path) <= 1:
+            with STATE_LOCK:
+                current = RESPONSE_CACHE.get(key)
+                if current is None or current.generation < generation:
+                    RESPONSE_CACHE[key] = entry
+
+    return _cached_response(entry)
+
+
+def _cached_response(entry):
+    """Serve a CachedBody: 304 on a matching If-None-Match, else the best encoding"""
+    for etag in entry.etags():
+        if request.if_none_match.contains(etag):
+            response = app.response_class(status=304)
+            response.set_etag(etag)
+            return response
+    encoding = _pick_encoding(len(entry.variants["identity"]))
+    response = app.response_class(entry.variant(encoding), mimetype="application/json")
+    response.vary.add("Accept-Encoding")
+    if encoding == "identity":
+        response.set_etag(entry.etag)
+    else:
+        response.set_etag(f"{entry.etag}-{encoding}")
+        response.headers["Content-Encoding"] = encoding
+    return response
+
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def _natural_key(value):
+    """Sort key ordering eth2 before eth10 and 10.0.2.0/24 before 10.0.10.0/24
+
+    Digit runs are zero-padded rather than turned into ints so the key stays
+    one flat tuple of like-typed fields, which sorts several times faster.
+    """
+    if value is None:
+        return (2, 0, "")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (0, value, "")
+    parts = _DIGITS.split(str(value).lower())
+    parts[1::2] = [digits.zfill(20) for digits in parts[1::2]]
+    return (1, 0, "".join(parts))
+
+
+def _search_text(row):
+    return " ".join(str(value) for value in row.values()).lower()
+
+
+class TableView:
+    """Rows of one section matching a filter, kept sorted ascending on (field key, row id)
+
+    Commits patch views row by row (_update_table_views), so a view costs
+    one sort when first asked for and O(log n) lookups plus a list insert
+    per changed row after that.
+    """
+    __slots__ = ("generation", "field", "text", "keys", "rows", "index")
+
+    def __init__(self, generation, field, text, pairs, ordered=False):
+        """pairs: (row id, row) already built; ordered when they come sorted on field already"""
+        self.generation = generation
+        self.field = field
+        self.text = text
+        keys, rows = [], []
+        for rid, row in pairs:
+            if not text or text in _search_text(row):
+                keys.append(_natural_key(row.get(field)) + (str(rid),))
+                rows.append(row)
+        if not ordered:
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            keys = [keys[i] for i in order]
+            rows = [rows[i] for i in order]
+        self.keys = keys
+        self.rows = rows
+        self.index = {key[3]: key for key in keys}
+
+    def pairs(self):
+        return zip((key[3] for key in self.keys), self.rows)
+
+    def remove(self, rid):
+        key = self.index.pop(str(rid), None)
+        if key is not None:
+            pos = bisect.bisect_left(self.keys, key)
+            del self.keys[pos]
+            del self.rows[pos]
+
+    def insert(self, rid, row):
+        if self.text and self.text not in _search_text(row):
+            return
+        key = _natural_key(row.get(self.field)) + (str(rid),)
+        pos = bisect.bisect_left(self.keys, key)
+        self.keys.insert(pos, key)
+        self.rows.insert(pos, row)
+        self.index[key[3]] = key
+
+    def page(self, offset, limit, descending=False):
+        if not descending:
+            return self.rows[offset:offset + limit]
+        end = len(self.rows) - offset
+        return self.rows[max(0, end - limit):max(0, end)][::-1]
+
+
+def _interface_row(name, cfg):
+    return dict(cfg.items(), name=name) if isinstance(cfg, PMap) else None
+
+
+def _vlan_row(vid, cfg):
+    return dict(cfg.items() if isinstance(cfg, PMap) else (), vlan_id=int(vid) if vid.isdigit() else vid)
+
+
+def _route_row(rid, route):
+    return dict(route.items()) if isinstance(route, PMap) else None
+
+
+# Paged sections: row builder (key, stored value) -> row dict, and default sort field
+TABLES = {
+    "interfaces": (_interface_row, "name"),
+    "vlans": (_vlan_row, "vlan_id"),
+    "static_routes": (_route_row, "destination"),
+}
+
+
+def _paged():
+    return any(arg in request.args for arg in PAGE_ARGS)
+
+
+def _table_view(section, field, text, scope=None, ids=None):
+    """The cached view of a section for (sort field, filter text, scope), built on a miss
+
+    A miss borrows rows from a current view of the same section and scope
+    when there is one: the unfiltered view on the same field only needs
+    filtering, any other unfiltered view only re-sorting.
+    """
+    cacheable = _open_txn() is None
+    key = (section, scope, field, text)
+    # Views are patched by a commit hook, so look up and copy donor rows under
+    # the lock; the sort that builds the new view runs outside it
+    with STATE_LOCK:
+        generation = SECTION_GENERATIONS.get(section, 0)
+        view = TABLE_VIEWS.get(key) if cacheable else None
+        if view is not None and view.generation == generation:
+            return view
+        donors = [v for k, v in TABLE_VIEWS.items() if k[:2] == (section, scope) and not v.text
+                  and v.generation == generation] if cacheable else []
+        base = next((v for v in donors if v.field == field), None)
+        pairs = base.pairs() if base is not None else donors[0].pairs() if donors else None
+    if base is not None:
+        view = TableView(generation, field, text, pairs, ordered=True)
+    elif donors:
+        view = TableView(generation, field, text, pairs)
+    else:
+        make = TABLES[section][0]
+        items = _read(section, default=PMap()).items()
+        if ids is not None:
+            items = [(rid, value) for rid, value in items if rid in ids]
+        rows = ((rid, make(rid, value)) for rid, value in items)
+        view = TableView(generation, field, text, [(rid, row) for rid, row in rows if row is not None])
+    if cacheable:
+        with STATE_LOCK:
+            if len(TABLE_VIEWS) >= MAX_TABLE_VIEWS:
+                TABLE_VIEWS.pop(next(iter(TABLE_VIEWS)))
+            TABLE_VIEWS[key] = view
+    return view
+
+
+def _update_table_views(commit):
+    """Commit hook: patch cached table views with the rows a commit changed
+
+    Views of a replaced section, scoped views (their filters live outside
+    the view) and views that are behind or would change by more than an
+    eighth are dropped instead and rebuilt on their next read.
+    """
+    with STATE_LOCK:
+        if not TABLE_VIEWS:
+            return
+        touched = {}
+        for path, _, _ in commit.changes:
+            if path[0] in TABLES:
+                touched.setdefault(path[0], set()).add(path[1] if len(path) > 1 else None)
+        for key, view in list(TABLE_VIEWS.items()):
+            section, scope = key[0], key[1]
+            rids = touched.get(section)
+            if rids is None:
+                continue
+            generation = SECTION_GENERATIONS.get(section, 0)
+            if (None in rids or scope is not None or view.generation != generation - 1
+                    or len(rids) > max(64, len(view.rows) // 8)):
+                TABLE_VIEWS.pop(key, None)
+                continue
+            make = TABLES[section][0]
+            current = commit.root.get(section, MISSING)
+            for rid in rids:
+                view.remove(rid)
+                value = current.get(rid, MISSING) if isinstance(current, PMap) else MISSING
+                row = make(rid, value) if value is not MISSING else None
+                if row is not None:
+                    view.insert(rid, row)
+            view.generation = generation
+
+
+DATASTORE.subscribe(_update_table_views)
+
+
+def _table_page(section, scope=None, ids=None):
+    """One page of a section as rows (?offset=&limit=&sort=field|-field&filter=text), with an ETag
+
+    scope names the filter that produced ids (a subset of row keys), so its
+    views are cached apart. The body carries no version, so a page the last
+    commit left alone still revalidates with a 304.
+    """
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(MAX_PAGE, max(1, int(request.args.get("limit", 100))))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    sort = request.args.get("sort") or TABLES[section][1]
+    if not re.fullmatch(r"-?\w+", sort):
+        return jsonify({"error": "sort must be a field name, optionally prefixed with '-'"}), 400
+    text = request.args.get("filter", "").strip().lower()
+    view = _table_view(section, sort.lstrip("-"), text, scope, ids)
+    with STATE_LOCK:
+        generation = view.generation
+        body = {"total": len(view.rows), "offset": offset, "limit": limit, "sort": sort,
+                "entries": view.page(offset, limit, sort.startswith("-"))}
+    return _cached_response(CachedBody(generation, (app.json.dumps(body) + "\n").encode("utf-8")))
+
+
+def _api_path(text):
+    """Map an API-style path (l2/vlans, l3/bgp/neighbors) to a datastore path"""
+    parts = [p for p in text.strip().strip("/").split("/") if p]
+    if parts[:1] == ["api"]:
+        parts = parts[1:]
+    if parts[:1] and parts[0] in ("l2", "l3", "mgmt", "config"):
+        parts = parts[1:]
+    if parts:
+        parts[0] = PATH_ALIASES.get(parts[0], parts[0])
+    return tuple(parts)
+
+
+def _change_json(path, old, new):
+    change = {"path": "/".join(str(p) for p in path)}
+    if old is not MISSING:
+        change["old"] = old
+    if new is not MISSING:
+        change["new"] = new
+    return change
+
+
+def _check_group(route):
+    """Reject a route naming a next-hop group that does not exist"""
+    gid = route.get("group")
+    if gid and _read("next_hop_groups", gid, default=MISSING) is MISSING:
+        raise ValueError(f"unknown next-hop group '{gid}'")
+    return route
+
+
+def _route_map(routes):
+    """Key a route list (or id -> route map) by route id, validating each"""
+    if isinstance(routes, (dict, PMap)):
+        routes = list(routes.values())
+    if not isinstance(routes, (list, tuple)):
+        raise ValueError("static routes must be a list")
+    entries = (_check_group(normalize_route(route)) for route in routes)
+    return {entry["id"]: entry for entry in entries}
+
+
+def _route_list(routes):
+    """Static routes as a list ordered by vrf, destination and gateway"""
+    return sorted(routes.values(), key=lambda r: (r["vrf"], r["destination"], r["gateway"]))
+
+
+def _group_list(groups):
+    """Next-hop groups as a list ordered by id"""
+    return sorted(groups.values(), key=lambda g: g["id"])
+
+
+def _sync_routes(changes, root, before):
+    """Apply static route changes from one commit to ROUTES (and so the FIB) and their gateway pins"""
+    touched = set()
+    for path, _, new in changes:
+        if len(path) == 1:
+            routes = [route for route in (new.values() if isinstance(new, PMap) else ()) if isinstance(route, PMap)]
+            ROUTES.load(routes)
+            for rid in list(ROUTE_HOPS):
+                _set_hops(ROUTE_HOPS, rid, (), before)
+            for route in routes:
+                _set_hops(ROUTE_HOPS, route["id"], _route_hops(route), before)
+            touched.clear()
+        else:
+            touched.add(path[1])
+    for rid in touched:
+        ROUTES.remove(rid)
+        route = get_in(root, ("static_routes", rid), MISSING)
+        if isinstance(route, PMap):
+            ROUTES.add(route)
+            _set_hops(ROUTE_HOPS, rid, _route_hops(route), before)
+        else:
+            _set_hops(ROUTE_HOPS, rid, (), before)
+
+
+def _sync_groups(changes, root, before):
+    """Apply next-hop group changes from one commit to the FIB's ECMP groups and their member pins"""
+    touched = set()
+    for path, _, new in changes:
+        if len(path) == 1:
+            touched.update(group.id for group in FIB.groups)
+            touched.update(new.keys() if isinstance(new, PMap) else ())
+        else:
+            touched.add(path[1])
+    for gid in touched:
+        group = get_in(root, ("next_hop_groups", gid), MISSING)
+        if isinstance(group, PMap) and isinstance(group.get("members"), tuple):
+            FIB.groups.set(gid, group["members"])
+            targets = {_hop_target(NEIGHBOR_INTERFACE, member) for member in group["members"]}
+            targets.discard(None)
+            _set_hops(GROUP_HOPS, gid, tuple(targets), before)
+        else:
+            FIB.groups.remove(gid)
+            _set_hops(GROUP_HOPS, gid, (), before)
+
+
+def _hop_target(interface, gateway):
+    """Neighbor cache key of an IP gateway; None for an interface or group next-hop"""
+    try:
+        ip, version = parse_ip(gateway)
+    except ValueError:
+        return None
+    return NEIGHBORS.if_id(interface), ip, version
+
+
+def _route_hops(route):
+    target = _hop_target(route.get("interface") or NEIGHBOR_INTERFACE, route["gateway"])
+    return (target,) if target is not None else ()
+
+
+def _set_hops(owners, key, targets, before):
+    """Replace the gateways owner key uses in the NEXT_HOPS refcounts
+
+    before records the count each touched gateway had, for _pin_next_hops.
+    """
+    old = owners.pop(key, ())
+    if targets:
+        owners[key] = targets
+    for target, delta in [(target, -1) for target in old] + [(target, 1) for target in targets]:
+        count = NEXT_HOPS.get(target, 0)
+        before.setdefault(target, count)
+        count += delta
+        if count:
+            NEXT_HOPS[target] = count
+        else:
+            del NEXT_HOPS[target]
+
+
+def _pin_next_hops(before):
+    """Pin gateways whose count went from 0 to some, unpin those that dropped to 0"""
+    new = []
+    for target, count in before.items():
+        if target in NEXT_HOPS:
+            if not count:
+                new.append(target)
+        elif count:
+            NEIGHBORS.unpin(*target)
+    if new:
+        ifids, ips, versions = zip(*new)
+        NEIGHBORS.resolve_many(ifids, ips, time.monotonic(), versions)
+
+
+def _sync_interfaces(changes, root):
+    """Apply interface changes from one commit to the VLAN membership bitmaps"""
+    touched = set()
+    for path, old, new in changes:
+        if len(path) == 1:
+            touched.update(old.keys() if isinstance(old, PMap) else ())
+            touched.update(new.keys() if isinstance(new, PMap) else ())
+        else:
+            touched.add(path[1])
+    for name in touched:
+        config = get_in(root, ("interfaces", name), MISSING)
+        if not isinstance(config, PMap):
+            VLAN_MAP.remove(name)
+            continue
+        try:
+            VLAN_MAP.configure(name, thaw(config))
+        except (ValueError, TypeError) as e:
+            print(f"[NateOS Web API] interface {name}: VLAN membership not applied: {e}", file=sys.stderr)
+            APPLY_ERRORS.inc(("interfaces",))
+
+
+def _sync_qos(qos):
+    """Recompile the QoS policy; a config that does not compile keeps the old one"""
+    global QOS
+    try:
+        QOS = QosPolicy(thaw(qos) if isinstance(qos, PMap) else {})
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"[NateOS Web API] qos config not applied: {e}", file=sys.stderr)
+        APPLY_ERRORS.inc(("qos",))
+
+
+def _sync_lacp(section):
+    """Recompile the LAG bundles; a config that does not compile keeps the old ones"""
+    global LACP
+    try:
+        lacp = LacpSystem(thaw(section) if isinstance(section, PMap) else {}, now=time.monotonic())
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"[NateOS Web API] lacp config not applied: {e}", file=sys.stderr)
+        APPLY_ERRORS.inc(("lacp",))
+        return
+    lacp.set_links([(name, True) for name in lacp.members], time.monotonic())
+    LACP = lacp
+
+
+def _sync_igmp(section):
+    try:
+        IGMP.configure(thaw(section) if isinstance(section, PMap) else {})
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"[NateOS Web API] igmp_snooping config not applied: {e}", file=sys.stderr)
+        APPLY_ERRORS.inc(("igmp_snooping",))
+
+
+def _sync_stp(root):
+    """Rebuild the spanning tree; a config that does not compile keeps the old one"""
+    global STP
+    section = root.get("stp", MISSING)
+    config = thaw(section) if isinstance(section, PMap) else {}
+    if not config.get("enabled"):
+        STP = None
+        return
+    interfaces = root.get("interfaces", MISSING)
+    try:
+        STP = stp_from_config(config, interfaces.keys() if isinstance(interfaces, PMap) else (),
+                              now=time.monotonic())
+    except (ValueError, TypeError, AttributeError) as e:
+        print(f"[NateOS Web API] stp config not applied: {e}", file=sys.stderr)
+        APPLY_ERRORS.inc(("stp",))
+
+
+def _ports_changed(path, old, new):
+    """True if an interfaces change adds or removes a port (not just edits one)"""
+    if len(path) == 1:
+        return set(old.keys() if isinstance(old, PMap) else ()) != set(new.keys() if isinstance(new, PMap) else ())
+    return len(path) == 2 and (old is MISSING) != (new is MISSING)
+
+
+def _sync_tables(commit):
+    """Commit hook: keep the FIB, ACL classifier, QoS policy, IGMP snooping, LAGs and STP in step with running"""
+    with STATE_LOCK:
+        route_changes, group_changes, interface_changes = [], [], []
+        qos_changed = igmp_changed = stp_changed = lacp_changed = False
+        for path, old, new in commit.changes:
+            if path[:1] == ("static_routes",):
+                route_changes.append((path, old, new))
+            elif path[:1] == ("next_hop_groups",):
+                group_changes.append((path, old, new))
+            elif path[:1] == ("interfaces",):
+                interface_changes.append((path, old, new))
+            elif path == ("acl",):
+                old = old if isinstance(old, tuple) else ()
+                new = new if isinstance(new, tuple) else ()
+                if new[:len(old)] == old:
+                    for rule in new[len(old):]:
+                        ACL.add(rule)
+                else:
+                    ACL.compile(new)
+            elif path[:1] == ("qos",):
+                qos_changed = True
+            elif path[:1] == ("igmp_snooping",):
+                igmp_changed = True
+            elif path[:1] == ("stp",):
+                stp_changed = True
+            elif path[:1] == ("lacp",):
+                lacp_changed = True
+        if interface_changes:
+            _sync_interfaces(interface_changes, commit.root)
+        if stp_changed or any(_ports_changed(path, old, new) for path, old, new in interface_changes):
+            _sync_stp(commit.root)
+        if qos_changed:
+            _sync_qos(commit.root.get("qos", MISSING))
+        if igmp_changed:
+            _sync_igmp(commit.root.get("igmp_snooping", MISSING))
+        if lacp_changed:
+            _sync_lacp(commit.root.get("lacp", MISSING))
+        before = {}
+        if group_changes:
+            _sync_groups(group_changes, commit.root, before)
+        if route_changes:
+            _sync_routes(route_changes, commit.root, before)
+        _pin_next_hops(before)
+
+
+def _load_tables(root):
+    """Program the route table/FIB, ACL, VLAN membership, QoS, IGMP snooping, LAGs and STP from a whole (e.g. recovered) config"""
+    before = {}
+    _sync_groups([(("next_hop_groups",), MISSING, root.get("next_hop_groups", MISSING))], root, before)
+    _sync_routes([(("static_routes",), MISSING, root.get("static_routes", MISSING))], root, before)
+    _pin_next_hops(before)
+    acl = root.get("acl", ())
+    ACL.compile(acl if isinstance(acl, tuple) else ())
+    _sync_interfaces([(("interfaces",), MISSING, root.get("interfaces", MISSING))], root)
+    _sync_qos(root.get("qos", MISSING))
+    _sync_igmp(root.get("igmp_snooping", MISSING))
+    _sync_lacp(root.get("lacp", MISSING))
+    _sync_stp(root)
+
+
+DATASTORE.subscribe(_sync_tables)
+_load_tables(DATASTORE.running)
+
 
 @app.route("/api/health", methods=["GET"])
 def health():
@@ -48,176 +898,947 @@ def health():
     return jsonify({"status": "ok", "service": "nateos-web-api"})
 
 
+@app.route("/api/metrics", methods=["GET"])
+def metrics():
+    """Request, table and process metrics in the Prometheus text format"""
+    return Response(METRICS.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/api/debug/profile", methods=["GET"])
+def debug_profile():
+    """Sample every thread's stack for ?seconds= (default 10) at ?hz= (default 100); collapsed stacks for flamegraph.pl
+
+    Threads idling for work are left out unless ?idle=1.
+    """
+    try:
+        seconds = float(request.args.get("seconds", 10))
+        hz = int(request.args.get("hz", 100))
+    except ValueError:
+        return jsonify({"error": "seconds and hz must be numbers"}), 400
+    if not 0 < seconds <= PROFILE_MAX_SECONDS or not 1 <= hz <= PROFILE_MAX_HZ:
+        return jsonify({"error": f"seconds must be in (0, {PROFILE_MAX_SECONDS}] and hz in [1, {PROFILE_MAX_HZ}]"}), 400
+    try:
+        samples, stacks = sample_stacks(seconds, hz, idle=request.args.get("idle") in ("1", "true"))
+    except ProfilerBusy as e:
+        return jsonify({"error": str(e)}), 409
+    return Response(collapse(stacks), content_type="text/plain; charset=utf-8",
+                    headers={"X-NateOS-Profile-Samples": str(samples)})
+
+
 @app.route("/api/config", methods=["GET"])
 def get_config():
     """Get entire configuration"""
-    return jsonify(CONFIG_STORE)
+    return _json_response()
 
 
 @app.route("/api/config/<section>", methods=["GET"])
 def get_config_section(section):
     """Get specific configuration section"""
-    if section in CONFIG_STORE:
-        return jsonify(CONFIG_STORE[section])
+    if _read(section, default=MISSING) is not MISSING:
+        return _json_response(section)
     return jsonify({"error": f"Section '{section}' not found"}), 404
 
 
 @app.route("/api/config/<section>", methods=["POST", "PUT"])
 def update_config_section(section):
     """Update configuration section"""
-    if section not in CONFIG_STORE:
+    current = _read(section, default=MISSING)
+    if current is MISSING:
         return jsonify({"error": f"Section '{section}' not found"}), 404
     
     data = request.get_json()
-    if isinstance(CONFIG_STORE[section], dict):
-        CONFIG_STORE[section].update(data)
-    elif isinstance(CONFIG_STORE[section], list):
-        CONFIG_STORE[section] = data
-    else:
-        CONFIG_STORE[section] = data
+    try:
+        if section == "acl":
+            for i, rule in enumerate(data):
+                AclClassifier.parse(rule, i)
+        elif section == "static_routes":
+            data = _route_map(data)
+    except (ValueError, TypeError, AttributeError) as e:
+        label = "ACL" if section == "acl" else "static routes"
+        return jsonify({"error": f"Invalid {label}: {e}"}), 400
+    with _edit(f"update {section}") as txn:
+        if section == "static_routes":
+            txn.set((section,), data)
+        elif isinstance(current, PMap):
+            txn.merge((section,), data)
+        else:
+            txn.set((section,), data)
     
-    return jsonify({"status": "updated", section: CONFIG_STORE[section]})
+    return jsonify({"status": "updated", section: txn.get((section,))})
+
+
+# Transactions and versions
+@app.route("/api/config/transactions", methods=["POST"])
+def begin_transaction():
+    """Open a candidate config; send its id in the X-NateOS-Transaction header"""
+    data = request.get_json(silent=True) or {}
+    now = time.monotonic()
+    with TRANSACTION_LOCK:
+        _expire_transactions(now)
+        if len(TRANSACTIONS) >= MAX_TRANSACTIONS:
+            raise TooManyTransactions(f"{len(TRANSACTIONS)} transactions already open; commit or discard one first")
+        txn = DATASTORE.begin(data.get("comment", ""))
+        txn_id = secrets.token_hex(8)
+        TRANSACTIONS[txn_id] = txn
+        TRANSACTION_USED[txn_id] = now
+    return jsonify({"transaction": txn_id, "base_version": txn.base_version, "header": TXN_HEADER}), 201
+
+
+@app.route("/api/config/transactions/<txn_id>", methods=["GET", "DELETE"])
+def transaction(txn_id):
+    """Show pending changes in a candidate, or discard it (rollback)"""
+    txn = _transaction(txn_id, close=request.method == "DELETE")
+    if txn is None:
+        return jsonify({"error": f"transaction '{txn_id}' not found"}), 404
+    if request.method == "DELETE":
+        txn.rollback()
+        return jsonify({"status": "discarded", "transaction": txn_id})
+    return jsonify({
+        "transaction": txn_id,
+        "base_version": txn.base_version,
+        "changes": [_change_json(*change) for change in txn.changes()],
+    })
+
+
+@app.route("/api/config/transactions/<txn_id>/commit", methods=["POST"])
+def commit_transaction(txn_id):
+    """Commit a candidate into running"""
+    txn = _transaction(txn_id, close=True)
+    if txn is None:
+        return jsonify({"error": f"transaction '{txn_id}' not found"}), 404
+    commit = txn.commit()
+    return jsonify({"status": "committed", "version": commit.version, "changes": len(commit.changes)})
+
+
+@app.route("/api/config/versions", methods=["GET"])
+def config_versions():
+    """List committed versions (?limit=N)"""
+    limit = request.args.get("limit", type=int)
+    return jsonify({"version": DATASTORE.version, "history": DATASTORE.history(limit)})
+
+
+@app.route("/api/config/diff", methods=["GET"])
+def config_diff():
+    """Changes between two versions (?from=N&to=M, to defaults to running)"""
+    from_version = request.args.get("from", type=int)
+    to_version = request.args.get("to", default=DATASTORE.version, type=int)
+    if from_version is None:
+        return jsonify({"error": "from required"}), 400
+    changes = DATASTORE.diff(from_version, to_version)
+    return jsonify({
+        "from": from_version,
+        "to": to_version,
+        "changes": [_change_json(*change) for change in changes],
+    })
+
+
+@app.route("/api/config/rollback", methods=["POST"])
+def config_rollback():
+    """Restore running to an earlier version as a new commit"""
+    version = (request.get_json() or {}).get("version")
+    if not isinstance(version, int):
+        return jsonify({"error": "version required"}), 400
+    commit = DATASTORE.rollback_to(version)
+    return jsonify({"status": "rolled back", "version": commit.version, "changes": len(commit.changes)})
+
+
+# Streaming telemetry
+def format_sse(event, data, event_id=None):
+    """Encode one server-sent event"""
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {app.json.dumps(data)}\n\n"
+
+
+def open_stream(args):
+    """Validate /api/stream query args and subscribe
+
+    Raises ValueError for bad arguments and TooManySubscribers when full.
+    Shared by the Flask route and the native ASGI stream (asgi.py).
+    """
+    paths = [_api_path(p) for p in args.get("paths", "").split(",") if p.strip()]
+    if not paths:
+        raise ValueError("paths required")
+    unknown = [p[0] for p in paths if p and DATASTORE.get(p[:1], MISSING) is MISSING]
+    if unknown:
+        raise ValueError(f"unknown section(s): {', '.join(unknown)}")
+    mode = args.get("mode", MODE_ON_CHANGE)
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {', '.join(MODES)}")
+    # Sample period in sample mode, coalescing window in on_change mode
+    interval = args.get("interval", default=10.0 if mode == MODE_SAMPLE else 0.0, type=float)
+    max_pending = args.get("queue", default=1024, type=int)
+    return TELEMETRY.subscribe(paths, mode, interval, max_pending)
+
+
+@app.route("/api/stream", methods=["GET"])
+def stream():
+    """Server-sent events for config paths (?paths=l2/vlans,l3/bgp&mode=on_change|sample&interval=s)"""
+    try:
+        sub = open_stream(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except TooManySubscribers as e:
+        return jsonify({"error": str(e)}), 503
+
+    def events():
+        try:
+            while not sub.closed:
+                message = sub.next(timeout=STREAM_KEEPALIVE)
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(message["type"], message, message["version"])
+        finally:
+            sub.close()
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# Bulk edits
+_PORT_RANGE = re.compile(r"^(.*?)(\d+)-(\d+)$")
+
+
+def _vlan_ids(text):
+    """Expand a VLAN list such as "10,100-199" into ids"""
+    ids = []
+    for part in text.split(","):
+        lo, sep, hi = part.partition("-")
+        lo = int(lo)
+        hi = int(hi) if sep else lo
+        if not 1 <= lo <= hi <= 4094:
+            raise ValueError(f"invalid VLAN range '{part}'")
+        ids.extend(range(lo, hi + 1))
+    return ids
+
+
+def _interface_names(text):
+    """Expand an interface range such as "eth0-47" into names"""
+    match = _PORT_RANGE.match(text)
+    if not match or int(match.group(2)) > int(match.group(3)):
+        return [text]
+    prefix, lo, hi = match.group(1), int(match.group(2)), int(match.group(3))
+    return [f"{prefix}{i}" for i in range(lo, hi + 1)]
+
+
+def _batch_edits(item):
+    """Validate one batch item and expand it into (op, path, value) edits"""
+    if not isinstance(item, dict):
+        raise ValueError("operation object required")
+    op = item.get("op")
+    if op not in BATCH_OPS:
+        raise ValueError(f"op must be one of {', '.join(BATCH_OPS)}")
+    path = _api_path(str(item.get("path", "")))
+    if not path or _read(path[0], default=MISSING) is MISSING:
+        raise ValueError(f"unknown path '{item.get('path')}'")
+    value = item.get("value")
+    if op != "delete" and "value" not in item:
+        raise ValueError("value required")
+    if op == "merge" and not isinstance(value, dict):
+        raise ValueError("merge value must be an object")
+
+    section = path[0]
+    if section == "vlans" and len(path) > 1:
+        edits = []
+        for vlan_id in _vlan_ids(path[1]):
+            entry = value
+            if len(path) == 2 and isinstance(value, dict):
+                entry = dict(value, vlan_id=vlan_id)
+                if isinstance(entry.get("name"), str):
+                    entry["name"] = entry["name"].replace("{vlan_id}", str(vlan_id))
+            edits.append((op, ("vlans", str(vlan_id)) + path[2:], entry))
+        return edits
+    if section == "interfaces" and len(path) > 1:
+        return [(op, ("interfaces", name) + path[2:], value) for name in _interface_names(path[1])]
+    if section == "static_routes":
+        if op == "append" and len(path) == 1:
+            route = _check_group(normalize_route(value))
+            return [("set", ("static_routes", route["id"]), route)]
+        if op == "set" and len(path) == 1:
+            return [("set", path, _route_map(value))]
+        if op != "delete" or len(path) != 2:
+            raise ValueError("static routes support append, set (whole table) and delete by id")
+        return [(op, path, value)]
+
+    current = _read(*path, default=MISSING)
+    if op == "append" and not isinstance(current, tuple):
+        raise ValueError("append needs a list path")
+    if op == "merge" and current is not MISSING and not isinstance(current, PMap):
+        raise ValueError("merge needs an object path")
+    if len(path) == 1 and section == "acl" and op in ("set", "append"):
+        rules = [value] if op == "append" else value
+        if not isinstance(rules, list):
+            raise ValueError("acl must be a list")
+        for i, rule in enumerate(rules):
+            if not isinstance(rule, dict):
+                raise ValueError("acl entries must be objects")
+            AclClassifier.parse(rule, i)
+    return [(op, path, value)]
+
+
+def _batch_items():
+    """Operations from a JSON body or an NDJSON stream, plus request options"""
+    if request.mimetype == "application/x-ndjson":
+        items = (json.loads(line) for line in request.stream if line.strip())
+        options = request.args
+    else:
+        data = request.get_json(silent=True)
+        if isinstance(data, list):
+            data = {"operations": data}
+        if not isinstance(data, dict) or not isinstance(data.get("operations"), list):
+            raise ValueError("operations list required")
+        items, options = data["operations"], data
+    atomic = str(options.get("atomic", "true")).lower() not in ("false", "0", "no")
+    return items, atomic, options.get("comment") or "batch"
+
+
+@app.route("/api/batch", methods=["POST"])
+def batch():
+    """Apply many edits in one request and one commit
+
+    Body: {"operations": [{"op": "set|merge|append|delete", "path": "l2/vlans/100-199",
+    "value": {...}}, ...], "atomic": true} or NDJSON (one operation per line,
+    atomic/comment as query args). VLAN and interface ranges are expanded
+    server-side. Atomic batches apply nothing if any item is invalid.
+    """
+    try:
+        items, atomic, comment = _batch_items()
+        results, edits, failed = [], [], 0
+        for index, item in enumerate(items):
+            if index >= MAX_BATCH_ITEMS:
+                raise ValueError(f"batch limited to {MAX_BATCH_ITEMS} operations")
+            try:
+                item_edits = _batch_edits(item)
+            except (ValueError, TypeError, AttributeError) as e:
+                failed += 1
+                results.append({"index": index, "status": "error", "error": str(e)})
+                continue
+            edits.extend(item_edits)
+            results.append({"index": index, "status": "ok", "edits": len(item_edits)})
+    except ValueError as e:
+        return jsonify({"error": f"Invalid batch: {e}"}), 400
+
+    if failed and atomic:
+        for result in results:
+            if result["status"] == "ok":
+                result["status"] = "skipped"
+        return jsonify({"status": "rejected", "applied": 0, "failed": failed, "results": results}), 400
+
+    txn = _open_txn()
+    own = txn is None
+    if own:
+        txn = DATASTORE.begin(comment)
+    try:
+        for op, path, value in edits:
+            if op == "delete":
+                txn.delete(path)
+            else:
+                getattr(txn, op)(path, value)
+    except Exception:
+        if own:
+            txn.rollback()
+        raise
+    # Inside an open transaction the edits stay pending until it commits
+    version = txn.commit().version if own else None
+    return jsonify({
+        "status": "applied",
+        "version": version,
+        "applied": len(results) - failed,
+        "failed": failed,
+        "edits": len(edits),
+        "results": results,
+    })
 
 
 # L2 Configuration Endpoints
 @app.route("/api/l2/interfaces", methods=["GET"])
 def get_interfaces():
-    """Get all interfaces"""
-    return jsonify(CONFIG_STORE["interfaces"])
+    """Get all interfaces, or a page of them (?offset=&limit=&sort=&filter=)"""
+    if _paged():
+        return _table_page("interfaces")
+    return _json_response("interfaces")
 
 
 @app.route("/api/l2/interfaces/<interface>", methods=["GET", "PUT", "POST"])
 def interface_config(interface):
     """Configure interface (VLAN membership, mode, etc.)"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["interfaces"].get(interface, {}))
+        return _json_response("interfaces", interface, default={})
     
     data = request.get_json()
-    if interface not in CONFIG_STORE["interfaces"]:
-        CONFIG_STORE["interfaces"][interface] = {}
-    CONFIG_STORE["interfaces"][interface].update(data)
-    return jsonify({"status": "updated", "interface": interface, "config": CONFIG_STORE["interfaces"][interface]})
+    if not isinstance(data, dict):
+        return jsonify({"error": "interface object required"}), 400
+    current = _read("interfaces", interface, default=MISSING)
+    try:
+        VlanMembership().configure(interface, dict(thaw(current) if isinstance(current, PMap) else {}, **data))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid interface: {e}"}), 400
+    with _edit(f"interface {interface}") as txn:
+        txn.merge(("interfaces", interface), data)
+    return jsonify({"status": "updated", "interface": interface, "config": txn.get(("interfaces", interface))})
+
+
+@app.route("/api/l2/interfaces/<interface>/vlans", methods=["GET"])
+def interface_vlans(interface):
+    """VLANs an interface carries, as compact ranges"""
+    with STATE_LOCK:
+        info = VLAN_MAP.describe(interface)
+    if info is None:
+        return jsonify({"error": "interface not found"}), 404
+    return jsonify(info)
+
+
+@app.route("/api/l2/interfaces/<interface>/allowed-vlans", methods=["POST"])
+def interface_allowed_vlans(interface):
+    """Edit a trunk's allowed VLANs with range operations
+
+    Body: {"add": "100-3999"}, {"remove": "2000-2099"} or {"set": "1,10-20"}
+    (ranges, "all", "none", or lists of ids/ranges).
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict) or not data.keys() & {"add", "remove", "set"}:
+        return jsonify({"error": "add, remove or set required"}), 400
+    current = _read("interfaces", interface, default=MISSING)
+    if not isinstance(current, PMap):
+        return jsonify({"error": "interface not found"}), 404
+    if current.get("mode") != "trunk":
+        return jsonify({"error": f"{interface} is not a trunk port"}), 409
+    try:
+        allowed = parse_vlans(thaw(current.get("allowed_vlans", "all")))
+        if "set" in data:
+            allowed = parse_vlans(data["set"])
+        allowed |= parse_vlans(data.get("add"))
+        allowed &= ~parse_vlans(data.get("remove"))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid VLAN list: {e}"}), 400
+    text = format_vlans(allowed) or "none"
+    with _edit(f"interface {interface} allowed vlans") as txn:
+        txn.set(("interfaces", interface, "allowed_vlans"), text)
+    return jsonify({"status": "updated", "interface": interface, "allowed_vlans": text})
 
 
 @app.route("/api/l2/vlans", methods=["GET", "POST"])
 def vlans():
-    """Get or create VLANs"""
+    """Get (?offset=&limit=&sort=&filter= for a page) or create VLANs"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["vlans"])
+        if _paged():
+            return _table_page("vlans")
+        return _json_response("vlans")
     
     data = request.get_json()
     vlan_id = data.get("vlan_id")
     if vlan_id:
-        CONFIG_STORE["vlans"][str(vlan_id)] = data
-        return jsonify({"status": "created", "vlan": CONFIG_STORE["vlans"][str(vlan_id)]})
+        with _edit(f"create vlan {vlan_id}") as txn:
+            txn.set(("vlans", str(vlan_id)), data)
+        return jsonify({"status": "created", "vlan": txn.get(("vlans", str(vlan_id)))})
     return jsonify({"error": "vlan_id required"}), 400
 
 
+@app.route("/api/l2/vlans/<int:vlan_id>/ports", methods=["GET"])
+def vlan_ports(vlan_id):
+    """Ports carrying a VLAN (tagged and untagged), from the membership bitmaps"""
+    if not 1 <= vlan_id <= 4094:
+        return jsonify({"error": "VLAN must be 1-4094"}), 400
+    with STATE_LOCK:
+        ports = VLAN_MAP.ports(vlan_id)
+        untagged = set(VLAN_MAP.untagged(vlan_id))
+    return jsonify({
+        "vlan_id": vlan_id,
+        "ports": ports,
+        "untagged": [p for p in ports if p in untagged],
+        "tagged": [p for p in ports if p not in untagged],
+    })
+
+
 @app.route("/api/l2/vlans/<vlan_id>", methods=["DELETE"])
 def delete_vlan(vlan_id):
     """Delete VLAN"""
-    if vlan_id in CONFIG_STORE["vlans"]:
-        del CONFIG_STORE["vlans"][vlan_id]
+    with _edit(f"delete vlan {vlan_id}") as txn:
+        deleted = txn.delete(("vlans", vlan_id))
+    if deleted:
         return jsonify({"status": "deleted", "vlan_id": vlan_id})
     return jsonify({"error": "VLAN not found"}), 404
 
 
+def _feed_entries():
+    """The "entries" list of a state report from the dataplane"""
+    data = request.get_json(silent=True)
+    entries = data.get("entries") if isinstance(data, dict) else None
+    if not isinstance(entries, list):
+        raise ValueError("entries list required")
+    return entries
+
+
+def _feed_vlan(entry):
+    vlan = entry["vlan"]
+    if not isinstance(vlan, int) or not 1 <= vlan <= 4094:
+        raise ValueError(f"vlan must be 1-4094: {vlan!r}")
+    return vlan
+
+
+def _feed_port(entry):
+    port = entry["port"]
+    if not isinstance(port, str) or not port:
+        raise ValueError(f"port must be a name: {port!r}")
+    return port
+
+
+@app.route("/api/l2/fdb", methods=["GET", "POST"])
+def fdb_entries():
+    """List learned MAC entries (?vlan=&port=&offset=&limit=), or take entries the dataplane learned
+
+    POST {"entries": [{"vlan", "mac", "port", "age"?}]} learns or refreshes
+    each one as last seen age seconds ago.
+    """
+    if request.method == "POST":
+        try:
+            learned = []
+            for entry in _feed_entries():
+                age = entry.get("age", 0)
+                if not isinstance(age, (int, float)) or age < 0:
+                    raise ValueError(f"age must be a non-negative number: {age!r}")
+                learned.append((_feed_vlan(entry), mac_to_int(str(entry["mac"])), _feed_port(entry), age))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return jsonify({"error": f"Invalid FDB entry: {e}"}), 400
+        now = time.monotonic()
+        with STATE_LOCK:
+            FDB.expire(now)
+            full = sum(FDB.learn(vlan, mac, port, now - age) < 0 for vlan, mac, port, age in learned)
+            total = len(FDB)
+        return jsonify({"status": "learned", "entries": len(learned) - full, "table_full": full, "total": total})
+    try:
+        vlan = request.args.get("vlan", type=int)
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(1000, max(1, int(request.args.get("limit", 100))))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    port = request.args.get("port")
+    now = time.monotonic()
+    with STATE_LOCK:
+        FDB.expire(now)
+        body = {
+            "total": FDB.count(vlan, port),
+            "offset": offset,
+            "limit": limit,
+            "entries": FDB.entries(vlan, port, offset, limit, now),
+        }
+    return jsonify(body)
+
+
 @app.route("/api/l2/stp", methods=["GET", "PUT"])
 def stp_config():
     """Configure Spanning Tree Protocol"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["stp"])
+        return _json_response("stp")
     
     data = request.get_json()
-    CONFIG_STORE["stp"].update(data)
-    return jsonify({"status": "updated", "stp": CONFIG_STORE["stp"]})
+    if not isinstance(data, dict):
+        return jsonify({"error": "stp object required"}), 400
+    current = _read("stp", default=MISSING)
+    interfaces = _read("interfaces", default=MISSING)
+    try:
+        stp_from_config(dict(thaw(current) if isinstance(current, PMap) else {}, **data),
+                        interfaces.keys() if isinstance(interfaces, PMap) else ())
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid STP config: {e}"}), 400
+    with _edit("update stp") as txn:
+        txn.merge(("stp",), data)
+    return jsonify({"status": "updated", "stp": txn.get(("stp",))})
+
+
+@app.route("/api/l2/stp/state", methods=["GET"])
+def stp_state():
+    """Per-instance root, port roles and states, and MSTI VLAN ranges (?instance=)"""
+    instance = request.args.get("instance", type=int)
+    with STATE_LOCK:
+        stp = STP
+        if stp is None:
+            return jsonify({"enabled": False, "instances": []})
+        if instance is not None and instance not in stp.trees:
+            return jsonify({"error": f"MST instance {instance} not configured"}), 404
+        stp.advance(time.monotonic())
+        body = dict(stp.summary(), enabled=True, instances=stp.describe(instance))
+    return jsonify(body)
 
 
 @app.route("/api/l2/lacp", methods=["GET", "PUT"])
 def lacp_config():
     """Configure LACP"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["lacp"])
+        return _json_response("lacp")
     
     data = request.get_json()
-    CONFIG_STORE["lacp"].update(data)
-    return jsonify({"status": "updated", "lacp": CONFIG_STORE["lacp"]})
+    if not isinstance(data, dict):
+        return jsonify({"error": "lacp object required"}), 400
+    current = _read("lacp", default=MISSING)
+    try:
+        LacpSystem(dict(thaw(current) if isinstance(current, PMap) else {}, **data))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid LACP config: {e}"}), 400
+    with _edit("update lacp") as txn:
+        txn.merge(("lacp",), data)
+    return jsonify({"status": "updated", "lacp": txn.get(("lacp",))})
+
+
+@app.route("/api/l2/lacp/state", methods=["GET"])
+def lacp_state():
+    """Per-bundle actor/partner state, distributing members and selection-table loads (?bundle=)"""
+    bundle = request.args.get("bundle")
+    with STATE_LOCK:
+        if bundle is not None and bundle not in LACP.lags:
+            return jsonify({"error": f"Bundle {bundle} not configured"}), 404
+        LACP.advance(time.monotonic())
+        body = dict(LACP.summary(), bundles=LACP.describe(bundle))
+    return jsonify(body)
+
+
+@app.route("/api/l2/lacp/distribution", methods=["POST"])
+def lacp_distribution():
+    """Per-member share of a trace through a bundle's selection table
+
+    Body: {"bundle": "po1", "trace": {"src_ip": [...], ...} | "synthetic":
+    {"flows", "packets", "seed", "skew"}, "members": [...] (optional what-if)}
+    """
+    data = request.get_json(silent=True) or {}
+    bundle = data.get("bundle")
+    if bundle not in LACP.lags:
+        return jsonify({"error": f"Bundle {bundle} not configured"}), 404
+    try:
+        if "trace" in data:
+            trace = data["trace"]
+            count = len(trace[LACP.hash_fields[0]])
+            if any(len(trace[f]) != count for f in LACP.hash_fields):
+                raise ValueError("trace fields must be equal-length lists")
+        else:
+            spec = data.get("synthetic") or {}
+            count = int(spec.get("packets", 100000))
+            trace = None
+        if count > MAX_TRACE_PACKETS:
+            raise ValueError(f"at most {MAX_TRACE_PACKETS} packets")
+        if trace is None:
+            trace = synthetic_lag_trace(int(spec.get("flows", 1000)), count, int(spec.get("seed", 1)),
+                                        float(spec.get("skew", 1.0)))
+        # advance() can rebuild selection tables in place, so hold the lock across the replay
+        with STATE_LOCK:
+            result = LACP.distribution(bundle, trace, data.get("members"))
+        return jsonify(result)
+    except KeyError as e:
+        return jsonify({"error": f"trace is missing hash field {e}"}), 400
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": str(e)}), 400
 
 
 @app.route("/api/l2/lldp", methods=["GET", "PUT"])
 def lldp_config():
     """Configure LLDP"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["lldp"])
+        return _json_response("lldp")
     
     data = request.get_json()
-    CONFIG_STORE["lldp"].update(data)
-    return jsonify({"status": "updated", "lldp": CONFIG_STORE["lldp"]})
+    with _edit("update lldp") as txn:
+        txn.merge(("lldp",), data)
+    return jsonify({"status": "updated", "lldp": txn.get(("lldp",))})
 
 
 @app.route("/api/l2/igmp-snooping", methods=["GET", "PUT"])
 def igmp_snooping_config():
     """Configure IGMP snooping"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["igmp_snooping"])
+        return _json_response("igmp_snooping")
     
     data = request.get_json()
-    CONFIG_STORE["igmp_snooping"].update(data)
-    return jsonify({"status": "updated", "igmp_snooping": CONFIG_STORE["igmp_snooping"]})
+    if not isinstance(data, dict):
+        return jsonify({"error": "igmp_snooping object required"}), 400
+    current = _read("igmp_snooping", default=MISSING)
+    try:
+        IgmpSnooping(dict(thaw(current) if isinstance(current, PMap) else {}, **data))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid IGMP snooping config: {e}"}), 400
+    with _edit("update igmp_snooping") as txn:
+        txn.merge(("igmp_snooping",), data)
+    return jsonify({"status": "updated", "igmp_snooping": txn.get(("igmp_snooping",))})
+
+
+@app.route("/api/l2/igmp-snooping/groups", methods=["GET", "POST"])
+def igmp_snooping_groups():
+    """List snooped group memberships with egress ports (?vlan=&group=&offset=&limit=), or take ones the dataplane snooped
+
+    POST {"entries": [{"vlan", "group", "source"?, "port"}]} joins or
+    refreshes each port as if its report had just arrived; it is ignored
+    while snooping is disabled here.
+    """
+    if request.method == "POST":
+        try:
+            reports = []
+            for entry in _feed_entries():
+                source = entry.get("source", "*")
+                reports.append((_feed_vlan(entry), ip_to_int(entry["group"]), _feed_port(entry),
+                                ANY_SOURCE if source == "*" else ip_to_int(source)))
+        except (KeyError, TypeError, ValueError, AttributeError) as e:
+            return jsonify({"error": f"Invalid IGMP membership: {e}"}), 400
+        now = time.monotonic()
+        with STATE_LOCK:
+            IGMP.advance(now)
+            joined = 0
+            if reports:
+                vlans, groups, ports, sources = zip(*reports)
+                joined = IGMP.join_many(vlans, groups, ports, now, sources)
+            IGMP.commit()
+            body = {"status": "joined", "enabled": IGMP.enabled, "entries": len(reports), "new": joined,
+                    "memberships": IGMP.count()}
+        return jsonify(body)
+    try:
+        vlan = request.args.get("vlan", type=int)
+        group = request.args.get("group")
+        group = ip_to_int(group) if group else None
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(1000, max(1, int(request.args.get("limit", 100))))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    now = time.monotonic()
+    with STATE_LOCK:
+        IGMP.advance(now)
+        body = dict(IGMP.summary(), total=IGMP.count(vlan, group), offset=offset, limit=limit,
+                    entries=IGMP.entries(vlan, group, offset, limit, now))
+    return jsonify(body)
 
 
 # L3 Configuration Endpoints
-@app.route("/api/l3/static-routes", methods=["GET", "POST"])
+def _route_ids(gateway=None, prefix_length=None):
+    """Route ids matching the filters; index-backed unless a transaction is open"""
+    if _open_txn() is None:
+        with STATE_LOCK:
+            if gateway is not None:
+                ids = set(ROUTES.via(gateway))
+                if prefix_length is not None:
+                    ids.intersection_update(ROUTES.with_prefix_length(prefix_length))
+                return ids
+            return set(ROUTES.with_prefix_length(prefix_length))
+    ids = set()
+    gateway = normalize_gateway(gateway) if gateway is not None else None
+    for rid, route in _read("static_routes", default=PMap()).items():
+        if gateway is not None and route["gateway"] != gateway:
+            continue
+        if prefix_length is not None and not route["destination"].endswith(f"/{prefix_length}"):
+            continue
+        ids.add(rid)
+    return ids
+
+
+@app.route("/api/l3/static-routes", methods=["GET", "POST", "DELETE"])
 def static_routes():
-    """Get or add static routes"""
+    """Get (?gateway=&prefix_length=, ?offset=&limit=&sort=&filter= for a page), add, or withdraw all routes via ?gateway="""
+    gateway = request.args.get("gateway")
+    prefix_length = request.args.get("prefix_length", type=int)
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["static_routes"])
-    
+        if _paged():
+            if gateway is None and prefix_length is None:
+                return _table_page("static_routes")
+            return _table_page("static_routes", (gateway, prefix_length), _route_ids(gateway, prefix_length))
+        if gateway is None and prefix_length is None:
+            return _json_response("static_routes", default=PMap(), transform=_route_list)
+        routes = _read("static_routes", default=PMap())
+        return jsonify(_route_list({rid: routes[rid] for rid in _route_ids(gateway, prefix_length)}))
+
+    if request.method == "DELETE":
+        if gateway is None:
+            return jsonify({"error": "gateway required"}), 400
+        with _edit(f"withdraw routes via {gateway}") as txn:
+            ids = _route_ids(gateway, prefix_length)
+            for rid in ids:
+                txn.delete(("static_routes", rid))
+        return jsonify({"status": "withdrawn", "gateway": gateway, "count": len(ids)})
+
     data = request.get_json()
-    CONFIG_STORE["static_routes"].append(data)
-    return jsonify({"status": "added", "route": data})
+    if not isinstance(data, dict):
+        return jsonify({"error": "route object required"}), 400
+    try:
+        route = _check_group(normalize_route(data))
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid route: {e}"}), 400
+    with _edit(f"add route {route['destination']} via {route['gateway']}") as txn:
+        txn.set(("static_routes", route["id"]), route)
+    return jsonify({"status": "added", "route": route})
 
 
-@app.route("/api/l3/static-routes/<int:index>", methods=["DELETE"])
-def delete_static_route(index):
-    """Delete static route by index"""
-    if 0 <= index < len(CONFIG_STORE["static_routes"]):
-        route = CONFIG_STORE["static_routes"].pop(index)
+@app.route("/api/l3/static-routes/<route_id>", methods=["GET", "DELETE"])
+def static_route(route_id):
+    """Get or delete one static route by id"""
+    if request.method == "GET":
+        route = _read("static_routes", route_id, default=MISSING)
+        if route is MISSING:
+            return jsonify({"error": "Route not found"}), 404
+        return jsonify(route)
+    with _edit(f"delete route {route_id}") as txn:
+        route = txn.get(("static_routes", route_id), MISSING)
+        txn.delete(("static_routes", route_id))
+    if route is not MISSING:
         return jsonify({"status": "deleted", "route": route})
     return jsonify({"error": "Route not found"}), 404
 
 
+def _group_json(group, routes=None):
+    entry = dict(group.items())
+    if routes is not None:
+        entry["routes"] = routes
+    return entry
+
+
+def _group_routes(gid):
+    """Number of routes using group gid; index-backed unless a transaction is open"""
+    if _open_txn() is None:
+        with STATE_LOCK:
+            return len(ROUTES.using_group(gid))
+    return sum(1 for route in _read("static_routes", default=PMap()).values() if route.get("group") == gid)
+
+
+@app.route("/api/l3/next-hop-groups", methods=["GET", "POST"])
+def next_hop_groups():
+    """List ECMP next-hop groups, or create one ({"members": [...], "id"?})
+
+    Without an explicit id, a group with the same member set is reused, so
+    routes with the same next-hops share one group.
+    """
+    if request.method == "GET":
+        return _json_response("next_hop_groups", default=PMap(),
+                              transform=_group_list)
+    data = request.get_json()
+    try:
+        group = normalize_group(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid next-hop group: {e}"}), 400
+    groups = _read("next_hop_groups", default=PMap())
+    if "id" not in data:
+        for existing in groups.values():
+            if list(existing["members"]) == group["members"]:
+                return jsonify({"status": "exists", "group": existing})
+    if group["id"] in groups:
+        return jsonify({"error": f"Group '{group['id']}' already exists"}), 409
+    with _edit(f"add next-hop group {group['id']}") as txn:
+        txn.set(("next_hop_groups", group["id"]), group)
+    return jsonify({"status": "added", "group": group})
+
+
+@app.route("/api/l3/next-hop-groups/<group_id>", methods=["GET", "PUT", "DELETE"])
+def next_hop_group(group_id):
+    """Get, change the members of (resilient rehash), or delete one group"""
+    if request.method == "GET":
+        group = _read("next_hop_groups", group_id, default=MISSING)
+        if group is MISSING:
+            return jsonify({"error": "Group not found"}), 404
+        return jsonify(_group_json(group, _group_routes(group_id)))
+
+    if _read("next_hop_groups", group_id, default=MISSING) is MISSING:
+        return jsonify({"error": "Group not found"}), 404
+    if request.method == "DELETE":
+        in_use = _group_routes(group_id)
+        if in_use:
+            return jsonify({"error": f"Group is used by {in_use} route(s)"}), 409
+        with _edit(f"delete next-hop group {group_id}") as txn:
+            group = txn.get(("next_hop_groups", group_id))
+            txn.delete(("next_hop_groups", group_id))
+        return jsonify({"status": "deleted", "group": group})
+
+    data = request.get_json()
+    try:
+        group = normalize_group(data, group_id)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid next-hop group: {e}"}), 400
+    with _edit(f"update next-hop group {group_id}") as txn:
+        txn.set(("next_hop_groups", group_id), group)
+    return jsonify({"status": "updated", "group": group})
+
+
+@app.route("/api/l3/fib/lookup", methods=["GET", "POST"])
+def fib_lookup():
+    """Longest-prefix-match lookup (?address=... or {"addresses": [...]})"""
+    if request.method == "GET":
+        addresses = request.args.getlist("address")
+    else:
+        addresses = (request.get_json() or {}).get("addresses", [])
+    if not addresses:
+        return jsonify({"error": "address required"}), 400
+    try:
+        with STATE_LOCK:
+            results = [FIB.lookup(address) or {"address": address, "prefix": None, "gateway": None}
+                       for address in addresses]
+            stats = FIB.stats()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": results, "fib": stats})
+
+
+@app.route("/api/l3/neighbors", methods=["GET", "DELETE"])
+def neighbors():
+    """List ARP/ND entries (?interface=&state=&offset=&limit=) or clear dynamic ones (?interface=&ip=)"""
+    interface = request.args.get("interface")
+    if request.method == "DELETE":
+        address = request.args.get("ip")
+        if address is None:
+            with STATE_LOCK:
+                now = time.monotonic()
+                NEIGHBORS.advance(now)
+                return jsonify({"status": "cleared", "entries": NEIGHBORS.flush(interface, now=now)})
+        try:
+            ip, version = parse_ip(address)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        with STATE_LOCK:
+            NEIGHBORS.advance(time.monotonic())
+            removed = NEIGHBORS.remove(NEIGHBORS.if_id(interface or NEIGHBOR_INTERFACE), ip, version)
+        if removed:
+            return jsonify({"status": "cleared", "entries": 1})
+        return jsonify({"error": "Neighbor not found"}), 404
+    state = request.args.get("state")
+    if state is not None and state not in NEIGHBOR_STATES[1:]:
+        return jsonify({"error": f"state must be one of {', '.join(NEIGHBOR_STATES[1:])}"}), 400
+    try:
+        offset = max(0, int(request.args.get("offset", 0)))
+        limit = min(1000, max(1, int(request.args.get("limit", 100))))
+    except ValueError:
+        return jsonify({"error": "offset and limit must be integers"}), 400
+    with STATE_LOCK:
+        now = time.monotonic()
+        NEIGHBORS.advance(now)
+        body = dict(NEIGHBORS.summary(), total=NEIGHBORS.count(interface, state), offset=offset,
+                    limit=limit, entries=NEIGHBORS.entries(interface, state, offset, limit, now))
+    return jsonify(body)
+
+
 @app.route("/api/l3/ospf", methods=["GET", "PUT"])
 def ospf_config():
     """Configure OSPF"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["ospf"])
+        return _json_response("ospf")
     
     data = request.get_json()
-    CONFIG_STORE["ospf"].update(data)
-    return jsonify({"status": "updated", "ospf": CONFIG_STORE["ospf"]})
+    with _edit("update ospf") as txn:
+        txn.merge(("ospf",), data)
+    return jsonify({"status": "updated", "ospf": txn.get(("ospf",))})
 
 
 @app.route("/api/l3/bgp", methods=["GET", "PUT"])
 def bgp_config():
     """Configure BGP"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["bgp"])
+        return _json_response("bgp")
     
     data = request.get_json()
-    CONFIG_STORE["bgp"].update(data)
-    return jsonify({"status": "updated", "bgp": CONFIG_STORE["bgp"]})
+    with _edit("update bgp") as txn:
+        txn.merge(("bgp",), data)
+    return jsonify({"status": "updated", "bgp": txn.get(("bgp",))})
 
 
 @app.route("/api/l3/vrrp", methods=["GET", "PUT"])
 def vrrp_config():
     """Configure VRRP"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["vrp"])
+        return _json_response("vrp")
     
     data = request.get_json()
-    CONFIG_STORE["vrp"].update(data)
-    return jsonify({"status": "updated", "vrrp": CONFIG_STORE["vrp"]})
+    with _edit("update vrp") as txn:
+        txn.merge(("vrp",), data)
+    return jsonify({"status": "updated", "vrrp": txn.get(("vrp",))})
 
 
 # Management Endpoints
@@ -225,55 +1846,138 @@ def vrrp_config():
 def qos_config():
     """Configure QoS"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["qos"])
+        return _json_response("qos")
     
     data = request.get_json()
-    CONFIG_STORE["qos"].update(data)
-    return jsonify({"status": "updated", "qos": CONFIG_STORE["qos"]})
+    if not isinstance(data, dict):
+        return jsonify({"error": "qos object required"}), 400
+    current = _read("qos", default=MISSING)
+    try:
+        QosPolicy(dict(thaw(current) if isinstance(current, PMap) else {}, **data))
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid QoS: {e}"}), 400
+    with _edit("update qos") as txn:
+        txn.merge(("qos",), data)
+    return jsonify({"status": "updated", "qos": txn.get(("qos",))})
+
+
+@app.route("/api/mgmt/qos/compiled", methods=["GET"])
+def qos_compiled():
+    """Classification tables, class queues, policers and port rates of the running QoS policy"""
+    return jsonify(QOS.summary())
+
+
+@app.route("/api/mgmt/qos/simulate", methods=["POST"])
+def qos_simulate():
+    """Replay a traffic trace through the running QoS policy
+
+    Body: {"trace": [[time_s, dscp, length(, pcp)], ...]} or
+    {"synthetic": {"duration": 1.0, "seed": 1}}, plus an optional "port".
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "simulation object required"}), 400
+    port = str(data.get("port", "default"))
+    try:
+        if "trace" in data:
+            rows = data["trace"]
+            if not isinstance(rows, list) or len(rows) > MAX_SIM_PACKETS:
+                raise ValueError(f"trace must be a list of at most {MAX_SIM_PACKETS} packets")
+            trace = sorted((float(row[0]), int(row[1]) & 63,
+                            (int(row[3]) if len(row) > 3 else int(row[1]) >> 3) & 7, int(row[2]))
+                           for row in rows)
+        else:
+            synthetic = data.get("synthetic") or {}
+            duration = float(synthetic.get("duration", 1.0))
+            if not 0 < duration <= 10:
+                raise ValueError("synthetic duration must be 0-10 seconds")
+            trace = synthetic_trace(duration, int(synthetic.get("seed", 1)))
+    except (ValueError, TypeError, IndexError, KeyError, AttributeError) as e:
+        return jsonify({"error": f"Invalid trace: {e}"}), 400
+    return jsonify(simulate_qos(QOS, trace, port=port))
 
 
 @app.route("/api/mgmt/acl", methods=["GET", "POST"])
 def acl_config():
     """Get or add ACL rules"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["acl"])
+        return _json_response("acl")
     
     data = request.get_json()
-    CONFIG_STORE["acl"].append(data)
+    if not isinstance(data, dict):
+        return jsonify({"error": "rule object required"}), 400
+    try:
+        AclClassifier.parse(data)
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": f"Invalid ACL rule: {e}"}), 400
+    with _edit("add acl rule") as txn:
+        txn.append(("acl",), data)
     return jsonify({"status": "added", "acl": data})
 
 
+@app.route("/api/mgmt/acl/classify", methods=["GET", "POST"])
+def acl_classify():
+    """Classify packets against the compiled ACL (?src=&dst=&proto=&src_port=&dst_port= or {"packets": [...]})"""
+    if request.method == "GET":
+        packets = [request.args.to_dict()]
+    else:
+        packets = (request.get_json() or {}).get("packets", [])
+    results = []
+    try:
+        with STATE_LOCK:
+            for pkt in packets:
+                action, index = ACL.classify(pkt["src"], pkt["dst"], pkt.get("proto", 0),
+                                             pkt.get("src_port", 0), pkt.get("dst_port", 0))
+                results.append({"action": action, "rule": index})
+            rules = len(ACL)
+    except KeyError as e:
+        return jsonify({"error": f"{e.args[0]} required"}), 400
+    except (ValueError, TypeError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"results": results, "rules": rules})
+
+
 @app.route("/api/mgmt/span", methods=["GET", "PUT"])
 def span_config():
     """Configure SPAN/port mirroring"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["span"])
+        return _json_response("span")
     
     data = request.get_json()
-    CONFIG_STORE["span"].update(data)
-    return jsonify({"status": "updated", "span": CONFIG_STORE["span"]})
+    if not isinstance(data, dict):
+        return jsonify({"error": "span object required"}), 400
+    current = _read("span", default=MISSING)
+    try:
+        SpanEngine(dict(thaw(current) if isinstance(current, PMap) else {}, **data), allocate=False)
+    except (ValueError, TypeError, AttributeError) as e:
+        return jsonify({"error": f"Invalid span config: {e}"}), 400
+    with _edit("update span") as txn:
+        txn.merge(("span",), data)
+    return jsonify({"status": "updated", "span": txn.get(("span",))})
 
 
 @app.route("/api/mgmt/system", methods=["GET", "PUT"])
 def system_config():
     """Configure system settings"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["system"])
+        return _json_response("system")
     
     data = request.get_json()
-    CONFIG_STORE["system"].update(data)
-    return jsonify({"status": "updated", "system": CONFIG_STORE["system"]})
+    with _edit("update system") as txn:
+        txn.merge(("system",), data)
+    return jsonify({"status": "updated", "system": txn.get(("system",))})
 
 
 @app.route("/api/mgmt/aaa", methods=["GET", "PUT"])
 def aaa_config():
     """Configure AAA (Authentication, Authorization, Accounting)"""
     if request.method == "GET":
-        return jsonify(CONFIG_STORE["aaa"])
+        return _json_response("aaa")
     
     data = request.get_json()
-    CONFIG_STORE["aaa"].update(data)
-    return jsonify({"status": "updated", "aaa": CONFIG_STORE["aaa"]})
+    with _edit("update aaa") as txn:
+        txn.merge(("aaa",), data)
+    return jsonify({"status": "updated", "aaa": txn.get(("aaa",))})
 
 
 # Serve static files (CSS, JS)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+NateOS Web Management API (ASGI)
+Serves the Flask app from an asyncio event loop
+
+Regular routes run in a bounded thread pool, so a slow request never stalls
+the loop or other clients. /api/stream runs natively on the loop off the
+telemetry hub, with no thread per subscriber. Everything stays in one
+process so the datastore, FIB/ACL tables and open transactions are shared.
+Scale with threads, not worker processes.
+
+    uvicorn --app-dir src/mgmt/web asgi:application     (any ASGI server)
+    python src/mgmt/web/serve.py                          (bundled server)
+"""
+import asyncio
+import io
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl
+
+from werkzeug.datastructures import MultiDict
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+import api
+from mgmt.telemetry import TooManySubscribers
+
+DEFAULT_THREADS = 32
+
+
+def _header_list(headers):
+    return [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+
+
+class Application:
+    """ASGI application wrapping a WSGI app, with a native SSE stream route"""
+
+    def __init__(self, wsgi_app=None, threads=DEFAULT_THREADS):
+        self.wsgi_app = wsgi_app or api.app
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="nateos-api")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+        elif scope["type"] == "http":
+            if scope["path"] == "/api/stream" and scope["method"] == "GET":
+                await self._stream(scope, receive, send)
+            else:
+                await self._wsgi(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.executor.shutdown(wait=False)
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _wsgi(self, scope, receive, send):
+        chunks = []
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            chunks.append(message.get("body", b""))
+            if not message.get("more_body"):
+                break
+        environ = self._environ(scope, b"".join(chunks))
+        loop = asyncio.get_running_loop()
+        status, headers, body = await loop.run_in_executor(self.executor, self._call_wsgi, environ)
+        await send({"type": "http.response.start", "status": status, "headers": _header_list(headers)})
+        await send({"type": "http.response.body", "body": body})
+
+    def _call_wsgi(self, environ):
+        """Run the WSGI app to completion in a pool thread"""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started[:] = [int(status.split(" ", 1)[0]), headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            body = b"".join(result)
+        finally:
+            close = getattr(result, "close", None)
+            if close is not None:
+                close()
+        return started[0], started[1], body
+
+    @staticmethod
+    def _environ(scope, body):
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "REMOTE_PORT": str(client[1]),
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", ()):
+            name = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if name == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+                continue
+            if name in ("CONTENT_LENGTH", "TRANSFER_ENCODING"):
+                continue  # the body is already read and de-chunked
+            key = f"HTTP_{name}"
+            environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    async def _stream(self, scope, receive, send):
+        """/api/stream on the event loop: wake on commits, never block a thread"""
+        args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("latin-1")))
+        try:
+            sub = api.open_stream(args)
+        except (ValueError, TooManySubscribers) as e:
+            status = 503 if isinstance(e, TooManySubscribers) else 400
+            body = (api.app.json.dumps({"error": str(e)}) + "\n").encode("utf-8")
+            await send({"type": "http.response.start", "status": status, "headers": [
+                (b"content-type", b"application/json"), (b"access-control-allow-origin", b"*")]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        loop = asyncio.get_running_loop()
+        ready = asyncio.Event()
+        sub.on_ready = lambda _: loop.call_soon_threadsafe(ready.set)
+        disconnect = asyncio.ensure_future(self._wait_disconnect(receive))
+        try:
+            await send({"type": "http.response.start", "status": 200, "headers": [
+                (b"content-type", b"text/event-stream; charset=utf-8"),
+                (b"cache-control", b"no-cache"),
+                (b"x-accel-buffering", b"no"),
+                (b"access-control-allow-origin", b"*"),
+            ]})
+            while not sub.closed and not disconnect.done():
+                message = sub.poll()
+                if message is not None:
+                    chunk = api.format_sse(message["type"], message, message["version"])
+                    await send({"type": "http.response.body", "body": chunk.encode("utf-8"), "more_body": True})
+                    continue
+                due = sub.due()
+                timeout = api.STREAM_KEEPALIVE
+                if due is not None:
+                    timeout = min(timeout, max(0.0, due - time.monotonic()))
+                woken = asyncio.ensure_future(ready.wait())
+                done, _ = await asyncio.wait({woken, disconnect}, timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                woken.cancel()
+                if disconnect in done:
+                    break
+                if woken in done:
+                    ready.clear()
+                    if sub.interval > 0 and due is None:
+                        # Coalescing window: let a burst settle before sending it
+                        await asyncio.sleep(sub.interval)
+                elif due is None or time.monotonic() < due:
+                    await send({"type": "http.response.body", "body": b": keepalive\n\n", "more_body": True})
+            if not disconnect.done():
+                await send({"type": "http.response.body", "body": b""})
+        except OSError:
+            pass  # client went away mid-write
+        finally:
+            sub.on_ready = None
+            sub.close()
+            disconnect.cancel()
+
+    @staticmethod
+    async def _wait_disconnect(receive):
+        while True:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+
+
+application = Application()
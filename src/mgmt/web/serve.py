@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+NateOS Web Management API - production server
+Runs the ASGI application (asgi.py) on uvicorn when installed, otherwise on
+a small bundled asyncio HTTP/1.1 server (keep-alive, chunked streaming).
+
+Always a single process: the config datastore lives in memory, so every
+request must see the same copy. Concurrency comes from the event loop plus
+the request thread pool (--threads).
+
+Usage: python src/mgmt/web/serve.py [--host 0.0.0.0] [--port 8080] [--threads 32] [--server auto|builtin|uvicorn]
+                                   [--state-dir DIR] [--fsync group|each|interval|none]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import traceback
+from http import HTTPStatus
+from urllib.parse import unquote
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+MAX_HEAD = 64 * 1024
+MAX_BODY = 64 * 1024 * 1024
+READ_SIZE = 64 * 1024
+
+
+class BadRequest(Exception):
+    pass
+
+
+class _Connection:
+    """One client connection: parse requests, drive the ASGI app, write replies"""
+
+    def __init__(self, app, reader, writer):
+        self.app = app
+        self.reader = reader
+        self.writer = writer
+        self.buf = bytearray()
+        self.client = writer.get_extra_info("peername") or ("", 0)
+        self.server = writer.get_extra_info("sockname") or ("", 0)
+
+    async def run(self):
+        try:
+            while True:
+                request = await self._read_request()
+                if request is None:
+                    break
+                if not await self._dispatch(*request):
+                    break
+        except BadRequest as e:
+            await self._simple(400, str(e))
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def _more(self):
+        data = await self.reader.read(READ_SIZE)
+        if not data:
+            raise asyncio.IncompleteReadError(bytes(self.buf), None)
+        self.buf += data
+
+    async def _read_until(self, marker, limit):
+        while True:
+            idx = self.buf.find(marker)
+            if idx >= 0:
+                line = bytes(self.buf[:idx])
+                del self.buf[:idx + len(marker)]
+                return line
+            if len(self.buf) > limit:
+                raise BadRequest("header too large")
+            await self._more()
+
+    async def _read_exact(self, n):
+        while len(self.buf) < n:
+            await self._more()
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+
+    async def _read_request(self):
+        try:
+            head = await self._read_until(b"\r\n\r\n", MAX_HEAD)
+        except asyncio.IncompleteReadError:
+            return None  # clean close between requests
+        lines = head.split(b"\r\n")
+        try:
+            method, target, version = lines[0].decode("latin-1").split(" ")
+        except ValueError:
+            raise BadRequest("malformed request line")
+        headers = []
+        fields = {}
+        for line in lines[1:]:
+            name, sep, value = line.partition(b":")
+            if not sep:
+                raise BadRequest("malformed header")
+            name, value = name.strip().lower(), value.strip()
+            headers.append((name, value))
+            fields[name] = value
+
+        if fields.get(b"expect", b"").lower() == b"100-continue":
+            self.writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+        if b"chunked" in fields.get(b"transfer-encoding", b"").lower():
+            body = await self._read_chunked()
+        else:
+            try:
+                length = int(fields.get(b"content-length", b"0"))
+            except ValueError:
+                raise BadRequest("bad content-length")
+            if not 0 <= length <= MAX_BODY:
+                raise BadRequest("body too large")
+            body = await self._read_exact(length)
+
+        connection = fields.get(b"connection", b"").lower()
+        keep_alive = connection != b"close" if version == "HTTP/1.1" else connection == b"keep-alive"
+        return method, target, version, headers, body, keep_alive
+
+    async def _read_chunked(self):
+        chunks, total = [], 0
+        while True:
+            size_line = await self._read_until(b"\r\n", MAX_HEAD)
+            try:
+                size = int(size_line.split(b";", 1)[0], 16)
+            except ValueError:
+                raise BadRequest("bad chunk size")
+            if size == 0:
+                while await self._read_until(b"\r\n", MAX_HEAD):
+                    pass  # trailers
+                return b"".join(chunks)
+            total += size
+            if total > MAX_BODY:
+                raise BadRequest("body too large")
+            chunks.append(await self._read_exact(size))
+            await self._read_exact(2)
+
+    async def _dispatch(self, method, target, version, headers, body, keep_alive):
+        path, _, query = target.partition("?")
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": version.split("/", 1)[-1],
+            "method": method.upper(),
+            "scheme": "http",
+            "path": unquote(path),
+            "raw_path": path.encode("latin-1"),
+            "query_string": query.encode("latin-1"),
+            "root_path": "",
+            "headers": headers,
+            "client": tuple(self.client[:2]),
+            "server": tuple(self.server[:2]),
+        }
+        state = {"body_sent": False, "watcher": None, "status": None, "headers": None,
+                 "chunked": False, "done": False}
+        disconnected = asyncio.get_running_loop().create_future()
+
+        async def watch():
+            # Only runs while the app waits for a disconnect (streaming responses)
+            try:
+                while True:
+                    data = await self.reader.read(READ_SIZE)
+                    if not data:
+                        break
+                    self.buf += data
+            except ConnectionError:
+                pass
+            if not disconnected.done():
+                disconnected.set_result(True)
+
+        async def receive():
+            if not state["body_sent"]:
+                state["body_sent"] = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            if state["watcher"] is None:
+                state["watcher"] = asyncio.ensure_future(watch())
+            await disconnected
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if disconnected.done() or self.writer.is_closing():
+                raise ConnectionResetError("client disconnected")
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+                state["headers"] = list(message.get("headers", ()))
+                return
+            if message["type"] != "http.response.body" or state["done"]:
+                return
+            chunk = message.get("body", b"")
+            more = message.get("more_body", False)
+            if state["headers"] is not None:
+                self._write_head(state, chunk, more, keep_alive, version)
+            if state["chunked"]:
+                if chunk:
+                    self.writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                if not more:
+                    self.writer.write(b"0\r\n\r\n")
+            elif chunk and method.upper() != "HEAD":
+                self.writer.write(chunk)
+            state["done"] = not more
+            await self.writer.drain()
+
+        try:
+            await self.app(scope, receive, send)
+        except ConnectionError:
+            return False
+        except Exception:
+            traceback.print_exc()
+            if state["status"] is None or state["headers"] is not None:
+                await self._simple(500, "internal server error")
+            return False
+        finally:
+            if state["watcher"] is not None:
+                state["watcher"].cancel()
+        if state["headers"] is not None:
+            # App returned without a body
+            await send({"type": "http.response.body", "body": b""})
+        elif not state["done"]:
+            if state["chunked"]:
+                self.writer.write(b"0\r\n\r\n")
+            return False
+        return keep_alive and not disconnected.done()
+
+    def _write_head(self, state, chunk, more, keep_alive, version):
+        headers = state["headers"]
+        state["headers"] = None
+        names = {name.lower() for name, _ in headers}
+        if b"content-length" not in names:
+            if not more:
+                headers.append((b"content-length", str(len(chunk)).encode()))
+            elif version == "HTTP/1.1":
+                headers.append((b"transfer-encoding", b"chunked"))
+                state["chunked"] = True
+        if not keep_alive:
+            headers.append((b"connection", b"close"))
+        status = state["status"]
+        try:
+            reason = HTTPStatus(status).phrase
+        except ValueError:
+            reason = ""
+        lines = [f"HTTP/1.1 {status} {reason}".encode("latin-1")]
+        lines.extend(name + b": " + value for name, value in headers)
+        self.writer.write(b"\r\n".join(lines) + b"\r\n\r\n")
+
+    async def _simple(self, status, text):
+        body = text.encode("utf-8")
+        reason = HTTPStatus(status).phrase
+        self.writer.write(
+            f"HTTP/1.1 {status} {reason}\r\ncontent-type: text/plain\r\n"
+            f"content-length: {len(body)}\r\nconnection: close\r\n\r\n".encode("latin-1") + body)
+        try:
+            await self.writer.drain()
+        except ConnectionError:
+            pass
+
+
+async def serve_builtin(app, host, port, backlog=1024):
+    async def handle(reader, writer):
+        await _Connection(app, reader, writer).run()
+
+    server = await asyncio.start_server(handle, host, port, backlog=backlog, reuse_address=True)
+    async with server:
+        await server.serve_forever()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="NateOS Web API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8080)))
+    parser.add_argument("--threads", type=int, default=32, help="request handler threads")
+    parser.add_argument("--server", choices=("auto", "builtin", "uvicorn"), default="auto")
+    parser.add_argument("--state-dir", default=os.environ.get("NATEOS_STATE_DIR"),
+                        help="persist the config here (WAL + snapshots); in-memory if unset")
+    parser.add_argument("--fsync", choices=("group", "each", "interval", "none"),
+                        default=os.environ.get("NATEOS_FSYNC", "group"))
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # api.py reads these at import time
+    if args.state_dir:
+        os.environ["NATEOS_STATE_DIR"] = args.state_dir
+    os.environ["NATEOS_FSYNC"] = args.fsync
+    from asgi import Application
+    app = Application(threads=args.threads)
+
+    server = args.server
+    if server == "auto":
+        try:
+            import uvicorn  # noqa: F401
+            server = "uvicorn"
+        except ImportError:
+            server = "builtin"
+    print(f"[NateOS Web API] {server} server on http://{args.host}:{args.port} ({args.threads} threads)")
+    if server == "uvicorn":
+        import uvicorn
+        # One worker only: the datastore is in-process state
+        uvicorn.run(app, host=args.host, port=args.port, workers=1, log_level="warning")
+    else:
+        try:
+            asyncio.run(serve_builtin(app, args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -268,10 +268,10 @@ async function loadStaticRoutes() {
         const list = document.getElementById('routes-list');
         list.innerHTML = routes.length === 0
             ? '<p>No static routes configured</p>'
-            : routes.map((route, idx) =>
+            : routes.map(route =>
                 `<div class="list-item">
                     <span><strong>${route.destination || 'N/A'}</strong> via ${route.gateway || 'N/A'}</span>
-                    <button class="btn-danger" onclick="deleteRoute(${idx})">Delete</button>
+                    <button class="btn-danger" onclick="deleteRoute('${route.id}')">Delete</button>
                 </div>`
             ).join('');
     } catch (e) {
@@ -312,11 +312,11 @@ async function saveRoute() {
     }
 }
 
-async function deleteRoute(index) {
+async function deleteRoute(routeId) {
     if (!confirm('Delete this route?')) return;
     
     try {
-        await fetch(`${API_BASE}/l3/static-routes/${index}`, {method: 'DELETE'});
+        await fetch(`${API_BASE}/l3/static-routes/${routeId}`, {method: 'DELETE'});
         loadStaticRoutes();
         showSuccess('Route deleted');
     } catch (e) {
@@ -389,8 +389,41 @@ function configureVRRP() {
 }
 
 // Management Functions
-function configureQoS() {
-    showModal('<h3>QoS Configuration</h3><p>QoS policy configuration coming soon...</p>');
+async function configureQoS() {
+    try {
+        const res = await fetch(`${API_BASE}/mgmt/qos/compiled`);
+        const policy = await res.json();
+        const rows = policy.classes.map(c => `<tr><td>tc${c.class}</td><td>${c.name}</td>
+            <td>${c.priority ? 'strict' : 'weight ' + c.weight}</td>
+            <td>${c.rate_mbps ?? '-'} / ${c.ceil_mbps ?? '-'}</td></tr>`).join('');
+        showModal(`<h3>QoS Configuration</h3>
+            <p>Trust: ${policy.trust}, default class ${policy.default_class}</p>
+            <table><thead><tr><th>Class</th><th>Name</th><th>Scheduling</th><th>Rate / Ceil (Mbps)</th></tr></thead>
+            <tbody>${rows}</tbody></table>
+            <button class="btn-primary" onclick="simulateQoS()">Simulate Traffic</button>
+            <div id="qos-sim"></div>`);
+    } catch (e) {
+        showError('Failed to load QoS policy');
+    }
+}
+
+async function simulateQoS() {
+    try {
+        const res = await fetch(`${API_BASE}/mgmt/qos/simulate`, {
+            method: 'POST',
+            headers: {'Content-Type': 'application/json'},
+            body: JSON.stringify({synthetic: {duration: 1.0}})
+        });
+        const result = await res.json();
+        const rows = result.classes.map(c => `<tr><td>${c.name}</td>
+            <td>${c.throughput_mbps} / ${c.offered_mbps}</td><td>${c.latency_p99_ms}</td>
+            <td>${c.queue_drops + c.policer_drops}</td></tr>`).join('');
+        document.getElementById('qos-sim').innerHTML = `<p>${result.packets} packets on a ${result.port_mbps} Mbps port</p>
+            <table><thead><tr><th>Class</th><th>Mbps (out / in)</th><th>p99 ms</th><th>Drops</th></tr></thead>
+            <tbody>${rows}</tbody></table>`;
+    } catch (e) {
+        showError('QoS simulation failed');
+    }
 }
 
 function showAddACL() {
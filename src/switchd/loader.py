@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+NateOS switchd config loader
+Parses the structured startup config and caches the result
+
+The file format is a YAML subset: nested mappings by indentation, block
+lists ("- item", including lists of mappings), inline [] / {} for empty
+or short scalar lists, quoted strings, ints (decimal or 0x), floats,
+true/false and null. Errors raise ConfigError carrying file:line.
+
+The parsed and validated config is cached as marshal data, keyed by the
+file's mtime and size and by its content hash. An unchanged file is
+served from the cache without being read. A touched file whose content
+is the same still skips the parse.
+"""
+import hashlib
+import marshal
+import os
+
+CACHE_FORMAT = 1
+
+DEFAULTS = {
+    "user_name": "",
+    "communication_language": "English",
+    "output_folder": "outputs",
+    "dataplane": {"vector_size": 256, "flows": 1024, "router_mac": "02:00:5e:00:00:01"},
+    "routes": [],
+    "mgmt": {"state_dir": "", "fsync": "group"},
+}
+
+# Known keys and their types; unknown top-level keys pass through untouched
+# (the file is shared with other tools), unknown keys inside a section are errors
+SCHEMA = {
+    "user_name": str,
+    "communication_language": str,
+    "output_folder": str,
+    "dataplane": {"vector_size": int, "flows": int, "router_mac": str},
+    "routes": [{"destination": str, "gateway": str, "distance": int, "vrf": str}],
+    "mgmt": {"state_dir": str, "fsync": str},
+}
+
+FSYNC_MODES = ("group", "each", "interval", "none")
+
+
+class ConfigError(Exception):
+    pass
+
+
+def parse_mac(text):
+    """'aa:bb:cc:dd:ee:ff' (or '-' separated) -> 48-bit int"""
+    parts = text.replace("-", ":").split(":")
+    if len(parts) != 6:
+        raise ValueError(f"invalid MAC address '{text}'")
+    try:
+        octets = [int(p, 16) for p in parts]
+    except ValueError:
+        raise ValueError(f"invalid MAC address '{text}'")
+    if any(not 0 <= o <= 255 for o in octets):
+        raise ValueError(f"invalid MAC address '{text}'")
+    return int.from_bytes(bytes(octets), "big")
+
+
+# --- parser -----------------------------------------------------------------
+
+def _strip_comment(text):
+    quote = None
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == "#" and (i == 0 or text[i - 1] in " \t"):
+            return text[:i].rstrip()
+    return text.rstrip()
+
+
+def _scalar(text, where):
+    if not text:
+        return None
+    if text[0] in "'\"":
+        if len(text) < 2 or text[-1] != text[0]:
+            raise ConfigError(f"{where}: unterminated string")
+        return text[1:-1]
+    if text[0] == "[" or text[0] == "{":
+        close = "]" if text[0] == "[" else "}"
+        if text[-1] != close:
+            raise ConfigError(f"{where}: unterminated inline {'list' if close == ']' else 'mapping'}")
+        inner = text[1:-1].strip()
+        if close == "}":
+            if inner:
+                raise ConfigError(f"{where}: only empty inline mappings are supported")
+            return {}
+        return [_scalar(item.strip(), where) for item in inner.split(",")] if inner else []
+    lowered = text.lower()
+    if lowered in ("true", "yes", "on"):
+        return True
+    if lowered in ("false", "no", "off"):
+        return False
+    if lowered in ("null", "~"):
+        return None
+    try:
+        return int(text, 0)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return text
+
+
+def _lines(text, path):
+    """(indent, lineno, content) for each meaningful line"""
+    out = []
+    for lineno, raw in enumerate(text.splitlines(), 1):
+        content = _strip_comment(raw)
+        if not content.strip() or content.strip() == "---":
+            continue
+        body = content.lstrip(" ")
+        if body.startswith("\t"):
+            raise ConfigError(f"{path}:{lineno}: tabs are not allowed for indentation")
+        out.append((len(content) - len(body), lineno, body))
+    return out
+
+
+class _Parser:
+    def __init__(self, lines, path):
+        self.lines = lines
+        self.path = path
+        self.pos = 0
+
+    def where(self, lineno):
+        return f"{self.path}:{lineno}"
+
+    def block(self, indent):
+        """Parse the mapping or list starting at the current line"""
+        if self.lines[self.pos][2].startswith("- ") or self.lines[self.pos][2] == "-":
+            return self.sequence(indent)
+        return self.mapping(indent)
+
+    def mapping(self, indent):
+        result = {}
+        while self.pos < len(self.lines):
+            ind, lineno, body = self.lines[self.pos]
+            if ind < indent:
+                break
+            if ind > indent:
+                raise ConfigError(f"{self.where(lineno)}: unexpected indentation")
+            if body.startswith("- "):
+                raise ConfigError(f"{self.where(lineno)}: list item where a key was expected")
+            key, sep, rest = body.partition(":")
+            if not sep or (rest and rest[0] not in " \t"):
+                raise ConfigError(f"{self.where(lineno)}: expected 'key: value'")
+            key = key.strip()
+            if key[:1] in "'\"" and key[-1:] == key[:1] and len(key) >= 2:
+                key = key[1:-1]
+            if not key:
+                raise ConfigError(f"{self.where(lineno)}: empty key")
+            if key in result:
+                raise ConfigError(f"{self.where(lineno)}: duplicate key '{key}'")
+            self.pos += 1
+            result[key] = self.value(rest.strip(), indent, lineno)
+        return result
+
+    def sequence(self, indent):
+        result = []
+        while self.pos < len(self.lines):
+            ind, lineno, body = self.lines[self.pos]
+            if ind < indent:
+                break
+            if ind > indent:
+                raise ConfigError(f"{self.where(lineno)}: unexpected indentation")
+            if not (body.startswith("- ") or body == "-"):
+                break  # back to the enclosing mapping's next key
+            item = body[2:].strip()
+            key, sep, rest = item.partition(":")
+            if sep and (not rest or rest[0] in " \t") and item[:1] not in "'\"[{":
+                # "- key: value" starts a mapping whose other keys align with it
+                item_indent = ind + 2
+                self.lines[self.pos] = (item_indent, lineno, item)
+                result.append(self.mapping(item_indent))
+            else:
+                self.pos += 1
+                result.append(self.value(item, indent, lineno))
+        return result
+
+    def value(self, text, indent, lineno):
+        if text:
+            if text in ("|", ">"):
+                raise ConfigError(f"{self.where(lineno)}: block scalars are not supported")
+            return _scalar(text, self.where(lineno))
+        if self.pos < len(self.lines) and self.lines[self.pos][0] > indent:
+            return self.block(self.lines[self.pos][0])
+        if self.pos < len(self.lines) and self.lines[self.pos][0] == indent and \
+                self.lines[self.pos][2].startswith("- "):
+            return self.sequence(indent)  # list items may sit at the key's indent
+        return None
+
+
+def parse(text, path="<config>"):
+    """Parse config text into plain dicts/lists/scalars"""
+    lines = _lines(text, path)
+    if not lines:
+        return {}
+    if lines[0][0] != 0:
+        raise ConfigError(f"{path}:{lines[0][1]}: unexpected indentation")
+    result = _Parser(lines, path).block(0)
+    if not isinstance(result, dict):
+        raise ConfigError(f"{path}: top level must be a mapping")
+    return result
+
+
+# --- validation -------------------------------------------------------------
+
+def _type_name(kind):
+    return {str: "a string", int: "an integer", bool: "a boolean"}.get(kind, kind.__name__)
+
+
+def _check(value, schema, where):
+    """Type-check value against schema; returns it with scalars coerced to str where declared"""
+    if isinstance(schema, dict):
+        if not isinstance(value, dict):
+            raise ConfigError(f"{where}: expected a mapping")
+        for key, item in value.items():
+            if key not in schema:
+                raise ConfigError(f"{where}.{key}: unknown key")
+            value[key] = _check(item, schema[key], f"{where}.{key}")
+    elif isinstance(schema, list):
+        if not isinstance(value, list):
+            raise ConfigError(f"{where}: expected a list")
+        value = [_check(item, schema[0], f"{where}[{i}]") for i, item in enumerate(value)]
+    elif schema is str:
+        if isinstance(value, (dict, list)):
+            raise ConfigError(f"{where}: expected a string")
+        value = "" if value is None else str(value)  # "user_name: 42" is still a name
+    elif not isinstance(value, schema) or isinstance(value, bool) and schema is not bool:
+        raise ConfigError(f"{where}: expected {_type_name(schema)}")
+    return value
+
+
+def validate(raw, path="<config>"):
+    """Type-check raw against SCHEMA, fill in DEFAULTS and check value ranges"""
+    config = {}
+    for key, value in raw.items():
+        if key in SCHEMA and value is not None:
+            value = _check(value, SCHEMA[key], f"{path}: {key}")
+        config[key] = value
+    for key, default in DEFAULTS.items():
+        if config.get(key) is None:
+            config[key] = default
+        elif isinstance(default, dict):
+            config[key] = dict(default, **config[key])
+
+    dp = config["dataplane"]
+    if not 32 <= dp["vector_size"] <= 256:
+        raise ConfigError(f"{path}: dataplane.vector_size must be 32-256")
+    if dp["flows"] < 1:
+        raise ConfigError(f"{path}: dataplane.flows must be positive")
+    try:
+        parse_mac(dp["router_mac"])
+    except ValueError as e:
+        raise ConfigError(f"{path}: dataplane.router_mac: {e}")
+    if config["routes"]:
+        import ipaddress  # only when routes are configured: it is slow to import
+    for i, route in enumerate(config["routes"]):
+        if "destination" not in route:
+            raise ConfigError(f"{path}: routes[{i}]: destination is required")
+        try:
+            ipaddress.ip_network(route["destination"], strict=False)
+        except ValueError as e:
+            raise ConfigError(f"{path}: routes[{i}]: {e}")
+        if not 0 <= route.get("distance", 1) <= 255:
+            raise ConfigError(f"{path}: routes[{i}]: distance must be 0-255")
+    if config["mgmt"]["fsync"] not in FSYNC_MODES:
+        raise ConfigError(f"{path}: mgmt.fsync must be one of {', '.join(FSYNC_MODES)}")
+    return config
+
+
+# --- cache ------------------------------------------------------------------
+
+def default_cache_path(path):
+    base = os.environ.get("NATEOS_CACHE_DIR") or os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), "nateos")
+    key = hashlib.blake2b(os.path.abspath(path).encode("utf-8"), digest_size=8).hexdigest()
+    return os.path.join(base, f"switchd-config-{key}.bin")
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path, "rb") as f:
+            entry = marshal.load(f)
+    except (OSError, EOFError, ValueError, TypeError):
+        return None
+    if not isinstance(entry, tuple) or len(entry) != 5 or entry[0] != CACHE_FORMAT:
+        return None
+    return entry
+
+
+def _write_cache(cache_path, entry):
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            marshal.dump(entry, f)
+        os.replace(tmp, cache_path)
+    except OSError:
+        pass  # the cache is an optimization; a read-only home must not stop switchd
+
+
+def load(path, cache_path=None, use_cache=True):
+    """Load and validate the config at path; returns (config, source)
+
+    source is "default" (no file), "cache" (mtime/size hit), "cache-hash"
+    (touched but unchanged) or "parsed".
+    """
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return validate({}, path), "default"
+    except OSError as e:
+        raise ConfigError(f"{path}: {e.strerror}")
+    stamp = (st.st_mtime_ns, st.st_size)
+    if use_cache:
+        cache_path = cache_path or default_cache_path(path)
+        entry = _read_cache(cache_path)
+        if entry is not None and (entry[1], entry[2]) == stamp:
+            return entry[4], "cache"
+
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        raise ConfigError(f"{path}: {e.strerror}")
+    digest = hashlib.blake2b(data, digest_size=16).digest()
+    if use_cache and entry is not None and entry[3] == digest:
+        _write_cache(cache_path, (CACHE_FORMAT, stamp[0], stamp[1], digest, entry[4]))
+        return entry[4], "cache-hash"
+
+    try:
+        text = data.decode("utf-8-sig")
+    except UnicodeDecodeError:
+        raise ConfigError(f"{path}: not valid UTF-8")
+    config = validate(parse(text, path), path)
+    if use_cache:
+        _write_cache(cache_path, (CACHE_FORMAT, stamp[0], stamp[1], digest, config))
+    return config, "parsed"
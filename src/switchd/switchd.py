@@ -1,39 +1,422 @@
 #!/usr/bin/env python3
+"""
+NateOS switch daemon
+Loads the startup config, then brings components up lazily in dependency
+order (config -> dataplane -> control -> mgmt), timing each phase.
+
+Usage: python src/switchd/switchd.py [--config PATH] [--startup-profile] [--generate N | --pcap FILE]
+                                    [--span-pcap FILE] [--metrics FILE] [--api URL] [--qos-sim TRACE.csv|synthetic]
+"""
+import time
+
+STARTED = time.perf_counter()
+
+import argparse
+import json
 import os
 import sys
 
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+from loader import ConfigError, load, parse_mac
+
 CONFIG_PATH = os.path.join("bmad", "bmm", "config.yaml")
+ROUTER_MAC = 0x02005E000001
+STARTUP_BUDGET_MS = 300.0
+# Frame sources number front-panel ports from 1 (GeneratorSource spreads
+# flows over 48); they take the first FDB port ids, as eth1..eth48
+FRONT_PORTS = 48
+# The component whose init completes "dataplane ready" (FIB programmed)
+READY_COMPONENT = "control"
 
 
-def read_simple_yaml(path):
-    config = {"user_name": "", "communication_language": "English", "output_folder": "outputs"}
-    if not os.path.exists(path):
-        return config
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("#"):
-                    continue
-                if ":" in line:
-                    key, value = line.split(":", 1)
-                    config[key.strip()] = value.strip()
-    except Exception:
-        pass
+def _init_config(startup):
+    config, source = load(startup.args.config, use_cache=not startup.args.no_config_cache)
+    startup.notes["config"] = source
     return config
 
 
-def main():
-    cfg = read_simple_yaml(CONFIG_PATH)
-    user = cfg.get("user_name", "Operator")
-    lang = cfg.get("communication_language", "English")
-    out = cfg.get("output_folder", "outputs")
+def _init_dataplane(startup):
+    from dataplane.acl import AclClassifier
+    from dataplane.fdb import Fdb
+    from dataplane.fib import Fib
+    from dataplane.pipeline import Pipeline
+
+    config = startup.get("config")
+    dp = config["dataplane"]
+    vector_size = dp["vector_size"]
+    if startup.args.vector_size is not None:
+        vector_size = startup.args.vector_size
+        if not 32 <= vector_size <= 256:
+            raise ConfigError("--vector-size must be 32-256")
+    router_mac = parse_mac(dp["router_mac"])
+    qos = None
+    if config.get("qos"):
+        from dataplane.qos import QosPolicy
+        try:
+            qos = QosPolicy(config["qos"])
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ConfigError(f"qos: {e}")
+    igmp = None
+    if (config.get("igmp_snooping") or {}).get("enabled"):
+        from control.igmp import IgmpSnooping
+        try:
+            igmp = IgmpSnooping(config["igmp_snooping"], now=time.monotonic())
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ConfigError(f"igmp_snooping: {e}")
+    fdb = Fdb()
+    for port in range(1, FRONT_PORTS + 1):
+        fdb.port_id(f"eth{port}")
+    lacp = None
+    if (config.get("lacp") or {}).get("bundles"):
+        from control.lacp import LacpSystem
+        try:
+            # LAG and member names share the FDB's port ids, so out_port can name a bundle
+            lacp = LacpSystem(config["lacp"], now=time.monotonic(), port_id=fdb.port_id)
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ConfigError(f"lacp: {e}")
+        lacp.set_links([(name, True) for name in lacp.members], time.monotonic())
+    span = None
+    if (config.get("span") or {}).get("sessions"):
+        from dataplane.span import SpanEngine
+        try:
+            span = SpanEngine(config["span"])
+        except (ValueError, TypeError, AttributeError, OSError) as e:
+            raise ConfigError(f"span: {e}")
+    fib = Fib()
+    pipeline = Pipeline(fdb, fib, AclClassifier(), router_mac=router_mac, vector_size=vector_size,
+                        qos=qos, igmp=igmp, lacp=lacp, span=span)
+    return {"pipeline": pipeline, "fib": fib, "fdb": fdb, "igmp": igmp, "router_mac": router_mac, "span": span}
+
+
+def _init_control(startup):
+    from control.routes import StaticRouteTable, parse
+
+    routes = startup.get("config")["routes"]
+    table = StaticRouteTable(startup.get("dataplane")["fib"])
+    if not routes:
+        # No configured routes: a default plus a spread of /8s for the synthetic traffic
+        routes = [{"destination": "0.0.0.0/0", "gateway": "192.0.2.1"}]
+        routes += [{"destination": f"{octet}.0.0.0/8", "gateway": f"192.0.2.{octet % 250 + 2}"}
+                   for octet in range(1, 224, 7)]
+    try:
+        # Each prefix is parsed once; load() programs the FIB from the parsed keys
+        entries, keys = zip(*map(parse, routes))
+        table.load(entries, keys)
+    except ValueError as e:
+        raise ConfigError(f"routes: {e}")
+    startup.notes["control"] = f"{len(table)} static routes"
+    return table
+
+
+def _init_mgmt(startup):
+    from mgmt.datastore import Datastore
+
+    mgmt = startup.get("config")["mgmt"]
+    initial = {"static_routes": {route["id"]: route for route in startup.get("control").routes()}}
+    if mgmt["state_dir"]:
+        import atexit
+        from mgmt.persist import open_datastore
+        store, log = open_datastore(mgmt["state_dir"], initial, fsync=mgmt["fsync"])
+        atexit.register(log.close)
+        return store
+    return Datastore(initial)
+
+
+# name -> (dependencies, init); each runs at most once, on first use
+COMPONENTS = {
+    "config": ((), _init_config),
+    "dataplane": (("config",), _init_dataplane),
+    "control": (("config", "dataplane"), _init_control),
+    "mgmt": (("config", "control"), _init_mgmt),
+}
+
+
+class Startup:
+    """Lazily initialized components with per-phase timing"""
+
+    def __init__(self, args, components=COMPONENTS):
+        self.args = args
+        self.components = components
+        self.phases = []
+        self.notes = {}
+        self.ready_ms = None
+        self._values = {}
+        self._starting = set()
+
+    def get(self, name):
+        """Return component name, initializing it (and its dependencies) first"""
+        if name in self._values:
+            return self._values[name]
+        if name in self._starting:
+            raise RuntimeError(f"component dependency cycle at '{name}'")
+        deps, init = self.components[name]
+        self._starting.add(name)
+        for dep in deps:
+            self.get(dep)
+        t0 = time.perf_counter()
+        value = init(self)
+        done = time.perf_counter()
+        self._starting.discard(name)
+        self._values[name] = value
+        self.phases.append({"component": name, "ms": round((done - t0) * 1000, 3),
+                            "at_ms": round((done - STARTED) * 1000, 3)})
+        if name == READY_COMPONENT:
+            self.ready_ms = round((done - STARTED) * 1000, 3)
+        return value
+
+    def start_all(self):
+        for name in self.components:
+            self.get(name)
+
+    def profile(self):
+        return {
+            "phases": [dict(p, note=self.notes[p["component"]]) if p["component"] in self.notes else p
+                       for p in self.phases],
+            "dataplane_ready_ms": self.ready_ms,
+            "budget_ms": STARTUP_BUDGET_MS,
+            "within_budget": self.ready_ms is not None and self.ready_ms <= STARTUP_BUDGET_MS,
+        }
+
+
+def print_profile(profile):
+    print("[switchd] Startup profile (ms since switchd import):")
+    for phase in profile["phases"]:
+        note = f"  ({phase['note']})" if "note" in phase else ""
+        print(f"[switchd]   {phase['component']:<10} {phase['ms']:>9.3f} ms  done at {phase['at_ms']:>9.3f} ms{note}")
+    if profile["dataplane_ready_ms"] is not None:
+        verdict = "within" if profile["within_budget"] else "OVER"
+        print(f"[switchd] Dataplane ready at {profile['dataplane_ready_ms']:.3f} ms "
+              f"({verdict} {profile['budget_ms']:.0f} ms budget)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog="switchd", description="NateOS switch daemon")
+    parser.add_argument("--config", default=CONFIG_PATH, help=f"Startup config (default {CONFIG_PATH})")
+    parser.add_argument("--no-config-cache", action="store_true", help="Always re-parse the config file")
+    parser.add_argument("--startup-profile", action="store_true",
+                        help="Bring every component up and print per-component init time")
+    parser.add_argument("--pcap", help="Drive the dataplane from a pcap file")
+    parser.add_argument("--pcap-loop", type=int, default=1, help="Replay the pcap N times")
+    parser.add_argument("--generate", type=int, metavar="N", help="Drive the dataplane with N synthetic frames")
+    parser.add_argument("--flows", type=int, help="Distinct flows for --generate (default from config, 1024)")
+    parser.add_argument("--vector-size", type=int, help="Frames per vector, 32-256 (default from config, 256)")
+    parser.add_argument("--span-pcap", metavar="FILE",
+                        help="After the run, write the SPAN mirror ring to a pcap (needs span sessions)")
+    parser.add_argument("--metrics", metavar="FILE",
+                        help="After the run, write per-stage counters and vector latency histograms "
+                             "(Prometheus text, for a textfile collector)")
+    parser.add_argument("--api", metavar="URL",
+                        help="After the run, report the learned FDB entries and IGMP memberships to the "
+                             "management API at URL (e.g. http://127.0.0.1:5000)")
+    parser.add_argument("--qos-sim", metavar="TRACE",
+                        help="Replay a CSV trace (time_s,dscp,length[,pcp]) or 'synthetic' through the qos config")
+    parser.add_argument("--qos-port", default="default", help="Port whose shaper --qos-sim uses")
+    parser.add_argument("--json", action="store_true", help="Print the dataplane report as JSON")
+    return parser.parse_args(argv)
+
+
+def run_dataplane(args, startup):
+    """Run the vector pipeline over a frame source using the started tables"""
+    from dataplane.pipeline import GeneratorSource, PcapSource
+
+    startup.get(READY_COMPONENT)
+    dataplane = startup.get("dataplane")
+    pipeline = dataplane["pipeline"]
+    if args.pcap:
+        try:
+            source = PcapSource(args.pcap, loop=args.pcap_loop)
+        except (OSError, ValueError) as e:
+            raise ConfigError(f"pcap: {e}")
+    else:
+        flows = args.flows or startup.get("config")["dataplane"]["flows"]
+        source = GeneratorSource(args.generate, flows=flows, router_mac=dataplane["router_mac"])
+    registry = None
+    if args.metrics:
+        registry = pipeline_metrics(pipeline, startup)
+    pipeline.run(source)
+    report = pipeline.report()
+    if registry is not None:
+        report["metrics"] = write_metrics(registry, args.metrics)
+    span = dataplane["span"]
+    if span is not None:
+        report["span"] = span.summary()
+        if args.span_pcap:
+            report["span"]["pcap"] = write_span_pcap(span, args.span_pcap)
+    if args.api:
+        report["api"] = push_state(dataplane, args.api)
+
+    if args.json:
+        return report
+    print(f"[switchd] Dataplane: {report['packets']} packets, vector={report['vector_size']}, "
+          f"{report['pipeline_mpps']} Mpps pipeline / {report['wall_mpps']} Mpps wall")
+    for stage in report["stages"]:
+        print(f"[switchd]   {stage['stage']:<7} {stage['mpps']:>8.3f} Mpps  {stage['ns_per_packet']:>8.1f} ns/pkt")
+    print(f"[switchd] Verdicts: {report['verdicts']}")
+    if span is not None:
+        for name, session in report["span"]["sessions"].items():
+            print(f"[switchd] SPAN {name}: {session['packets']} frames mirrored (1-in-{session['sample']}, "
+                  f"truncate {session['truncate']})")
+        if args.span_pcap:
+            pcap = report["span"]["pcap"]
+            print(f"[switchd] SPAN pcap: {pcap['packets']} frames to {pcap['path']}, "
+                  f"{pcap['lost']} overwritten before the drain")
+    if args.metrics:
+        print(f"[switchd] Metrics written to {args.metrics}")
+    if args.api:
+        pushed = report["api"]
+        print(f"[switchd] Reported {pushed['fdb']} FDB entries and {pushed['igmp']} IGMP memberships to {args.api}")
+    return report
+
+
+def pipeline_metrics(pipeline, startup):
+    """A metrics registry over the pipeline's stage counters and startup phases; attaches a vector latency histogram"""
+    from dataplane.pipeline import ACTION_NAMES
+    from mgmt.metrics import Registry
+
+    registry = Registry()
+    stats = pipeline.stats
+    registry.gauge("nateos_pipeline_stage_packets_total", "Packets through each pipeline stage",
+                   lambda: {s.labels: s.packets for s in stats}, ("stage",), kind="counter")
+    registry.gauge("nateos_pipeline_stage_vectors_total", "Vectors through each pipeline stage",
+                   lambda: {s.labels: s.vectors for s in stats}, ("stage",), kind="counter")
+    registry.gauge("nateos_pipeline_stage_seconds_total", "Time spent in each pipeline stage",
+                   lambda: {s.labels: s.ns / 1e9 for s in stats}, ("stage",), kind="counter")
+    pipeline.histogram = registry.histogram("nateos_pipeline_stage_vector_seconds",
+                                            "Time one vector spends in a pipeline stage", ("stage",))
+    registry.gauge("nateos_pipeline_verdicts_total", "Packets by final verdict",
+                   lambda: {(name,): count for name, count in zip(ACTION_NAMES, pipeline.egress.verdicts)},
+                   ("verdict",), kind="counter")
+    registry.gauge("nateos_startup_phase_seconds", "Init time of each switchd component",
+                   lambda: {(p["component"],): p["ms"] / 1e3 for p in startup.phases}, ("component",))
+    return registry
+
+
+def write_metrics(registry, path):
+    """Write the registry in the Prometheus text format, atomically (textfile collectors read it while we write)"""
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(registry.render())
+        os.replace(tmp, path)
+    except OSError as e:
+        raise ConfigError(f"metrics: {e}")
+    return {"path": path}
+
+
+def _post(url, body):
+    import urllib.error
+    import urllib.request
+
+    req = urllib.request.Request(url, data=json.dumps(body).encode("utf-8"), method="POST",
+                                 headers={"Content-Type": "application/json"})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return json.load(resp)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        raise ConfigError(f"api {url}: {e}")
+
+
+def push_state(dataplane, url):
+    """POST the learned FDB entries and snooped IGMP memberships to the management API at url"""
+    fdb, igmp = dataplane["fdb"], dataplane["igmp"]
+    now = time.monotonic()
+    fdb.expire(now)
+    entries = [{"vlan": e["vlan"], "mac": e["mac"], "port": e["port"], "age": e["age"]}
+               for e in fdb.entries(now=now) if e["type"] == "dynamic"]
+    base = url.rstrip("/")
+    _post(f"{base}/api/l2/fdb", {"entries": entries})
+    memberships = []
+    if igmp is not None:
+        igmp.advance(now)
+        for group in igmp.entries():
+            for port in group["ports"]:
+                if port["type"] == "dynamic":
+                    # The dataplane's IGMP ports are the frame sources' numbers
+                    name = port["port"]
+                    memberships.append({"vlan": group["vlan"], "group": group["group"], "source": group["source"],
+                                        "port": fdb.port_name(name) if isinstance(name, int) else name})
+        _post(f"{base}/api/l2/igmp-snooping/groups", {"entries": memberships})
+    return {"url": url, "fdb": len(entries), "igmp": len(memberships)}
+
+
+def write_span_pcap(span, path):
+    """Drain the mirror ring into a pcap file"""
+    from dataplane.span import PcapWriter, RingReader, wall_offset
+
+    reader = RingReader(span.ring)
+    try:
+        writer = PcapWriter(path)
+    except OSError as e:
+        raise ConfigError(f"span pcap: {e}")
+    try:
+        reader.drain(writer, ts_offset=wall_offset())
+    finally:
+        writer.close()
+    return {"path": path, "packets": writer.packets, "bytes": writer.bytes, "lost": reader.lost}
+
+
+def run_qos_sim(args, startup):
+    """Simulate the configured QoS policy over a trace; per-class throughput, latency, drops"""
+    from dataplane.qos import QosPolicy, load_trace, simulate, synthetic_trace
+
+    try:
+        policy = QosPolicy(startup.get("config").get("qos") or {})
+    except (ValueError, TypeError, AttributeError) as e:
+        raise ConfigError(f"qos: {e}")
+    if args.qos_sim == "synthetic":
+        trace = synthetic_trace()
+    else:
+        try:
+            trace = load_trace(args.qos_sim)
+        except (OSError, ValueError) as e:
+            raise ConfigError(str(e))
+    result = simulate(policy, trace, port=args.qos_port)
+    if args.json:
+        return result
+    print(f"[switchd] QoS simulation: {result['packets']} packets over {result['duration_s']}s "
+          f"on a {result['port_mbps']} Mbps port")
+    for c in result["classes"]:
+        print(f"[switchd]   tc{c['class']} {c['name']:<12} {c['throughput_mbps']:>9.2f}/{c['offered_mbps']:<9.2f} Mbps  "
+              f"avg {c['latency_avg_ms']:>8.3f} ms  p99 {c['latency_p99_ms']:>8.3f} ms  "
+              f"drops {c['queue_drops']} queue / {c['policer_drops']} policer")
+    return result
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    startup = Startup(args)
+    try:
+        cfg = startup.get("config")
+        user = cfg["user_name"] or "Operator"
+        if not args.json:
+            print(f"[switchd] NateOS starting (lang={cfg['communication_language']})")
+            print(f"[switchd] Hello, {user}!")
+            print(f"[switchd] Outputs: {cfg['output_folder']}")
+        if args.startup_profile:
+            startup.start_all()
+        report = run_dataplane(args, startup) if args.pcap or args.generate else None
+        qos_report = run_qos_sim(args, startup) if args.qos_sim else None
+    except ConfigError as e:
+        print(f"[switchd] Config error: {e}", file=sys.stderr)
+        return 2
 
-    print(f"[switchd] NateOS starting (lang={lang})")
-    print(f"[switchd] Hello, {user}!")
-    print(f"[switchd] Outputs: {out}")
-    print("[switchd] Loading components: dataplane, control-plane, mgmt-plane (stubs)")
-    # Future: initialize Redis/datastore, start protocol daemons, expose mgmt API/CLI
+    if args.json:
+        output = dict(report or {})
+        if qos_report is not None:
+            output["qos"] = qos_report
+        if args.startup_profile:
+            output["startup"] = startup.profile()
+        if output:
+            print(json.dumps(output, indent=2))
+    else:
+        print(f"[switchd] Components up: {', '.join(p['component'] for p in startup.phases)}")
+        if args.startup_profile:
+            print_profile(startup.profile())
+    # Future: start protocol daemons, expose mgmt API/CLI
+    return 0
 
 
 if __name__ == "__main__":